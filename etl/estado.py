@@ -0,0 +1,161 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║                 ESTADO DEL ETL EN SQLITE                     ║
+║                                                              ║
+║  Checkpoints por lote (reanudar una carga concurrente) y     ║
+║  watermarks por serie (carga incremental). Usa las           ║
+║  conexiones de db_manager; las tablas se crean al primer     ║
+║  uso, así que una BD existente no necesita migración         ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+from typing import Optional
+import logging
+import sqlite3
+
+from utils import db_manager
+
+logger = logging.getLogger(__name__)
+
+# Una fila por lote (metrica, entidad, rango) ya cargado en una ejecución del ETL. La
+# ejecución se identifica por su rango pedido (ver etl_xm_to_sqlite._id_ejecucion): al
+# reiniciar con los mismos argumentos se saltan los lotes registrados. Vive en la misma
+# BD que los datos: con --snapshot, una carga fallida descarta datos y checkpoints juntos.
+_SCHEMA_ETL_CHECKPOINTS = """
+    CREATE TABLE IF NOT EXISTS etl_checkpoints (
+        ejecucion VARCHAR(100) NOT NULL,
+        metrica VARCHAR(50) NOT NULL,
+        entidad VARCHAR(100) NOT NULL,
+        fecha_inicio DATE NOT NULL,
+        fecha_fin DATE NOT NULL,
+        registros INTEGER NOT NULL,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (ejecucion, metrica, entidad, fecha_inicio, fecha_fin)
+    ) WITHOUT ROWID
+"""
+
+
+def save_etl_checkpoint(ejecucion: str, metrica: str, entidad: str, fecha_inicio, fecha_fin,
+                        registros: int) -> bool:
+    """
+    Registra un lote del ETL como cargado (después de confirmar sus datos: si el proceso
+    muere entre ambos, el lote se repite y el upsert lo deja igual)
+    """
+    try:
+        with db_manager.get_connection() as conn:
+            conn.execute(_SCHEMA_ETL_CHECKPOINTS)
+            conn.execute("""
+                INSERT OR REPLACE INTO etl_checkpoints
+                    (ejecucion, metrica, entidad, fecha_inicio, fecha_fin, registros, fecha_actualizacion)
+                VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (ejecucion, metrica, entidad, str(fecha_inicio)[:10], str(fecha_fin)[:10], registros))
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error guardando checkpoint {metrica}/{entidad} {fecha_inicio}: {e}")
+        return False
+
+
+def get_etl_checkpoints(ejecucion: str) -> set:
+    """Lotes (metrica, entidad, fecha_inicio, fecha_fin) ya cargados en la ejecución"""
+    try:
+        with db_manager.get_connection(readonly=True) as conn:
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'etl_checkpoints'").fetchone():
+                return set()
+            return {tuple(fila) for fila in conn.execute("""
+                SELECT metrica, entidad, fecha_inicio, fecha_fin
+                FROM etl_checkpoints
+                WHERE ejecucion = ?
+            """, (ejecucion,))}
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error leyendo checkpoints de {ejecucion}: {e}")
+        return set()
+
+
+def clear_etl_checkpoints(ejecucion: Optional[str] = None) -> int:
+    """Borra los checkpoints de una ejecución (o todos); retorna filas borradas"""
+    try:
+        with db_manager.get_connection() as conn:
+            conn.execute(_SCHEMA_ETL_CHECKPOINTS)
+            if ejecucion is None:
+                borrados = conn.execute("DELETE FROM etl_checkpoints").rowcount
+            else:
+                borrados = conn.execute("DELETE FROM etl_checkpoints WHERE ejecucion = ?", (ejecucion,)).rowcount
+            conn.commit()
+        return borrados
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error borrando checkpoints: {e}")
+        return 0
+
+
+# Watermark por serie: fecha hasta la que el ETL cargó la serie sin lotes fallidos. La
+# carga incremental pide desde el watermark menos la ventana de revisión (XM revisa los
+# días recientes) en lugar de todo dias_history.
+_SCHEMA_ETL_WATERMARKS = """
+    CREATE TABLE IF NOT EXISTS etl_watermarks (
+        metrica VARCHAR(50) NOT NULL,
+        entidad VARCHAR(100) NOT NULL,
+        fecha DATE NOT NULL,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (metrica, entidad)
+    ) WITHOUT ROWID
+"""
+
+
+def get_etl_watermark(metrica: str, entidad: str) -> Optional[str]:
+    """
+    Watermark de la serie ('YYYY-MM-DD'). Si el ETL nunca lo registró (BD cargada antes
+    de los watermarks o por otra vía), la última fecha con datos según el índice de
+    cobertura; None si la serie no tiene datos
+    """
+    try:
+        with db_manager.get_connection(readonly=True) as conn:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'etl_watermarks'").fetchone():
+                fila = conn.execute("SELECT fecha FROM etl_watermarks WHERE metrica = ? AND entidad = ?",
+                                    (metrica, entidad)).fetchone()
+                if fila:
+                    return fila[0]
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error leyendo watermark de {metrica}/{entidad}: {e}")
+        return None
+    return db_manager.get_ultima_fecha(metrica, entidad)
+
+
+def set_etl_watermark(metrica: str, entidad: str, fecha) -> bool:
+    """Avanza el watermark de la serie a `fecha` (nunca lo retrocede)"""
+    try:
+        with db_manager.get_connection() as conn:
+            conn.execute(_SCHEMA_ETL_WATERMARKS)
+            conn.execute("""
+                INSERT INTO etl_watermarks (metrica, entidad, fecha, fecha_actualizacion)
+                VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(metrica, entidad) DO UPDATE SET
+                    fecha = MAX(fecha, excluded.fecha),
+                    fecha_actualizacion = CURRENT_TIMESTAMP
+            """, (metrica, entidad, str(fecha)[:10]))
+            conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error guardando watermark de {metrica}/{entidad}: {e}")
+        return False
+
+
+def clear_etl_watermarks(metrica: Optional[str] = None, entidad: Optional[str] = None) -> int:
+    """Borra los watermarks de una serie, de una métrica o todos; retorna filas borradas"""
+    try:
+        with db_manager.get_connection() as conn:
+            conn.execute(_SCHEMA_ETL_WATERMARKS)
+            condiciones, params = [], []
+            if metrica is not None:
+                condiciones.append("metrica = ?")
+                params.append(metrica)
+            if entidad is not None:
+                condiciones.append("entidad = ?")
+                params.append(entidad)
+            where = f" WHERE {' AND '.join(condiciones)}" if condiciones else ""
+            borrados = conn.execute(f"DELETE FROM etl_watermarks{where}", params).rowcount
+            conn.commit()
+        return borrados
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error borrando watermarks: {e}")
+        return 0
@@ -6,6 +6,12 @@ ETL COMPLETO: Descarga TODAS las métricas de XM (193 métricas)
 Este script consulta la API de XM, obtiene la lista completa de métricas
 disponibles y las descarga todas a la base de datos SQLite.
 
+Las descargas van en paralelo (pool acotado + limitador de tasa global de la API XM,
+utils/utils_xm.fetch_chunks_concurrente) y cada métrica se guarda apenas llega con la
+conversión vectorizada compartida con el ETL principal (etl/transformaciones.py) y la
+carga bulk de db_manager. Al final queda un reporte por métrica (segundos de descarga y
+de guardado, filas) en el log y en CSV.
+
 Uso:
     python3 etl/etl_todas_metricas_xm.py [--dias 90] [--solo-nuevas]
     
@@ -14,20 +20,26 @@ Argumentos:
     --solo-nuevas: Solo descargar métricas que no están en BD
     --metrica: Descargar solo una métrica específica
     --seccion: Descargar solo métricas de una sección específica
+    --workers: Descargas en paralelo (default: XM_API_WORKERS)
+    --reporte: Ruta del CSV con el reporte por métrica (default: logs/etl_todas_metricas_<fecha>.csv)
 """
 
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pydataxm.pydataxm import ReadDB
+try:
+    from pydataxm.pydataxm import ReadDB
+except ImportError:
+    ReadDB = None  # Sin pydataxm, ejecutar_etl_completo necesita un obj_api propio
 from datetime import datetime, timedelta
 import time
 import logging
 import pandas as pd
 import argparse
-import sqlite3
-from utils import db_manager
+from utils import db_manager, cache_manager, catalogos
+from utils.utils_xm import fetch_chunks_concurrente
+from etl.transformaciones import config_serie, valor_diario, filas_sqlite
 
 # Configurar logging
 logging.basicConfig(
@@ -35,7 +47,7 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-DB_PATH = '/home/admonctrlxm/server/portal_energetico.db'
+DIRECTORIO_REPORTES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'logs')
 
 # Clasificación de métricas por sección
 METRICAS_POR_SECCION = {
@@ -95,35 +107,37 @@ def obtener_todas_metricas_xm(obj_api):
         return None
 
 def obtener_metricas_en_bd():
-    """Obtener lista de métricas que ya están en la base de datos"""
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        query = "SELECT DISTINCT metrica FROM metrics"
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return set(df['metrica'].tolist())
-    except Exception as e:
-        logging.error(f"❌ Error al consultar BD: {e}")
+    """Obtener lista de métricas que ya están en la base de datos (catálogo de estadísticas)"""
+    stats = db_manager.get_metrics_stats()
+    if stats.empty:
         return set()
+    return set(stats['metrica'])
 
 def detectar_conversion(metric_id, entity):
-    """Detectar tipo de conversión necesaria basado en el nombre de la métrica"""
+    """
+    Conversión de la métrica (nombres de etl/transformaciones.valor_diario): la de
+    config_metricas si el ETL principal carga la serie; si no, según el nombre
+    """
+    config = config_serie(metric_id, entity)
+    if config is not None:
+        return config.get('conversion')
+    
     # Hidrología - datos en Wh
     if metric_id in ['AporEner', 'VoluUtilDiarEner', 'CapaUtilDiarEner', 'VertEner', 
                      'AporValorEner', 'VoluFinalMensEner', 'EneIndisp']:
         return 'Wh_a_GWh'
     
-    # Disponibilidad - promedio horario
+    # Disponibilidad - promedio horario (kW → MW)
     if 'Dispo' in metric_id:
-        return 'horas_a_MW'
+        return 'horas_a_diario'
     
     # Generación - suma horaria
     if 'Gene' in metric_id or metric_id in ['CapEfecNeta', 'CapaTeoHidroNacion']:
-        return 'horas_a_GWh'
+        return 'horas_a_diario'
     
     # Demanda - suma horaria
     if 'Dema' in metric_id:
-        return 'horas_a_GWh'
+        return 'horas_a_diario'
     
     # Precios, cargos - sin conversión
     if 'Prec' in metric_id or 'Cargo' in metric_id or 'Cost' in metric_id:
@@ -131,159 +145,77 @@ def detectar_conversion(metric_id, entity):
     
     # Transacciones - suma horaria generalmente
     if 'Comp' in metric_id or 'Vent' in metric_id or 'Trans' in metric_id:
-        return 'horas_a_GWh'
+        return 'horas_a_diario'
     
     # Por defecto
     return 'sin_conversion'
 
-def convertir_unidades(df, metric, conversion_type):
-    """Convertir unidades de datos crudos de XM"""
-    if df is None or df.empty:
-        return df
+def guardar_metrica(df, metric_id, entity, conversion):
+    """
+    Convierte una respuesta de la API XM y la guarda en SQLite con las funciones del ETL
+    principal: conversión vectorizada, upsert bulk, rollups y limpieza de la caché negativa
     
-    df = df.copy()
+    Returns:
+        Número de filas guardadas
+    """
+    if 'Date' not in df.columns and 'date' in df.columns:
+        df = df.rename(columns={'date': 'Date'})
     
-    try:
-        if conversion_type == 'Wh_a_GWh':
-            if 'Value' in df.columns:
-                df['Value'] = df['Value'] / 1_000_000
-                logging.info(f"  ✅ Convertido Wh → GWh")
-        
-        elif conversion_type == 'kWh_a_GWh':
-            if 'Value' in df.columns:
-                df['Value'] = df['Value'] / 1_000_000
-                logging.info(f"  ✅ Convertido kWh → GWh")
-        
-        elif conversion_type == 'horas_a_MW':
-            # Disponibilidad: Promediar valores horarios
-            hour_cols = [f'Values_Hour{i:02d}' for i in range(1, 25)]
-            existing_cols = [col for col in hour_cols if col in df.columns]
-            
-            if existing_cols:
-                df['Value'] = df[existing_cols].mean(axis=1) / 1_000  # kW → MW
-                df = df.dropna(subset=['Value'])
-                logging.info(f"  ✅ Promediado {len(existing_cols)} horas → MW")
-            elif 'Value' in df.columns:
-                df['Value'] = df['Value'] / 1_000
-                logging.info(f"  ✅ Convertido kW → MW")
-        
-        elif conversion_type == 'horas_a_GWh':
-            # Generación/Demanda: Sumar valores horarios
-            hour_cols = [f'Values_Hour{i:02d}' for i in range(1, 25)]
-            existing_cols = [col for col in hour_cols if col in df.columns]
-            
-            if existing_cols:
-                df['Value'] = df[existing_cols].sum(axis=1) / 1_000_000  # kWh → GWh
-                df = df.dropna(subset=['Value'])
-                logging.info(f"  ✅ Sumado {len(existing_cols)} horas → GWh")
-            elif 'Value' in df.columns:
-                df['Value'] = df['Value'] / 1_000_000
-                logging.info(f"  ✅ Convertido kWh → GWh")
-        
-    except Exception as e:
-        logging.warning(f"  ⚠️ Error en conversión: {e}")
+    codigos_embalse = (catalogos.mapa_nombres('ListadoEmbalses') or None) if entity == 'Embalse' else None
+    filas = filas_sqlite(valor_diario(df, metric_id, conversion), metric_id, entity, codigos_embalse)
+    if not filas:
+        return 0
     
-    return df
+    db_manager.upsert_metrics_bulk(filas)
+    db_manager.refresh_rollups_bulk(filas)
+    fechas = [fila[0] for fila in filas]
+    cache_manager.clear_empty_days(metric_id, entity, min(fechas), max(fechas))
+    return len(filas)
 
-def descargar_metrica(obj_api, metric_id, entity, dias_historia=90):
-    """Descargar una métrica específica de XM"""
-    fecha_fin = datetime.now() - timedelta(days=1)
-    fecha_inicio = fecha_fin - timedelta(days=dias_historia)
+def escribir_reporte(reporte, ruta=None):
+    """
+    Reporte por métrica (estado, filas, segundos de descarga y de guardado): resumen en
+    el log y CSV completo
+    
+    Returns:
+        Ruta del CSV (None si no se pudo escribir)
+    """
+    df = pd.DataFrame(reporte)
+    if df.empty:
+        return None
     
-    logging.info(f"\n{'='*70}")
-    logging.info(f"📊 Métrica: {metric_id} | Entidad: {entity}")
-    logging.info(f"📅 Período: {fecha_inicio.date()} → {fecha_fin.date()}")
+    df['total_s'] = df['descarga_s'] + df['guardado_s']
+    lentas = df.sort_values('total_s', ascending=False).head(10)
+    logging.info(f"\n🐢 Métricas más lentas:")
+    for _, fila in lentas.iterrows():
+        logging.info(f"  {fila['metrica']}/{fila['entidad']}: {fila['total_s']:.1f}s "
+                     f"(descarga {fila['descarga_s']:.1f}s, guardado {fila['guardado_s']:.1f}s), {fila['filas']:,} filas")
     
+    ruta = ruta or os.path.join(DIRECTORIO_REPORTES, f"etl_todas_metricas_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
     try:
-        # Consultar API
-        df = obj_api.request_data(
-            metric_id,
-            entity,
-            start_date=fecha_inicio.strftime('%Y-%m-%d'),
-            end_date=fecha_fin.strftime('%Y-%m-%d')
-        )
-        
-        if df is None or df.empty:
-            logging.warning(f"  ⚠️ Sin datos disponibles")
-            return 0
-        
-        logging.info(f"  ✅ Descargados {len(df)} registros")
-        
-        # Detectar y aplicar conversión
-        conversion = detectar_conversion(metric_id, entity)
-        df = convertir_unidades(df, metric_id, conversion)
-        
-        if df.empty:
-            logging.warning(f"  ⚠️ Sin datos después de conversión")
-            return 0
-        
-        # Preparar datos para inserción
-        registros = []
-        
-        # Detectar columnas relevantes
-        fecha_col = 'Date' if 'Date' in df.columns else 'date'
-        valor_col = 'Value'
-        
-        # Columnas de identificación (priorizar Name sobre Id)
-        id_cols = []
-        if 'Name' in df.columns:
-            id_cols.append('Name')
-        elif 'Code' in df.columns:
-            id_cols.append('Code')
-        elif 'Agent' in df.columns:
-            id_cols.append('Agent')
-        elif 'Id' in df.columns:
-            id_cols.append('Id')
-        
-        for _, row in df.iterrows():
-            # Recurso/Agente/Id
-            recurso = None
-            if id_cols:
-                recurso = str(row[id_cols[0]]) if pd.notna(row[id_cols[0]]) else None
-            
-            # Fecha
-            fecha = pd.to_datetime(row[fecha_col]).strftime('%Y-%m-%d')
-            
-            # Valor
-            valor = float(row[valor_col]) if pd.notna(row[valor_col]) else None
-            
-            if valor is not None:
-                registros.append({
-                    'fecha': fecha,
-                    'metrica': metric_id,
-                    'entidad': entity,
-                    'recurso': recurso,
-                    'valor_gwh': valor
-                })
-        
-        # Insertar en BD
-        if registros:
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            
-            for reg in registros:
-                cursor.execute("""
-                    INSERT OR REPLACE INTO metrics 
-                    (fecha, metrica, entidad, recurso, valor_gwh, fecha_actualizacion)
-                    VALUES (?, ?, ?, ?, ?, datetime('now'))
-                """, (reg['fecha'], reg['metrica'], reg['entidad'], 
-                      reg['recurso'], reg['valor_gwh']))
-            
-            conn.commit()
-            conn.close()
-            
-            logging.info(f"  💾 Insertados {len(registros)} registros en BD")
-            return len(registros)
-        else:
-            logging.warning(f"  ⚠️ No hay registros para insertar")
-            return 0
-            
-    except Exception as e:
-        logging.error(f"  ❌ Error: {e}")
-        return 0
+        os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+        df.to_csv(ruta, index=False)
+        logging.info(f"📄 Reporte por métrica: {ruta}")
+        return ruta
+    except OSError as e:
+        logging.error(f"❌ Error escribiendo reporte {ruta}: {e}")
+        return None
 
-def ejecutar_etl_completo(dias=90, solo_nuevas=False, metrica_especifica=None, seccion_especifica=None):
-    """Ejecutar ETL completo de todas las métricas"""
+def ejecutar_etl_completo(dias=90, solo_nuevas=False, metrica_especifica=None, seccion_especifica=None,
+                          max_workers=None, reporte=None, obj_api=None):
+    """
+    Ejecutar ETL completo de todas las métricas
+    
+    Las métricas se descargan en paralelo (max_workers hilos, limitador de tasa global de
+    la API XM) y se guardan de a una, en el orden en que llegan.
+    
+    Args:
+        obj_api: Cliente de la API XM (all_variables, request_data); por defecto ReadDB()
+    
+    Returns:
+        Diccionario con estadísticas (total, exitosas, sin_datos, fallidas, registros,
+        tiempo_total, tiempo_secuencial_estimado, reporte)
+    """
     inicio = time.time()
     stats = {
         'total': 0,
@@ -300,14 +232,18 @@ def ejecutar_etl_completo(dias=90, solo_nuevas=False, metrica_especifica=None, s
     logging.info(f"🔄 Solo nuevas: {'Sí' if solo_nuevas else 'No'}")
     
     # Conectar a API
-    logging.info("\n🔌 Conectando a API XM...")
-    obj_api = ReadDB()
+    if obj_api is None:
+        if ReadDB is None:
+            logging.error("❌ pydataxm no disponible")
+            return stats
+        logging.info("\n🔌 Conectando a API XM...")
+        obj_api = ReadDB()
     
     # Obtener lista completa de métricas
     df_metricas = obtener_todas_metricas_xm(obj_api)
     if df_metricas is None:
         logging.error("❌ No se pudo obtener lista de métricas")
-        return
+        return stats
     
     # Filtrar por métrica específica
     if metrica_especifica:
@@ -327,28 +263,67 @@ def ejecutar_etl_completo(dias=90, solo_nuevas=False, metrica_especifica=None, s
         df_metricas = df_metricas[~df_metricas['MetricId'].isin(metricas_bd)]
         logging.info(f"🆕 Métricas nuevas a descargar: {len(df_metricas)}")
     
-    stats['total'] = len(df_metricas)
+    tareas = list(dict.fromkeys(zip(df_metricas['MetricId'], df_metricas['Entity'])))
+    stats['total'] = len(tareas)
     
-    # Procesar cada métrica
-    for idx, row in df_metricas.iterrows():
-        metric_id = row['MetricId']
-        entity = row['Entity']
-        
-        registros = descargar_metrica(obj_api, metric_id, entity, dias)
-        
-        if registros > 0:
-            stats['exitosas'] += 1
-            stats['registros'] += registros
-        elif registros == 0:
-            stats['sin_datos'] += 1
+    fecha_fin = (datetime.now() - timedelta(days=1)).date()
+    fecha_inicio = fecha_fin - timedelta(days=dias)
+    logging.info(f"📅 Período: {fecha_inicio} → {fecha_fin}")
+    
+    # Segundos de descarga por métrica (suma de los intentos); cada hilo escribe su clave
+    descarga_s = {}
+    
+    def _descargar(tarea):
+        metric_id, entity = tarea
+        t0 = time.time()
+        try:
+            return obj_api.request_data(
+                metric_id,
+                entity,
+                start_date=str(fecha_inicio),
+                end_date=str(fecha_fin)
+            )
+        finally:
+            descarga_s[tarea] = descarga_s.get(tarea, 0.0) + time.time() - t0
+    
+    # Descargas en paralelo; cada métrica se convierte y guarda apenas llega
+    reporte_metricas = []
+    for n, (tarea, df) in enumerate(fetch_chunks_concurrente(_descargar, tareas, max_workers=max_workers), start=1):
+        metric_id, entity = tarea
+        t0 = time.time()
+        filas = 0
+        if df is None:
+            estado = 'fallida'
+        elif df.empty:
+            estado = 'sin_datos'
         else:
-            stats['fallidas'] += 1
+            try:
+                filas = guardar_metrica(df, metric_id, entity, detectar_conversion(metric_id, entity))
+                estado = 'exitosa' if filas else 'sin_datos'
+            except Exception as e:
+                logging.error(f"  ❌ {metric_id}/{entity}: {e}")
+                estado = 'fallida'
         
-        # Pausa entre métricas
-        time.sleep(0.5)
+        reporte_metricas.append({
+            'metrica': metric_id,
+            'entidad': entity,
+            'estado': estado,
+            'filas_api': 0 if df is None else len(df),
+            'filas': filas,
+            'descarga_s': round(descarga_s.get(tarea, 0.0), 2),
+            'guardado_s': round(time.time() - t0, 2),
+        })
+        stats[{'exitosa': 'exitosas', 'sin_datos': 'sin_datos', 'fallida': 'fallidas'}[estado]] += 1
+        stats['registros'] += filas
+        icono = {'exitosa': '✅', 'sin_datos': '⚠️', 'fallida': '❌'}[estado]
+        logging.info(f"[{n}/{len(tareas)}] {icono} {metric_id}/{entity}: {filas:,} filas "
+                     f"(descarga {reporte_metricas[-1]['descarga_s']:.1f}s, guardado {reporte_metricas[-1]['guardado_s']:.1f}s)")
     
     # Resumen
     tiempo_total = time.time() - inicio
+    stats['tiempo_total'] = tiempo_total
+    # La versión secuencial hacía lo mismo de a una métrica, con 0.5 s de pausa entre ellas
+    stats['tiempo_secuencial_estimado'] = sum(r['descarga_s'] + r['guardado_s'] + 0.5 for r in reporte_metricas)
     
     logging.info("\n╔══════════════════════════════════════════════════════════════╗")
     logging.info("║                    RESUMEN ETL COMPLETO                      ║")
@@ -359,30 +334,23 @@ def ejecutar_etl_completo(dias=90, solo_nuevas=False, metrica_especifica=None, s
     logging.info(f"  ❌ Fallidas: {stats['fallidas']}")
     logging.info(f"💾 Total registros insertados: {stats['registros']:,}")
     logging.info(f"⏱️  Tiempo total: {tiempo_total:.1f} seg ({tiempo_total/60:.1f} min)")
+    logging.info(f"⏱️  Tiempo secuencial estimado: {stats['tiempo_secuencial_estimado']:.1f} seg "
+                 f"({stats['tiempo_secuencial_estimado'] / max(tiempo_total, 1e-9):.1f}× más lento)")
     
-    # Estadísticas de BD
-    try:
-        conn = sqlite3.connect(DB_PATH)
-        df_stats = pd.read_sql_query("""
-            SELECT 
-                COUNT(*) as total_registros,
-                COUNT(DISTINCT metrica) as metricas_unicas,
-                COUNT(DISTINCT fecha) as dias_unicos,
-                MIN(fecha) as fecha_min,
-                MAX(fecha) as fecha_max
-            FROM metrics
-        """, conn)
-        conn.close()
-        
+    stats['reporte'] = escribir_reporte(reporte_metricas, reporte)
+    
+    # Estadísticas de BD (catálogo de estadísticas de db_manager, sin recorrer metrics)
+    db_stats = db_manager.get_database_stats()
+    if db_stats:
         logging.info(f"\n📈 Estadísticas de Base de Datos:")
-        logging.info(f"  Total registros: {df_stats['total_registros'][0]:,}")
-        logging.info(f"  Métricas únicas: {df_stats['metricas_unicas'][0]}")
-        logging.info(f"  Días únicos: {df_stats['dias_unicos'][0]}")
-        logging.info(f"  Rango: {df_stats['fecha_min'][0]} → {df_stats['fecha_max'][0]}")
-    except Exception as e:
-        logging.error(f"❌ Error al obtener estadísticas: {e}")
+        logging.info(f"  Total registros: {db_stats['total_registros']:,}")
+        logging.info(f"  Métricas únicas: {db_stats['metricas_unicas']}")
+        logging.info(f"  Rango: {db_stats['fecha_minima']} → {db_stats['fecha_maxima']}")
+    else:
+        logging.error("❌ Error al obtener estadísticas (ver log de db_manager)")
     
     logging.info(f"\n✅ ETL completado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    return stats
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='ETL Completo: Todas las métricas XM')
@@ -391,6 +359,8 @@ if __name__ == "__main__":
     parser.add_argument('--metrica', type=str, help='Descargar solo una métrica específica')
     parser.add_argument('--seccion', type=str, help='Descargar solo métricas de una sección',
                        choices=list(METRICAS_POR_SECCION.keys()))
+    parser.add_argument('--workers', type=int, help='Descargas en paralelo (default: XM_API_WORKERS)')
+    parser.add_argument('--reporte', type=str, help='Ruta del CSV con el reporte por métrica')
     
     args = parser.parse_args()
     
@@ -398,5 +368,7 @@ if __name__ == "__main__":
         dias=args.dias,
         solo_nuevas=args.solo_nuevas,
         metrica_especifica=args.metrica,
-        seccion_especifica=args.seccion
+        seccion_especifica=args.seccion,
+        max_workers=args.workers,
+        reporte=args.reporte
     )
@@ -8,23 +8,44 @@ Script ETL que consulta la API de XM y popula la base de datos SQLite.
 Reemplaza: scripts/precalentar_cache_inteligente.py
 
 Ejecución:
-    Automático: Cron 3×/día (06:30, 12:30, 20:30)
+    Automático: Cron 3×/día (06:30, 12:30, 20:30), incremental desde el watermark de cada serie
     Manual: python3 etl/etl_xm_to_sqlite.py
+    Backfill completo (bajo demanda): python3 etl/etl_xm_to_sqlite.py --completo
+    Revisar más días recientes: python3 etl/etl_xm_to_sqlite.py --ventana-revision 45
     Manual (sin timeout): python3 etl/etl_xm_to_sqlite.py --sin-timeout
+    Concurrente y reanudable: python3 etl/etl_xm_to_sqlite.py --concurrente --fecha-inicio 2020-01-01
+    Sobre un snapshot (publicación atómica): python3 etl/etl_xm_to_sqlite.py --snapshot
 """
 
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from pydataxm.pydataxm import ReadDB
+try:
+    from pydataxm.pydataxm import ReadDB
+except ImportError:
+    ReadDB = None  # Sin pydataxm solo se pueden usar las funciones con un obj_api propio
 from datetime import datetime, timedelta
 import time
+import threading
 import logging
+import numpy as np
 import pandas as pd
 import argparse
-from utils import db_manager
+from utils import db_manager, analitica, cache_manager, catalogos
+from utils._xm import escribir_cubo_reciente
+from utils.utils_xm import chunk_date_ranges, fetch_chunks_concurrente
 from etl.config_metricas import METRICAS_CONFIG
+from etl.transformaciones import valor_diario, unidad_metrica, filas_sqlite, filas_horarias
+from etl.estado import (save_etl_checkpoint, get_etl_checkpoints, clear_etl_checkpoints,
+                        get_etl_watermark, set_etl_watermark)
+
+# Catálogos de mapeo código → nombre (FASE 1, antes que las métricas)
+CATALOGOS_XM = ['ListadoRecursos', 'ListadoEmbalses', 'ListadoRios', 'ListadoAgentes']
+
+# Días antes del watermark que la carga incremental vuelve a pedir: XM revisa los datos
+# recientes después de publicarlos
+VENTANA_REVISION_DIAS = int(os.getenv('ETL_VENTANA_REVISION_DIAS', 7))
 
 # Configurar logging
 logging.basicConfig(
@@ -32,90 +53,6 @@ logging.basicConfig(
     format='%(asctime)s - %(levelname)s - %(message)s'
 )
 
-def convertir_unidades(df, metric, conversion_type):
-    """
-    Convertir unidades de datos crudos de XM a GWh o MW
-    
-    Conversiones:
-    - Wh_a_GWh: Divide por 1e6 (AporEner)
-    - kWh_a_GWh: Divide por 1e6 (VoluUtil, CapaUtil)
-    - horas_a_diario: Suma Values_Hour01-24 en kWh → GWh (para generación)
-                      Promedio Values_Hour01-24 en kW → MW (para disponibilidad)
-    - sin_conversion: No aplica conversión (ya en unidades correctas)
-    """
-    if df is None or df.empty:
-        logging.warning(f"⚠️ {metric}: DataFrame vacío")
-        return df
-    
-    if conversion_type is None or conversion_type == 'sin_conversion':
-        return df
-    
-    df = df.copy()
-    
-    try:
-        if conversion_type == 'Wh_a_GWh':
-            if 'Value' in df.columns:
-                valor_antes = df['Value'].mean()
-                df['Value'] = df['Value'] / 1_000_000  # Wh → GWh
-                valor_despues = df['Value'].mean()
-                logging.info(f"✅ {metric}: Wh→GWh | Promedio: {valor_antes:,.0f} Wh → {valor_despues:.2f} GWh")
-        
-        elif conversion_type == 'kWh_a_GWh':
-            if 'Value' in df.columns:
-                valor_antes = df['Value'].mean()
-                df['Value'] = df['Value'] / 1_000_000  # kWh → GWh
-                valor_despues = df['Value'].mean()
-                logging.info(f"✅ {metric}: kWh→GWh | Promedio: {valor_antes:,.2f} kWh → {valor_despues:.2f} GWh")
-        
-        elif conversion_type == 'horas_a_diario':
-            # Procesar valores horarios (Values_Hour01-24)
-            hour_cols = [f'Values_Hour{i:02d}' for i in range(1, 25)]
-            existing_cols = [col for col in hour_cols if col in df.columns]
-            
-            if existing_cols:
-                # Detectar tipo de métrica por nombre
-                if 'Dispo' in metric:
-                    # Disponibilidad: Promediar valores en kW → MW
-                    df['Value'] = df[existing_cols].mean(axis=1) / 1_000  # kW → MW
-                    # Filtrar NaN (recursos sin datos)
-                    filas_antes = len(df)
-                    df = df.dropna(subset=['Value'])
-                    filas_despues = len(df)
-                    if filas_antes != filas_despues:
-                        logging.info(f"  ⚠️ Eliminadas {filas_antes - filas_despues} filas sin datos (NaN)")
-                    valor_despues = df['Value'].mean() if not df.empty else 0
-                    logging.info(f"✅ {metric}: Promedio {len(existing_cols)} horas (kW→MW) → {valor_despues:.2f} MW promedio")
-                elif 'Prec' in metric:
-                    # Precios: Promediar valores horarios en $/kWh (sin conversión de unidades)
-                    df['Value'] = df[existing_cols].mean(axis=1)
-                    # Filtrar NaN
-                    filas_antes = len(df)
-                    df = df.dropna(subset=['Value'])
-                    filas_despues = len(df)
-                    if filas_antes != filas_despues:
-                        logging.info(f"  ⚠️ Eliminadas {filas_antes - filas_despues} filas sin datos (NaN)")
-                    valor_despues = df['Value'].mean() if not df.empty else 0
-                    logging.info(f"✅ {metric}: Promedio {len(existing_cols)} horas → ${valor_despues:.2f}/kWh promedio")
-                else:
-                    # Generación: Sumar valores en kWh → GWh
-                    df['Value'] = df[existing_cols].sum(axis=1) / 1_000_000  # kWh → GWh
-                    # Filtrar NaN
-                    df = df.dropna(subset=['Value'])
-                    valor_despues = df['Value'].mean() if not df.empty else 0
-                    logging.info(f"✅ {metric}: Agregado {len(existing_cols)} horas → {valor_despues:.2f} GWh promedio")
-            elif 'Value' in df.columns:
-                valor_antes = df['Value'].mean()
-                df['Value'] = df['Value'] / 1_000_000
-                df = df.dropna(subset=['Value'])
-                valor_despues = df['Value'].mean() if not df.empty else 0
-                logging.info(f"✅ {metric}: Value (kWh→GWh) | {valor_antes:,.2f} → {valor_despues:.2f} GWh")
-        
-        return df
-        
-    except Exception as e:
-        logging.error(f"❌ Error convirtiendo unidades para {metric}: {e}")
-        return df
-
 
 def poblar_catalogo(obj_api, catalogo_name: str) -> int:
     """
@@ -222,10 +159,168 @@ def poblar_catalogo(obj_api, catalogo_name: str) -> int:
         return 0
 
 
-def poblar_metrica(obj_api, config, usar_timeout=True, timeout_seconds=60, fecha_inicio_custom=None, fecha_fin_custom=None):
+def rango_metrica(config, fecha_inicio_custom=None, fecha_fin_custom=None):
+    """(fecha_inicio, fecha_fin) a cargar: las personalizadas o los dias_history hasta ayer"""
+    fecha_fin_auto = datetime.now().date() - timedelta(days=1)
+    if fecha_inicio_custom:
+        fecha_inicio = datetime.strptime(fecha_inicio_custom, '%Y-%m-%d').date()
+    else:
+        fecha_inicio = fecha_fin_auto - timedelta(days=config.get('dias_history', 7))
+    
+    if fecha_fin_custom:
+        fecha_fin = datetime.strptime(fecha_fin_custom, '%Y-%m-%d').date()
+    else:
+        fecha_fin = fecha_fin_auto
+    return fecha_inicio, fecha_fin
+
+
+def rango_carga(config, fecha_inicio_custom=None, fecha_fin_custom=None, incremental=False,
+                ventana_revision=None):
+    """
+    (fecha_inicio, fecha_fin, watermark, desde_limite) a cargar
+    
+    En modo incremental (sin fecha de inicio personalizada) el inicio es el watermark de
+    la serie menos la ventana de revisión, sin ir más atrás que dias_history; una serie
+    sin watermark ni datos se carga completa. Si no, el rango de rango_metrica.
+    
+    desde_limite es True si el inicio es el límite de dias_history (el ETL no carga nada
+    más viejo): aunque el watermark haya quedado más atrás, el rango cuenta como empalmado
+    y _avanzar_watermark lo mueve; si no, una serie atrasada más de dias_history (p. ej.
+    tras una caída del ETL) se descargaría completa en cada corrida.
+    """
+    watermark = get_etl_watermark(config['metric'], config['entity'])
+    fecha_inicio, fecha_fin = rango_metrica(config, fecha_inicio_custom, fecha_fin_custom)
+    desde_limite = not fecha_inicio_custom
+    if incremental and not fecha_inicio_custom and watermark:
+        ventana = VENTANA_REVISION_DIAS if ventana_revision is None else ventana_revision
+        desde = datetime.strptime(watermark, '%Y-%m-%d').date() - timedelta(days=ventana)
+        desde_limite = desde <= fecha_inicio
+        fecha_inicio = max(fecha_inicio, desde)
+    return fecha_inicio, fecha_fin, watermark, desde_limite
+
+
+def _avanzar_watermark(metric, entity, watermark, fecha_inicio, fecha_fin, desde_limite=False):
+    """
+    Tras cargar [fecha_inicio, fecha_fin] sin lotes fallidos, avanza el watermark a la
+    última fecha con datos del rango, si el rango empalma con el watermark anterior o
+    empieza en el límite de dias_history (ver rango_carga); una carga posterior que deje
+    un hueco detrás no lo mueve
+    """
+    ultima = db_manager.get_ultima_fecha(metric, entity, hasta=fecha_fin)
+    if ultima is None or ultima < str(fecha_inicio):
+        return  # XM no publicó nada en el rango
+    if (watermark is None or desde_limite
+            or fecha_inicio <= datetime.strptime(watermark, '%Y-%m-%d').date() + timedelta(days=1)):
+        set_etl_watermark(metric, entity, ultima)
+
+
+def lotes_metrica(config, fecha_inicio, fecha_fin):
+    """Lotes (ini, fin) de una métrica: de batch_size días si es menor que dias_history; si no, uno solo"""
+    dias_history = config.get('dias_history', 7)
+    batch_size = config.get('batch_size', dias_history)
+    if batch_size < dias_history:
+        return chunk_date_ranges(fecha_inicio, fecha_fin, chunk_days=batch_size)
+    return [(fecha_inicio, fecha_fin)] if fecha_inicio <= fecha_fin else []
+
+
+def guardar_datos(df, metric, entity, conversion) -> int:
+    """
+    Convierte una respuesta de la API XM (todo el rango o un lote) y la guarda en SQLite:
+    datos diarios, rollups, datos horarios y limpieza de la caché negativa
+
+    Args:
+        df: DataFrame crudo de request_data
+        metric, entity: Serie
+        conversion: Conversión de config_metricas
+
+    Returns:
+        Número de registros diarios insertados o modificados
+    """
+    total_insertados = 0
+    
+    # Validar datos
+    if df is None or df.empty:
+        logging.warning(f"❌ {metric}/{entity}: Sin datos de API")
+        return 0
+    
+    logging.info(f"  📊 Datos recibidos: {len(df)} filas")
+    
+    # Convertir unidades (las mismas reglas que la lectura con relleno de huecos de utils/_xm.py)
+    if conversion:
+        logging.info(f"  🔄 Aplicando conversión: {conversion}")
+        filas_antes = len(df)
+        df = valor_diario(df, metric, conversion)
+        if df is None or df.empty:
+            logging.error(f"❌ {metric}/{entity}: Conversión falló (DataFrame vacío)")
+            return 0
+        if len(df) != filas_antes:
+            logging.info(f"  ⚠️ Eliminadas {filas_antes - len(df)} filas sin datos (NaN)")
+        if 'Value' in df.columns:
+            logging.info(f"✅ {metric}: {conversion} → {df['Value'].mean():.2f} {unidad_metrica(metric)} promedio")
+    
+    # Detectar columnas necesarias
+    if 'Date' not in df.columns:
+        logging.error(f"❌ {metric}/{entity}: Falta columna 'Date'")
+        logging.error(f"   Columnas disponibles: {list(df.columns)}")
+        return 0
+    
+    if 'Value' not in df.columns:
+        logging.error(f"❌ {metric}/{entity}: Falta columna 'Value'")
+        logging.error(f"   Columnas disponibles: {list(df.columns)}")
+        logging.error(f"   Conversión aplicada: {conversion}")
+        return 0
+    
+    # Búsqueda inversa nombre → código de embalses (catálogo en memoria del proceso)
+    nombre_a_codigo_embalses = None
+    if entity == 'Embalse':
+        nombre_a_codigo_embalses = catalogos.mapa_nombres('ListadoEmbalses') or None
+        if nombre_a_codigo_embalses:
+            logging.info(f"📖 Catálogo de Embalses cargado: {len(nombre_a_codigo_embalses)} embalses")
+    
+    # Tuplas para SQLite con operaciones vectorizadas (etl/transformaciones.py): columna de
+    # recurso detectada una vez, '_SISTEMA_' normalizado, embalses nombre → código y
+    # validaciones de DemaCome/DemaReal
+    metrics_to_insert = filas_sqlite(df, metric, entity, nombre_a_codigo_embalses, coincidencia_parcial=True)
+    
+    # Insertar en SQLite (bulk)
+    if metrics_to_insert:
+        total_insertados = db_manager.upsert_metrics_bulk(metrics_to_insert)
+        logging.info(f"✅ {metric}/{entity}: {total_insertados} registros guardados en SQLite")
+        
+        # Mantener rollups semanales/mensuales/anuales de los periodos tocados
+        db_manager.refresh_rollups_bulk(metrics_to_insert)
+        
+        # XM ya publicó estos días: olvidar los que la caché negativa tenía como vacíos
+        fechas = [fila[0] for fila in metrics_to_insert]
+        cache_manager.clear_empty_days(metric, entity, min(fechas), max(fechas))
+    
+    # =========================================================================
+    # GUARDAR DATOS HORARIOS (si existen columnas Values_Hour01-24)
+    # =========================================================================
+    hourly_data = filas_horarias(df, metric, entity)
+    
+    # Insertar datos horarios en bulk (una fila por serie y día)
+    if hourly_data:
+        logging.info(f"  💾 Guardando datos horarios para {metric}/{entity}...")
+        dias_horarios = db_manager.upsert_hourly_dia_bulk(hourly_data)
+        horas = sum(int((~np.isnan(valores)).sum()) for *_, valores in hourly_data)
+        logging.info(f"  ✅ Datos horarios: {dias_horarios} días guardados ({horas} horas)")
+    
+    return total_insertados
+
+
+def poblar_metrica(obj_api, config, usar_timeout=True, timeout_seconds=60, fecha_inicio_custom=None, fecha_fin_custom=None,
+                   incremental=False, ventana_revision=None):
     """
     Consulta API XM y popula SQLite para una métrica
     
+    Con batch_size < dias_history la descarga va por lotes en paralelo y cada lote se
+    guarda en SQLite apenas llega (ver guardar_datos): el pico de memoria lo fija el
+    tamaño del lote y los lotes ya guardados sobreviven a un error en uno posterior.
+    
+    Con incremental solo se piden los días desde el watermark de la serie menos la
+    ventana de revisión (ver rango_carga); una carga sin lotes fallidos avanza el watermark.
+    
     Args:
         obj_api: Objeto ReadDB de pydataxm
         config: Configuración de la métrica
@@ -233,9 +328,17 @@ def poblar_metrica(obj_api, config, usar_timeout=True, timeout_seconds=60, fecha
         fecha_inicio_custom: Fecha inicio personalizada (str YYYY-MM-DD)
         fecha_fin_custom: Fecha fin personalizada (str YYYY-MM-DD)
         timeout_seconds: Timeout en segundos
+        incremental: Cargar desde el watermark (False = rango completo de dias_history)
+        ventana_revision: Días antes del watermark a recargar (por defecto VENTANA_REVISION_DIAS)
     
     Returns:
-        Número de registros insertados
+        Diccionario con:
+        - estado: 'exitosa', 'al_dia' (nada que pedir), 'sin_datos' (XM no devolvió filas)
+          o 'fallida' (error de la API o al guardar, en todo el rango o en algún lote)
+        - registros: registros diarios insertados o modificados (incluye los de lotes
+          guardados antes de un error; 0 si XM devolvió lo mismo que ya estaba)
+        - filas_api: filas recibidas de la API
+        - lotes_fallidos: lotes que no se descargaron o no se guardaron
     """
     metric = config['metric']
     entity = config['entity']
@@ -243,267 +346,110 @@ def poblar_metrica(obj_api, config, usar_timeout=True, timeout_seconds=60, fecha
     dias_history = config.get('dias_history', 7)
     batch_size = config.get('batch_size', dias_history)
     
-    # Usar fechas personalizadas o calcular automáticamente
-    if fecha_inicio_custom:
-        fecha_inicio = datetime.strptime(fecha_inicio_custom, '%Y-%m-%d').date()
-    else:
-        fecha_fin_auto = datetime.now().date() - timedelta(days=1)
-        fecha_inicio = fecha_fin_auto - timedelta(days=dias_history)
-    
-    if fecha_fin_custom:
-        fecha_fin = datetime.strptime(fecha_fin_custom, '%Y-%m-%d').date()
-    else:
-        fecha_fin = datetime.now().date() - timedelta(days=1)
+    fecha_inicio, fecha_fin, watermark, desde_limite = rango_carga(
+        config, fecha_inicio_custom, fecha_fin_custom, incremental, ventana_revision)
+    resultado = {'estado': 'al_dia', 'registros': 0, 'filas_api': 0, 'lotes_fallidos': 0}
+    if fecha_inicio > fecha_fin:
+        logging.info(f"✅ {metric}/{entity}: al día (watermark {watermark})")
+        return resultado
     
     dias_totales = (fecha_fin - fecha_inicio).days + 1
-    logging.info(f"📡 {metric}/{entity} - Rango: {fecha_inicio} a {fecha_fin} ({dias_totales} días)")
-    
-    total_insertados = 0
+    logging.info(f"📡 {metric}/{entity} - Rango: {fecha_inicio} a {fecha_fin} ({dias_totales} días)"
+                 + (f", watermark {watermark}" if incremental and watermark else ""))
     
     try:
         # Dividir en batches si es necesario
         if batch_size < dias_history:
-            current_date = fecha_inicio
-            all_data = []
+            # Batches en paralelo (pool acotado + limitador de tasa de la API XM), guardados
+            # en streaming: cada lote se convierte, valida y guarda (commit) apenas llega, así
+            # la memoria depende del tamaño del lote y no del historial, y un lote fallido
+            # no descarta los que ya se guardaron
+            batches = lotes_metrica(config, fecha_inicio, fecha_fin)
+            logging.info(f"  📦 {len(batches)} batches de {batch_size} días")
             
-            while current_date <= fecha_fin:
-                batch_end = min(current_date + timedelta(days=batch_size - 1), fecha_fin)
-                
-                logging.info(f"  📦 Batch: {current_date} a {batch_end}")
-                
-                # Consultar API XM
+            def _consultar_batch(batch):
                 start_time = time.time()
-                df = obj_api.request_data(
-                    metric, 
+                df_batch = obj_api.request_data(
+                    metric,
                     entity,
-                    start_date=str(current_date),
-                    end_date=str(batch_end)
+                    start_date=str(batch[0]),
+                    end_date=str(batch[1])
                 )
-                elapsed = time.time() - start_time
-                
-                if df is not None and not df.empty:
-                    all_data.append(df)
-                    logging.info(f"  ✅ Batch OK: {len(df)} filas en {elapsed:.1f}s")
+                if df_batch is not None and not df_batch.empty:
+                    logging.info(f"  ✅ Batch {batch[0]} a {batch[1]} OK: {len(df_batch)} filas en {time.time() - start_time:.1f}s")
                 else:
-                    logging.warning(f"  ⚠️ Batch sin datos")
-                
-                current_date = batch_end + timedelta(days=1)
-                time.sleep(0.5)  # Evitar sobrecargar API
-            
-            # Concatenar todos los batches
-            if all_data:
-                df = pd.concat(all_data, ignore_index=True)
-            else:
-                df = pd.DataFrame()
-        
-        else:
-            # Sin batches, query completo
-            start_time = time.time()
-            df = obj_api.request_data(
-                metric,
-                entity,
-                start_date=str(fecha_inicio),
-                end_date=str(fecha_fin)
-            )
-            elapsed = time.time() - start_time
-            logging.info(f"  ⏱️ API respondió en {elapsed:.1f}s")
-        
-        # Validar datos
-        if df is None or df.empty:
-            logging.warning(f"❌ {metric}/{entity}: Sin datos de API")
-            return 0
-        
-        logging.info(f"  📊 Datos recibidos: {len(df)} filas")
-        
-        # Convertir unidades
-        if conversion:
-            logging.info(f"  🔄 Aplicando conversión: {conversion}")
-            df = convertir_unidades(df, metric, conversion)
-            if df is None or df.empty:
-                logging.error(f"❌ {metric}/{entity}: Conversión falló (DataFrame vacío)")
-                return 0
-        
-        # Preparar datos para inserción
-        metrics_to_insert = []
-        
-        # Detectar columnas necesarias
-        if 'Date' not in df.columns:
-            logging.error(f"❌ {metric}/{entity}: Falta columna 'Date'")
-            logging.error(f"   Columnas disponibles: {list(df.columns)}")
-            return 0
-        
-        if 'Value' not in df.columns:
-            logging.error(f"❌ {metric}/{entity}: Falta columna 'Value'")
-            logging.error(f"   Columnas disponibles: {list(df.columns)}")
-            logging.error(f"   Conversión aplicada: {conversion}")
-            return 0
-        
-        # OPTIMIZACIÓN: Cargar catálogo de Embalses UNA VEZ si es necesario
-        nombre_a_codigo_embalses = None
-        if entity == 'Embalse':
-            catalogos_nombres = db_manager.get_catalogo('ListadoEmbalses')
-            if catalogos_nombres is not None and len(catalogos_nombres) > 0:
-                # FIX: get_catalogo devuelve DataFrame, convertir a lista de diccionarios
-                nombre_a_codigo_embalses = {
-                    str(item['nombre']).strip().upper(): str(item['codigo']).strip() 
-                    for item in catalogos_nombres.to_dict('records')
-                }
-                logging.info(f"📖 Catálogo de Embalses cargado: {len(nombre_a_codigo_embalses)} embalses")
-        
-        # Iterar sobre filas
-        for _, row in df.iterrows():
-            fecha = str(row['Date'])[:10]  # 'YYYY-MM-DD'
-            valor_gwh = float(row['Value'])
-            
-            # VALIDACIÓN: Rechazar DemaCome con valores anormalmente bajos
-            # Threshold reducido de 100 a 10 GWh para permitir datos parciales válidos
-            if metric == 'DemaCome' and entity == 'Sistema' and valor_gwh < 10:
-                logging.warning(f"⚠️  {metric}/{entity} ({fecha}): Valor {valor_gwh:.2f} GWh muy bajo, RECHAZADO (posible dato incompleto de API XM)")
-                continue  # Saltar este registro
-            
-            # VALIDACIÓN: Para DemaCome/DemaReal por Agente, rechazar valores muy bajos (probablemente errores)
-            if metric in ['DemaCome', 'DemaReal'] and entity == 'Agente' and valor_gwh < 0.001:
-                continue  # Saltar valores casi cero
+                    logging.warning(f"  ⚠️ Batch {batch[0]} a {batch[1]} sin datos")
+                return df_batch
             
-            # Detectar recurso (columnas según tipo de métrica)
-            # Para DemaCome/DemaReal por Agente, el código está en 'Values_code'
-            # Name: AporEner/Rio
-            # Values_code: Gene/Recurso, DemaCome/Agente, DemaReal/Agente
-            # Resources, Embalse, Rio, Agente: otros casos legacy
-            # Id: Para algunas métricas como Gene/Sistema, AporEner/Sistema
-            recurso = None
-            for col_name in ['Values_code', 'Name', 'Id', 'Resources', 'Embalse', 'Rio', 'Agente']:
-                if col_name in df.columns:
-                    recurso = row.get(col_name)
-                    if pd.notna(recurso):
-                        recurso = str(recurso)
-                        # NORMALIZAR 'Sistema' → '_SISTEMA_' para evitar duplicados
-                        if recurso.strip().lower() == 'sistema':
-                            recurso = '_SISTEMA_'
-                    break
+            for n, (batch, df_batch) in enumerate(fetch_chunks_concurrente(_consultar_batch, batches), start=1):
+                if df_batch is None:
+                    resultado['lotes_fallidos'] += 1
+                    logging.error(f"  ❌ Batch {batch[0]} a {batch[1]} falló: se omite ({n}/{len(batches)})")
+                    continue
+                if df_batch.empty:
+                    continue
+                resultado['filas_api'] += len(df_batch)
+                try:
+                    resultado['registros'] += guardar_datos(df_batch, metric, entity, conversion)
+                except Exception as e:
+                    resultado['lotes_fallidos'] += 1
+                    logging.error(f"  ❌ Batch {batch[0]} a {batch[1]} no se pudo guardar: {e}")
+                    continue
+                logging.info(f"  💾 Progreso {metric}/{entity}: {n}/{len(batches)} batches, "
+                             f"{resultado['registros']} registros guardados")
             
-            # FIX MAPEO EMBALSES: API devuelve nombres completos, necesitamos códigos
-            # Para Embalse, buscar código en catálogo usando mapeo inverso nombre→código
-            if entity == 'Embalse' and recurso is not None and nombre_a_codigo_embalses:
-                # Buscar código por nombre (case-insensitive, stripped)
-                recurso_upper = str(recurso).strip().upper()
-                if recurso_upper in nombre_a_codigo_embalses:
-                    codigo_embalse = nombre_a_codigo_embalses[recurso_upper]
-                    logging.debug(f"🔄 Embalse mapeado: {recurso} → {codigo_embalse}")
-                    recurso = codigo_embalse
-                else:
-                    # Si no se encuentra, intentar match parcial
-                    encontrado = False
-                    for nombre_cat, codigo_cat in nombre_a_codigo_embalses.items():
-                        if recurso_upper in nombre_cat or nombre_cat in recurso_upper:
-                            logging.info(f"🔄 Embalse match parcial: {recurso} → {codigo_cat}")
-                            recurso = codigo_cat
-                            encontrado = True
-                            break
-                    
-                    if not encontrado:
-                        logging.warning(f"⚠️  Embalse sin mapeo: '{recurso}' no encontrado en catálogo")
-                        # Mantener el nombre original si no se encuentra código
-            
-            # FIX DUPLICADOS: Para entidad=Sistema, si recurso=None, usar placeholder
-            # Esto evita que SQLite inserte múltiples NULL (no los considera iguales en UNIQUE)
-            if entity == 'Sistema' and recurso is None:
-                recurso = '_SISTEMA_'
-            
-            # Detectar unidad correcta según métrica
-            if 'Prec' in metric or 'Cost' in metric:
-                unidad = '$/kWh'
-            elif 'Dispo' in metric:
-                unidad = 'MW'
-            else:
-                unidad = 'GWh'
-            
-            metrics_to_insert.append((
-                fecha,
-                metric,
-                entity,
-                recurso,
-                valor_gwh,
-                unidad
-            ))
-        
-        # Insertar en SQLite (bulk)
-        if metrics_to_insert:
-            total_insertados = db_manager.upsert_metrics_bulk(metrics_to_insert)
-            logging.info(f"✅ {metric}/{entity}: {total_insertados} registros guardados en SQLite")
-        
-        # =========================================================================
-        # GUARDAR DATOS HORARIOS (si existen columnas Values_Hour01-24)
-        # =========================================================================
-        hour_cols = [col for col in df.columns if 'Hour' in col and col.startswith('Values_Hour')]
-        
-        if hour_cols and len(hour_cols) == 24:
-            logging.info(f"  💾 Guardando datos horarios para {metric}/{entity}...")
-            
-            hourly_data = []
-            
-            for _, row in df.iterrows():
-                fecha = str(row['Date'])[:10]
-                
-                # Obtener código de recurso/agente
-                recurso = None
-                for col_name in ['Values_code', 'Name', 'Id', 'Resources', 'Embalse', 'Rio', 'Agente']:
-                    if col_name in df.columns:
-                        recurso = row.get(col_name)
-                        if pd.notna(recurso):
-                            recurso = str(recurso)
-                            if recurso.strip().lower() == 'sistema':
-                                recurso = '_SISTEMA_'
-                        break
-                
-                # FIX: Para Sistema, usar placeholder
-                if entity == 'Sistema' and recurso is None:
-                    recurso = '_SISTEMA_'
-                
-                # Extraer valores horarios
-                for h in range(1, 25):
-                    col_name = f'Values_Hour{h:02d}'
-                    if col_name in df.columns:
-                        valor_kwh = row.get(col_name)
-                        if pd.notna(valor_kwh) and valor_kwh > 0:
-                            valor_mwh = float(valor_kwh) / 1000  # kWh → MWh
-                            
-                            # Validación: rechazar valores muy bajos en métricas de demanda por agente
-                            if metric in ['DemaCome', 'DemaReal'] and entity == 'Agente' and valor_mwh < 0.001:
-                                continue
-                            
-                            hourly_data.append((
-                                fecha,
-                                metric,
-                                entity,
-                                recurso,
-                                h,
-                                valor_mwh
-                            ))
-            
-            # Insertar datos horarios en bulk
-            if hourly_data:
-                registros_horarios = db_manager.upsert_hourly_metrics_bulk(hourly_data)
-                logging.info(f"  ✅ Datos horarios: {registros_horarios} registros guardados ({len(hourly_data)//24} días × 24 horas)")
-        
-        return total_insertados
+            if resultado['lotes_fallidos']:
+                resultado['estado'] = 'fallida'
+                logging.warning(f"⚠️ {metric}/{entity}: {resultado['lotes_fallidos']} de {len(batches)} "
+                                f"batches fallidos; los demás quedaron guardados")
+                return resultado
+            resultado['estado'] = 'exitosa' if resultado['filas_api'] else 'sin_datos'
+            if not resultado['filas_api']:
+                logging.warning(f"❌ {metric}/{entity}: Sin datos de API")
+            _avanzar_watermark(metric, entity, watermark, fecha_inicio, fecha_fin, desde_limite)
+            return resultado
+        
+        # Sin batches, query completo
+        start_time = time.time()
+        df = obj_api.request_data(
+            metric,
+            entity,
+            start_date=str(fecha_inicio),
+            end_date=str(fecha_fin)
+        )
+        elapsed = time.time() - start_time
+        logging.info(f"  ⏱️ API respondió en {elapsed:.1f}s")
+        
+        resultado['filas_api'] = 0 if df is None else len(df)
+        resultado['registros'] = guardar_datos(df, metric, entity, conversion)
+        resultado['estado'] = 'exitosa' if resultado['filas_api'] else 'sin_datos'
+        _avanzar_watermark(metric, entity, watermark, fecha_inicio, fecha_fin, desde_limite)
+        return resultado
         
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
         logging.error(f"❌ Error poblando {metric}/{entity}: {e}")
         logging.error(f"Detalles del error:\n{error_details}")
-        return 0
+        resultado['estado'] = 'fallida'
+        return resultado
 
 
-def ejecutar_etl(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=None):
+def ejecutar_etl(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=None, completo=False,
+                 ventana_revision=None):
     """
-    Ejecuta ETL completo: consulta API XM y popula SQLite
+    Ejecuta ETL: consulta API XM y popula SQLite
+    
+    Por defecto es incremental: cada serie se pide desde su watermark menos la ventana de
+    revisión (las series sin watermark ni datos se cargan completas). completo=True
+    recarga todo dias_history (backfill bajo demanda).
     
     Args:
         usar_timeout: Si False, espera indefinidamente en API lenta
         fecha_inicio_custom: Fecha inicio personalizada (YYYY-MM-DD)
         fecha_fin_custom: Fecha fin personalizada (YYYY-MM-DD)
+        completo: Recargar el historial completo en lugar de cargar desde el watermark
+        ventana_revision: Días antes del watermark a recargar (por defecto VENTANA_REVISION_DIAS)
     
     Returns:
         Diccionario con estadísticas de ejecución
@@ -517,9 +463,12 @@ def ejecutar_etl(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=N
     
     if fecha_inicio_custom or fecha_fin_custom:
         logging.info(f"🎯 Modo personalizado: {fecha_inicio_custom or 'auto'} → {fecha_fin_custom or 'auto'}")
+    _log_modo_carga(fecha_inicio_custom, completo, ventana_revision)
     
     # Inicializar API XM
     try:
+        if ReadDB is None:
+            raise ImportError("pydataxm no disponible")
         obj_api = ReadDB()
         logging.info("✅ Conexión a API XM inicializada")
     except Exception as e:
@@ -536,6 +485,7 @@ def ejecutar_etl(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=N
         'total_metricas': 0,
         'metricas_exitosas': 0,
         'metricas_fallidas': 0,
+        'metricas_sin_datos': 0,
         'total_registros': 0,
         'tiempo_total': 0,
         'exito': True
@@ -548,9 +498,7 @@ def ejecutar_etl(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=N
     logging.info("FASE 1: CATÁLOGOS DE MAPEO (códigos → nombres)")
     logging.info("="*60)
     
-    catalogos = ['ListadoRecursos', 'ListadoEmbalses', 'ListadoRios', 'ListadoAgentes']
-    
-    for catalogo in catalogos:
+    for catalogo in CATALOGOS_XM:
         try:
             logging.info(f"\n🔄 Procesando {catalogo}...")
             registros = poblar_catalogo(obj_api, catalogo)
@@ -583,19 +531,25 @@ def ejecutar_etl(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=N
             entity = config['entity']
             
             try:
-                registros = poblar_metrica(
+                resultado = poblar_metrica(
                     obj_api, 
                     config, 
                     usar_timeout,
                     fecha_inicio_custom=fecha_inicio_custom,
-                    fecha_fin_custom=fecha_fin_custom
+                    fecha_fin_custom=fecha_fin_custom,
+                    incremental=not completo,
+                    ventana_revision=ventana_revision
                 )
                 
-                if registros > 0:
-                    stats['metricas_exitosas'] += 1
-                    stats['total_registros'] += registros
-                else:
+                # Fallida solo por error de API o al guardar: una serie al día, sin datos
+                # nuevos en XM o que recibe lo mismo que ya tenía (0 registros) es exitosa
+                stats['total_registros'] += resultado['registros']
+                if resultado['estado'] == 'fallida':
                     stats['metricas_fallidas'] += 1
+                else:
+                    stats['metricas_exitosas'] += 1
+                    if resultado['estado'] == 'sin_datos':
+                        stats['metricas_sin_datos'] += 1
                 
             except Exception as e:
                 logging.error(f"❌ Excepción en {metric}/{entity}: {e}")
@@ -612,10 +566,28 @@ def ejecutar_etl(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=N
     logging.info(f"Total métricas procesadas: {stats['total_metricas']}")
     logging.info(f"  ✅ Exitosas: {stats['metricas_exitosas']}")
     logging.info(f"  ❌ Fallidas: {stats['metricas_fallidas']}")
+    logging.info(f"  📭 Sin datos nuevos en XM: {stats['metricas_sin_datos']}")
     logging.info(f"Total registros insertados: {stats['total_registros']}")
     logging.info(f"Tiempo total: {stats['tiempo_total']:.1f} segundos ({stats['tiempo_total']/60:.1f} min)")
     
-    # Mostrar estadísticas de BD
+    _log_estadisticas_bd()
+    
+    return stats
+
+
+def _log_modo_carga(fecha_inicio_custom, completo, ventana_revision):
+    """Registra si la carga es incremental (watermark) o completa"""
+    if fecha_inicio_custom:
+        return
+    if completo:
+        logging.info("📚 Modo completo: historial de dias_history de cada métrica")
+    else:
+        ventana = VENTANA_REVISION_DIAS if ventana_revision is None else ventana_revision
+        logging.info(f"⚡ Modo incremental: desde el watermark de cada serie menos {ventana} días de revisión")
+
+
+def _log_estadisticas_bd():
+    """Resumen de la BD al final de una carga"""
     db_stats = db_manager.get_database_stats()
     logging.info(f"\n📊 Estadísticas de base de datos:")
     logging.info(f"  Total registros: {db_stats.get('total_registros', 0):,}")
@@ -624,6 +596,175 @@ def ejecutar_etl(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=N
     logging.info(f"  Tamaño BD: {db_stats.get('tamano_db_mb', 0):.2f} MB")
     
     logging.info(f"\nFin: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+
+
+def _id_ejecucion(fecha_inicio_custom=None, fecha_fin_custom=None) -> str:
+    """
+    Identificador de una carga para sus checkpoints: el rango pedido. Con fechas
+    automáticas (relativas a hoy) incluye el día, así un reinicio el mismo día reanuda
+    """
+    id_ejecucion = f"{fecha_inicio_custom or 'auto'}|{fecha_fin_custom or 'auto'}"
+    if not (fecha_inicio_custom and fecha_fin_custom):
+        id_ejecucion += f"|{datetime.now().date()}"
+    return id_ejecucion
+
+
+def ejecutar_etl_concurrente(usar_timeout=True, fecha_inicio_custom=None, fecha_fin_custom=None,
+                             max_workers=None, reiniciar=False, completo=False, ventana_revision=None):
+    """
+    Ejecuta el ETL como grafo de tareas concurrente (ver etl/planificador.py):
+    
+        catálogos (CATALOGOS_XM) → métricas → lotes de cada métrica
+    
+    Los lotes de todas las métricas comparten un pool acotado de hilos y el limitador
+    de tasa global de la API XM; las descargas se solapan y las escrituras en SQLite se
+    hacen de a una. Cada lote cargado queda registrado en etl_checkpoints: si el proceso
+    muere, volver a ejecutar con los mismos argumentos salta los lotes ya cargados. Los
+    checkpoints se borran cuando la carga termina sin lotes fallidos.
+    
+    Args:
+        usar_timeout: Igual que ejecutar_etl
+        fecha_inicio_custom, fecha_fin_custom: Rango personalizado (YYYY-MM-DD)
+        max_workers: Hilos del pool (por defecto XM_API_WORKERS)
+        reiniciar: True = ignorar los checkpoints de una ejecución anterior interrumpida
+        completo, ventana_revision: Igual que ejecutar_etl (por defecto, incremental)
+    
+    Returns:
+        Diccionario con las estadísticas de ejecutar_etl, más lotes, lotes_reanudados,
+        lotes_fallidos y tiempo_secuencial_estimado (suma de las tareas más las pausas
+        del runner secuencial)
+    """
+    from etl import planificador
+    
+    inicio_global = time.time()
+    
+    logging.info("╔══════════════════════════════════════════════════════════════╗")
+    logging.info("║   ETL CONCURRENTE: Portal Energético MME (XM API → SQLite)  ║")
+    logging.info("╚══════════════════════════════════════════════════════════════╝")
+    logging.info(f"Inicio: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    _log_modo_carga(fecha_inicio_custom, completo, ventana_revision)
+    
+    try:
+        if ReadDB is None:
+            raise ImportError("pydataxm no disponible")
+        obj_api = ReadDB()
+        logging.info("✅ Conexión a API XM inicializada")
+    except Exception as e:
+        logging.error(f"❌ Error conectando a API XM: {e}")
+        return {'exito': False, 'error': str(e)}
+    
+    if not db_manager.test_connection():
+        logging.error("❌ Error de conexión a SQLite")
+        return {'exito': False, 'error': 'Conexión SQLite fallida'}
+    
+    ejecucion = _id_ejecucion(fecha_inicio_custom, fecha_fin_custom)
+    if reiniciar:
+        clear_etl_checkpoints(ejecucion)
+    hechos = get_etl_checkpoints(ejecucion)
+    escritura = threading.Lock()
+    
+    def _cargar_lote(config, ini, fin):
+        # Los errores de la API o al guardar los registra el planificador como error del lote
+        metric, entity = config['metric'], config['entity']
+        df = obj_api.request_data(metric, entity, start_date=str(ini), end_date=str(fin))
+        with escritura:
+            registros = guardar_datos(df, metric, entity, config.get('conversion'))
+            save_etl_checkpoint(ejecucion, metric, entity, ini, fin, registros)
+        return {'registros': registros, 'filas_api': 0 if df is None else len(df)}
+    
+    def _abrir_metrica(metric, entity, ini, fin, n_lotes, reanudados):
+        logging.info(f"📡 {metric}/{entity} - Rango: {ini} a {fin}: {n_lotes} lotes ({reanudados} ya cargados)")
+    
+    # Grafo: catálogos → métricas → lotes de cada métrica
+    grafo = {('catalogo', c): planificador.tarea(lambda c=c: poblar_catalogo(obj_api, c)) for c in CATALOGOS_XM}
+    ids_catalogos = list(grafo)
+    lotes_por_metrica = {}
+    rangos = {}
+    for metricas in METRICAS_CONFIG.values():
+        for config in metricas:
+            metric, entity = config['metric'], config['entity']
+            if metric in CATALOGOS_XM:
+                continue  # Los listados se cargan como catálogos
+            ini, fin, watermark, desde_limite = rango_carga(config, fecha_inicio_custom, fecha_fin_custom,
+                                                            not completo, ventana_revision)
+            lotes = lotes_metrica(config, ini, fin)
+            pendientes = [(i, f) for i, f in lotes if (metric, entity, str(i), str(f)) not in hechos]
+            id_metrica = ('metrica', metric, entity)
+            grafo[id_metrica] = planificador.tarea(
+                lambda m=metric, e=entity, i=ini, f=fin, n=len(lotes), r=len(lotes) - len(pendientes):
+                    _abrir_metrica(m, e, i, f, n, r),
+                depende_de=ids_catalogos, api=False)
+            lotes_por_metrica[(metric, entity)] = (len(lotes), [])
+            rangos[(metric, entity)] = (watermark, ini, fin, desde_limite)
+            for i, f in pendientes:
+                id_lote = ('lote', metric, entity, str(i), str(f))
+                grafo[id_lote] = planificador.tarea(lambda c=config, i=i, f=f: _cargar_lote(c, i, f),
+                                                    depende_de=[id_metrica])
+                lotes_por_metrica[(metric, entity)][1].append(id_lote)
+    
+    lotes_reanudados = sum(n - len(ids) for n, ids in lotes_por_metrica.values())
+    if lotes_reanudados:
+        logging.info(f"⏩ Reanudando {ejecucion}: {lotes_reanudados} lotes ya cargados")
+    
+    resultados = planificador.ejecutar_grafo(grafo, max_workers=max_workers)
+    
+    # Resumen por métrica
+    # Una métrica falla solo si falló alguno de sus lotes (API o guardado): una serie al día
+    # (sin lotes) o que recibe lo mismo que ya tenía (0 registros) es exitosa
+    metricas = []
+    for (metric, entity), (n_lotes, ids) in lotes_por_metrica.items():
+        cargados = [resultados[i]['resultado'] for i in ids if not resultados[i]['error']]
+        registros = sum(r['registros'] for r in cargados)
+        filas_api = sum(r['filas_api'] for r in cargados)
+        fallidos = len(ids) - len(cargados)
+        segundos = sum(resultados[i]['segundos'] for i in ids)
+        metricas.append({'registros': registros, 'filas_api': filas_api, 'lotes': len(ids),
+                         'fallidos': fallidos, 'exitosa': not fallidos})
+        estado = '✅' if not fallidos else '⚠️'
+        if not fallidos:
+            _avanzar_watermark(metric, entity, *rangos[(metric, entity)])
+        logging.info(f"{estado} {metric}/{entity}: {registros} registros ({filas_api} filas de la API), "
+                     f"{n_lotes} lotes ({n_lotes - len(ids)} reanudados, {fallidos} fallidos), "
+                     f"{segundos:.1f}s de tareas")
+    
+    stats = {
+        'total_metricas': len(metricas),
+        'metricas_exitosas': sum(1 for m in metricas if m['exitosa']),
+        'metricas_fallidas': sum(1 for m in metricas if not m['exitosa']),
+        'metricas_sin_datos': sum(1 for m in metricas if m['exitosa'] and m['lotes'] and not m['filas_api']),
+        'total_registros': (sum(resultados[('catalogo', c)]['resultado'] or 0 for c in CATALOGOS_XM)
+                            + sum(m['registros'] for m in metricas)),
+        'lotes': sum(1 for clave in resultados if clave[0] == 'lote') + lotes_reanudados,
+        'lotes_reanudados': lotes_reanudados,
+        'lotes_fallidos': sum(1 for clave, r in resultados.items() if clave[0] == 'lote' and r['error']),
+        'tiempo_total': time.time() - inicio_global,
+        'exito': True
+    }
+    # El runner secuencial hace las mismas tareas de a una, con pausas de 0.5 s entre
+    # catálogos y 0.3 s entre métricas
+    stats['tiempo_secuencial_estimado'] = (sum(r['segundos'] for r in resultados.values())
+                                           + 0.5 * len(CATALOGOS_XM) + 0.3 * len(metricas))
+    
+    if stats['lotes_fallidos'] == 0:
+        clear_etl_checkpoints(ejecucion)
+    else:
+        logging.warning(f"⚠️ {stats['lotes_fallidos']} lotes fallidos: ejecutar de nuevo con los mismos "
+                        f"argumentos reintenta solo esos")
+    
+    logging.info("\n╔══════════════════════════════════════════════════════════════╗")
+    logging.info("║                RESUMEN DE ETL CONCURRENTE                    ║")
+    logging.info("╚══════════════════════════════════════════════════════════════╝")
+    logging.info(f"Total métricas procesadas: {stats['total_metricas']}")
+    logging.info(f"  ✅ Exitosas: {stats['metricas_exitosas']}")
+    logging.info(f"  ❌ Fallidas: {stats['metricas_fallidas']}")
+    logging.info(f"  📭 Sin datos nuevos en XM: {stats['metricas_sin_datos']}")
+    logging.info(f"Lotes: {stats['lotes']} ({stats['lotes_reanudados']} reanudados, {stats['lotes_fallidos']} fallidos)")
+    logging.info(f"Total registros insertados: {stats['total_registros']}")
+    logging.info(f"Tiempo total: {stats['tiempo_total']:.1f} segundos ({stats['tiempo_total']/60:.1f} min)")
+    logging.info(f"Tiempo secuencial estimado: {stats['tiempo_secuencial_estimado']:.1f} segundos "
+                 f"({stats['tiempo_secuencial_estimado'] / max(stats['tiempo_total'], 1e-9):.1f}× más lento)")
+    
+    _log_estadisticas_bd()
     
     return stats
 
@@ -646,14 +787,79 @@ if __name__ == "__main__":
         type=str,
         help='Fecha fin (YYYY-MM-DD). Por defecto: ayer'
     )
+    parser.add_argument(
+        '--concurrente',
+        action='store_true',
+        help='Grafo de tareas en paralelo con checkpoints por lote (reanuda una carga interrumpida)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        help='Hilos del modo concurrente (por defecto XM_API_WORKERS)'
+    )
+    parser.add_argument(
+        '--reiniciar',
+        action='store_true',
+        help='Modo concurrente: ignorar los checkpoints de una carga anterior con los mismos argumentos'
+    )
+    parser.add_argument(
+        '--completo',
+        action='store_true',
+        help='Backfill completo: recargar dias_history de cada métrica (por defecto, incremental desde el watermark)'
+    )
+    parser.add_argument(
+        '--ventana-revision',
+        type=int,
+        help=f'Días antes del watermark que se vuelven a pedir (por defecto {VENTANA_REVISION_DIAS})'
+    )
+    parser.add_argument(
+        '--snapshot',
+        action='store_true',
+        help='Cargar sobre una copia de la BD y publicarla al terminar (los dashboards no esperan locks). '
+             'Lo que otros procesos escriban en la BD publicada durante la carga se pierde al publicar'
+    )
     args = parser.parse_args()
     
     # Ejecutar ETL
-    resultado = ejecutar_etl(
-        usar_timeout=not args.sin_timeout,
-        fecha_inicio_custom=args.fecha_inicio,
-        fecha_fin_custom=args.fecha_fin
-    )
+    def ejecutar():
+        if args.concurrente:
+            return ejecutar_etl_concurrente(
+                usar_timeout=not args.sin_timeout,
+                fecha_inicio_custom=args.fecha_inicio,
+                fecha_fin_custom=args.fecha_fin,
+                max_workers=args.workers,
+                reiniciar=args.reiniciar,
+                completo=args.completo,
+                ventana_revision=args.ventana_revision
+            )
+        return ejecutar_etl(
+            usar_timeout=not args.sin_timeout,
+            fecha_inicio_custom=args.fecha_inicio,
+            fecha_fin_custom=args.fecha_fin,
+            completo=args.completo,
+            ventana_revision=args.ventana_revision
+        )
+    
+    if args.snapshot:
+        # Si el ETL falla (excepción o exito=False) el snapshot se descarta y lo publicado no cambia
+        try:
+            with db_manager.carga_en_snapshot():
+                resultado = ejecutar()
+                if not resultado.get('exito', False):
+                    raise RuntimeError(resultado.get('error', 'ETL fallido'))
+        except Exception as e:
+            logging.error(f"❌ Snapshot no publicado: {e}")
+            resultado = {'exito': False, 'error': str(e)}
+    else:
+        resultado = ejecutar()
+    
+    # Espejo Parquet del motor analítico: solo las particiones (métrica, año) que cambiaron
+    if resultado.get('exito', False) and analitica.DUCKDB_AVAILABLE:
+        analitica.sincronizar_parquet()
+    
+    # Cubo de los últimos días que los workers del dashboard leen por mmap
+    if resultado.get('exito', False):
+        escribir_cubo_reciente()
     
     # Exit code
     sys.exit(0 if resultado.get('exito', False) else 1)
@@ -0,0 +1,87 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║            PLANIFICADOR CONCURRENTE DEL ETL                  ║
+║                                                              ║
+║  Ejecuta un grafo de tareas (catálogos → lotes de métricas)  ║
+║  en un pool acotado de hilos: una tarea arranca cuando       ║
+║  terminaron sus dependencias, y las que consultan la API XM  ║
+║  pasan antes por el limitador de tasa global                 ║
+║  (utils/utils_xm.LIMITADOR_XM). Sin dependencia de pydataxm  ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Hashable, Iterable, Optional
+
+from utils import utils_xm
+from utils.utils_xm import LimitadorTasa
+
+
+def tarea(funcion: Callable, depende_de: Iterable[Hashable] = (), api: bool = True) -> dict:
+    """
+    Nodo del grafo
+
+    Args:
+        funcion: Callable sin argumentos; su retorno queda en el resultado de la tarea
+        depende_de: Ids de las tareas que deben terminar antes (con o sin error: una
+                    dependencia fallida no cancela a las que dependen de ella, como en
+                    la carga secuencial)
+        api: True si la tarea consulta la API XM (toma un turno del limitador de tasa)
+    """
+    return {'funcion': funcion, 'depende_de': tuple(depende_de), 'api': api}
+
+
+def ejecutar_grafo(tareas: Dict[Hashable, dict], max_workers: Optional[int] = None,
+                   limitador: Optional[LimitadorTasa] = None, retries: int = 2,
+                   backoff_sec: float = 0.8) -> Dict[Hashable, dict]:
+    """
+    Ejecuta las tareas respetando sus dependencias, hasta max_workers a la vez
+
+    Una tarea que lanza excepción se reintenta hasta `retries` veces con backoff
+    exponencial con jitter (utils_xm.reintentar, igual que fetch_chunks_concurrente).
+
+    Args:
+        tareas: {id: tarea(...)}
+        max_workers: Hilos del pool (por defecto XM_API_WORKERS)
+        limitador: Limitador de las tareas con api=True (por defecto el global de XM)
+
+    Returns:
+        {id: {'resultado': retorno o None, 'error': str o None, 'segundos': duración de los intentos}}
+
+    Raises:
+        ValueError: Dependencia inexistente o ciclo en el grafo
+
+    Ejemplo:
+        grafo = {'cat': tarea(cargar_catalogo, api=True),
+                 'lote1': tarea(lambda: cargar('2024-01-01', '2024-01-30'), depende_de=['cat'])}
+        resultados = ejecutar_grafo(grafo, max_workers=4)
+    """
+    limitador = limitador or utils_xm.LIMITADOR_XM
+    for id_tarea, nodo in tareas.items():
+        faltantes = [d for d in nodo['depende_de'] if d not in tareas]
+        if faltantes:
+            raise ValueError(f"Tarea {id_tarea}: dependencias inexistentes {faltantes}")
+
+    def _ejecutar(id_tarea, nodo):
+        resultado, error, segundos = utils_xm.reintentar(nodo['funcion'], f"Tarea {id_tarea}",
+                                                         limitador if nodo['api'] else None,
+                                                         retries, backoff_sec)
+        return {'resultado': resultado, 'error': None if error is None else str(error), 'segundos': segundos}
+
+    resultados = {}
+    pendientes = dict(tareas)
+    if not pendientes:
+        return resultados
+
+    with ThreadPoolExecutor(max_workers=max_workers or utils_xm.XM_API_WORKERS, thread_name_prefix='etl') as pool:
+        en_curso = {}
+        while pendientes or en_curso:
+            listas = [i for i, nodo in pendientes.items() if all(d in resultados for d in nodo['depende_de'])]
+            for id_tarea in listas:
+                en_curso[pool.submit(_ejecutar, id_tarea, pendientes.pop(id_tarea))] = id_tarea
+            if not en_curso:
+                raise ValueError(f"Ciclo de dependencias entre {list(pendientes)}")
+            hechos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in hechos:
+                resultados[en_curso.pop(futuro)] = futuro.result()
+    return resultados
@@ -0,0 +1,214 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║           TRANSFORMACIONES API XM → SQLITE                   ║
+║                                                              ║
+║  Conversión de unidades y armado de las tuplas               ║
+║  (fecha, metrica, entidad, recurso, valor_gwh, unidad) que   ║
+║  recibe db_manager.upsert_metrics_bulk, con operaciones      ║
+║  vectorizadas. Sin dependencia de pydataxm: la usan el ETL   ║
+║  y la lectura con relleno de huecos de utils/_xm.py          ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+from typing import Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+import pandas as pd
+
+from etl.config_metricas import METRICAS_CONFIG
+
+logger = logging.getLogger(__name__)
+
+# Columnas de la tabla metrics en el orden de las tuplas
+COLUMNAS_METRICS = ['fecha', 'metrica', 'entidad', 'recurso', 'valor_gwh', 'unidad']
+
+# Columnas donde la API XM trae el código del recurso, por prioridad:
+# Values_code (Gene/Recurso, DemaCome/Agente), Name (AporEner/Rio), Id (Gene/Sistema) y legacy
+COLUMNAS_RECURSO = ('Values_code', 'Name', 'Id', 'Resources', 'Embalse', 'Rio', 'Agente')
+
+HORAS_API = [f'Values_Hour{h:02d}' for h in range(1, 25)]
+
+
+def config_serie(metric: str, entity: str) -> Optional[dict]:
+    """
+    Configuración del ETL (etl/config_metricas.py) de la serie, o None si el ETL no la
+    carga en metrics. Los listados (ListadoRecursos, ListadoEmbalses...) van a la tabla
+    catalogos (poblar_catalogo), no a metrics: para ellos también None.
+    """
+    if metric.startswith('Listado'):
+        return None
+    for grupo in METRICAS_CONFIG.values():
+        for config in grupo:
+            if config.get('metric') == metric and config.get('entity') == entity:
+                return config
+    return None
+
+
+def unidad_metrica(metric: str) -> str:
+    """Unidad con la que se guarda la métrica en SQLite"""
+    if 'Prec' in metric or 'Cost' in metric:
+        return '$/kWh'
+    if 'Dispo' in metric:
+        return 'MW'
+    return 'GWh'
+
+
+def valor_diario(df: pd.DataFrame, metric: str, conversion: Optional[str]) -> pd.DataFrame:
+    """
+    Columna Value en unidades de SQLite (conversion de etl/config_metricas.py). La usan
+    guardar_datos del ETL y la lectura con relleno de huecos de utils/_xm.py
+
+    - Wh_a_GWh / kWh_a_GWh: Value / 1e6
+    - horas_a_diario: Values_Hour01-24 sumadas / 1e6 (energía), promediadas / 1e3
+      (Dispo, kW → MW) o promediadas (Prec, $/kWh); sin horas, Value / 1e6
+    - None / sin_conversion: sin cambios
+    """
+    if df is None or df.empty or conversion in (None, 'sin_conversion'):
+        return df
+
+    df = df.copy()
+    if conversion in ('Wh_a_GWh', 'kWh_a_GWh'):
+        if 'Value' in df.columns:
+            df['Value'] = df['Value'] / 1_000_000
+        return df
+
+    if conversion == 'horas_a_diario':
+        horas = [col for col in HORAS_API if col in df.columns]
+        if horas:
+            matriz = df[horas].to_numpy(dtype=float)
+            if 'Dispo' in metric:
+                with np.errstate(all='ignore'):
+                    df['Value'] = np.nanmean(matriz, axis=1) / 1_000
+            elif 'Prec' in metric:
+                with np.errstate(all='ignore'):
+                    df['Value'] = np.nanmean(matriz, axis=1)
+            else:
+                df['Value'] = np.nansum(matriz, axis=1) / 1_000_000
+        elif 'Value' in df.columns:
+            df['Value'] = df['Value'] / 1_000_000
+        else:
+            return df
+        return df.dropna(subset=['Value'])
+
+    logger.warning(f"⚠️ {metric}: conversión desconocida '{conversion}', valores sin convertir")
+    return df
+
+
+def _codigo_parcial(nombre: str, codigos_embalse: Dict[str, str]) -> Optional[str]:
+    """Código del primer embalse del catálogo cuyo nombre contiene a `nombre` o está contenido en él"""
+    for nombre_cat, codigo in codigos_embalse.items():
+        if nombre in nombre_cat or nombre_cat in nombre:
+            return codigo
+    return None
+
+
+def recursos_api(df: pd.DataFrame, entity: str, codigos_embalse: Optional[Dict[str, str]] = None,
+                 coincidencia_parcial: bool = False) -> pd.Series:
+    """
+    Código de recurso de cada fila de una respuesta de la API XM
+
+    Sale de la primera columna de COLUMNAS_RECURSO presente (detectada una vez, no por
+    fila); 'Sistema' y los recursos vacíos de entidad Sistema quedan como '_SISTEMA_'.
+    Para Embalse la API trae nombres: se traducen a código con codigos_embalse
+    ({NOMBRE EN MAYÚSCULAS: código}); con coincidencia_parcial, los nombres sin match
+    exacto se buscan por inclusión (una vez por nombre distinto, no por fila).
+
+    Returns:
+        Serie object alineada con df (None = sin recurso)
+    """
+    columna = next((col for col in COLUMNAS_RECURSO if col in df.columns), None)
+    if columna is not None:
+        crudos = df[columna]
+        recursos = crudos.astype(str).where(crudos.notna(), None)
+        recursos = recursos.mask(recursos.str.strip().str.lower() == 'sistema', '_SISTEMA_')
+    else:
+        recursos = pd.Series(None, index=df.index, dtype=object)
+
+    if entity == 'Embalse' and codigos_embalse:
+        claves = recursos.astype(str).str.strip().str.upper()
+        codigos = claves.map(codigos_embalse)
+        if coincidencia_parcial:
+            sin_mapeo = claves[codigos.isna() & recursos.notna()].unique()
+            parciales = {nombre: _codigo_parcial(nombre, codigos_embalse) for nombre in sin_mapeo}
+            for nombre, codigo in parciales.items():
+                if codigo is not None:
+                    logger.info(f"🔄 Embalse match parcial: {nombre} → {codigo}")
+                else:
+                    logger.warning(f"⚠️  Embalse sin mapeo: '{nombre}' no encontrado en catálogo")
+            if parciales:
+                codigos = codigos.where(codigos.notna(), claves.map(parciales))
+        recursos = codigos.where(codigos.notna(), recursos)
+    if entity == 'Sistema':
+        recursos = recursos.where(recursos.notna(), '_SISTEMA_')
+    return recursos.astype(object).where(recursos.notna(), None)
+
+
+def filas_sqlite(df: pd.DataFrame, metric: str, entity: str,
+                 codigos_embalse: Optional[Dict[str, str]] = None,
+                 coincidencia_parcial: bool = False) -> List[Tuple]:
+    """
+    Tuplas (fecha, metrica, entidad, recurso, valor_gwh, unidad) de un DataFrame de la API XM
+    ya convertido (columnas Date y Value)
+
+    El recurso sale de recursos_api (columna detectada una vez, '_SISTEMA_' normalizado y,
+    para Embalse, nombre → código con codigos_embalse). Descarta los valores nulos y los
+    que el ETL rechaza (DemaCome/Sistema < 10 GWh, demanda por agente < 0.001 GWh).
+
+    Args:
+        df: Respuesta de la API con Value en unidades de SQLite (ver valor_diario)
+        metric, entity: Serie
+        codigos_embalse: Mapeo nombre → código de ListadoEmbalses
+        coincidencia_parcial: Buscar por inclusión los embalses sin match exacto (ETL)
+
+    Returns:
+        Lista de tuplas para upsert_metrics_bulk (vacía si falta Date o Value)
+    """
+    if df is None or df.empty or 'Date' not in df.columns or 'Value' not in df.columns:
+        return []
+
+    fechas = df['Date'].astype(str).str[:10]
+    valores = pd.to_numeric(df['Value'], errors='coerce')
+    recursos = recursos_api(df, entity, codigos_embalse, coincidencia_parcial)
+
+    validos = valores.notna()
+    if metric == 'DemaCome' and entity == 'Sistema':
+        bajos = validos & (valores < 10)
+        if bajos.any():
+            logger.warning(f"⚠️  {metric}/{entity}: {int(bajos.sum())} días con menos de 10 GWh RECHAZADOS "
+                           f"(posible dato incompleto de API XM): {', '.join(fechas[bajos].head(5))}")
+        validos &= ~bajos
+    elif metric in ('DemaCome', 'DemaReal') and entity == 'Agente':
+        validos &= valores >= 0.001
+
+    n = int(validos.sum())
+    return list(zip(fechas[validos], [metric] * n, [entity] * n, recursos[validos],
+                    valores[validos].astype(float), [unidad_metrica(metric)] * n))
+
+
+def filas_horarias(df: pd.DataFrame, metric: str, entity: str) -> List[Tuple]:
+    """
+    Tuplas (fecha, metrica, entidad, recurso, valores_24) de las columnas
+    Values_Hour01-24 (kWh → MWh) para upsert_hourly_dia_bulk
+
+    La matriz días × 24 se convierte de una vez en NumPy: las horas sin dato o <= 0
+    (y < 0.001 MWh en demanda por agente) quedan NaN, y los días sin ninguna hora válida
+    se descartan.
+
+    Returns:
+        Lista de tuplas (vacía si la respuesta no trae las 24 columnas horarias)
+    """
+    if df is None or df.empty or 'Date' not in df.columns or not all(col in df.columns for col in HORAS_API):
+        return []
+
+    valores = df[HORAS_API].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float) / 1000
+    with np.errstate(invalid='ignore'):
+        valores[~(valores > 0)] = np.nan
+        if metric in ('DemaCome', 'DemaReal') and entity == 'Agente':
+            valores[valores < 0.001] = np.nan
+
+    con_dato = ~np.isnan(valores).all(axis=1)
+    fechas = df['Date'].astype(str).str[:10].to_numpy()[con_dato]
+    recursos = recursos_api(df, entity).to_numpy()[con_dato]
+    n = len(fechas)
+    return list(zip(fechas, [metric] * n, [entity] * n, recursos, valores[con_dato]))
@@ -31,21 +31,20 @@ dash.register_page(__name__, path='/comercializacion', name='Comercialización',
 
 def obtener_rango_fechas_disponibles():
     """Obtener el rango de fechas con datos disponibles en la BD"""
-    import sqlite3
+    from utils import db_manager
     
     try:
-        conn = sqlite3.connect('portal_energetico.db')
-        cursor = conn.cursor()
-        
-        # Buscar fechas min y max de PrecEsca (la más completa)
-        cursor.execute("""
-            SELECT MIN(fecha), MAX(fecha)
-            FROM metrics
-            WHERE metrica = 'PrecEsca' AND entidad = 'Sistema'
-        """)
-        
-        result = cursor.fetchone()
-        conn.close()
+        with db_manager.get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            # Buscar fechas min y max de PrecEsca (la más completa)
+            cursor.execute("""
+                SELECT MIN(fecha), MAX(fecha)
+                FROM metrics
+                WHERE metrica = 'PrecEsca' AND entidad = 'Sistema'
+            """)
+            
+            result = cursor.fetchone()
         
         if result and result[0] and result[1]:
             fecha_min = pd.to_datetime(result[0]).date()
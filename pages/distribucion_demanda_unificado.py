@@ -44,11 +44,9 @@ register_page(
 def obtener_listado_agentes():
     """Obtener el listado de agentes ordenados por cantidad de datos y con advertencias"""
     try:
-        import sqlite3
-        from utils.db_manager import DB_PATH
+        from utils import db_manager
         
         # Paso 1: Obtener estadísticas de datos por agente
-        conn = sqlite3.connect(str(DB_PATH))
         query = """
         SELECT 
             recurso as code,
@@ -65,8 +63,8 @@ def obtener_listado_agentes():
         ORDER BY total_registros DESC, dias_unicos DESC
         """
         
-        agentes_estadisticas = pd.read_sql_query(query, conn)
-        conn.close()
+        with db_manager.get_connection(readonly=True) as conn:
+            agentes_estadisticas = pd.read_sql_query(query, conn)
         
         if agentes_estadisticas.empty:
             logger.warning("⚠️ No se encontraron agentes con datos en la base")
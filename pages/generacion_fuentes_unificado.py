@@ -45,10 +45,8 @@ def obtener_ultima_fecha_disponible():
     Evita que los usuarios seleccionen fechas sin datos o incompletos.
     """
     from utils import db_manager
-    import sqlite3
     
     try:
-        conn = sqlite3.connect('portal_energetico.db')
         query = """
         SELECT DATE(fecha) as fecha, COUNT(DISTINCT recurso) as num_recursos
         FROM metrics
@@ -58,8 +56,8 @@ def obtener_ultima_fecha_disponible():
         ORDER BY fecha DESC
         LIMIT 1
         """
-        df = pd.read_sql_query(query, conn)
-        conn.close()
+        with db_manager.get_connection(readonly=True) as conn:
+            df = pd.read_sql_query(query, conn)
         
         if not df.empty:
             ultima_fecha = pd.to_datetime(df['fecha'].iloc[0]).date()
@@ -135,7 +133,7 @@ def obtener_listado_recursos(tipo_fuente='EOLICA'):
     - ✅ Instantáneo (0.003s vs 5-10s API)
     - ✅ No depende de API XM (más confiable)
     """
-    from utils.db_manager import get_catalogo
+    from utils.catalogos import get_catalogo
     
     import time as time_module
     with open('/home/admonctrlxm/server/logs/timing.log', 'a') as f:
@@ -143,7 +141,7 @@ def obtener_listado_recursos(tipo_fuente='EOLICA'):
     logger.info(f"🔍 Obteniendo ListadoRecursos desde SQLite ({tipo_fuente})...")
     
     try:
-        # PASO 1: Obtener catálogo completo desde SQLite (devuelve DataFrame)
+        # PASO 1: Catálogo completo (en memoria del worker; se relee si cambia su versión)
         df_recursos = get_catalogo('ListadoRecursos')
         
         if df_recursos is None or df_recursos.empty:
@@ -265,6 +263,38 @@ def filtrar_por_tipo_fuente(df_recursos, tipo_fuente):
 
 
 
+def clasificar_tipo_catalogo(tipo):
+    """Label de TIPOS_FUENTE para un tipo del catálogo (mismas reglas que filtrar_por_tipo_fuente)"""
+    tipo_upper = str(tipo).upper()
+    for clave in ('HIDRAULICA', 'EOLICA', 'SOLAR', 'TERMICA'):
+        if clave in tipo_upper:
+            return TIPOS_FUENTE[clave]['label']
+    if any(termino in tipo_upper for termino in ['BIOMASA', 'BIOMAS', 'COGENER', 'BAGAZO', 'RESIDUO']):
+        return TIPOS_FUENTE['BIOMASA']['label']
+    return None
+
+
+def obtener_generacion_diaria_por_fuente(fecha_inicio, fecha_fin):
+    """
+    Generación diaria total por tipo de fuente desde los rollups por grupo de SQLite
+    (una fila por día y fuente, sin leer cada planta).
+    
+    Returns:
+        pd.DataFrame con columnas ['Fecha', 'Tipo', 'Generacion_GWh'] (vacío si no hay rollups)
+    """
+    from utils.db_manager import get_group_rollup, GRUPO_TOTAL
+    
+    df = get_group_rollup('Gene', 'Recurso', fecha_inicio, fecha_fin, resolucion='D')
+    if df.empty:
+        return pd.DataFrame()
+    
+    df = df[df['grupo'] != GRUPO_TOTAL].copy()
+    df['Tipo'] = df['grupo'].map(clasificar_tipo_catalogo)
+    df = df.dropna(subset=['Tipo'])
+    df = df.groupby(['fecha', 'Tipo'], as_index=False)['valor_gwh'].sum()
+    return df.rename(columns={'fecha': 'Fecha', 'valor_gwh': 'Generacion_GWh'})
+
+
 # CÓDIGO DEPRECADO - Mantener por compatibilidad pero ya no se usa
 def obtener_listado_recursos_OLD(tipo_fuente='EOLICA'):
     """DEPRECADO: Usa API directamente - reemplazado por versión SQLite"""
@@ -414,7 +444,7 @@ def obtener_generacion_plantas(fecha_inicio, fecha_fin, plantas_df=None, tipo_fu
         return pd.DataFrame(), pd.DataFrame()
 
 
-def obtener_generacion_agregada_por_tipo(fecha_inicio, fecha_fin, tipo_fuente='HIDRAULICA'):
+def obtener_generacion_agregada_por_tipo(fecha_inicio, fecha_fin, tipo_fuente='HIDRAULICA', resolucion=None):
     """
     Consulta generación usando SQLite PRIMERO (5 años de datos), luego API si es necesario.
     
@@ -428,6 +458,7 @@ def obtener_generacion_agregada_por_tipo(fecha_inicio, fecha_fin, tipo_fuente='H
         fecha_inicio: Fecha inicial (str formato 'YYYY-MM-DD')
         fecha_fin: Fecha final (str formato 'YYYY-MM-DD')
         tipo_fuente: 'HIDRAULICA', 'TERMICA', 'EOLICA', 'SOLAR', 'BIOMASA'
+        resolucion: None/'D' diario; 'W', 'M', 'Y' lee los rollups de SQLite (Fecha = inicio del periodo)
     
     Returns:
         pd.DataFrame con columnas: ['Fecha', 'Generacion_GWh', 'Tipo', 'Codigo', 'Planta']
@@ -479,8 +510,9 @@ def obtener_generacion_agregada_por_tipo(fecha_inicio, fecha_fin, tipo_fuente='H
         # PASO 1.5: OPTIMIZACIÓN - Obtener solo códigos con datos reales
         # ═══════════════════════════════════════════════════════════════
         # Para rangos grandes (>30 días), primero verificar qué códigos tienen datos
+        # (con rollups no hace falta: se leen pocas filas por código)
         dias_rango = (fecha_fin_dt - fecha_inicio_dt).days
-        if dias_rango > 30:
+        if dias_rango > 30 and resolucion in (None, 'D'):
             from utils.db_manager import get_codigos_con_datos
             codigos_con_datos = get_codigos_con_datos('Gene', 'Recurso', fecha_inicio, fecha_fin)
             
@@ -505,7 +537,8 @@ def obtener_generacion_agregada_por_tipo(fecha_inicio, fecha_fin, tipo_fuente='H
             'Recurso',
             fecha_inicio,
             fecha_fin,
-            recurso_filter=codigos_tipo  # Filtrar solo códigos con datos reales
+            recurso_filter=codigos_tipo,  # Filtrar solo códigos con datos reales
+            resolucion=resolucion
         )
         with open('/home/admonctrlxm/server/logs/timing.log', 'a') as f:
             f.write(f"[{time.strftime('%H:%M:%S')}] get_metric_data: {(time.time()-t2)*1000:.0f}ms, {len(df_gene) if df_gene is not None else 0} registros\n")
@@ -525,10 +558,8 @@ def obtener_generacion_agregada_por_tipo(fecha_inicio, fecha_fin, tipo_fuente='H
             df_gene['Tipo_Original'] = tipo_fuente.upper()
             
             # Agregar nombre de planta desde catálogo
-            from utils.db_manager import get_mapeo_codigos
-            mapeo_nombres = get_mapeo_codigos('ListadoRecursos')
-            
-            df_gene['Planta'] = df_gene['Codigo'].map(mapeo_nombres).fillna(df_gene['Codigo'])
+            from utils import catalogos
+            df_gene['Planta'] = catalogos.nombres(df_gene['Codigo'], 'ListadoRecursos')
             
             # Convertir Fecha a datetime si es string
             if df_gene['Fecha'].dtype == 'object':
@@ -982,6 +1013,15 @@ def crear_tabla_participacion(df_participacion):
     return tabla
 
 # Función para agregar datos inteligentemente según el período
+def resolucion_para_periodo(dias_periodo):
+    """Resolución de rollup equivalente a agregar_datos_inteligente ('D', 'W' o 'M')"""
+    if dias_periodo <= 60:
+        return 'D'
+    elif dias_periodo <= 180:
+        return 'W'
+    return 'M'
+
+
 def agregar_datos_inteligente(df_generacion, dias_periodo):
     """
     Agrupa los datos según el período:
@@ -2542,8 +2582,12 @@ def actualizar_tablero_fuentes(n_clicks, tipos_fuente, fecha_inicio, fecha_fin):
         
         # Informar sobre rango grande
         total_days = (fecha_fin_dt - fecha_inicio_dt).days
-        if total_days > 180:
-            logger.warning(f"⚠️ Rango grande: {total_days} días - puede tardar 30-60s")
+        
+        # Rangos largos: leer directamente semanas/meses desde los rollups de SQLite
+        # (misma agregación que aplica la gráfica temporal con agregar_datos_inteligente)
+        resolucion = resolucion_para_periodo(total_days)
+        if resolucion != 'D':
+            logger.info(f"📊 Rango de {total_days} días: usando rollups con resolución {resolucion}")
         
         logger.info(f"📊 Iniciando carga de datos para: {', '.join(tipos_fuente)}")
         
@@ -2565,7 +2609,8 @@ def actualizar_tablero_fuentes(n_clicks, tipos_fuente, fecha_inicio, fecha_fin):
                 df_agregado = obtener_generacion_agregada_por_tipo(
                     fecha_inicio_dt.strftime('%Y-%m-%d'),
                     fecha_fin_dt.strftime('%Y-%m-%d'),
-                    fuente
+                    fuente,
+                    resolucion=resolucion
                 )
                 
                 logger.info(f"📊 {fuente}: DataFrame con {len(df_agregado)} filas")
@@ -3237,6 +3282,7 @@ def actualizar_comparacion_anual(n_clicks, years_selected):
         # 1. OBTENER DATOS DE GENERACIÓN PARA CADA AÑO SELECCIONADO
         # ============================================================
         datos_todos_años = []
+        dias_todos_años = []
         
         for year in sorted(years_selected):
             logger.info(f"📅 Obteniendo datos para año {year}...")
@@ -3249,36 +3295,49 @@ def actualizar_comparacion_anual(n_clicks, years_selected):
             if year == date.today().year:
                 fecha_fin = date.today() - timedelta(days=1)
             
+            # Totales diarios por fuente para la línea (rollups por grupo: ~365 filas por fuente)
+            df_dias_year = obtener_generacion_diaria_por_fuente(
+                fecha_inicio.strftime('%Y-%m-%d'),
+                fecha_fin.strftime('%Y-%m-%d')
+            )
+            # Con rollups, la torta solo necesita el total anual de cada planta
+            resolucion = 'Y' if not df_dias_year.empty else None
+            
             # Obtener datos de generación agregada por tipo
             # Usamos la función existente que consulta SQLite
             df_year_hidraulica = obtener_generacion_agregada_por_tipo(
                 fecha_inicio.strftime('%Y-%m-%d'),
                 fecha_fin.strftime('%Y-%m-%d'),
-                'HIDRAULICA'
+                'HIDRAULICA',
+                resolucion=resolucion
             )
             
             df_year_termica = obtener_generacion_agregada_por_tipo(
                 fecha_inicio.strftime('%Y-%m-%d'),
                 fecha_fin.strftime('%Y-%m-%d'),
-                'TERMICA'
+                'TERMICA',
+                resolucion=resolucion
             )
             
             df_year_eolica = obtener_generacion_agregada_por_tipo(
                 fecha_inicio.strftime('%Y-%m-%d'),
                 fecha_fin.strftime('%Y-%m-%d'),
-                'EOLICA'
+                'EOLICA',
+                resolucion=resolucion
             )
             
             df_year_solar = obtener_generacion_agregada_por_tipo(
                 fecha_inicio.strftime('%Y-%m-%d'),
                 fecha_fin.strftime('%Y-%m-%d'),
-                'SOLAR'
+                'SOLAR',
+                resolucion=resolucion
             )
             
             df_year_biomasa = obtener_generacion_agregada_por_tipo(
                 fecha_inicio.strftime('%Y-%m-%d'),
                 fecha_fin.strftime('%Y-%m-%d'),
-                'BIOMASA'
+                'BIOMASA',
+                resolucion=resolucion
             )
             
             # Combinar todos los tipos de fuente para este año
@@ -3293,6 +3352,11 @@ def actualizar_comparacion_anual(n_clicks, years_selected):
             if not df_year_completo.empty:
                 df_year_completo['Año'] = year
                 datos_todos_años.append(df_year_completo)
+                
+                # Sin rollups, la línea se arma con los datos diarios por planta
+                if df_dias_year.empty:
+                    df_dias_year = df_year_completo[['Fecha', 'Tipo', 'Generacion_GWh']]
+                dias_todos_años.append(df_dias_year.assign(Año=year))
         
         if not datos_todos_años:
             return (
@@ -3310,7 +3374,9 @@ def actualizar_comparacion_anual(n_clicks, years_selected):
         # ============================================================
         
         # Agregar por fecha y año (suma total de todas las fuentes por día)
-        df_por_dia_año = df_completo.groupby(['Año', 'Fecha'], as_index=False)['Generacion_GWh'].sum()
+        df_dias = pd.concat(dias_todos_años, ignore_index=True)
+        df_dias['Fecha'] = pd.to_datetime(df_dias['Fecha'])
+        df_por_dia_año = df_dias.groupby(['Año', 'Fecha'], as_index=False)['Generacion_GWh'].sum()
         
         # Crear fecha normalizada (mismo año base 2024 para superposición)
         df_por_dia_año['MesDia'] = df_por_dia_año['Fecha'].dt.strftime('%m-%d')
@@ -3573,11 +3639,8 @@ def generar_predicciones(n_clicks, active_tab, horizonte_meses, fuentes_seleccio
         # ==================================================================
         # FASE 2: CARGAR PREDICCIONES REALES DE LA BASE DE DATOS
         # ==================================================================
-        import sqlite3
         from datetime import datetime
-        
-        # Conectar a BD
-        conn = sqlite3.connect('/home/admonctrlxm/server/portal_energetico.db')
+        from utils import db_manager
         
         # Cargar predicciones de la BD
         query = """
@@ -3590,10 +3653,10 @@ def generar_predicciones(n_clicks, active_tab, horizonte_meses, fuentes_seleccio
         """.format(','.join(['?' for _ in fuentes_seleccionadas]))
         
         params = fuentes_seleccionadas + [horizonte_meses]
-        df_pred = pd.read_sql_query(query, conn, params=params)
+        with db_manager.get_connection(readonly=True) as conn:
+            df_pred = pd.read_sql_query(query, conn, params=params)
         
         if df_pred.empty:
-            conn.close()
             return (
                 dbc.Alert("⚠️ No hay predicciones disponibles. Ejecute: python scripts/train_predictions.py", color="warning"),
                 dbc.Alert("⚠️ No hay predicciones disponibles. Ejecute: python scripts/train_predictions.py", color="warning")
@@ -3634,14 +3697,13 @@ def generar_predicciones(n_clicks, active_tab, horizonte_meses, fuentes_seleccio
           AND m.fecha >= date('now', '-30 days')
         GROUP BY m.fecha
         """
-        df_hist = pd.read_sql_query(query_hist, conn, params=tipos_list)
+        with db_manager.get_connection(readonly=True) as conn:
+            df_hist = pd.read_sql_query(query_hist, conn, params=tipos_list)
         
         promedio_diario_actual = 0
         if not df_hist.empty and 'total_dia' in df_hist.columns:
             promedio_diario_actual = df_hist['total_dia'].mean()
         
-        conn.close()
-        
         # Comparar promedios diarios correctamente
         variacion = ((promedio_diario_predicho - promedio_diario_actual) / promedio_diario_actual * 100) if promedio_diario_actual > 0 else 0
         color_variacion = "success" if variacion >= 0 else "danger"
@@ -83,7 +83,7 @@ def format_date(date_value):
 
 
 # Inicializar API XM de forma perezosa usando el helper
-from utils._xm import get_objetoAPI, obtener_datos_desde_sqlite, obtener_datos_inteligente
+from utils._xm import get_objetoAPI, obtener_datos_desde_sqlite, obtener_datos_inteligente, obtener_datos_inteligente_bulk
 API_STATUS = None
 
 # Verificar si la API está disponible al inicializar el módulo
@@ -259,8 +259,10 @@ def get_aportes_hidricos(fecha):
         fecha_inicio_str = fecha_inicio.strftime('%Y-%m-%d')
         fecha_final_str = fecha_final.strftime('%Y-%m-%d')
 
-        # Obtener aportes energía usando métrica principal de XM desde SQLite
-        aportes_diarios, warning = obtener_datos_inteligente('AporEner', 'Sistema', fecha_inicio_str, fecha_final_str)
+        # Aportes y media histórica del sistema en una sola consulta a SQLite
+        datos = obtener_datos_inteligente_bulk([('AporEner', 'Sistema'), ('AporEnerMediHist', 'Sistema')],
+                                               fecha_inicio_str, fecha_final_str)
+        aportes_diarios, warning = datos[('AporEner', 'Sistema')]
 
         # Si no funciona, intentar con métricas alternativas
         if aportes_diarios is None or aportes_diarios.empty:
@@ -273,8 +275,7 @@ def get_aportes_hidricos(fecha):
                 except Exception:
                     continue
 
-        # Obtener media histórica usando métrica principal de XM desde SQLite
-        media_historica, warning = obtener_datos_inteligente('AporEnerMediHist', 'Sistema', fecha_inicio_str, fecha_final_str)
+        media_historica, warning = datos[('AporEnerMediHist', 'Sistema')]
 
         # Si no funciona, intentar con métricas alternativas
         if media_historica is None or media_historica.empty:
@@ -456,8 +457,10 @@ def get_aportes_hidricos_por_region(fecha, region):
         fecha_inicio_str = fecha_inicio.strftime('%Y-%m-%d')
         fecha_final_str = fecha_final.strftime('%Y-%m-%d')
         
-        # Obtener aportes energía por río desde SQLite
-        aportes_data, warning = obtener_datos_inteligente('AporEner', 'Rio', fecha_inicio_str, fecha_final_str)
+        # Aportes y media histórica por río en una sola consulta a SQLite
+        datos = obtener_datos_inteligente_bulk([('AporEner', 'Rio'), ('AporEnerMediHist', 'Rio')],
+                                               fecha_inicio_str, fecha_final_str)
+        aportes_data, warning = datos[('AporEner', 'Rio')]
         
         if aportes_data is not None and not aportes_data.empty:
             # Asignar región a cada río
@@ -474,7 +477,7 @@ def get_aportes_hidricos_por_region(fecha, region):
                 aportes_total_region = aportes_region['Value'].sum()
                 
                 # Obtener media histórica para la región
-                media_historica_data, warning = obtener_datos_inteligente('AporEnerMediHist', 'Rio', fecha_inicio_str, fecha_final_str)
+                media_historica_data, warning = datos[('AporEnerMediHist', 'Rio')]
                 
                 if media_historica_data is not None and not media_historica_data.empty:
                     media_historica_data['Region'] = media_historica_data['Name'].map(rio_region)
@@ -1724,8 +1727,10 @@ def crear_ficha_kpi_inicial():
         end_date_str = fecha_fin.strftime('%Y-%m-%d')
         logger.info(f"📅 Fechas: {start_date_str} a {end_date_str}")
         
-        # Obtener datos
-        data, _ = obtener_datos_inteligente('AporEner', 'Rio', start_date_str, end_date_str)
+        # Obtener aportes y media histórica (mismo rango) en una sola consulta
+        datos = obtener_datos_inteligente_bulk([('AporEner', 'Rio'), ('AporEnerMediHist', 'Rio')],
+                                               start_date_str, end_date_str)
+        data, _ = datos[('AporEner', 'Rio')]
         if data is None or data.empty:
             logger.warning("⚠️ FICHA INICIAL: No hay datos de AporEner")
             return html.Div()
@@ -1733,8 +1738,7 @@ def crear_ficha_kpi_inicial():
         total_real = data['Value'].sum()
         logger.info(f"📊 Total real: {total_real:.2f} GWh")
         
-        # Obtener media histórica usando el mismo rango de fechas
-        media_hist_data, _ = obtener_datos_inteligente('AporEnerMediHist', 'Rio', start_date_str, end_date_str)
+        media_hist_data, _ = datos[('AporEnerMediHist', 'Rio')]
         
         if media_hist_data is not None and not media_hist_data.empty:
             total_historico = media_hist_data['Value'].sum()
@@ -1843,16 +1847,17 @@ def update_ficha_kpi(n_clicks, rango, start_date, end_date):
     end_date_str = fecha_fin.strftime('%Y-%m-%d')
     
     try:
-        # Calcular porcentaje vs histórico
-        data, _ = obtener_datos_inteligente('AporEner', 'Rio', start_date_str, end_date_str)
+        # Calcular porcentaje vs histórico (aportes y media histórica en una sola consulta)
+        datos = obtener_datos_inteligente_bulk([('AporEner', 'Rio'), ('AporEnerMediHist', 'Rio')],
+                                               start_date_str, end_date_str)
+        data, _ = datos[('AporEner', 'Rio')]
         if data is None or data.empty:
             logger.warning(f"⚠️ Ficha KPI: No hay datos para {start_date_str} a {end_date_str}")
             return html.Div()
         
         total_real = data['Value'].sum()
         
-        # Obtener media histórica usando el mismo rango de fechas
-        media_hist_data, _ = obtener_datos_inteligente('AporEnerMediHist', 'Rio', start_date_str, end_date_str)
+        media_hist_data, _ = datos[('AporEnerMediHist', 'Rio')]
         
         if media_hist_data is not None and not media_hist_data.empty:
             total_historico = media_hist_data['Value'].sum()
@@ -7049,6 +7054,39 @@ def cargar_mapa_embalses(data):
 # CALLBACK: COMPARACIÓN ANUAL DE HIDROLOGÍA (EMBALSES)
 # ============================================================================
 
+def obtener_volumen_anual_desde_rollups(fecha_inicio, fecha_fin):
+    """
+    Volumen útil de embalses para la comparación anual desde los rollups de SQLite:
+    total diario de todos los embalses (grupo '_TOTAL_') y promedio del periodo por embalse.
+    
+    Returns:
+        tuple: (DataFrame ['Fecha', 'Volumen_GWh'], DataFrame ['Embalse', 'Promedio']),
+               o (None, None) si los rollups no están construidos
+    """
+    from utils import db_manager, catalogos
+    
+    inicio_str = fecha_inicio.strftime('%Y-%m-%d')
+    fin_str = fecha_fin.strftime('%Y-%m-%d')
+    
+    df_total = db_manager.get_group_rollup('VoluUtilDiarEner', 'Embalse', inicio_str, fin_str,
+                                           resolucion='D', grupos=[db_manager.GRUPO_TOTAL])
+    if df_total.empty:
+        return None, None
+    
+    df_embalses = db_manager.get_metric_data('VoluUtilDiarEner', 'Embalse', inicio_str, fin_str,
+                                             resolucion='Y', agregacion='promedio')
+    if df_embalses.empty:
+        return None, None
+    
+    # Mapear código → nombre (igual que obtener_datos_inteligente) y promediar por nombre
+    df_embalses['Embalse'] = catalogos.nombres(df_embalses['recurso'], 'ListadoEmbalses')
+    df_embalses = df_embalses.groupby('Embalse', as_index=False)[['suma', 'conteo']].sum()
+    df_embalses['Promedio'] = df_embalses['suma'] / df_embalses['conteo']
+    
+    df_dias = df_total.rename(columns={'fecha': 'Fecha', 'valor_gwh': 'Volumen_GWh'})[['Fecha', 'Volumen_GWh']]
+    return df_dias, df_embalses[['Embalse', 'Promedio']]
+
+
 @callback(
     [Output('grafica-lineas-temporal-hidro', 'figure'),
      Output('contenedor-embalses-anuales', 'children')],
@@ -7089,7 +7127,8 @@ def actualizar_comparacion_anual_hidro(n_clicks, years_selected, active_tab):
         # ============================================================
         # 1. OBTENER DATOS DE VOLÚMENES PARA CADA AÑO SELECCIONADO
         # ============================================================
-        datos_todos_años = []
+        dias_todos_años = []
+        promedios_por_embalse = {}
         
         for year in sorted(years_selected):
             logger.info(f"📅 Obteniendo datos hidrológicos para año {year}...")
@@ -7102,6 +7141,13 @@ def actualizar_comparacion_anual_hidro(n_clicks, years_selected, active_tab):
             if year == date.today().year:
                 fecha_fin = date.today() - timedelta(days=1)
             
+            # Rollups: ~365 totales diarios + un promedio por embalse (sin leer cada embalse por día)
+            df_dias_year, df_por_embalse_year = obtener_volumen_anual_desde_rollups(fecha_inicio, fecha_fin)
+            if df_dias_year is not None:
+                dias_todos_años.append(df_dias_year.assign(Año=year))
+                promedios_por_embalse[year] = df_por_embalse_year
+                continue
+            
             # Obtener datos de volumen útil de embalses (VoluUtilDiarEner)
             try:
                 df_year, warning_msg = obtener_datos_inteligente(
@@ -7127,7 +7173,10 @@ def actualizar_comparacion_anual_hidro(n_clicks, years_selected, active_tab):
                         df_year['Embalse'] = df_year['Name']
                     
                     df_year['Año'] = year
-                    datos_todos_años.append(df_year)
+                    dias_todos_años.append(df_year.groupby(['Año', 'Fecha'], as_index=False)['Volumen_GWh'].sum())
+                    df_por_embalse_year = df_year.groupby('Embalse')['Volumen_GWh'].mean().reset_index()
+                    df_por_embalse_year.columns = ['Embalse', 'Promedio']
+                    promedios_por_embalse[year] = df_por_embalse_year
                 else:
                     logger.warning(f"⚠️ Sin datos para año {year}")
                     
@@ -7135,33 +7184,29 @@ def actualizar_comparacion_anual_hidro(n_clicks, years_selected, active_tab):
                 logger.error(f"❌ Error obteniendo datos para {year}: {e}")
                 continue
         
-        if not datos_todos_años:
+        if not dias_todos_años:
             return (
                 go.Figure().add_annotation(text="No hay datos disponibles para los años seleccionados", 
                                          xref="paper", yref="paper", x=0.5, y=0.5),
                 dbc.Alert("No se encontraron datos para los años seleccionados", color="warning")
             )
         
-        # Combinar todos los años
-        df_completo = pd.concat(datos_todos_años, ignore_index=True)
-        df_completo['Fecha'] = pd.to_datetime(df_completo['Fecha'])
-        
         # ============================================================
         # NOTA: Se muestran TODOS los embalses de cada año (sin filtrar)
         # Esto asegura que los datos sean reales y completos
         # ============================================================
         
         # Logging para verificar totales por año
-        for year in sorted(years_selected):
-            embalses_año = df_completo[df_completo['Año'] == year]['Embalse'].nunique()
-            logger.info(f"📊 {year}: {embalses_año} embalses")
+        for year in sorted(promedios_por_embalse):
+            logger.info(f"📊 {year}: {len(promedios_por_embalse[year])} embalses")
         
         # ============================================================
         # 2. CREAR GRÁFICA DE LÍNEAS TEMPORALES SUPERPUESTAS
         # ============================================================
         
-        # Agregar por fecha y año (suma total de embalses comunes por día)
-        df_por_dia_año = df_completo.groupby(['Año', 'Fecha'], as_index=False)['Volumen_GWh'].sum()
+        # Suma total de embalses por día y año
+        df_por_dia_año = pd.concat(dias_todos_años, ignore_index=True)
+        df_por_dia_año['Fecha'] = pd.to_datetime(df_por_dia_año['Fecha'])
         
         # Crear fecha normalizada (mismo año base 2024 para superposición)
         df_por_dia_año['MesDia'] = df_por_dia_año['Fecha'].dt.strftime('%m-%d')
@@ -7236,17 +7281,13 @@ def actualizar_comparacion_anual_hidro(n_clicks, years_selected, active_tab):
             if year == date.today().year:
                 fecha_fin_year = date.today() - timedelta(days=1)
             
-            # Filtrar datos del año
-            df_year = df_completo[df_completo['Año'] == year].copy()
-            
             # Calcular totales para KPIs
             volumen_promedio_total = df_por_dia_año[df_por_dia_año['Año'] == year]['Volumen_GWh'].mean()
             volumen_minimo = df_por_dia_año[df_por_dia_año['Año'] == year]['Volumen_GWh'].min()
             volumen_maximo = df_por_dia_año[df_por_dia_año['Año'] == year]['Volumen_GWh'].max()
             
-            # Calcular promedios por embalse para la gráfica
-            df_por_embalse = df_year.groupby('Embalse')['Volumen_GWh'].mean().reset_index()
-            df_por_embalse.columns = ['Embalse', 'Promedio']
+            # Promedios por embalse para la gráfica
+            df_por_embalse = promedios_por_embalse.get(year, pd.DataFrame(columns=['Embalse', 'Promedio']))
             
             # Ordenar y tomar top 10 embalses
             df_por_embalse = df_por_embalse.sort_values('Promedio', ascending=False).head(10)
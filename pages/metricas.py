@@ -18,7 +18,7 @@ from io import BytesIO
 import base64
 import warnings
 import zipfile
-import sqlite3
+from utils import analitica
 import numpy as np
 import pandas.api.types
 
@@ -48,9 +48,6 @@ warnings.filterwarnings("ignore")
 # Configurar logger para este módulo
 logger = setup_logger(__name__)
 
-# Ruta de la base de datos
-DB_PATH = '/home/admonctrlxm/server/portal_energetico.db'
-
 # =============================================================================
 # SISTEMA AUTOMÁTICO DE GENERACIÓN DE INFORMACIÓN DE MÉTRICAS
 # =============================================================================
@@ -342,6 +339,7 @@ register_page(
     order=2
 )
 from utils._xm import get_objetoAPI
+from utils.xm_client import get_xm_client
 
 # Inicializar API XM de forma perezosa y cargar colecciones si están disponibles
 todas_las_metricas = pd.DataFrame()
@@ -349,7 +347,7 @@ todas_las_metricas = pd.DataFrame()
 try:
     objetoAPI = get_objetoAPI()  # Obtener la API cuando se necesita
     if objetoAPI is not None:
-        todas_las_metricas = objetoAPI.get_collections()
+        todas_las_metricas = get_xm_client().get_collections()
         logger.info("API XM inicializada correctamente (lazy)")
         logger.info(f"Métricas disponibles: {len(todas_las_metricas)}")
     else:
@@ -1518,7 +1516,7 @@ def display_metric_results(n_clicks, selected_metric, selected_entity, start_dat
             })
             
             try:
-                data = objetoAPI.request_data(selected_metric, selected_entity, start_dt, end_dt)
+                data = get_xm_client().request_data(selected_metric, selected_entity, start_dt, end_dt)
             except Exception as api_error:
                 logger.error(f"Error en consulta API XM", extra={
                     'error': str(api_error),
@@ -2095,11 +2093,11 @@ def analisis_multivariable_simem(n_clicks, variables, start_date, end_date):
 def obtener_datos_reporte():
     """Obtener datos para el reporte"""
     try:
-        # Intentar obtener datos reales de la API usando get_objetoAPI para colecciones
-        from utils._xm import get_objetoAPI
-        objectxm = get_objetoAPI()
-        if objectxm is not None:
-            metricas_list = objectxm.get_collections()
+        # Intentar obtener datos reales de la API (cliente XM) para colecciones
+        from utils.xm_client import get_xm_client
+        cliente = get_xm_client()
+        if cliente.disponible:
+            metricas_list = cliente.get_collections()
         else:
             metricas_list = []
         
@@ -2291,42 +2289,37 @@ def analizar_seccion_multivariado(n_clicks, ids):
     
     # Consultar datos de la base de datos
     try:
-        conn = sqlite3.connect(DB_PATH)
-        
         # Obtener últimos 90 días de datos para cada métrica
         fecha_fin = datetime.now()
         fecha_inicio = fecha_fin - timedelta(days=90)
         
-        df_list = []
-        metricas_disponibles = []
+        metricas_consulta = metricas[:10]  # Limitar a 10 métricas para rendimiento
         
-        for metrica in metricas[:10]:  # Limitar a 10 métricas para rendimiento
-            query = f"""
-            SELECT fecha, metrica, AVG(valor_gwh) as valor
-            FROM metrics
-            WHERE metrica = '{metrica}'
-            AND fecha >= '{fecha_inicio.strftime('%Y-%m-%d')}'
-            AND fecha <= '{fecha_fin.strftime('%Y-%m-%d')}'
-            GROUP BY fecha, metrica
-            ORDER BY fecha
-            """
-            df_temp = pd.read_sql_query(query, conn)
-            if not df_temp.empty:
-                df_list.append(df_temp)
-                metricas_disponibles.append(metrica)
+        # Una sola consulta para todas las métricas (motor analítico: SQLite o espejo Parquet)
+        query = f"""
+        SELECT fecha, metrica, AVG(valor_gwh) as valor
+        FROM metrics
+        WHERE metrica IN ({','.join('?' * len(metricas_consulta))})
+        AND fecha >= ?
+        AND fecha <= ?
+        GROUP BY fecha, metrica
+        ORDER BY fecha
+        """
+        df_combined = analitica.consultar(query, (
+            *metricas_consulta,
+            fecha_inicio.strftime('%Y-%m-%d'),
+            fecha_fin.strftime('%Y-%m-%d')
+        ))
+        con_datos = set(df_combined['metrica']) if not df_combined.empty else set()
+        metricas_disponibles = [m for m in metricas_consulta if m in con_datos]
         
-        conn.close()
-        
-        if not df_list:
+        if not metricas_disponibles:
             return dbc.Alert([
                 html.I(className="fas fa-exclamation-triangle me-2"),
                 f"No hay datos disponibles en la base de datos para las métricas de '{seccion}'. ",
                 "Estas métricas están disponibles en la API de XM pero aún no han sido cargadas al sistema."
             ], color="warning")
         
-        # Combinar datos
-        df_combined = pd.concat(df_list, ignore_index=True)
-        
         # Pivotar para análisis multivariado
         df_pivot = df_combined.pivot_table(
             index='fecha',
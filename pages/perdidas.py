@@ -17,7 +17,7 @@ import time
 # Imports locales para componentes uniformes
 from utils.components import crear_navbar_horizontal, crear_filtro_fechas_compacto, registrar_callback_filtro_fechas
 from utils.config import COLORS
-from utils._xm import obtener_datos_inteligente
+from utils._xm import obtener_datos_inteligente_bulk
 
 warnings.filterwarnings("ignore")
 
@@ -88,11 +88,17 @@ def actualizar_perdidas(n_clicks, fecha_inicio, fecha_fin):
         fecha_ini = pd.to_datetime(fecha_inicio).strftime('%Y-%m-%d')
         fecha_fin = pd.to_datetime(fecha_fin).strftime('%Y-%m-%d')
         
-        # Obtener datos de pérdidas desde SQLite/API
-        perdidas_totales, _ = obtener_datos_inteligente('PerdidasEner', 'Sistema', fecha_ini, fecha_fin)
-        perdidas_reg, _ = obtener_datos_inteligente('PerdidasEnerReg', 'Sistema', fecha_ini, fecha_fin)
-        perdidas_no_reg, _ = obtener_datos_inteligente('PerdidasEnerNoReg', 'Sistema', fecha_ini, fecha_fin)
-        generacion, _ = obtener_datos_inteligente('Gene', 'Sistema', fecha_ini, fecha_fin)
+        # Obtener datos de pérdidas desde SQLite/API (una sola consulta para las 4 series)
+        datos = obtener_datos_inteligente_bulk([
+            ('PerdidasEner', 'Sistema'),
+            ('PerdidasEnerReg', 'Sistema'),
+            ('PerdidasEnerNoReg', 'Sistema'),
+            ('Gene', 'Sistema'),
+        ], fecha_ini, fecha_fin)
+        perdidas_totales, _ = datos[('PerdidasEner', 'Sistema')]
+        perdidas_reg, _ = datos[('PerdidasEnerReg', 'Sistema')]
+        perdidas_no_reg, _ = datos[('PerdidasEnerNoReg', 'Sistema')]
+        generacion, _ = datos[('Gene', 'Sistema')]
         
         # Verificar que haya datos
         if perdidas_totales is None or perdidas_totales.empty:
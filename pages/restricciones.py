@@ -17,7 +17,7 @@ import time
 # Imports locales para componentes uniformes
 from utils.components import crear_navbar_horizontal, crear_filtro_fechas_compacto, registrar_callback_filtro_fechas
 from utils.config import COLORS
-from utils._xm import obtener_datos_inteligente
+from utils._xm import obtener_datos_inteligente_bulk
 
 warnings.filterwarnings("ignore")
 
@@ -88,10 +88,15 @@ def actualizar_restricciones(n_clicks, fecha_inicio, fecha_fin):
         fecha_ini = pd.to_datetime(fecha_inicio).strftime('%Y-%m-%d')
         fecha_fin = pd.to_datetime(fecha_fin).strftime('%Y-%m-%d')
         
-        # Obtener datos de restricciones desde SQLite/API
-        rest_aliv, _ = obtener_datos_inteligente('RestAliv', 'Sistema', fecha_ini, fecha_fin)
-        rest_sin_aliv, _ = obtener_datos_inteligente('RestSinAliv', 'Sistema', fecha_ini, fecha_fin)
-        resp_agc, _ = obtener_datos_inteligente('RespComerAGC', 'Sistema', fecha_ini, fecha_fin)
+        # Obtener datos de restricciones desde SQLite/API (una sola consulta para las 3 series)
+        datos = obtener_datos_inteligente_bulk([
+            ('RestAliv', 'Sistema'),
+            ('RestSinAliv', 'Sistema'),
+            ('RespComerAGC', 'Sistema'),
+        ], fecha_ini, fecha_fin)
+        rest_aliv, _ = datos[('RestAliv', 'Sistema')]
+        rest_sin_aliv, _ = datos[('RestSinAliv', 'Sistema')]
+        resp_agc, _ = datos[('RespComerAGC', 'Sistema')]
         
         # Verificar que haya datos
         if (rest_aliv is None or rest_aliv.empty) and (rest_sin_aliv is None or rest_sin_aliv.empty):
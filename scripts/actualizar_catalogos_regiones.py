@@ -76,6 +76,8 @@ def actualizar_regiones_embalses():
                 errores += 1
                 logger.error(f"❌ Error actualizando {codigo}: {e}")
         
+        # Subir la versión del catálogo: los workers lo vuelven a leer (utils/catalogos)
+        db_manager._registrar_versiones(conn, [(db_manager.METRICA_CATALOGO, 'ListadoEmbalses', '')])
         conn.commit()
         conn.close()
         
@@ -147,6 +149,7 @@ def actualizar_regiones_rios():
                 errores += 1
                 logger.error(f"❌ Error actualizando {codigo}: {e}")
         
+        db_manager._registrar_versiones(conn, [(db_manager.METRICA_CATALOGO, 'ListadoRios', '')])
         conn.commit()
         conn.close()
         
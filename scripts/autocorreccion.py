@@ -63,9 +63,15 @@ class AutoCorrector:
         logger.info("="*60)
         
         try:
+            from utils.db_manager import es_schema_v2
+            if es_schema_v2(conn):
+                # La PK de metrics_fact es (métrica, entidad, recurso, día): no puede haber duplicados
+                logger.info("✅ Esquema v2: sin duplicados posibles")
+                return 0
+            
             cursor = conn.cursor()
             
-            # Detectar duplicados
+            # Detectar duplicados (v1: UNIQUE no impide repetidos con recurso NULL)
             cursor.execute("""
                 SELECT metrica, entidad, recurso, fecha, COUNT(*) as count
                 FROM metrics
@@ -98,9 +104,9 @@ class AutoCorrector:
                         WHERE id NOT IN (
                             SELECT MAX(id)
                             FROM metrics
-                            WHERE metrica = ? AND entidad = ? AND recurso = ? AND fecha = ?
+                            WHERE metrica = ? AND entidad = ? AND recurso IS ? AND fecha = ?
                         )
-                        AND metrica = ? AND entidad = ? AND recurso = ? AND fecha = ?
+                        AND metrica = ? AND entidad = ? AND recurso IS ? AND fecha = ?
                     """, (metrica, entidad, recurso, fecha, metrica, entidad, recurso, fecha))
                     
                     eliminados = cursor.rowcount
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════╗
+║     BENCHMARK: executemany vs carga por lotes / staging      ║
+║                                                              ║
+║  Carga N filas sintéticas tipo Gene/Recurso (backfill de     ║
+║  varios años) con el upsert fila a fila en una sola          ║
+║  transacción (comportamiento anterior) y con la carga por    ║
+║  lotes de upsert_metrics_bulk. Mide carga inicial y          ║
+║  recarga (todas las filas ya existen) en filas/s.            ║
+║  --horario hace lo mismo con upsert_hourly_metrics_bulk.     ║
+║                                                              ║
+║  Uso:                                                        ║
+║    python3 scripts/benchmark_carga_bulk.py                   ║
+║    python3 scripts/benchmark_carga_bulk.py --filas 1000000 --v2
+║    python3 scripts/benchmark_carga_bulk.py --horario         ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import logging
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+
+def generar_filas(n: int, recursos: int = 500):
+    """Filas en el orden en que llegan de la API: día por día, todos los recursos"""
+    inicio = date(2020, 1, 1)
+    filas = []
+    dia = 0
+    while len(filas) < n:
+        fecha = (inicio + timedelta(days=dia)).isoformat()
+        filas.extend((fecha, 'Gene', 'Recurso', f'R{r:03d}', random.uniform(0, 5), 'GWh')
+                     for r in range(min(recursos, n - len(filas))))
+        dia += 1
+    return filas
+
+
+def generar_filas_horarias(n: int, agentes: int = 200):
+    """Filas horarias (fecha, metrica, entidad, recurso, hora, valor_mwh): día por día, agente por agente"""
+    inicio = date(2022, 1, 1)
+    filas = []
+    dia = 0
+    while len(filas) < n:
+        fecha = (inicio + timedelta(days=dia)).isoformat()
+        for a in range(agentes):
+            filas.extend((fecha, 'DemaCome', 'Agente', f'AG{a:03d}', h, random.uniform(0, 50)) for h in range(1, 25))
+        dia += 1
+    return filas[:n - n % 24]
+
+
+def preparar_bd(db_manager, ruta: Path, v2: bool, horario: bool = False):
+    """BD vacía con el esquema del portal (migrada a v2 / horarios por día si se pide)"""
+    db_manager.close_all_connections()
+    for sufijo in ('', '-wal', '-shm'):
+        Path(str(ruta) + sufijo).unlink(missing_ok=True)
+    db_manager.DB_PATH = ruta
+    db_manager.init_database()
+    if v2:
+        db_manager.migrate_schema_v2()
+    if horario:
+        db_manager.migrate_hourly_dia()
+
+
+def cargar_executemany(db_manager, filas):
+    """Comportamiento anterior: upsert fila a fila en una sola transacción"""
+    with db_manager.get_connection() as conn:
+        db_manager._upsert_metrics(conn, filas)
+        conn.commit()
+
+
+def cargar_executemany_horario(db_manager, filas):
+    """Comportamiento anterior del horario empaquetado: agrupar por día y upsert fila a fila"""
+    dias = {}
+    for fecha, metrica, entidad, recurso, hora, valor_mwh in filas:
+        dias.setdefault((fecha, metrica, entidad, recurso), [None] * 24)[hora - 1] = valor_mwh
+    with db_manager.get_connection() as conn:
+        conn.executemany(db_manager._UPSERT_HOURLY_DIA, db_manager._filas_hourly_dia(
+            [(*clave, valores) for clave, valores in dias.items()]
+        ))
+        conn.commit()
+
+
+def medir(funcion, filas):
+    t0 = time.perf_counter()
+    funcion(filas)
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de cargas masivas')
+    parser.add_argument('--filas', type=int, default=1_000_000, help='Filas a cargar')
+    parser.add_argument('--v2', action='store_true', help='Usar el esquema v2 (metrics_fact)')
+    parser.add_argument('--horario', action='store_true', help='Medir la carga horaria (metrics_hourly_dia)')
+    parser.add_argument('--lote', type=int, help='Filas por lote de la carga por lotes')
+    args = parser.parse_args()
+
+    from utils import db_manager
+    db_manager.logger.setLevel(logging.WARNING)
+    if args.lote:
+        db_manager.LOTE_CARGA = args.lote
+
+    if args.horario:
+        filas = generar_filas_horarias(args.filas)
+        recarga = [(f, m, e, r, h, v + 1.0) for f, m, e, r, h, v in filas]
+        tabla = 'metrics_hourly'
+        metodos = (('executemany', lambda f: cargar_executemany_horario(db_manager, f)),
+                   ('por lotes', db_manager.upsert_hourly_metrics_bulk))
+    else:
+        filas = generar_filas(args.filas)
+        recarga = [(f, m, e, r, v + 1.0, u) for f, m, e, r, v, u in filas]
+        tabla = 'metrics'
+        metodos = (('executemany', lambda f: cargar_executemany(db_manager, f)),
+                   ('por lotes', db_manager.upsert_metrics_bulk))
+    print(f"🧪 {len(filas):,} filas sintéticas ({filas[0][0]} a {filas[-1][0]}), "
+          f"esquema {'v2' if args.v2 else 'v1'}{', horario por día' if args.horario else ''}")
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta = Path(tmp) / 'bench.db'
+        for nombre, funcion in metodos:
+            preparar_bd(db_manager, ruta, args.v2, args.horario)
+            resultados[nombre] = (medir(funcion, filas), medir(funcion, recarga))
+            with db_manager.get_connection(readonly=True) as conn:
+                total = conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+            assert total == len(filas), f"{nombre}: {total} filas en la BD"
+        db_manager.close_all_connections()
+
+    print("\n📊 RESULTADOS (filas/s)")
+    print(f"{'':<16}{'Carga inicial':>16}{'Recarga':>16}")
+    for nombre, (inicial, recarga_s) in resultados.items():
+        print(f"{nombre:<16}{len(filas) / inicial:>16,.0f}{len(filas) / recarga_s:>16,.0f}")
+    print(f"\nexecutemany retiene el lock de escritura toda la carga; "
+          f"la carga por lotes lo libera cada {db_manager.LOTE_CARGA:,} filas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
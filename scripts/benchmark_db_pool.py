@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════╗
+║        BENCHMARK: Conexión por query vs Pool WAL             ║
+║                                                              ║
+║  Compara la latencia p50/p95 de consultas tipo              ║
+║  get_metric_data abriendo una conexión nueva por query      ║
+║  (comportamiento anterior) contra el pool de db_manager.    ║
+║                                                              ║
+║  Uso:                                                        ║
+║    python3 scripts/benchmark_db_pool.py                      ║
+║    python3 scripts/benchmark_db_pool.py --db portal_energetico.db --hilos 3
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import random
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+
+def crear_bd_sintetica(ruta: Path, dias: int = 1826, recursos: int = 120):
+    """Crea una BD con el esquema del portal y datos sintéticos tipo Gene/Recurso"""
+    schema = (Path(__file__).parent.parent / 'sql' / 'schema.sql').read_text(encoding='utf-8')
+    conn = sqlite3.connect(str(ruta))
+    conn.executescript(schema)
+
+    inicio = date.today() - timedelta(days=dias)
+    filas = []
+    for d in range(dias):
+        fecha = (inicio + timedelta(days=d)).isoformat()
+        filas.append((fecha, 'Gene', 'Sistema', '_SISTEMA_', random.uniform(180, 240), 'GWh'))
+        for r in range(recursos):
+            filas.append((fecha, 'Gene', 'Recurso', f'R{r:03d}', random.uniform(0, 5), 'GWh'))
+
+    conn.executemany(
+        "INSERT INTO metrics (fecha, metrica, entidad, recurso, valor_gwh, unidad) VALUES (?, ?, ?, ?, ?, ?)",
+        filas
+    )
+    conn.commit()
+    conn.close()
+    print(f"🧪 BD sintética: {len(filas):,} filas en {ruta}")
+
+
+def generar_consultas(n: int, recursos: int = 120):
+    """Mezcla de consultas del dashboard: rangos de Sistema y filtros IN por recursos"""
+    consultas = []
+    hoy = date.today()
+    for _ in range(n):
+        dias = random.choice([7, 30, 90, 365])
+        fin = hoy - timedelta(days=random.randint(1, 60))
+        ini = fin - timedelta(days=dias)
+        if random.random() < 0.5:
+            consultas.append(('Gene', 'Sistema', ini.isoformat(), fin.isoformat(), ['_SISTEMA_']))
+        else:
+            codigos = [f'R{r:03d}' for r in random.sample(range(recursos), 20)]
+            consultas.append(('Gene', 'Recurso', ini.isoformat(), fin.isoformat(), codigos))
+    return consultas
+
+
+def _sql(codigos):
+    placeholders = ','.join(['?'] * len(codigos))
+    return f"""
+        SELECT fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion
+        FROM metrics
+        WHERE metrica = ? AND entidad = ? AND fecha BETWEEN ? AND ?
+          AND recurso IN ({placeholders})
+        ORDER BY fecha, recurso
+    """
+
+
+def consulta_legacy(ruta: str, metrica, entidad, ini, fin, codigos):
+    """Comportamiento anterior: conexión nueva por query, sin PRAGMAs"""
+    conn = sqlite3.connect(ruta, timeout=10.0, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        return conn.execute(_sql(codigos), [metrica, entidad, ini, fin, *codigos]).fetchall()
+    finally:
+        conn.close()
+
+
+def consulta_pool(metrica, entidad, ini, fin, codigos):
+    """Conexión de solo lectura reutilizada desde el pool de db_manager"""
+    from utils import db_manager
+    with db_manager.get_connection(readonly=True) as conn:
+        return conn.execute(_sql(codigos), [metrica, entidad, ini, fin, *codigos]).fetchall()
+
+
+def medir(funcion, consultas, hilos: int):
+    """Ejecuta las consultas repartidas en N hilos y retorna latencias en ms"""
+    latencias = []
+    lock = threading.Lock()
+
+    def worker(lote):
+        locales = []
+        for c in lote:
+            t0 = time.perf_counter()
+            funcion(*c)
+            locales.append((time.perf_counter() - t0) * 1000)
+        with lock:
+            latencias.extend(locales)
+
+    threads = [threading.Thread(target=worker, args=(consultas[i::hilos],)) for i in range(hilos)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencias
+
+
+def percentil(valores, p):
+    valores = sorted(valores)
+    k = max(0, min(len(valores) - 1, int(round(p / 100 * (len(valores) - 1)))))
+    return valores[k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark conexión por query vs pool WAL')
+    parser.add_argument('--db', type=str, help='BD a usar (por defecto crea una sintética temporal)')
+    parser.add_argument('--consultas', type=int, default=400, help='Número de consultas por escenario')
+    parser.add_argument('--hilos', type=int, default=3, help='Hilos concurrentes (gunicorn usa 3 por worker)')
+    args = parser.parse_args()
+
+    tmpdir = None
+    if args.db:
+        ruta = Path(args.db).resolve()
+    else:
+        tmpdir = tempfile.TemporaryDirectory()
+        ruta = Path(tmpdir.name) / 'benchmark.db'
+        crear_bd_sintetica(ruta)
+
+    os.environ['PORTAL_DB_PATH'] = str(ruta)
+    from utils import db_manager
+    db_manager.DB_PATH = ruta
+
+    consultas = generar_consultas(args.consultas)
+
+    # Calentamiento para no medir la primera lectura del archivo desde disco
+    medir(lambda *c: consulta_legacy(str(ruta), *c), consultas[:20], 1)
+
+    resultados = {}
+    resultados['Conexión por query'] = medir(lambda *c: consulta_legacy(str(ruta), *c), consultas, args.hilos)
+    resultados['Pool WAL (readonly)'] = medir(consulta_pool, consultas, args.hilos)
+
+    print("\n" + "=" * 70)
+    print(f"📊 {args.consultas} consultas, {args.hilos} hilos, BD: {ruta}")
+    print("=" * 70)
+    print(f"{'Escenario':<25}{'p50 (ms)':>12}{'p95 (ms)':>12}{'media (ms)':>12}")
+    for nombre, lat in resultados.items():
+        print(f"{nombre:<25}{percentil(lat, 50):>12.2f}{percentil(lat, 95):>12.2f}{statistics.mean(lat):>12.2f}")
+
+    db_manager.close_all_connections()
+    if tmpdir:
+        tmpdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
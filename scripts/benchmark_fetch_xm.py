@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════╗
+║     BENCHMARK: fetch_gene_recurso_chunked secuencial vs      ║
+║                pool concurrente con limitador de tasa        ║
+║                                                              ║
+║  Contra un sustituto local de la API XM (request_data con    ║
+║  latencia y errores transitorios simulados) que registra     ║
+║  la concurrencia máxima y las consultas por segundo, para    ║
+║  comprobar que el limitador respeta la tolerancia de XM.     ║
+║                                                              ║
+║  Uso:                                                        ║
+║    python3 scripts/benchmark_fetch_xm.py                     ║
+║    python3 scripts/benchmark_fetch_xm.py --dias 365 --codigos 300 --latencia 1.5
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import logging
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+
+import pandas as pd
+
+
+class APIXMLocal:
+    """request_data de pydataxm para Gene/Recurso: 24 columnas horarias por código y día"""
+
+    def __init__(self, latencia: float, tasa_error: float):
+        self.latencia = latencia
+        self.tasa_error = tasa_error
+        self.consultas = 0
+        self.errores = 0
+        self.concurrencia_max = 0
+        self._en_curso = 0
+        self._inicios = deque()
+        self.max_por_segundo = 0
+        self._lock = threading.Lock()
+
+    def request_data(self, metric, entity, start, end, codigos=None):
+        with self._lock:
+            self.consultas += 1
+            self._en_curso += 1
+            self.concurrencia_max = max(self.concurrencia_max, self._en_curso)
+            ahora = time.monotonic()
+            self._inicios.append(ahora)
+            while self._inicios[0] < ahora - 1:
+                self._inicios.popleft()
+            self.max_por_segundo = max(self.max_por_segundo, len(self._inicios))
+        try:
+            time.sleep(self.latencia * random.uniform(0.7, 1.3))
+            if random.random() < self.tasa_error:
+                with self._lock:
+                    self.errores += 1
+                raise ConnectionError("503 Service Unavailable (simulado)")
+            fechas = pd.date_range(start, end, freq='D').strftime('%Y-%m-%d')
+            filas = [(f, c) for f in fechas for c in codigos]
+            df = pd.DataFrame(filas, columns=['Date', 'Values_code'])
+            for h in range(1, 25):
+                df[f'Values_Hour{h:02d}'] = 1000.0
+            return df
+        finally:
+            with self._lock:
+                self._en_curso -= 1
+
+
+def fetch_secuencial(api, start, end, filtros, batch_size, chunk_days, backoff_sec):
+    """Comportamiento anterior: chunks × lotes uno tras otro con pausa fija entre consultas"""
+    from utils.utils_xm import chunk_date_ranges, _gene_recurso_diario
+    partes = []
+    primera = True
+    for ini, fin in chunk_date_ranges(start, end, chunk_days=chunk_days):
+        for i in range(0, len(filtros), batch_size):
+            if not primera:
+                time.sleep(backoff_sec)
+            primera = False
+            try:
+                parte = _gene_recurso_diario(api.request_data("Gene", "Recurso", ini, fin, filtros[i:i + batch_size]))
+            except ConnectionError:
+                continue
+            if parte is not None:
+                partes.append(parte)
+    return pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de consultas Gene/Recurso a la API XM')
+    parser.add_argument('--dias', type=int, default=365, help='Días del rango')
+    parser.add_argument('--codigos', type=int, default=300, help='Plantas consultadas')
+    parser.add_argument('--latencia', type=float, default=0.5, help='Segundos por consulta simulada')
+    parser.add_argument('--errores', type=float, default=0.05, help='Fracción de consultas que fallan')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    os.environ['PORTAL_XM_CACHE_PATH'] = os.path.join(tempfile.mkdtemp(), 'xm_cache.db')
+    from utils import utils_xm
+
+    fin = date(2024, 12, 31)
+    inicio = fin - timedelta(days=args.dias - 1)
+    codigos = [f'P{i:03d}' for i in range(args.codigos)]
+    # Tamaños de chunk y lote que elige fetch_gene_recurso_chunked para el rango
+    chunk_days = args.dias if args.dias <= 61 else 90 if args.dias <= 181 else 180 if args.dias <= 366 else 365
+    batch_size = 50 if args.dias <= 181 else 40 if args.dias <= 366 else 30
+    print(f"🧪 Gene/Recurso {inicio} a {fin}, {len(codigos)} plantas, latencia {args.latencia}s, "
+          f"{args.errores:.0%} errores; tasa {utils_xm.LIMITADOR_XM.tasa}/s, {utils_xm.XM_API_WORKERS} hilos")
+
+    resultados = {}
+    for nombre, funcion in (
+        ('secuencial', lambda api: fetch_secuencial(api, inicio, fin, codigos, batch_size, chunk_days, 1.0)),
+        ('concurrente', lambda api: utils_xm.fetch_gene_recurso_chunked(api, inicio, fin, codigos)),
+    ):
+        api = APIXMLocal(args.latencia, args.errores)
+        t0 = time.perf_counter()
+        df = funcion(api)
+        resultados[nombre] = (time.perf_counter() - t0, len(df), api)
+
+    print(f"\n📊 RESULTADOS")
+    print(f"{'':<14}{'Tiempo':>10}{'Filas':>10}{'Consultas':>11}{'Errores':>9}{'Máx. simult.':>14}{'Máx. /s':>9}")
+    for nombre, (segundos, filas, api) in resultados.items():
+        print(f"{nombre:<14}{segundos:>9.1f}s{filas:>10,}{api.consultas:>11}{api.errores:>9}"
+              f"{api.concurrencia_max:>14}{api.max_por_segundo:>9}")
+    print("\nsecuencial pierde los chunks que fallan; concurrente los reintenta con backoff y jitter")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
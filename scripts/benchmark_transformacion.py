@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════╗
+║     BENCHMARK: transformación API XM → tuplas de SQLite      ║
+║                                                              ║
+║  Respuesta sintética tipo Gene/Recurso (Values_code +        ║
+║  Values_Hour01-24, varios años) transformada con los bucles  ║
+║  iterrows de poblar_metrica (comportamiento anterior) y con  ║
+║  las funciones vectorizadas de etl/transformaciones.py.      ║
+║  Mide filas/s de las tuplas diarias y de las horarias, sin   ║
+║  tocar SQLite.                                               ║
+║                                                              ║
+║  Uso:                                                        ║
+║    python3 scripts/benchmark_transformacion.py               ║
+║    python3 scripts/benchmark_transformacion.py --filas 50000 ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from etl.transformaciones import HORAS_API, filas_sqlite, filas_horarias, valor_diario
+
+
+def generar_respuesta(n: int, recursos: int = 500) -> pd.DataFrame:
+    """n filas (recurso × día) como las devuelve request_data para Gene/Recurso"""
+    dias = -(-n // recursos)
+    fechas = np.repeat(pd.date_range('2020-01-01', periods=dias).strftime('%Y-%m-%d').to_numpy(), recursos)[:n]
+    codigos = np.tile([f'R{r:03d}' for r in range(recursos)], dias)[:n]
+    df = pd.DataFrame({'Values_code': codigos, 'Date': fechas})
+    horas = np.random.default_rng(0).uniform(0, 5000, size=(n, 24))
+    horas[::7, :6] = 0  # horas sin generación, como las plantas solares de noche
+    return pd.concat([df, pd.DataFrame(horas, columns=HORAS_API)], axis=1)
+
+
+def transformar_iterrows(df: pd.DataFrame, metric: str, entity: str):
+    """Comportamiento anterior de poblar_metrica: una iteración Python por fila (y por hora)"""
+    diarias = []
+    for _, row in df.iterrows():
+        recurso = None
+        for col_name in ['Values_code', 'Name', 'Id', 'Resources', 'Embalse', 'Rio', 'Agente']:
+            if col_name in df.columns:
+                recurso = row.get(col_name)
+                if pd.notna(recurso):
+                    recurso = str(recurso)
+                    if recurso.strip().lower() == 'sistema':
+                        recurso = '_SISTEMA_'
+                break
+        diarias.append((str(row['Date'])[:10], metric, entity, recurso, float(row['Value']), 'GWh'))
+
+    horarias = []
+    for _, row in df.iterrows():
+        recurso = None
+        for col_name in ['Values_code', 'Name', 'Id', 'Resources', 'Embalse', 'Rio', 'Agente']:
+            if col_name in df.columns:
+                recurso = row.get(col_name)
+                if pd.notna(recurso):
+                    recurso = str(recurso)
+                break
+        valores = []
+        for hora in range(1, 25):
+            valor = row[f'Values_Hour{hora:02d}']
+            valores.append(valor / 1000 if pd.notna(valor) and valor > 0 else np.nan)
+        if not all(np.isnan(valores)):
+            horarias.append((str(row['Date'])[:10], metric, entity, recurso, valores))
+    return diarias, horarias
+
+
+def transformar_vectorizado(df: pd.DataFrame, metric: str, entity: str):
+    """Transformación actual de guardar_datos (etl/transformaciones.py)"""
+    return filas_sqlite(df, metric, entity), filas_horarias(df, metric, entity)
+
+
+def medir(funcion, df):
+    t0 = time.perf_counter()
+    diarias, horarias = funcion(df, 'Gene', 'Recurso')
+    return time.perf_counter() - t0, len(diarias), len(horarias)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la transformación API XM → SQLite')
+    parser.add_argument('--filas', type=int, default=200_000, help='Filas (recurso × día) de la respuesta')
+    args = parser.parse_args()
+
+    df = valor_diario(generar_respuesta(args.filas), 'Gene', 'horas_a_diario')
+    print(f"🧪 {len(df):,} filas sintéticas Gene/Recurso ({df['Date'].iloc[0]} a {df['Date'].iloc[-1]})")
+
+    resultados = {}
+    for nombre, funcion in (('iterrows', transformar_iterrows), ('vectorizado', transformar_vectorizado)):
+        resultados[nombre] = medir(funcion, df)
+    assert resultados['iterrows'][1:] == resultados['vectorizado'][1:], resultados
+
+    print("\n📊 RESULTADOS")
+    print(f"{'':<16}{'Segundos':>12}{'Filas/s':>16}")
+    for nombre, (segundos, _, _) in resultados.items():
+        print(f"{nombre:<16}{segundos:>12.2f}{len(df) / segundos:>16,.0f}")
+    print(f"\nAceleración: {resultados['iterrows'][0] / resultados['vectorizado'][0]:.1f}x "
+          f"({resultados['vectorizado'][1]:,} tuplas diarias, {resultados['vectorizado'][2]:,} días horarios)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
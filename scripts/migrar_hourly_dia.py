@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════╗
+║      MIGRACIÓN: metrics_hourly → metrics_hourly_dia          ║
+║                                                              ║
+║  Empaqueta los datos horarios: una fila por                  ║
+║  (metrica, entidad, recurso, día) con las 24 horas en        ║
+║  columnas h01..h24, y deja una vista metrics_hourly          ║
+║  compatible con el SQL existente.                            ║
+║                                                              ║
+║  Reporta filas, tamaño de la BD y latencia de                ║
+║  get_hourly_data_aggregated antes y después.                 ║
+║                                                              ║
+║  Uso:                                                        ║
+║    python3 scripts/migrar_hourly_dia.py                      ║
+║    python3 scripts/migrar_hourly_dia.py --db /ruta/copia.db  ║
+║                                                              ║
+║  IMPORTANTE: detener el ETL y hacer backup antes de migrar   ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import random
+import time
+from pathlib import Path
+
+from migrar_schema_v2 import tamano_mb, resumen
+
+
+def elegir_consultas(db_manager, muestras: int):
+    """Elige (metrica, entidad, fecha) reales con datos horarios"""
+    with db_manager.get_connection(readonly=True) as conn:
+        dias = conn.execute("""
+            SELECT DISTINCT metrica, entidad, fecha
+            FROM metrics_hourly
+        """).fetchall()
+    return [tuple(random.choice(dias)) for _ in range(muestras)] if dias else []
+
+
+def medir_latencias(db_manager, consultas):
+    """Latencias (ms) de get_hourly_data_aggregated para la lista de consultas"""
+    import logging
+    nivel = db_manager.logger.level
+    db_manager.logger.setLevel(logging.ERROR)
+    latencias = []
+    try:
+        for metrica, entidad, fecha in consultas:
+            t0 = time.perf_counter()
+            db_manager.get_hourly_data_aggregated(metrica, entidad, fecha)
+            latencias.append((time.perf_counter() - t0) * 1000)
+    finally:
+        db_manager.logger.setLevel(nivel)
+    return latencias
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Empaquetado de metrics_hourly por día')
+    parser.add_argument('--db', type=str, help='BD a migrar (por defecto la de db_manager)')
+    parser.add_argument('--conservar-v1', action='store_true',
+                        help='Conservar la tabla original como metrics_hourly_v1 (no reduce tamaño)')
+    parser.add_argument('--sin-vacuum', action='store_true', help='No ejecutar VACUUM al final')
+    parser.add_argument('--muestras', type=int, default=50, help='Consultas para medir latencia')
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['PORTAL_DB_PATH'] = str(Path(args.db).resolve())
+    from utils import db_manager
+
+    ruta = db_manager.DB_PATH
+    print("=" * 70)
+    print(f"🔧 Empaquetado de datos horarios: {ruta}")
+    print("=" * 70)
+
+    with db_manager.get_connection() as conn:
+        if db_manager.es_hourly_dia(conn):
+            print("ℹ️ Los datos horarios ya están empaquetados, nada que hacer")
+            return 0
+        filas_antes = conn.execute("SELECT COUNT(*) FROM metrics_hourly").fetchone()[0]
+
+    # ANTES
+    consultas = elegir_consultas(db_manager, args.muestras)
+    medir_latencias(db_manager, consultas[:5])  # calentamiento de caché
+    lat_antes = medir_latencias(db_manager, consultas)
+    with db_manager.get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    mb_antes = tamano_mb(ruta)
+
+    # MIGRACIÓN
+    t0 = time.time()
+    if not db_manager.migrate_hourly_dia(conservar_v1=args.conservar_v1):
+        print("❌ Migración fallida (la BD no fue modificada)")
+        return 1
+    print(f"✅ Datos horarios empaquetados en {time.time() - t0:.1f}s")
+
+    if not args.sin_vacuum:
+        t0 = time.time()
+        with db_manager.get_connection() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"✅ VACUUM en {time.time() - t0:.1f}s")
+
+    # DESPUÉS
+    with db_manager.get_connection(readonly=True) as conn:
+        filas_despues = conn.execute("SELECT COUNT(*) FROM metrics_hourly_dia").fetchone()[0]
+    medir_latencias(db_manager, consultas[:5])
+    lat_despues = medir_latencias(db_manager, consultas)
+    mb_despues = tamano_mb(ruta)
+
+    print("\n📊 RESULTADOS")
+    print(f"{'':<34}{'Antes':>14}{'Después':>14}")
+    print(f"{'Filas horarias':<34}{filas_antes:>14,}{filas_despues:>14,}")
+    print(f"{'Tamaño BD (MB)':<34}{mb_antes:>14.1f}{mb_despues:>14.1f}")
+    if lat_antes and lat_despues:
+        p50_a, p95_a = resumen(lat_antes)
+        p50_d, p95_d = resumen(lat_despues)
+        print(f"{'hourly_aggregated p50 (ms)':<34}{p50_a:>14.2f}{p50_d:>14.2f}")
+        print(f"{'hourly_aggregated p95 (ms)':<34}{p95_a:>14.2f}{p95_d:>14.2f}")
+
+    db_manager.close_all_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
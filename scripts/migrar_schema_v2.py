@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════╗
+║          MIGRACIÓN: metrics (v1) → esquema v2                ║
+║                                                              ║
+║  Convierte la tabla metrics a dimensiones enteras + tabla    ║
+║  de hechos WITHOUT ROWID agrupada por                        ║
+║  (metrica, entidad, recurso, fecha) y deja una vista         ║
+║  metrics compatible con el SQL existente.                    ║
+║                                                              ║
+║  Reporta tamaño de la BD y latencia de get_metric_data       ║
+║  antes y después de la migración.                            ║
+║                                                              ║
+║  Uso:                                                        ║
+║    python3 scripts/migrar_schema_v2.py                       ║
+║    python3 scripts/migrar_schema_v2.py --db /ruta/copia.db   ║
+║                                                              ║
+║  IMPORTANTE: detener el ETL y hacer backup antes de migrar   ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import random
+import statistics
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+
+def tamano_mb(ruta: Path) -> float:
+    """Tamaño del archivo principal + WAL en MB"""
+    total = 0
+    for sufijo in ('', '-wal'):
+        archivo = Path(str(ruta) + sufijo)
+        if archivo.exists():
+            total += archivo.stat().st_size
+    return total / (1024 * 1024)
+
+
+def elegir_consultas(db_manager, muestras: int):
+    """Elige series reales de la BD y un rango de 365 días para medir get_metric_data"""
+    with db_manager.get_connection(readonly=True) as conn:
+        series = conn.execute("""
+            SELECT metrica, entidad, MAX(fecha) AS fecha_max
+            FROM metrics
+            GROUP BY metrica, entidad
+        """).fetchall()
+        consultas = []
+        for _ in range(muestras):
+            metrica, entidad, fecha_max = random.choice(series)
+            recursos = [r[0] for r in conn.execute(
+                "SELECT DISTINCT recurso FROM metrics WHERE metrica = ? AND entidad = ? AND fecha = ?",
+                (metrica, entidad, fecha_max)
+            ).fetchall()]
+            fin = date.fromisoformat(fecha_max[:10])
+            ini = fin - timedelta(days=365)
+            filtro = random.sample(recursos, min(20, len(recursos))) if recursos else None
+            consultas.append((metrica, entidad, ini.isoformat(), fin.isoformat(), filtro))
+    return consultas
+
+
+def medir_latencias(db_manager, consultas):
+    """Latencias (ms) de get_metric_data para la lista de consultas"""
+    import logging
+    nivel = db_manager.logger.level
+    db_manager.logger.setLevel(logging.WARNING)
+    latencias = []
+    try:
+        for metrica, entidad, ini, fin, filtro in consultas:
+            t0 = time.perf_counter()
+            db_manager.get_metric_data(metrica, entidad, ini, fin, recurso_filter=filtro)
+            latencias.append((time.perf_counter() - t0) * 1000)
+    finally:
+        db_manager.logger.setLevel(nivel)
+    return latencias
+
+
+def resumen(latencias):
+    latencias = sorted(latencias)
+    p95 = latencias[min(len(latencias) - 1, int(round(0.95 * (len(latencias) - 1))))]
+    return statistics.median(latencias), p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migración de metrics al esquema v2')
+    parser.add_argument('--db', type=str, help='BD a migrar (por defecto la de db_manager)')
+    parser.add_argument('--conservar-v1', action='store_true',
+                        help='Conservar la tabla original como metrics_v1 (no reduce tamaño)')
+    parser.add_argument('--sin-vacuum', action='store_true', help='No ejecutar VACUUM al final')
+    parser.add_argument('--muestras', type=int, default=50, help='Consultas para medir latencia')
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['PORTAL_DB_PATH'] = str(Path(args.db).resolve())
+    from utils import db_manager
+
+    ruta = db_manager.DB_PATH
+    print("=" * 70)
+    print(f"🔧 Migración a esquema v2: {ruta}")
+    print("=" * 70)
+
+    with db_manager.get_connection() as conn:
+        if db_manager.es_schema_v2(conn):
+            print("ℹ️ La base de datos ya está en esquema v2, nada que hacer")
+            return 0
+
+    # ANTES
+    consultas = elegir_consultas(db_manager, args.muestras)
+    medir_latencias(db_manager, consultas[:5])  # calentamiento de caché
+    lat_antes = medir_latencias(db_manager, consultas)
+    with db_manager.get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    mb_antes = tamano_mb(ruta)
+
+    # MIGRACIÓN
+    t0 = time.time()
+    if not db_manager.migrate_schema_v2(conservar_v1=args.conservar_v1):
+        print("❌ Migración fallida (la BD no fue modificada)")
+        return 1
+    print(f"✅ Datos migrados en {time.time() - t0:.1f}s")
+
+    if not args.sin_vacuum:
+        t0 = time.time()
+        with db_manager.get_connection() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"✅ VACUUM en {time.time() - t0:.1f}s")
+
+    # DESPUÉS
+    medir_latencias(db_manager, consultas[:5])
+    lat_despues = medir_latencias(db_manager, consultas)
+    mb_despues = tamano_mb(ruta)
+
+    p50_a, p95_a = resumen(lat_antes)
+    p50_d, p95_d = resumen(lat_despues)
+    print("\n📊 RESULTADOS")
+    print(f"{'':<28}{'Antes (v1)':>14}{'Después (v2)':>14}")
+    print(f"{'Tamaño BD (MB)':<28}{mb_antes:>14.1f}{mb_despues:>14.1f}")
+    print(f"{'get_metric_data p50 (ms)':<28}{p50_a:>14.2f}{p50_d:>14.2f}")
+    print(f"{'get_metric_data p95 (ms)':<28}{p95_a:>14.2f}{p95_d:>14.2f}")
+
+    db_manager.close_all_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
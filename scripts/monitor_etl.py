@@ -2,44 +2,45 @@
 """
 Monitor de progreso del ETL
 Muestra estadísticas en tiempo real de la carga de métricas
+
+Lee el catálogo de estadísticas de db_manager (una fila por serie, actualizado por
+las cargas), así que consultar cada 10 s no recorre la tabla metrics.
+
+Uso:
+    python3 scripts/monitor_etl.py
+    python3 scripts/monitor_etl.py --recompute   # reconstruir el catálogo desde cero
 """
 
-import sqlite3
+import sys
+import argparse
 import time
 import os
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
 DB_PATH = '/home/admonctrlxm/server/portal_energetico.db'
 
 def get_stats():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    # Métricas únicas
-    cursor.execute("SELECT COUNT(DISTINCT metrica) FROM metrics")
-    metricas = cursor.fetchone()[0]
+    from utils import db_manager
     
-    # Total registros
-    cursor.execute("SELECT COUNT(*) FROM metrics")
-    registros = cursor.fetchone()[0]
+    series = db_manager.get_metrics_stats()
+    if series.empty:
+        return {'metricas_unicas': 0, 'total_registros': 0, 'detalle': []}
     
-    # Métricas por sección
-    cursor.execute("""
-        SELECT metrica, COUNT(*) as registros, 
-               COUNT(DISTINCT fecha) as dias,
-               MIN(fecha) as fecha_min,
-               MAX(fecha) as fecha_max
-        FROM metrics
-        GROUP BY metrica
-        ORDER BY metrica
-    """)
-    metricas_detalle = cursor.fetchall()
-    
-    conn.close()
+    # Métricas por sección (días: los de la entidad con más días)
+    por_metrica = series.groupby('metrica').agg(
+        registros=('registros', 'sum'), dias=('dias', 'max'),
+        fecha_min=('fecha_min', 'min'), fecha_max=('fecha_max', 'max')
+    )
+    metricas_detalle = [
+        (metrica, int(fila.registros), int(fila.dias), fila.fecha_min, fila.fecha_max)
+        for metrica, fila in por_metrica.iterrows()
+    ]
     
     return {
-        'metricas_unicas': metricas,
-        'total_registros': registros,
+        'metricas_unicas': len(por_metrica),
+        'total_registros': int(series['registros'].sum()),
         'detalle': metricas_detalle
     }
 
@@ -106,6 +107,29 @@ def mostrar_stats():
     print(f"📄 Log ETL: tail -f /home/admonctrlxm/server/logs/etl_todas_metricas.log")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Monitor de progreso del ETL')
+    parser.add_argument('--db', type=str, default=os.getenv('PORTAL_DB_PATH', DB_PATH), help='BD a monitorear')
+    parser.add_argument('--recompute', action='store_true',
+                        help='Reconstruir el catálogo de estadísticas y el índice de cobertura recorriendo metrics y salir')
+    args = parser.parse_args()
+    os.environ['PORTAL_DB_PATH'] = args.db
+    
+    if args.recompute:
+        from utils import db_manager
+        t0 = time.time()
+        series = db_manager.rebuild_stats()
+        if not series:
+            print("❌ No se pudo reconstruir el catálogo de estadísticas (ver log)")
+            sys.exit(1)
+        print(f"✅ Catálogo de estadísticas reconstruido: {series} series en {time.time() - t0:.1f}s")
+        t0 = time.time()
+        tramos = db_manager.rebuild_cobertura()
+        if not tramos:
+            print("❌ No se pudo reconstruir el índice de cobertura (ver log)")
+            sys.exit(1)
+        print(f"✅ Índice de cobertura reconstruido: {tramos} tramos en {time.time() - t0:.1f}s")
+        sys.exit(0)
+    
     try:
         while True:
             mostrar_stats()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════╗
+║        PARTICIÓN DE LA BD POR AÑO (AÑOS CERRADOS)            ║
+║                                                              ║
+║  Mueve los datos diarios de cada año cerrado a               ║
+║  particiones/metrics_AAAA.db (solo lectura) y los borra de   ║
+║  portal_energetico.db, que queda con el año en curso,        ║
+║  rollups, horarios y catálogos. db_manager adjunta solo      ║
+║  los años que pide cada consulta.                            ║
+║                                                              ║
+║  Uso:                                                        ║
+║    python3 scripts/particionar_por_anio.py                   ║
+║    python3 scripts/particionar_por_anio.py --hasta 2023      ║
+║    python3 scripts/particionar_por_anio.py --reabrir 2023    ║
+║                                                              ║
+║  IMPORTANTE: detener el ETL y hacer backup antes de          ║
+║  particionar (el VACUUM final reescribe el archivo)          ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import time
+from datetime import date
+from pathlib import Path
+
+from migrar_schema_v2 import tamano_mb
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Partición de los datos diarios por año')
+    parser.add_argument('--db', type=str, help='BD a particionar (por defecto la de db_manager)')
+    parser.add_argument('--dir', type=str, help="Carpeta de particiones (por defecto 'particiones' junto a la BD)")
+    parser.add_argument('--hasta', type=int, default=date.today().year - 1,
+                        help='Último año a particionar (por defecto el año anterior al actual)')
+    parser.add_argument('--reabrir', type=int, metavar='ANIO',
+                        help='Devolver un año particionado a la BD principal (para corregirlo)')
+    parser.add_argument('--sin-vacuum', action='store_true', help='No ejecutar VACUUM al final')
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['PORTAL_DB_PATH'] = str(Path(args.db).resolve())
+    if args.dir:
+        os.environ['PORTAL_PARTICIONES_DIR'] = str(Path(args.dir).resolve())
+    from utils import db_manager
+    import logging
+    db_manager.logger.setLevel(logging.WARNING)
+
+    ruta = db_manager.DB_PATH
+    print("=" * 70)
+    print(f"🔧 Particiones por año: {ruta}")
+    print("=" * 70)
+
+    if args.reabrir:
+        t0 = time.time()
+        filas = db_manager.reabrir_particion(args.reabrir)
+        if not filas:
+            print(f"❌ No se pudo reabrir {args.reabrir} (ver log)")
+            return 1
+        print(f"✅ {args.reabrir} reabierto: {filas:,} filas en la BD principal ({time.time() - t0:.1f}s)")
+        db_manager.close_all_connections()
+        return 0
+
+    stats = db_manager.get_database_stats()
+    if not stats.get('fecha_minima'):
+        print("ℹ️ La BD no tiene datos diarios, nada que hacer")
+        return 0
+    with db_manager.get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    mb_antes = tamano_mb(ruta)
+
+    particionados = db_manager.get_particiones()
+    for anio in range(int(stats['fecha_minima'][:4]), args.hasta + 1):
+        if anio in particionados:
+            continue
+        t0 = time.time()
+        filas = db_manager.particionar_anio(anio)
+        if filas:
+            print(f"✅ {anio}: {filas:,} filas particionadas en {time.time() - t0:.1f}s")
+
+    if not args.sin_vacuum:
+        t0 = time.time()
+        with db_manager.get_connection() as conn:
+            conn.execute("VACUUM")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        print(f"✅ VACUUM en {time.time() - t0:.1f}s")
+
+    print("\n📊 RESULTADOS")
+    print(f"{'BD principal (MB)':<34}{mb_antes:>14.1f}{tamano_mb(ruta):>14.1f}")
+    for anio, ruta_particion in sorted(db_manager.get_particiones().items()):
+        print(f"{'Partición ' + str(anio) + ' (MB)':<34}{'':>14}{tamano_mb(ruta_particion):>14.1f}")
+
+    db_manager.close_all_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+╔══════════════════════════════════════════════════════════════╗
+║          RECONSTRUCCIÓN DE ROLLUPS DE MÉTRICAS               ║
+║                                                              ║
+║  Recalcula desde cero las tablas metrics_rollup y            ║
+║  metrics_rollup_grupo (semana / mes / año) a partir de los   ║
+║  datos diarios. El ETL las mantiene de forma incremental;    ║
+║  este script es para la carga inicial o tras cambios de      ║
+║  catálogo (tipo de fuente de un recurso).                    ║
+║                                                              ║
+║  Uso:                                                        ║
+║    python3 scripts/reconstruir_rollups.py                    ║
+║    python3 scripts/reconstruir_rollups.py --metrica Gene --entidad Recurso
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import argparse
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+
+def comparar_lecturas(db_manager, metrica: str, entidad: str, anios: int = 5):
+    """Filas leídas por una gráfica de N años: datos diarios vs rollups"""
+    fin = date.today() - timedelta(days=1)
+    inicio = date(fin.year - anios + 1, 1, 1)
+    resolucion = db_manager.pick_resolution(inicio, fin)
+
+    t0 = time.perf_counter()
+    diario = db_manager.get_metric_data(metrica, entidad, inicio.isoformat(), fin.isoformat())
+    t_diario = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    por_recurso = db_manager.get_metric_data(metrica, entidad, inicio.isoformat(), fin.isoformat(),
+                                             resolucion=resolucion)
+    t_recurso = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    por_grupo = db_manager.get_group_rollup(metrica, entidad, inicio.isoformat(), fin.isoformat(),
+                                            resolucion=resolucion)
+    t_grupo = (time.perf_counter() - t0) * 1000
+
+    print(f"\n📊 {metrica}/{entidad}, {inicio} a {fin} (resolución {resolucion})")
+    print(f"{'Consulta':<28}{'Filas':>12}{'ms':>10}")
+    print(f"{'Diario por recurso':<28}{len(diario):>12,}{t_diario:>10.1f}")
+    print(f"{'Rollup por recurso':<28}{len(por_recurso):>12,}{t_recurso:>10.1f}")
+    print(f"{'Rollup por grupo':<28}{len(por_grupo):>12,}{t_grupo:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Reconstrucción de rollups de métricas')
+    parser.add_argument('--db', type=str, help='BD a usar (por defecto la de db_manager)')
+    parser.add_argument('--metrica', type=str, help='Solo esta métrica')
+    parser.add_argument('--entidad', type=str, help='Solo esta entidad')
+    parser.add_argument('--comparar', action='store_true',
+                        help='Comparar filas leídas por una gráfica de 5 años (Gene/Recurso) antes y después')
+    args = parser.parse_args()
+
+    if args.db:
+        os.environ['PORTAL_DB_PATH'] = str(Path(args.db).resolve())
+    from utils import db_manager
+    import logging
+    db_manager.logger.setLevel(logging.WARNING)
+
+    print("=" * 70)
+    print(f"🔧 Reconstruyendo rollups: {db_manager.DB_PATH}")
+    print("=" * 70)
+
+    t0 = time.time()
+    filas = db_manager.rebuild_rollups(args.metrica, args.entidad)
+    print(f"✅ {filas:,} filas de rollup escritas en {time.time() - t0:.1f}s")
+
+    if args.comparar:
+        comparar_lecturas(db_manager, args.metrica or 'Gene', args.entidad or 'Recurso')
+
+    db_manager.close_all_connections()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,6 +9,8 @@ Horizonte: 3 meses (90 días)
 Fuentes: Hidráulica, Térmica, Eólica, Solar, Biomasa
 """
 
+import os
+import sys
 import sqlite3
 import pandas as pd
 import numpy as np
@@ -22,6 +24,11 @@ warnings.filterwarnings('ignore')
 
 # Configuración
 DB_PATH = '/home/admonctrlxm/server/portal_energetico.db'
+
+# Históricos por el motor analítico (PORTAL_MOTOR_ANALITICO=duckdb: espejo Parquet) sobre la misma BD
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+os.environ.setdefault('PORTAL_DB_PATH', DB_PATH)
+from utils import analitica
 HORIZONTE_DIAS = 90  # 3 meses
 CONFIANZA = 0.95
 MODELO_VERSION = 'ENSEMBLE_v1.0'
@@ -217,11 +224,9 @@ class PredictorEnsemble:
 
 
 def cargar_datos_historicos(fuente, fecha_inicio='2020-01-01'):
-    """Carga datos históricos de generación desde SQLite"""
+    """Carga datos históricos de generación (SQLite o espejo Parquet, ver utils/analitica.py)"""
     print(f"\n📊 Cargando datos históricos para {fuente}...")
     
-    conn = sqlite3.connect(DB_PATH)
-    
     # Mapeo de nombres de fuentes a tipos en catálogo
     tipo_mapa = {
         'Hidráulica': 'HIDRAULICA',
@@ -246,8 +251,7 @@ def cargar_datos_historicos(fuente, fecha_inicio='2020-01-01'):
     ORDER BY m.fecha
     """
     
-    df = pd.read_sql_query(query, conn, params=(tipo_catalogo, fecha_inicio))
-    conn.close()
+    df = analitica.consultar(query, (tipo_catalogo, fecha_inicio))
     
     df['fecha'] = pd.to_datetime(df['fecha'])
     df = df.sort_values('fecha')
@@ -0,0 +1,149 @@
+-- ============================================================================
+-- MÉTRICAS HORARIAS EMPAQUETADAS: Portal Energético MME
+-- Base de datos: SQLite
+-- Propósito: Una fila por (métrica, entidad, recurso, día) con las 24 horas en
+--            columnas, en lugar de 24 filas que repiten las claves de texto
+--
+-- Se aplica SOBRE una BD creada con schema.sql, mediante:
+--     python3 scripts/migrar_hourly_dia.py
+-- ============================================================================
+
+-- ============================================================================
+-- TABLA: metrics_hourly_dia
+-- Descripción: h01..h24 = valor de la hora 1..24 en MWh (NULL = hora sin dato)
+--              recurso: '' cuando el recurso horario es NULL
+--              El orden de la PK es el patrón de acceso de get_hourly_data_aggregated:
+--              metrica = ? AND entidad = ? AND fecha = ? (todos los recursos del día)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS metrics_hourly_dia (
+    metrica VARCHAR(50) NOT NULL,
+    entidad VARCHAR(100) NOT NULL,
+    fecha DATE NOT NULL,
+    recurso VARCHAR(100) NOT NULL,
+    h01 REAL, h02 REAL, h03 REAL, h04 REAL, h05 REAL, h06 REAL,
+    h07 REAL, h08 REAL, h09 REAL, h10 REAL, h11 REAL, h12 REAL,
+    h13 REAL, h14 REAL, h15 REAL, h16 REAL, h17 REAL, h18 REAL,
+    h19 REAL, h20 REAL, h21 REAL, h22 REAL, h23 REAL, h24 REAL,
+    unidad VARCHAR(10) DEFAULT 'MWh',
+    fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (metrica, entidad, fecha, recurso)
+) WITHOUT ROWID;
+
+-- ============================================================================
+-- VISTA DE COMPATIBILIDAD: metrics_hourly
+-- Mismas columnas que la tabla original (excepto id): una fila por hora con dato.
+-- Las escrituras se redirigen a metrics_hourly_dia con triggers.
+-- ============================================================================
+DROP VIEW IF EXISTS metrics_hourly;
+
+CREATE VIEW metrics_hourly AS
+WITH RECURSIVE horas(hora) AS (
+    SELECT 1 UNION ALL SELECT hora + 1 FROM horas WHERE hora < 24
+)
+SELECT fecha, metrica, entidad, recurso, hora, valor_mwh, unidad, fecha_actualizacion
+FROM (
+    SELECT d.fecha, d.metrica, d.entidad, NULLIF(d.recurso, '') AS recurso, h.hora,
+           CASE h.hora
+               WHEN 1 THEN d.h01 WHEN 2 THEN d.h02 WHEN 3 THEN d.h03 WHEN 4 THEN d.h04
+               WHEN 5 THEN d.h05 WHEN 6 THEN d.h06 WHEN 7 THEN d.h07 WHEN 8 THEN d.h08
+               WHEN 9 THEN d.h09 WHEN 10 THEN d.h10 WHEN 11 THEN d.h11 WHEN 12 THEN d.h12
+               WHEN 13 THEN d.h13 WHEN 14 THEN d.h14 WHEN 15 THEN d.h15 WHEN 16 THEN d.h16
+               WHEN 17 THEN d.h17 WHEN 18 THEN d.h18 WHEN 19 THEN d.h19 WHEN 20 THEN d.h20
+               WHEN 21 THEN d.h21 WHEN 22 THEN d.h22 WHEN 23 THEN d.h23 WHEN 24 THEN d.h24
+           END AS valor_mwh,
+           d.unidad, d.fecha_actualizacion
+    FROM metrics_hourly_dia d
+    CROSS JOIN horas h
+)
+WHERE valor_mwh IS NOT NULL;
+
+CREATE TRIGGER IF NOT EXISTS trg_metrics_hourly_insert INSTEAD OF INSERT ON metrics_hourly
+BEGIN
+    -- NOT EXISTS (no OR IGNORE): un INSERT OR REPLACE externo se impondría a este INSERT
+    INSERT INTO metrics_hourly_dia (metrica, entidad, fecha, recurso, unidad)
+        SELECT NEW.metrica, NEW.entidad, NEW.fecha, COALESCE(NEW.recurso, ''), COALESCE(NEW.unidad, 'MWh')
+        WHERE NOT EXISTS (
+            SELECT 1 FROM metrics_hourly_dia
+            WHERE metrica = NEW.metrica AND entidad = NEW.entidad
+              AND fecha = NEW.fecha AND recurso = COALESCE(NEW.recurso, '')
+        );
+    UPDATE metrics_hourly_dia SET
+        h01 = CASE NEW.hora WHEN 1 THEN NEW.valor_mwh ELSE h01 END,
+        h02 = CASE NEW.hora WHEN 2 THEN NEW.valor_mwh ELSE h02 END,
+        h03 = CASE NEW.hora WHEN 3 THEN NEW.valor_mwh ELSE h03 END,
+        h04 = CASE NEW.hora WHEN 4 THEN NEW.valor_mwh ELSE h04 END,
+        h05 = CASE NEW.hora WHEN 5 THEN NEW.valor_mwh ELSE h05 END,
+        h06 = CASE NEW.hora WHEN 6 THEN NEW.valor_mwh ELSE h06 END,
+        h07 = CASE NEW.hora WHEN 7 THEN NEW.valor_mwh ELSE h07 END,
+        h08 = CASE NEW.hora WHEN 8 THEN NEW.valor_mwh ELSE h08 END,
+        h09 = CASE NEW.hora WHEN 9 THEN NEW.valor_mwh ELSE h09 END,
+        h10 = CASE NEW.hora WHEN 10 THEN NEW.valor_mwh ELSE h10 END,
+        h11 = CASE NEW.hora WHEN 11 THEN NEW.valor_mwh ELSE h11 END,
+        h12 = CASE NEW.hora WHEN 12 THEN NEW.valor_mwh ELSE h12 END,
+        h13 = CASE NEW.hora WHEN 13 THEN NEW.valor_mwh ELSE h13 END,
+        h14 = CASE NEW.hora WHEN 14 THEN NEW.valor_mwh ELSE h14 END,
+        h15 = CASE NEW.hora WHEN 15 THEN NEW.valor_mwh ELSE h15 END,
+        h16 = CASE NEW.hora WHEN 16 THEN NEW.valor_mwh ELSE h16 END,
+        h17 = CASE NEW.hora WHEN 17 THEN NEW.valor_mwh ELSE h17 END,
+        h18 = CASE NEW.hora WHEN 18 THEN NEW.valor_mwh ELSE h18 END,
+        h19 = CASE NEW.hora WHEN 19 THEN NEW.valor_mwh ELSE h19 END,
+        h20 = CASE NEW.hora WHEN 20 THEN NEW.valor_mwh ELSE h20 END,
+        h21 = CASE NEW.hora WHEN 21 THEN NEW.valor_mwh ELSE h21 END,
+        h22 = CASE NEW.hora WHEN 22 THEN NEW.valor_mwh ELSE h22 END,
+        h23 = CASE NEW.hora WHEN 23 THEN NEW.valor_mwh ELSE h23 END,
+        h24 = CASE NEW.hora WHEN 24 THEN NEW.valor_mwh ELSE h24 END,
+        unidad = COALESCE(NEW.unidad, unidad),
+        fecha_actualizacion = CURRENT_TIMESTAMP
+    WHERE metrica = NEW.metrica AND entidad = NEW.entidad
+      AND fecha = NEW.fecha AND recurso = COALESCE(NEW.recurso, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_metrics_hourly_delete INSTEAD OF DELETE ON metrics_hourly
+BEGIN
+    UPDATE metrics_hourly_dia SET
+        h01 = CASE OLD.hora WHEN 1 THEN NULL ELSE h01 END,
+        h02 = CASE OLD.hora WHEN 2 THEN NULL ELSE h02 END,
+        h03 = CASE OLD.hora WHEN 3 THEN NULL ELSE h03 END,
+        h04 = CASE OLD.hora WHEN 4 THEN NULL ELSE h04 END,
+        h05 = CASE OLD.hora WHEN 5 THEN NULL ELSE h05 END,
+        h06 = CASE OLD.hora WHEN 6 THEN NULL ELSE h06 END,
+        h07 = CASE OLD.hora WHEN 7 THEN NULL ELSE h07 END,
+        h08 = CASE OLD.hora WHEN 8 THEN NULL ELSE h08 END,
+        h09 = CASE OLD.hora WHEN 9 THEN NULL ELSE h09 END,
+        h10 = CASE OLD.hora WHEN 10 THEN NULL ELSE h10 END,
+        h11 = CASE OLD.hora WHEN 11 THEN NULL ELSE h11 END,
+        h12 = CASE OLD.hora WHEN 12 THEN NULL ELSE h12 END,
+        h13 = CASE OLD.hora WHEN 13 THEN NULL ELSE h13 END,
+        h14 = CASE OLD.hora WHEN 14 THEN NULL ELSE h14 END,
+        h15 = CASE OLD.hora WHEN 15 THEN NULL ELSE h15 END,
+        h16 = CASE OLD.hora WHEN 16 THEN NULL ELSE h16 END,
+        h17 = CASE OLD.hora WHEN 17 THEN NULL ELSE h17 END,
+        h18 = CASE OLD.hora WHEN 18 THEN NULL ELSE h18 END,
+        h19 = CASE OLD.hora WHEN 19 THEN NULL ELSE h19 END,
+        h20 = CASE OLD.hora WHEN 20 THEN NULL ELSE h20 END,
+        h21 = CASE OLD.hora WHEN 21 THEN NULL ELSE h21 END,
+        h22 = CASE OLD.hora WHEN 22 THEN NULL ELSE h22 END,
+        h23 = CASE OLD.hora WHEN 23 THEN NULL ELSE h23 END,
+        h24 = CASE OLD.hora WHEN 24 THEN NULL ELSE h24 END
+    WHERE metrica = OLD.metrica AND entidad = OLD.entidad
+      AND fecha = OLD.fecha AND recurso = COALESCE(OLD.recurso, '');
+    -- Día sin ninguna hora: se elimina la fila
+    DELETE FROM metrics_hourly_dia
+    WHERE metrica = OLD.metrica AND entidad = OLD.entidad
+      AND fecha = OLD.fecha AND recurso = COALESCE(OLD.recurso, '')
+      AND COALESCE(h01, h02, h03, h04, h05, h06, h07, h08, h09, h10, h11, h12,
+                   h13, h14, h15, h16, h17, h18, h19, h20, h21, h22, h23, h24) IS NULL;
+END;
+
+-- ============================================================================
+-- COMENTARIOS TÉCNICOS
+-- ============================================================================
+-- 1. 24 columnas REAL y no un BLOB float32: la vista y los triggers siguen siendo
+--    SQL puro (SQLite no decodifica float32 sin funciones de usuario) y los valores
+--    conservan doble precisión. Una hora NULL no ocupa espacio en el registro.
+-- 2. db_manager lee metrics_hourly_dia directamente y arma la matriz días × 24 con
+--    NumPy; la vista es solo para SQL externo / consultas ad hoc
+-- 3. Las escrituras de db_manager actualizan solo las horas con dato
+--    (COALESCE con el valor anterior), igual que el upsert por hora original
+-- ============================================================================
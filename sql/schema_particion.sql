@@ -0,0 +1,38 @@
+-- ============================================================================
+-- PARTICIÓN ANUAL: Portal Energético MME
+-- Base de datos: SQLite (un archivo por año cerrado: particiones/metrics_AAAA.db)
+-- Propósito: Datos diarios de un año que ya no cambia, fuera de la BD principal,
+--            en un archivo de solo lectura que db_manager adjunta (ATTACH) cuando
+--            el rango de una consulta lo necesita
+--
+-- Se crea con:
+--     python3 scripts/particionar_por_anio.py --hasta 2023
+-- ============================================================================
+
+-- ============================================================================
+-- TABLA: metrics
+-- Descripción: Mismas columnas que metrics del esquema v1 (sin id): las consultas
+--              de get_metric_data se reutilizan tal cual sobre <alias>.metrics
+--              Las filas se insertan ordenadas por serie y fecha
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS metrics (
+    fecha DATE NOT NULL,
+    metrica VARCHAR(50) NOT NULL,
+    entidad VARCHAR(100) NOT NULL,
+    recurso VARCHAR(100),
+    valor_gwh REAL NOT NULL,
+    unidad VARCHAR(10) DEFAULT 'GWh',
+    fecha_actualizacion TIMESTAMP
+);
+
+-- Único índice: el patrón de acceso de get_metric_data (serie + rango de fechas)
+CREATE INDEX IF NOT EXISTS idx_particion_serie_fecha ON metrics(metrica, entidad, fecha, recurso);
+
+-- ============================================================================
+-- COMENTARIOS TÉCNICOS
+-- ============================================================================
+-- 1. El archivo queda en modo journal DELETE y con permisos 0444; se adjunta con
+--    mode=ro&immutable=1 (sin locks ni lectura del WAL en cada consulta)
+-- 2. No hay UNIQUE: el archivo se genera una sola vez desde datos ya deduplicados
+-- 3. Para corregir un año cerrado: --reabrir AAAA lo devuelve a la BD principal
+-- ============================================================================
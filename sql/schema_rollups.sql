@@ -0,0 +1,90 @@
+-- ============================================================================
+-- ROLLUPS DE MÉTRICAS: Portal Energético MME
+-- Base de datos: SQLite
+-- Propósito: Agregados semanales, mensuales y anuales precalculados para que
+--            las gráficas de varios años lean cientos de filas en lugar de
+--            cientos de miles de filas diarias
+--
+-- Se aplica con IF NOT EXISTS (init_database y db_manager.refresh_rollups).
+-- Mantenimiento: el ETL llama a db_manager.refresh_rollups() tras cada carga.
+-- Carga inicial / recálculo completo:
+--     python3 scripts/reconstruir_rollups.py
+-- ============================================================================
+
+-- ============================================================================
+-- TABLA: metrics_rollup
+-- Descripción: Agregados por (métrica, entidad, recurso, periodo)
+--              resolucion: 'W' = semana (lunes a domingo), 'M' = mes, 'Y' = año
+--              periodo: primer día del periodo ('YYYY-MM-DD')
+--              Estadísticos sobre los valores diarios del recurso en el periodo
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS metrics_rollup (
+    metrica VARCHAR(50) NOT NULL,
+    entidad VARCHAR(100) NOT NULL,
+    resolucion CHAR(1) NOT NULL,
+    recurso VARCHAR(100) NOT NULL,          -- '' cuando el recurso diario es NULL
+    periodo DATE NOT NULL,
+    suma REAL,
+    promedio REAL,
+    minimo REAL,
+    maximo REAL,
+    conteo INTEGER NOT NULL,                -- Días con dato en el periodo
+    unidad VARCHAR(10),
+
+    PRIMARY KEY (metrica, entidad, resolucion, recurso, periodo)
+) WITHOUT ROWID;
+
+-- ============================================================================
+-- TABLA: metrics_rollup_grupo
+-- Descripción: Agregados por grupo de recursos. Primero se suma el total diario
+--              del grupo y luego se agregan esos totales en el periodo.
+--              grupo: '_TOTAL_' (todos los recursos de la entidad) o el tipo del
+--                     catálogo (catalogos.tipo, ej: 'HIDRAULICA') para entidades
+--                     con catálogo de tipos (Recurso → ListadoRecursos)
+--              resolucion: 'D' (total diario), 'W', 'M', 'Y'
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS metrics_rollup_grupo (
+    metrica VARCHAR(50) NOT NULL,
+    entidad VARCHAR(100) NOT NULL,
+    resolucion CHAR(1) NOT NULL,
+    grupo VARCHAR(100) NOT NULL,
+    periodo DATE NOT NULL,
+    suma REAL,                              -- Total del grupo en el periodo
+    promedio REAL,                          -- Promedio de los totales diarios
+    minimo REAL,                            -- Mínimo total diario
+    maximo REAL,                            -- Máximo total diario
+    conteo INTEGER NOT NULL,                -- Días con dato en el periodo
+    unidad VARCHAR(10),
+
+    PRIMARY KEY (metrica, entidad, resolucion, grupo, periodo)
+) WITHOUT ROWID;
+
+-- ============================================================================
+-- TABLA: metrics_rollup_series
+-- Descripción: Series cuyos rollups cubren toda su historia diaria. Las
+--              consultas solo leen metrics_rollup / metrics_rollup_grupo de las
+--              series de esta tabla; las demás se agregan al vuelo.
+--              La escribe rebuild_rollups, y refresh_rollups cuando el rango
+--              recalculado abarca todos los datos de la serie (serie nueva)
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS metrics_rollup_series (
+    metrica VARCHAR(50) NOT NULL,
+    entidad VARCHAR(100) NOT NULL,
+    fecha_construccion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    PRIMARY KEY (metrica, entidad)
+) WITHOUT ROWID;
+
+-- ============================================================================
+-- COMENTARIOS TÉCNICOS
+-- ============================================================================
+-- 1. Los rollups dependen solo de la vista/tabla metrics: funcionan igual con el
+--    esquema v1 y con el v2 (metrics_fact)
+-- 2. promedio = suma / conteo, por eso un periodo parcial (primer o último mes de
+--    un rango) se calcula al vuelo desde los datos diarios y no desde el rollup
+-- 3. Si cambia el tipo de un recurso en catalogos, los rollups por grupo de los
+--    periodos ya calculados quedan con el tipo anterior hasta reconstruirlos
+-- 4. En una BD con historia previa a los rollups, refresh_rollups no mantiene
+--    las series hasta que reconstruir_rollups.py las construye: un rollup con
+--    solo los periodos recientes devolvería la historia truncada
+-- ============================================================================
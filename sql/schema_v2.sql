@@ -0,0 +1,138 @@
+-- ============================================================================
+-- ESQUEMA V2 DE MÉTRICAS: Portal Energético MME
+-- Base de datos: SQLite
+-- Propósito: Almacenamiento compacto y agrupado (clustered) de la tabla metrics
+--
+-- Se aplica SOBRE una BD creada con schema.sql, mediante:
+--     python3 scripts/migrar_schema_v2.py
+-- ============================================================================
+
+-- ============================================================================
+-- DIMENSIONES: claves sustitutas enteras para los textos repetidos
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS dim_metrica (
+    id INTEGER PRIMARY KEY,
+    nombre VARCHAR(50) NOT NULL UNIQUE      -- 'Gene', 'DemaCome', 'VoluUtilDiarEner', etc.
+);
+
+CREATE TABLE IF NOT EXISTS dim_entidad (
+    id INTEGER PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL UNIQUE     -- 'Sistema', 'Recurso', 'Embalse', etc.
+);
+
+CREATE TABLE IF NOT EXISTS dim_recurso (
+    id INTEGER PRIMARY KEY,
+    codigo VARCHAR(100) UNIQUE              -- '_SISTEMA_', '2QBW', etc. (id 0 = NULL)
+);
+
+CREATE TABLE IF NOT EXISTS dim_unidad (
+    id INTEGER PRIMARY KEY,
+    nombre VARCHAR(10) NOT NULL UNIQUE      -- 'GWh', 'MW', '$/kWh'
+);
+
+-- Recurso NULL reservado con id 0 (la PK de la tabla de hechos no admite NULL)
+INSERT OR IGNORE INTO dim_recurso (id, codigo) VALUES (0, NULL);
+
+-- ============================================================================
+-- TABLA DE HECHOS: metrics_fact
+-- Descripción: Una fila por (métrica, entidad, recurso, día), sin rowid.
+--              El orden físico de la PK es el patrón de acceso de get_metric_data:
+--              metrica = ? AND entidad = ? AND recurso IN (...) AND fecha BETWEEN ? AND ?
+-- ============================================================================
+CREATE TABLE IF NOT EXISTS metrics_fact (
+    metrica_id INTEGER NOT NULL,
+    entidad_id INTEGER NOT NULL,
+    recurso_id INTEGER NOT NULL,
+    fecha_dia INTEGER NOT NULL,             -- Días desde 1970-01-01 (julianday - 2440587.5)
+    valor_gwh REAL NOT NULL,
+    unidad_id INTEGER NOT NULL,
+    fecha_actualizacion INTEGER,            -- Epoch en segundos
+
+    PRIMARY KEY (metrica_id, entidad_id, recurso_id, fecha_dia)
+) WITHOUT ROWID;
+
+-- Rango de fechas sin filtro de recurso (ej: Gene/Recurso completo para un mes)
+CREATE INDEX IF NOT EXISTS idx_fact_metrica_entidad_fecha
+    ON metrics_fact(metrica_id, entidad_id, fecha_dia);
+
+-- ============================================================================
+-- VISTA DE COMPATIBILIDAD: metrics
+-- Mismas columnas que la tabla v1 (excepto id) para que el SQL existente siga
+-- funcionando. Las escrituras se redirigen a metrics_fact con triggers.
+-- ============================================================================
+DROP VIEW IF EXISTS metrics;
+
+CREATE VIEW metrics AS
+SELECT
+    date(f.fecha_dia + 2440587.5) AS fecha,
+    m.nombre AS metrica,
+    e.nombre AS entidad,
+    r.codigo AS recurso,
+    f.valor_gwh AS valor_gwh,
+    u.nombre AS unidad,
+    datetime(f.fecha_actualizacion, 'unixepoch') AS fecha_actualizacion
+FROM metrics_fact f
+JOIN dim_metrica m ON m.id = f.metrica_id
+JOIN dim_entidad e ON e.id = f.entidad_id
+JOIN dim_recurso r ON r.id = f.recurso_id
+JOIN dim_unidad u ON u.id = f.unidad_id;
+
+CREATE TRIGGER IF NOT EXISTS trg_metrics_insert INSTEAD OF INSERT ON metrics
+BEGIN
+    -- NOT EXISTS (no OR IGNORE): un INSERT OR REPLACE externo impondría REPLACE
+    -- a estos INSERT y cambiaría los ids de las dimensiones ya usadas
+    INSERT INTO dim_metrica (nombre)
+        SELECT NEW.metrica WHERE NOT EXISTS (SELECT 1 FROM dim_metrica WHERE nombre = NEW.metrica);
+    INSERT INTO dim_entidad (nombre)
+        SELECT NEW.entidad WHERE NOT EXISTS (SELECT 1 FROM dim_entidad WHERE nombre = NEW.entidad);
+    INSERT INTO dim_recurso (codigo)
+        SELECT NEW.recurso WHERE NEW.recurso IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM dim_recurso WHERE codigo = NEW.recurso);
+    INSERT INTO dim_unidad (nombre)
+        SELECT COALESCE(NEW.unidad, 'GWh')
+        WHERE NOT EXISTS (SELECT 1 FROM dim_unidad WHERE nombre = COALESCE(NEW.unidad, 'GWh'));
+    INSERT OR REPLACE INTO metrics_fact
+        (metrica_id, entidad_id, recurso_id, fecha_dia, valor_gwh, unidad_id, fecha_actualizacion)
+    VALUES (
+        (SELECT id FROM dim_metrica WHERE nombre = NEW.metrica),
+        (SELECT id FROM dim_entidad WHERE nombre = NEW.entidad),
+        COALESCE((SELECT id FROM dim_recurso WHERE codigo = NEW.recurso), 0),
+        CAST(julianday(NEW.fecha) - 2440587.5 AS INTEGER),
+        NEW.valor_gwh,
+        (SELECT id FROM dim_unidad WHERE nombre = COALESCE(NEW.unidad, 'GWh')),
+        CAST(strftime('%s', 'now') AS INTEGER)
+    );
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_metrics_delete INSTEAD OF DELETE ON metrics
+BEGIN
+    DELETE FROM metrics_fact
+    WHERE metrica_id = (SELECT id FROM dim_metrica WHERE nombre = OLD.metrica)
+      AND entidad_id = (SELECT id FROM dim_entidad WHERE nombre = OLD.entidad)
+      AND recurso_id = COALESCE((SELECT id FROM dim_recurso WHERE codigo = OLD.recurso), 0)
+      AND fecha_dia = CAST(julianday(OLD.fecha) - 2440587.5 AS INTEGER);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_metrics_update INSTEAD OF UPDATE ON metrics
+BEGIN
+    DELETE FROM metrics_fact
+    WHERE metrica_id = (SELECT id FROM dim_metrica WHERE nombre = OLD.metrica)
+      AND entidad_id = (SELECT id FROM dim_entidad WHERE nombre = OLD.entidad)
+      AND recurso_id = COALESCE((SELECT id FROM dim_recurso WHERE codigo = OLD.recurso), 0)
+      AND fecha_dia = CAST(julianday(OLD.fecha) - 2440587.5 AS INTEGER);
+    INSERT INTO metrics (fecha, metrica, entidad, recurso, valor_gwh, unidad)
+    VALUES (NEW.fecha, NEW.metrica, NEW.entidad, NEW.recurso, NEW.valor_gwh, NEW.unidad);
+END;
+
+-- ============================================================================
+-- COMENTARIOS TÉCNICOS
+-- ============================================================================
+-- 1. WITHOUT ROWID + PK compuesta: la tabla ES el índice agrupado; las lecturas
+--    de una serie son un recorrido secuencial de páginas contiguas
+-- 2. Enteros pequeños (varint) en lugar de 4 VARCHAR por fila reducen el archivo
+-- 3. fecha_dia entero: día N = date(N + 2440587.5); en Python: date.toordinal() - 719163
+-- 4. La vista metrics no usa índices para filtros por fecha (es una expresión);
+--    db_manager consulta metrics_fact directamente cuando detecta el esquema v2
+-- 5. UPDATE sobre la vista = borrar la clave anterior + INSERT en la vista
+--    (permite cambiar recurso/fecha, ej: normalización 'Sistema' → '_SISTEMA_')
+-- ============================================================================
@@ -0,0 +1,41 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║              BASE DE LOS TESTS SOBRE UNA BD TEMPORAL         ║
+║                                                              ║
+║  Importar ANTES que utils.db_manager (se auto-inicializa al  ║
+║  importar): apunta PORTAL_DB_PATH a una carpeta temporal y   ║
+║  BaseBDTest crea una BD nueva por test conectada al pool     ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# BD temporal ANTES de importar db_manager (se auto-inicializa al importar)
+_TMPDIR = tempfile.TemporaryDirectory()
+os.environ.setdefault('PORTAL_DB_PATH', os.path.join(_TMPDIR.name, 'import.db'))
+
+from utils import db_manager
+
+
+class BaseBDTest(unittest.TestCase):
+    """
+    Crea una BD nueva por test (self.tmpdir/test.db) y la conecta al pool.
+    Las subclases que cambian más configuración llaman a super().setUp() antes y a
+    super().tearDown() después de restaurarla.
+    """
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path_original = db_manager.DB_PATH
+        db_manager.DB_PATH = Path(self.tmpdir.name) / 'test.db'
+        self.assertTrue(db_manager.init_database())
+
+    def tearDown(self):
+        db_manager.close_all_connections()
+        db_manager.DB_PATH = self.db_path_original
+        self.tmpdir.cleanup()
@@ -0,0 +1,72 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║               TESTS UNITARIOS - MOTOR ANALÍTICO              ║
+║                                                              ║
+║  Espejo Parquet + DuckDB (utils/analitica.py) sobre una BD   ║
+║  temporal: mismos resultados que SQLite y sincronización     ║
+║  incremental por versión de datos                            ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from base_bd import BaseBDTest  # Antes de db_manager: BD temporal
+from utils import db_manager, analitica
+
+CONSULTA = """
+    SELECT m.fecha, SUM(m.valor_gwh) AS valor_gwh
+    FROM metrics m
+    INNER JOIN catalogos c ON m.recurso = c.codigo
+    WHERE m.metrica = 'Gene' AND c.catalogo = 'ListadoRecursos' AND c.tipo = ? AND m.fecha >= ?
+    GROUP BY m.fecha
+    ORDER BY m.fecha
+"""
+
+
+class TestAnalitica(BaseBDTest):
+    """Espejo Parquet y selección de motor"""
+
+    def setUp(self):
+        super().setUp()
+        self.motor_original = analitica.MOTOR_ANALITICO
+        db_manager.upsert_metrics_bulk([
+            (f'{anio}-0{mes}-01', 'Gene', 'Recurso', recurso, float(mes), 'GWh')
+            for anio in (2023, 2024) for mes in (1, 2) for recurso in ('H1', 'T1')
+        ])
+        db_manager.upsert_catalogo_bulk('ListadoRecursos', [{'codigo': 'H1', 'tipo': 'HIDRAULICA'},
+                                                            {'codigo': 'T1', 'tipo': 'TERMICA'}])
+
+    def tearDown(self):
+        analitica.MOTOR_ANALITICO = self.motor_original
+        super().tearDown()
+
+    def _consultar(self, motor):
+        analitica.MOTOR_ANALITICO = motor
+        df = analitica.consultar(CONSULTA, ('HIDRAULICA', '2023-02-01'))
+        return [(str(f)[:10], v) for f, v in df.itertuples(index=False)]
+
+    def test_sin_espejo_usa_sqlite(self):
+        """Sin espejo sincronizado el motor es SQLite aunque se pida DuckDB"""
+        analitica.MOTOR_ANALITICO = 'duckdb'
+        self.assertEqual(analitica.motor_activo(), 'sqlite')
+        self.assertEqual(self._consultar('duckdb'), [('2023-02-01', 2.0), ('2024-01-01', 1.0), ('2024-02-01', 2.0)])
+
+    @unittest.skipUnless(analitica.DUCKDB_AVAILABLE, "duckdb no instalado")
+    def test_duckdb_igual_a_sqlite(self):
+        """El espejo devuelve lo mismo que SQLite y solo se reescribe lo que cambió"""
+        self.assertEqual(analitica.sincronizar_parquet(), 3)  # Gene/2023, Gene/2024, catálogos
+        analitica.MOTOR_ANALITICO = 'duckdb'
+        self.assertEqual(analitica.motor_activo(), 'duckdb')
+        self.assertEqual(self._consultar('duckdb'), self._consultar('sqlite'))
+
+        self.assertEqual(analitica.sincronizar_parquet(), 0)
+        db_manager.upsert_metrics_bulk([('2024-03-01', 'Gene', 'Recurso', 'H1', 3.0, 'GWh')])
+        self.assertEqual(analitica.sincronizar_parquet(), 1)
+        self.assertEqual(self._consultar('duckdb')[-1], ('2024-03-01', 3.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
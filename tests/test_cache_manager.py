@@ -0,0 +1,224 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║            TESTS UNITARIOS - CACHÉ DE LA API XM              ║
+║                                                              ║
+║  utils/cache_manager.py + _xm.fetch_metric_data: solo los    ║
+║  huecos del rango van a la API; lo histórico no vence y lo   ║
+║  reciente vencido se sirve mientras se refresca; los días    ║
+║  sin datos en XM no se repiten (caché negativa); llamadas    ║
+║  idénticas concurrentes se coalescen (single-flight)         ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+from utils import cache_manager, _xm
+from utils.decorators import single_flight, get_single_flight_stats
+
+
+class APIFalsa:
+    """request_data de pydataxm: un registro por día y registro de los rangos pedidos"""
+
+    def __init__(self, sin_datos=(), falla: bool = False):
+        self.rangos = []
+        self.sin_datos = set(sin_datos)
+        self.falla = falla
+
+    def request_data(self, metric, entity, start, end):
+        self.rangos.append((start, end))
+        if self.falla:
+            raise ConnectionError("XM no responde")
+        fechas = pd.date_range(start, end, freq='D')
+        fechas = fechas[~fechas.strftime('%Y-%m-%d').isin(self.sin_datos)]
+        return pd.DataFrame({'Date': fechas.strftime('%Y-%m-%d'), 'Value': [float(f.day) for f in fechas]})
+
+
+def esperar_refrescos(limite: float = 5.0):
+    """Espera a que terminen los refrescos en segundo plano"""
+    fin = time.monotonic() + limite
+    while _xm._refrescando and time.monotonic() < fin:
+        time.sleep(0.01)
+
+
+class TestCacheXM(unittest.TestCase):
+    """Caché por día de fetch_metric_data y resultados por clave"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ruta_original = cache_manager.CACHE_PATH
+        self.api_original = _xm._objetoAPI
+        cache_manager.CACHE_PATH = Path(self.tmpdir.name) / 'xm_cache.db'
+        _xm._objetoAPI = self.api = APIFalsa()
+
+    def tearDown(self):
+        esperar_refrescos()
+        _xm._objetoAPI = self.api_original
+        cache_manager.CACHE_PATH = self.ruta_original
+        self.tmpdir.cleanup()
+
+    def test_solo_huecos_a_la_api(self):
+        """Un rango que cubre días ya guardados pide a la API solo los sub-rangos que faltan"""
+        _xm.fetch_metric_data('Gene', 'Sistema', '2015-01-05', '2015-01-10')
+        _xm.fetch_metric_data('Gene', 'Sistema', '2015-01-20', '2015-01-25')
+        self.api.rangos.clear()
+
+        df = _xm.fetch_metric_data('Gene', 'Sistema', '2015-01-01', '2015-01-31')
+        self.assertEqual(self.api.rangos, [('2015-01-01', '2015-01-04'), ('2015-01-11', '2015-01-19'),
+                                           ('2015-01-26', '2015-01-31')])
+        self.assertEqual(df['Date'].tolist(), pd.date_range('2015-01-01', '2015-01-31').strftime('%Y-%m-%d').tolist())
+
+        # Todo en caché e histórico: ninguna consulta
+        self.api.rangos.clear()
+        self.assertEqual(len(_xm.fetch_metric_data('Gene', 'Sistema', '2015-01-03', '2015-01-28')), 26)
+        self.assertEqual(self.api.rangos, [])
+
+    def test_recientes_vencidos_se_refrescan(self):
+        """Los días recientes vencidos se devuelven y se vuelven a pedir en segundo plano"""
+        ayer = date.today() - timedelta(days=1)
+        inicio = ayer - timedelta(days=2)
+        _xm.fetch_metric_data('Gene', 'Sistema', inicio, ayer)
+        self.api.rangos.clear()
+
+        ttl_original = cache_manager.CACHE_TTL_RECIENTE
+        cache_manager.CACHE_TTL_RECIENTE = 0
+        try:
+            df = _xm.fetch_metric_data('Gene', 'Sistema', inicio, ayer)
+            self.assertEqual(len(df), 3)
+            esperar_refrescos()
+            self.assertEqual(self.api.rangos, [(inicio.isoformat(), ayer.isoformat())])
+        finally:
+            cache_manager.CACHE_TTL_RECIENTE = ttl_original
+
+    def test_cache_negativa(self):
+        """Los días que XM devolvió vacíos no se vuelven a pedir hasta vencer o hasta que el ETL los carga"""
+        _xm._objetoAPI = self.api = APIFalsa(sin_datos={'2015-02-03', '2015-02-04'})
+        self.assertEqual(len(_xm.fetch_metric_data('Gene', 'Sistema', '2015-02-01', '2015-02-05')), 3)
+        self.assertEqual(cache_manager.get_empty_days('Gene', 'Sistema', date(2015, 2, 1), date(2015, 2, 5)),
+                         {date(2015, 2, 3), date(2015, 2, 4)})
+
+        # Repetir la consulta no llama a la API
+        self.api.rangos.clear()
+        self.assertEqual(len(_xm.fetch_metric_data('Gene', 'Sistema', '2015-02-01', '2015-02-05')), 3)
+        self.assertEqual(self.api.rangos, [])
+
+        # Vencida la entrada se vuelve a preguntar
+        ttl_original = cache_manager.CACHE_TTL_VACIO
+        cache_manager.CACHE_TTL_VACIO = 0
+        try:
+            _xm.fetch_metric_data('Gene', 'Sistema', '2015-02-01', '2015-02-05')
+        finally:
+            cache_manager.CACHE_TTL_VACIO = ttl_original
+        self.assertEqual(self.api.rangos, [('2015-02-03', '2015-02-04')])
+
+        # El ETL cargó la serie: los días vacíos se olvidan
+        self.api.rangos.clear()
+        self.assertEqual(cache_manager.clear_empty_days('Gene', 'Sistema', '2015-02-01', '2015-02-05'), 2)
+        self.api.sin_datos.clear()
+        self.assertEqual(len(_xm.fetch_metric_data('Gene', 'Sistema', '2015-02-01', '2015-02-05')), 5)
+        self.assertEqual(self.api.rangos, [('2015-02-03', '2015-02-04')])
+
+    def test_errores_no_se_cachean(self):
+        """Una consulta fallida no marca los días como vacíos"""
+        _xm._objetoAPI = self.api = APIFalsa(falla=True)
+        self.assertIsNone(_xm.fetch_metric_data('Gene', 'Sistema', '2015-04-01', '2015-04-02'))
+        self.assertEqual(cache_manager.get_empty_days('Gene', 'Sistema', date(2015, 4, 1), date(2015, 4, 2)), set())
+
+        self.api.falla = False
+        self.assertEqual(len(_xm.fetch_metric_data('Gene', 'Sistema', '2015-04-01', '2015-04-02')), 2)
+        self.assertEqual(len(self.api.rangos), 2)
+
+    def test_resultados_por_clave(self):
+        """get_cache_key es estable y save_to_cache respeta la vigencia del tipo"""
+        clave = cache_manager.get_cache_key('gene_recurso_chunked', ('A', 'B'), date(2015, 1, 1))
+        self.assertEqual(clave, cache_manager.get_cache_key('gene_recurso_chunked', ('A', 'B'), date(2015, 1, 1)))
+        self.assertTrue(cache_manager.save_to_cache(clave, pd.DataFrame({'x': [1]}), cache_type='historico'))
+        self.assertEqual(cache_manager.get_from_cache(clave)['x'].tolist(), [1])
+
+        cache_manager.save_to_cache('vencida', 1, ttl=-1)
+        self.assertIsNone(cache_manager.get_from_cache('vencida'))
+        self.assertEqual(cache_manager.get_from_cache('vencida', allow_expired=True), 1)
+        self.assertEqual(cache_manager.clear_cache(), 1)
+
+    def test_candados_acotados(self):
+        """Los candados entre procesos reutilizan CANDADO_FRANJAS archivos, sin uno por clave"""
+        carpeta = cache_manager.CACHE_PATH.parent / 'xm_cache.db.locks'
+        for i in range(2000):
+            with cache_manager.bloqueo_entre_procesos(f"Gene|Sistema|{i}") as espero:
+                self.assertFalse(espero)
+        candados = list(carpeta.glob('*.lock'))
+        self.assertLessEqual(len(candados), cache_manager.CANDADO_FRANJAS)
+        self.assertTrue(all(ruta.name.startswith('franja-') for ruta in candados))
+
+
+class TestSingleFlight(unittest.TestCase):
+    """Coalescencia de llamadas idénticas concurrentes"""
+
+    def test_una_ejecucion_por_hilos(self):
+        """Cinco hilos con los mismos argumentos: una ejecución y copias del resultado"""
+        ejecuciones = []
+        liberar = threading.Event()
+
+        @single_flight
+        def consulta_lenta(metrica):
+            ejecuciones.append(metrica)
+            liberar.wait(5)
+            return pd.DataFrame({'valor': [1.0]}), None
+
+        resultados = []
+        hilos = [threading.Thread(target=lambda: resultados.append(consulta_lenta('Gene'))) for _ in range(5)]
+        for hilo in hilos:
+            hilo.start()
+        while get_single_flight_stats().get('consulta_lenta', {}).get('coalescidas', 0) < 4:
+            time.sleep(0.01)
+        liberar.set()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(ejecuciones, ['Gene'])
+        self.assertEqual(get_single_flight_stats()['consulta_lenta'], {'ejecuciones': 1, 'coalescidas': 4})
+        self.assertEqual(len({id(df) for df, _ in resultados}), 5)
+
+        # Terminada la llamada no queda nada guardado
+        consulta_lenta('Gene')
+        self.assertEqual(len(ejecuciones), 2)
+
+    def test_rango_consultado_por_otro_worker(self):
+        """Quien espera el candado de un rango usa lo que guardó el otro proceso"""
+        with tempfile.TemporaryDirectory() as tmp:
+            ruta_original, api_original = cache_manager.CACHE_PATH, _xm._objetoAPI
+            cache_manager.CACHE_PATH = Path(tmp) / 'xm_cache.db'
+            _xm._objetoAPI = api = APIFalsa()
+            inicio, fin = date(2015, 3, 1), date(2015, 3, 3)
+            try:
+                tomado = threading.Event()
+
+                def otro_worker():
+                    with cache_manager.bloqueo_entre_procesos(f"Gene|Sistema|{inicio}|{fin}"):
+                        tomado.set()
+                        time.sleep(0.2)
+                        cache_manager.save_days('Gene', 'Sistema', _xm._respuesta_por_dia(
+                            APIFalsa().request_data('Gene', 'Sistema', '2015-03-01', '2015-03-03'), inicio, fin))
+
+                hilo = threading.Thread(target=otro_worker)
+                hilo.start()
+                tomado.wait(5)
+                antes = get_single_flight_stats().get('fetch_metric_data', {}).get('coalescidas_procesos', 0)
+                self.assertEqual(len(_xm._descargar_rango('Gene', 'Sistema', inicio, fin)), 3)
+                hilo.join()
+                self.assertEqual(api.rangos, [])
+                self.assertEqual(get_single_flight_stats()['fetch_metric_data']['coalescidas_procesos'], antes + 1)
+            finally:
+                cache_manager.CACHE_PATH, _xm._objetoAPI = ruta_original, api_original
+
+
+if __name__ == '__main__':
+    unittest.main()
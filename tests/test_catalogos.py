@@ -0,0 +1,77 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║             TESTS UNITARIOS - CATÁLOGOS EN MEMORIA           ║
+║                                                              ║
+║  utils/catalogos.py: una lectura por worker, recarga solo    ║
+║  cuando cambia la versión del catálogo y mapeo vectorizado   ║
+║  código → nombre y nombre → código                           ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from base_bd import BaseBDTest  # Antes de db_manager: BD temporal
+import numpy as np
+import pandas as pd
+from utils import db_manager, catalogos
+
+
+class TestCatalogos(BaseBDTest):
+    """Servicio de catálogos"""
+
+    def setUp(self):
+        super().setUp()
+        self.revision_original = catalogos.CATALOGOS_REVISION_S
+        db_manager.upsert_catalogo_bulk('ListadoEmbalses', [
+            {'codigo': 'PENOL', 'nombre': 'PEÑOL', 'tipo': 'EMBALSE'},
+            {'codigo': 'GUAVIO', 'nombre': 'GUAVIO', 'tipo': 'EMBALSE'},
+        ])
+        catalogos.CATALOGOS_REVISION_S = 0
+
+    def tearDown(self):
+        catalogos.CATALOGOS_REVISION_S = self.revision_original
+        catalogos.invalidar()
+        super().tearDown()
+
+    def test_mapeo_vectorizado(self):
+        """Código → nombre y nombre → código; lo desconocido se conserva y los nulos siguen nulos"""
+        codigos = pd.Series(['PENOL', 'guavio', 'XXX', None, 'PENOL'], index=[5, 6, 7, 8, 9], name='recurso')
+        nombres = catalogos.nombres(codigos, 'ListadoEmbalses')
+        self.assertEqual(nombres.tolist()[:3] + nombres.tolist()[4:], ['PEÑOL', 'GUAVIO', 'XXX', 'PEÑOL'])
+        self.assertIsNone(nombres.iloc[3])
+        self.assertEqual(nombres.index.tolist(), [5, 6, 7, 8, 9])
+        self.assertEqual(nombres.name, 'recurso')
+
+        inversa = catalogos.codigos(pd.Series(['Peñol ', 'GUAVIO', 'OTRO']).astype('category'), 'ListadoEmbalses')
+        self.assertEqual(inversa.tolist(), ['PENOL', 'GUAVIO', 'OTRO'])
+
+        vacia = catalogos.nombres(pd.Series([], dtype=object), 'ListadoEmbalses')
+        self.assertTrue(vacia.empty)
+        self.assertTrue(np.isnan(catalogos.nombres(pd.Series([np.nan]), 'ListadoEmbalses').iloc[0]))
+
+    def test_recarga_por_version(self):
+        """El catálogo se lee una vez y se relee solo cuando su versión cambia"""
+        mapa = catalogos.mapa_codigos('ListadoEmbalses')
+        self.assertIs(catalogos.mapa_codigos('ListadoEmbalses'), mapa)
+
+        # Upsert idéntico: la versión no cambia y el catálogo no se relee
+        db_manager.upsert_catalogo_bulk('ListadoEmbalses', [{'codigo': 'PENOL', 'nombre': 'PEÑOL', 'tipo': 'EMBALSE'}])
+        self.assertIs(catalogos.mapa_codigos('ListadoEmbalses'), mapa)
+
+        db_manager.upsert_catalogo_bulk('ListadoEmbalses', [{'codigo': 'PENOL', 'nombre': 'EL PEÑOL', 'tipo': 'EMBALSE'}])
+        self.assertEqual(catalogos.nombres(pd.Series(['PENOL']), 'ListadoEmbalses').tolist(), ['EL PEÑOL'])
+        self.assertEqual(catalogos.mapa_nombres('ListadoEmbalses')['EL PEÑOL'], 'PENOL')
+        self.assertEqual(len(catalogos.get_catalogo('ListadoEmbalses')), 2)
+
+    def test_catalogo_inexistente(self):
+        """Sin catálogo los valores pasan sin cambios"""
+        serie = pd.Series(['2QBW', 'ABC'])
+        self.assertEqual(catalogos.nombres(serie, 'ListadoRecursos').tolist(), ['2QBW', 'ABC'])
+        self.assertTrue(catalogos.get_catalogo('ListadoRecursos').empty)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,721 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║               TESTS UNITARIOS - DB MANAGER                   ║
+║                                                              ║
+║  Tests de la capa de acceso a SQLite (pool, lecturas,        ║
+║  escrituras bulk) sobre una BD temporal                      ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import sqlite3
+import threading
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from base_bd import BaseBDTest  # Antes de db_manager: BD temporal
+from utils import db_manager
+
+
+class TestPoolConexiones(BaseBDTest):
+    """Tests del pool de conexiones por hilo"""
+
+    def test_reutiliza_conexion_en_mismo_hilo(self):
+        """Dos checkouts seguidos en el mismo hilo usan la misma conexión"""
+        with db_manager.get_connection(readonly=True) as c1:
+            pass
+        with db_manager.get_connection(readonly=True) as c2:
+            pass
+        self.assertIs(c1, c2)
+
+    def test_conexion_distinta_por_hilo(self):
+        """Cada hilo recibe su propia conexión"""
+        conexiones = []
+
+        def worker():
+            with db_manager.get_connection(readonly=True) as conn:
+                conexiones.append(conn)
+
+        with db_manager.get_connection(readonly=True) as principal:
+            pass
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join()
+        self.assertIsNot(conexiones[0], principal)
+
+    def test_modo_wal_y_pragmas(self):
+        """La BD queda en WAL y los PRAGMAs se aplican a cada conexión"""
+        with db_manager.get_connection() as conn:
+            modo = conn.execute("PRAGMA journal_mode").fetchone()[0]
+            temp_store = conn.execute("PRAGMA temp_store").fetchone()[0]
+        self.assertEqual(modo.lower(), 'wal')
+        self.assertEqual(temp_store, 2)  # 2 = MEMORY
+
+    def test_readonly_no_permite_escritura(self):
+        """Las conexiones de lectura del dashboard no pueden escribir"""
+        import sqlite3
+        with self.assertRaises(sqlite3.OperationalError):
+            with db_manager.get_connection(readonly=True) as conn:
+                conn.execute("DELETE FROM metrics")
+
+    def test_rollback_si_no_hay_commit(self):
+        """Una transacción sin commit se descarta al devolver la conexión"""
+        with db_manager.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO metrics (fecha, metrica, entidad, recurso, valor_gwh) "
+                "VALUES ('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 1.0)"
+            )
+        df = db_manager.get_metric_data('Gene', 'Sistema', '2024-01-01')
+        self.assertTrue(df.empty)
+
+    def test_cambio_de_ruta_reabre_conexion(self):
+        """Si DB_PATH cambia, el pool abre una conexión sobre la nueva ruta"""
+        with db_manager.get_connection(readonly=True) as c1:
+            pass
+        db_manager.DB_PATH = Path(self.tmpdir.name) / 'otra.db'
+        db_manager.init_database()
+        with db_manager.get_connection(readonly=True) as c2:
+            pass
+        self.assertIsNot(c1, c2)
+
+
+class TestLecturaEscritura(BaseBDTest):
+    """Tests de upsert y consulta de métricas"""
+
+    def test_upsert_y_consulta(self):
+        """Los registros insertados en bulk se leen con get_metric_data"""
+        filas = [
+            ('2024-01-01', 'Gene', 'Recurso', 'R1', 1.5, 'GWh'),
+            ('2024-01-02', 'Gene', 'Recurso', 'R1', 2.5, 'GWh'),
+            ('2024-01-01', 'Gene', 'Recurso', 'R2', 3.0, 'GWh'),
+        ]
+        db_manager.upsert_metrics_bulk(filas)
+        df = db_manager.get_metric_data('Gene', 'Recurso', '2024-01-01', '2024-01-02', recurso_filter=['R1'])
+        self.assertEqual(len(df), 2)
+        self.assertAlmostEqual(df['valor_gwh'].sum(), 4.0)
+
+    def test_upsert_actualiza_existente(self):
+        """Un segundo upsert de la misma clave reemplaza el valor"""
+        db_manager.upsert_metrics_bulk([('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 1.0, 'GWh')])
+        db_manager.upsert_metrics_bulk([('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 9.0, 'GWh')])
+        df = db_manager.get_metric_data('Gene', 'Sistema', '2024-01-01')
+        self.assertEqual(len(df), 1)
+        self.assertAlmostEqual(df['valor_gwh'].iloc[0], 9.0)
+
+
+class TestMetricsBulk(BaseBDTest):
+    """Tests de la lectura de varias series en una sola consulta"""
+
+    FILAS = [
+        ('2024-01-01', 'PerdidasEner', 'Sistema', '_SISTEMA_', 5.0, 'GWh'),
+        ('2024-01-02', 'PerdidasEner', 'Sistema', '_SISTEMA_', 6.0, 'GWh'),
+        ('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 200.0, 'GWh'),
+        ('2024-01-01', 'Gene', 'Recurso', 'r1', 1.5, 'GWh'),
+        ('2024-01-01', 'Gene', 'Recurso', 'R2', 3.0, 'GWh'),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        db_manager.upsert_metrics_bulk(self.FILAS)
+        db_manager.upsert_catalogo_bulk('ListadoRecursos', [{'codigo': 'R1', 'nombre': 'Recurso Uno'}])
+
+    def _comparar_con_individual(self):
+        series = [('PerdidasEner', 'Sistema', '_SISTEMA_'), ('Gene', 'Sistema', '_SISTEMA_'),
+                  ('Gene', 'Recurso', ['r1', 'R2']), ('DemaCome', 'Sistema')]
+        datos = db_manager.get_metrics_bulk(series, '2024-01-01', '2024-01-31', como_dict=True)
+        self.assertEqual(set(datos), {(s[0], s[1]) for s in series})
+        cols = ['fecha', 'metrica', 'entidad', 'recurso', 'valor_gwh', 'unidad']
+        for metrica, entidad, *filtro in series:
+            filtro = filtro[0] if filtro else None
+            individual = db_manager.get_metric_data(
+                metrica, entidad, '2024-01-01', '2024-01-31',
+                recurso=filtro if isinstance(filtro, str) else None,
+                recurso_filter=filtro if isinstance(filtro, list) else None)
+            if individual.empty:
+                self.assertTrue(datos[(metrica, entidad)].empty)
+            else:
+                self.assertEqual(datos[(metrica, entidad)][cols].values.tolist(), individual[cols].values.tolist())
+
+    def test_igual_a_consultas_individuales(self):
+        """Cada serie del resultado coincide con get_metric_data"""
+        self._comparar_con_individual()
+
+    def test_igual_a_consultas_individuales_v2(self):
+        """Mismo resultado sobre el esquema v2"""
+        self.assertTrue(db_manager.migrate_schema_v2())
+        self._comparar_con_individual()
+
+    def test_nombres_de_catalogo(self):
+        """La columna nombre usa el catálogo de la entidad y conserva el código si no está"""
+        df = db_manager.get_metrics_bulk([('Gene', 'Recurso')], '2024-01-01')
+        self.assertEqual(dict(zip(df['recurso'], df['nombre'])), {'r1': 'Recurso Uno', 'R2': 'R2'})
+
+
+class TestSchemaV2(BaseBDTest):
+    """Tests de la migración al esquema v2 y su vista de compatibilidad"""
+
+    FILAS = [
+        ('2024-01-01', 'Gene', 'Recurso', 'R1', 1.5, 'GWh'),
+        ('2024-01-02', 'Gene', 'Recurso', 'R1', 2.5, 'GWh'),
+        ('2024-01-01', 'Gene', 'Recurso', 'R2', 3.0, 'GWh'),
+        ('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 200.0, 'GWh'),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        db_manager.upsert_metrics_bulk(self.FILAS)
+        self.antes = db_manager.get_metric_data('Gene', 'Recurso', '2024-01-01', '2024-01-31')
+        self.assertTrue(db_manager.migrate_schema_v2())
+
+    def test_conversion_dias(self):
+        """fecha_a_dia y dia_a_fecha son inversas"""
+        self.assertEqual(db_manager.fecha_a_dia('1970-01-01'), 0)
+        self.assertEqual(db_manager.dia_a_fecha(db_manager.fecha_a_dia('2024-02-29')), '2024-02-29')
+
+    def test_migracion_conserva_datos(self):
+        """get_metric_data devuelve lo mismo antes y después de migrar"""
+        despues = db_manager.get_metric_data('Gene', 'Recurso', '2024-01-01', '2024-01-31')
+        cols = ['fecha', 'metrica', 'entidad', 'recurso', 'valor_gwh', 'unidad']
+        self.assertEqual(self.antes[cols].values.tolist(), despues[cols].values.tolist())
+
+    def test_upsert_v2(self):
+        """Los upserts en v2 escriben en metrics_fact y reemplazan valores"""
+        db_manager.upsert_metrics_bulk([('2024-01-02', 'Gene', 'Recurso', 'R1', 9.0, 'GWh')])
+        df = db_manager.get_metric_data('Gene', 'Recurso', '2024-01-02', recurso='R1')
+        self.assertEqual(len(df), 1)
+        self.assertAlmostEqual(df['valor_gwh'].iloc[0], 9.0)
+        self.assertEqual(db_manager.get_latest_date('Gene', 'Recurso'), '2024-01-02')
+        self.assertEqual(sorted(db_manager.get_codigos_con_datos('Gene', 'Recurso', '2024-01-01', '2024-01-02')), ['R1', 'R2'])
+
+    def test_vista_compatible(self):
+        """El SQL existente (INSERT OR REPLACE / SELECT sobre metrics) sigue funcionando"""
+        with db_manager.get_connection() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO metrics (fecha, metrica, entidad, recurso, valor_gwh, unidad) "
+                "VALUES ('2024-01-03', 'Gene', 'Recurso', 'R9', 4.0, 'GWh')"
+            )
+            conn.commit()
+            total = conn.execute("SELECT COUNT(*) FROM metrics WHERE metrica = 'Gene'").fetchone()[0]
+            dims = conn.execute("SELECT COUNT(*) FROM dim_metrica").fetchone()[0]
+        self.assertEqual(total, len(self.FILAS) + 1)
+        self.assertEqual(dims, 1)
+
+
+class TestHourlyDia(BaseBDTest):
+    """Tests del empaquetado de datos horarios (una fila por día)"""
+
+    def setUp(self):
+        super().setUp()
+        filas = [('2024-01-01', 'DemaCome', 'Agente', ag, h, float(h) * (i + 1))
+                 for i, ag in enumerate(['AG1', 'AG2']) for h in range(1, 25) if not (ag == 'AG2' and h == 3)]
+        filas += [('2024-01-01', 'DemaReal', 'Sistema', None, h, 10.0) for h in range(1, 13)]
+        db_manager.upsert_hourly_metrics_bulk(filas)
+        self.agregado = db_manager.get_hourly_data_aggregated('DemaCome', 'Agente', '2024-01-01')
+        self.agente = db_manager.get_hourly_data('DemaCome', 'Agente', '2024-01-01', 'AG2')
+        self.sistema = db_manager.get_hourly_data('DemaReal', 'Sistema', '2024-01-01')
+        self.assertTrue(db_manager.migrate_hourly_dia())
+
+    def test_migracion_conserva_lecturas(self):
+        """get_hourly_data y get_hourly_data_aggregated devuelven lo mismo antes y después"""
+        agregado = db_manager.get_hourly_data_aggregated('DemaCome', 'Agente', '2024-01-01')
+        agente = db_manager.get_hourly_data('DemaCome', 'Agente', '2024-01-01', 'AG2')
+        sistema = db_manager.get_hourly_data('DemaReal', 'Sistema', '2024-01-01')
+        self.assertEqual(agregado.values.tolist(), self.agregado.values.tolist())
+        self.assertEqual(agente.values.tolist(), self.agente.values.tolist())
+        self.assertEqual(sistema['hora'].tolist(), list(range(1, 13)))
+        with db_manager.get_connection(readonly=True) as conn:
+            self.assertEqual(conn.execute("SELECT COUNT(*) FROM metrics_hourly_dia").fetchone()[0], 3)
+
+    def test_upsert_por_dia_conserva_horas_sin_dato(self):
+        """Las horas NaN de upsert_hourly_dia_bulk no borran el valor guardado"""
+        valores = [float('nan')] * 24
+        valores[0] = 99.0
+        db_manager.upsert_hourly_dia_bulk([('2024-01-01', 'DemaCome', 'Agente', 'AG1', valores)])
+        df = db_manager.get_hourly_data('DemaCome', 'Agente', '2024-01-01', 'AG1')
+        self.assertEqual(len(df), 24)
+        self.assertEqual(df['valor_mwh'].iloc[0], 99.0)
+        self.assertEqual(df['valor_mwh'].iloc[1], 2.0)
+
+    def test_vista_compatible(self):
+        """El SQL existente sobre metrics_hourly sigue funcionando"""
+        with db_manager.get_connection() as conn:
+            conn.execute(
+                "INSERT INTO metrics_hourly (fecha, metrica, entidad, recurso, hora, valor_mwh) "
+                "VALUES ('2024-01-01', 'DemaCome', 'Agente', 'AG2', 3, 5.0)"
+            )
+            conn.commit()
+            total = conn.execute(
+                "SELECT COUNT(*), SUM(valor_mwh) FROM metrics_hourly WHERE metrica = 'DemaCome'"
+            ).fetchone()
+        self.assertEqual(total[0], 48)
+        self.assertAlmostEqual(total[1], 3 * 300.0 - 2 * 3 + 5.0)
+
+
+class TestCargaStaging(BaseBDTest):
+    """Tests de la carga masiva por tabla staging y lotes"""
+
+    FILAS = [
+        ('2024-01-01', 'Gene', 'Recurso', 'R1', 1.0, 'GWh'),
+        ('2024-01-02', 'Gene', 'Recurso', 'R1', 2.0, 'GWh'),
+        ('2024-01-01', 'Gene', 'Recurso', 'R2', 3.0, 'GWh'),
+        ('2024-01-01', 'Gene', 'Recurso', 'R1', 5.0, 'GWh'),  # repetida en el mismo lote: gana la última
+        ('2024-01-03', 'Gene', 'Recurso', 'R3', 4.0, 'GWh'),
+        ('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 9.0, 'GWh'),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.umbral_original = db_manager.UMBRAL_STAGING
+        db_manager.UMBRAL_STAGING = 1
+
+    def tearDown(self):
+        db_manager.UMBRAL_STAGING = self.umbral_original
+        super().tearDown()
+
+    def _leer(self):
+        df = db_manager.get_metric_data('Gene', 'Recurso', '2024-01-01', '2024-01-31')
+        return df[['fecha', 'recurso', 'valor_gwh', 'unidad']].values.tolist()
+
+    def test_staging_igual_a_executemany(self):
+        """La carga por staging (v1 y v2, en lotes) deja los mismos datos que executemany"""
+        esperado = [['2024-01-01', 'R1', 5.0, 'GWh'], ['2024-01-01', 'R2', 3.0, 'GWh'],
+                    ['2024-01-02', 'R1', 2.0, 'GWh'], ['2024-01-03', 'R3', 4.0, 'GWh']]
+        db_manager.upsert_metrics_bulk(self.FILAS, lote=4)
+        self.assertEqual(self._leer(), esperado)
+
+        self.assertTrue(db_manager.migrate_schema_v2())
+        db_manager.upsert_metrics_bulk([('2024-01-02', 'Gene', 'Recurso', 'R1', 7.0, 'GWh'),
+                                        ('2024-01-04', 'Gene', 'Recurso', 'R4', 1.0, None)], lote=1)
+        esperado[2][2] = 7.0
+        self.assertEqual(self._leer(), esperado + [['2024-01-04', 'R4', 1.0, 'GWh']])
+
+    def test_staging_horario(self):
+        """Las cargas horarias por staging conservan las horas sin dato (empaquetado por día)"""
+        db_manager.upsert_hourly_metrics_bulk([('2024-01-01', 'DemaCome', 'Agente', 'AG1', h, 1.0) for h in range(1, 25)])
+        self.assertTrue(db_manager.migrate_hourly_dia())
+        db_manager.upsert_hourly_metrics_bulk([('2024-01-01', 'DemaCome', 'Agente', 'AG1', 2, 8.0),
+                                               ('2024-01-02', 'DemaCome', 'Agente', 'AG1', 1, 3.0)])
+        df = db_manager.get_hourly_data('DemaCome', 'Agente', '2024-01-01', 'AG1')
+        self.assertEqual(df['valor_mwh'].tolist(), [1.0, 8.0] + [1.0] * 22)
+        self.assertEqual(len(db_manager.get_hourly_data('DemaCome', 'Agente', '2024-01-02', 'AG1')), 1)
+
+
+class TestDataVersions(BaseBDTest):
+    """Tests de data_versions: la versión solo sube cuando los datos cambian"""
+
+    FILAS = [
+        ('2024-01-01', 'Gene', 'Recurso', 'R1', 1.0, 'GWh'),
+        ('2024-01-02', 'Gene', 'Recurso', 'R2', 2.0, 'GWh'),
+        ('2024-02-01', 'Gene', 'Recurso', 'R1', 3.0, 'GWh'),
+    ]
+
+    def _versiones(self):
+        return (db_manager.get_data_version(),
+                db_manager.get_data_version('Gene', 'Recurso'),
+                db_manager.get_data_version('Gene', 'Recurso', '2024-01-01', '2024-01-31'),
+                db_manager.get_data_version('Gene', 'Recurso', '2024-02-01', '2024-02-29'))
+
+    def _comprobar_versiones(self):
+        self.assertEqual(db_manager.upsert_metrics_bulk(self.FILAS), 3)
+        inicial = self._versiones()
+        self.assertTrue(all(v > 0 for v in inicial))
+
+        # Recarga idéntica: no cuenta filas ni cambia versiones
+        self.assertEqual(db_manager.upsert_metrics_bulk(self.FILAS), 0)
+        self.assertEqual(self._versiones(), inicial)
+
+        # Cambia un valor de febrero: suben global, serie y febrero; enero no
+        self.assertEqual(db_manager.upsert_metrics_bulk([('2024-02-01', 'Gene', 'Recurso', 'R1', 4.0, 'GWh')]), 1)
+        global_, serie, enero, febrero = self._versiones()
+        self.assertGreater(global_, inicial[0])
+        self.assertGreater(serie, inicial[1])
+        self.assertEqual(enero, inicial[2])
+        self.assertGreater(febrero, inicial[3])
+        self.assertEqual(db_manager.get_data_version('Gene', 'Sistema'), 0)
+
+    def test_versiones_executemany(self):
+        """Upserts pequeños (executemany) en v1 y v2"""
+        self._comprobar_versiones()
+        self.assertTrue(db_manager.migrate_schema_v2())
+        version = db_manager.get_data_version('Gene', 'Recurso')
+        self.assertEqual(db_manager.upsert_metrics_bulk(self.FILAS[:2]), 0)
+        self.assertEqual(db_manager.get_data_version('Gene', 'Recurso'), version)
+
+    def test_versiones_staging(self):
+        """Cargas por lotes con tabla staging (un merge por serie y mes)"""
+        umbral = db_manager.UMBRAL_STAGING
+        db_manager.UMBRAL_STAGING = 1
+        try:
+            self._comprobar_versiones()
+        finally:
+            db_manager.UMBRAL_STAGING = umbral
+
+    def test_versiones_catalogo_y_horario(self):
+        """upsert_catalogo_bulk y los upserts horarios también versionan"""
+        registros = [{'codigo': 'R1', 'nombre': 'Recurso Uno', 'tipo': 'HIDRAULICA'}]
+        self.assertEqual(db_manager.upsert_catalogo_bulk('ListadoRecursos', registros), 1)
+        version = db_manager.get_data_version(db_manager.METRICA_CATALOGO, 'ListadoRecursos')
+        self.assertGreater(version, 0)
+        self.assertEqual(db_manager.upsert_catalogo_bulk('ListadoRecursos', registros), 0)
+        self.assertEqual(db_manager.get_data_version(db_manager.METRICA_CATALOGO, 'ListadoRecursos'), version)
+
+        horas = [('2024-01-01', 'DemaCome', 'Agente', 'AG1', h, 1.0) for h in range(1, 25)]
+        db_manager.upsert_hourly_metrics_bulk(horas)
+        version = db_manager.get_data_version('DemaCome', 'Agente')
+        self.assertGreater(version, 0)
+        self.assertTrue(db_manager.migrate_hourly_dia())
+        db_manager.upsert_hourly_metrics_bulk(horas)
+        self.assertEqual(db_manager.get_data_version('DemaCome', 'Agente'), version)
+        db_manager.upsert_hourly_dia_bulk([('2024-01-01', 'DemaCome', 'Agente', 'AG1', [2.0] + [None] * 23)])
+        self.assertGreater(db_manager.get_data_version('DemaCome', 'Agente'), version)
+
+
+class TestEstadisticas(BaseBDTest):
+    """Tests del catálogo de estadísticas mantenido por las cargas"""
+
+    FILAS = TestDataVersions.FILAS
+
+    def _catalogo(self):
+        return db_manager.get_metrics_stats().drop(columns='fecha_actualizacion').to_dict('records')
+
+    def _comprobar_igual_a_recompute(self):
+        mantenido = self._catalogo()
+        self.assertGreater(db_manager.rebuild_stats(), 0)
+        self.assertEqual(self._catalogo(), mantenido)
+
+    def test_estadisticas_mantenidas(self):
+        """executemany, staging y v2 actualizan el catálogo igual que un recompute"""
+        db_manager.upsert_metrics_bulk(self.FILAS)
+        serie = self._catalogo()
+        self.assertEqual(serie, [{'metrica': 'Gene', 'entidad': 'Recurso', 'registros': 3, 'dias': 3,
+                                  'fecha_min': '2024-01-01', 'fecha_max': '2024-02-01'}])
+        stats = db_manager.get_database_stats()
+        self.assertEqual((stats['total_registros'], stats['metricas_unicas']), (3, 1))
+        self.assertEqual((stats['fecha_minima'], stats['fecha_maxima']), ('2024-01-01', '2024-02-01'))
+
+        umbral = db_manager.UMBRAL_STAGING
+        db_manager.UMBRAL_STAGING = 1
+        try:
+            db_manager.upsert_metrics_bulk([('2024-03-05', 'Gene', 'Recurso', 'R2', 1.0, 'GWh'),
+                                            ('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 9.0, 'GWh')])
+        finally:
+            db_manager.UMBRAL_STAGING = umbral
+        self.assertEqual(db_manager.get_database_stats()['total_registros'], 5)
+        self._comprobar_igual_a_recompute()
+
+        self.assertTrue(db_manager.migrate_schema_v2())
+        db_manager.upsert_metrics_bulk([('2024-03-06', 'Gene', 'Recurso', 'R2', 1.0, 'GWh')])
+        self.assertEqual(db_manager.get_metrics_stats('Gene', 'Recurso')['registros'].iloc[0], 5)
+        self._comprobar_igual_a_recompute()
+
+    def test_sin_catalogo_y_recompute(self):
+        """BD anterior al catálogo: los lectores recorren metrics hasta rebuild_stats"""
+        db_manager.upsert_metrics_bulk(self.FILAS)
+        with db_manager.get_connection() as conn:
+            conn.execute("DROP TABLE metrics_stats")
+            conn.execute("DROP TABLE metrics_stats_mes")
+            conn.commit()
+
+        # Las cargas no crean un catálogo incompleto
+        db_manager.upsert_metrics_bulk([('2024-03-05', 'Gene', 'Recurso', 'R2', 1.0, 'GWh')])
+        self.assertTrue(db_manager.get_metrics_stats().empty)
+        self.assertEqual(db_manager.get_database_stats()['total_registros'], 4)
+
+        self.assertEqual(db_manager.rebuild_stats(), 1)
+        self.assertEqual(db_manager.get_metrics_stats()['registros'].iloc[0], 4)
+        self.assertEqual(db_manager.get_database_stats()['total_registros'], 4)
+
+
+class TestCobertura(BaseBDTest):
+    """Tests del índice de cobertura (tramos de días por serie) mantenido por las cargas"""
+
+    FILAS = [(f'2024-01-{dia:02d}', 'Gene', 'Recurso', recurso, 1.0, 'GWh')
+             for dia in (1, 2, 3, 6, 7, 10) for recurso in ('R1', 'R2')]
+    FILAS += [('2024-01-04', 'Gene', 'Recurso', 'R2', 1.0, 'GWh')]
+
+    def _tramos(self):
+        with db_manager.get_connection(readonly=True) as conn:
+            return [tuple(f) for f in conn.execute("SELECT * FROM metrics_cobertura ORDER BY 1, 2, 3, 4")]
+
+    def test_consultas(self):
+        """Tramos, huecos, última fecha hasta X y límites de la serie"""
+        db_manager.upsert_metrics_bulk(self.FILAS)
+        self.assertEqual(db_manager.get_cobertura('Gene', 'Recurso'),
+                         [('2024-01-01', '2024-01-04'), ('2024-01-06', '2024-01-07'), ('2024-01-10', '2024-01-10')])
+        self.assertEqual(db_manager.get_rangos_faltantes('Gene', 'Recurso', '2023-12-30', '2024-01-12', 'R1'),
+                         [('2023-12-30', '2023-12-31'), ('2024-01-04', '2024-01-05'), ('2024-01-08', '2024-01-09'),
+                          ('2024-01-11', '2024-01-12')])
+        self.assertEqual(db_manager.get_rangos_faltantes('Gene', 'Recurso', '2024-01-02', '2024-01-04'), [])
+        self.assertEqual(db_manager.get_ultima_fecha('Gene', 'Recurso', hasta='2024-01-09'), '2024-01-07')
+        self.assertEqual(db_manager.get_ultima_fecha('Gene', 'Recurso', hasta='2024-01-05', recurso='R1'), '2024-01-03')
+        self.assertIsNone(db_manager.get_ultima_fecha('Gene', 'Recurso', hasta='2023-12-31'))
+        self.assertEqual(db_manager.get_limites_cobertura('Gene', 'Recurso'), ('2024-01-01', '2024-01-10'))
+        self.assertEqual(db_manager.get_latest_date('Gene', 'Recurso', 'R1'), '2024-01-10')
+
+    def test_mantenido_igual_a_rebuild(self):
+        """executemany, staging y v2 unen tramos igual que un recorrido completo"""
+        db_manager.upsert_metrics_bulk(self.FILAS)
+        umbral = db_manager.UMBRAL_STAGING
+        db_manager.UMBRAL_STAGING = 1
+        try:
+            db_manager.upsert_metrics_bulk([('2024-01-05', 'Gene', 'Recurso', 'R2', 1.0, 'GWh'),
+                                            ('2024-01-08', 'Gene', 'Recurso', 'R2', 1.0, 'GWh')])
+        finally:
+            db_manager.UMBRAL_STAGING = umbral
+        mantenido = self._tramos()
+        self.assertIn(('Gene', 'Recurso', 'R2', db_manager.fecha_a_dia('2024-01-01'),
+                       db_manager.fecha_a_dia('2024-01-08')), mantenido)
+        self.assertGreater(db_manager.rebuild_cobertura(), 0)
+        self.assertEqual(self._tramos(), mantenido)
+
+        self.assertTrue(db_manager.migrate_schema_v2())
+        db_manager.upsert_metrics_bulk([('2024-01-09', 'Gene', 'Recurso', 'R2', 1.0, 'GWh')])
+        mantenido = self._tramos()
+        self.assertGreater(db_manager.rebuild_cobertura(), 0)
+        self.assertEqual(self._tramos(), mantenido)
+
+    def test_sin_indice(self):
+        """BD anterior al índice: las consultas recorren metrics con el mismo resultado"""
+        db_manager.upsert_metrics_bulk(self.FILAS)
+        con_indice = db_manager.get_rangos_faltantes('Gene', 'Recurso', '2024-01-01', '2024-01-12')
+        with db_manager.get_connection() as conn:
+            conn.execute("DROP TABLE metrics_cobertura")
+            conn.commit()
+        db_manager.upsert_metrics_bulk([('2024-01-11', 'Gene', 'Recurso', 'R1', 1.0, 'GWh')])
+        self.assertEqual(db_manager.get_rangos_faltantes('Gene', 'Recurso', '2024-01-01', '2024-01-12'),
+                         con_indice[:-1] + [('2024-01-12', '2024-01-12')])
+        self.assertEqual(db_manager.get_ultima_fecha('Gene', 'Recurso'), '2024-01-11')
+
+
+class TestSnapshots(BaseBDTest):
+    """Tests de la carga sobre snapshot y su publicación atómica"""
+
+    def _valores(self):
+        df = db_manager.get_metric_data('Gene', 'Sistema', '2024-01-01', '2024-01-31')
+        return df['valor_gwh'].tolist()
+
+    def test_carga_y_publicacion(self):
+        """Los lectores ven lo publicado durante la carga y el snapshot nuevo al terminar"""
+        db_manager.upsert_metrics_bulk([('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 1.0, 'GWh')])
+        publicado = str(db_manager.DB_PATH)
+        with db_manager.get_connection(readonly=True) as conn:
+            lector = conn
+
+        with db_manager.carga_en_snapshot() as ruta:
+            db_manager.upsert_metrics_bulk([('2024-01-02', 'Gene', 'Sistema', '_SISTEMA_', 2.0, 'GWh')])
+            self.assertEqual(Path(db_manager.DB_PATH), ruta)
+            antes = sqlite3.connect(publicado)
+            self.assertEqual(antes.execute("SELECT COUNT(*) FROM metrics").fetchone()[0], 1)
+            antes.close()
+
+        self.assertTrue(os.path.islink(publicado))
+        self.assertEqual(os.path.realpath(publicado), str(ruta.resolve()))
+        with db_manager.get_connection(readonly=True) as conn:
+            self.assertIsNot(conn, lector)
+        self.assertEqual(self._valores(), [1.0, 2.0])
+
+    def test_publicado_queda_en_delete(self):
+        """Las conexiones del pool no vuelven a poner en WAL el snapshot publicado"""
+        db_manager.upsert_metrics_bulk([('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 1.0, 'GWh')])
+        with db_manager.carga_en_snapshot() as ruta:
+            db_manager.upsert_metrics_bulk([('2024-01-02', 'Gene', 'Sistema', '_SISTEMA_', 2.0, 'GWh')])
+
+        # Escritura de un proceso del dashboard sobre lo publicado
+        db_manager.upsert_metrics_bulk([('2024-01-03', 'Gene', 'Sistema', '_SISTEMA_', 3.0, 'GWh')])
+        with db_manager.get_connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], 'delete')
+        self.assertFalse(Path(str(ruta) + '-wal').exists())
+        self.assertEqual(self._valores(), [1.0, 2.0, 3.0])
+
+    def test_fallo_descarta_snapshot(self):
+        """Si la carga falla, lo publicado no cambia y el snapshot se borra"""
+        db_manager.upsert_metrics_bulk([('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 1.0, 'GWh')])
+        with self.assertRaises(ValueError):
+            with db_manager.carga_en_snapshot():
+                db_manager.upsert_metrics_bulk([('2024-01-02', 'Gene', 'Sistema', '_SISTEMA_', 2.0, 'GWh')])
+                raise ValueError('fallo del ETL')
+        self.assertFalse(os.path.islink(db_manager.DB_PATH))
+        self.assertEqual(db_manager.get_snapshots(), [])
+        self.assertEqual(self._valores(), [1.0])
+
+    def test_conserva_ultimos_snapshots(self):
+        """Cada publicación conserva SNAPSHOTS_CONSERVAR snapshots"""
+        conservar = db_manager.SNAPSHOTS_CONSERVAR
+        db_manager.SNAPSHOTS_CONSERVAR = 2
+        try:
+            for dia in range(1, 5):
+                with db_manager.carga_en_snapshot():
+                    db_manager.upsert_metrics_bulk([(f'2024-01-0{dia}', 'Gene', 'Sistema', '_SISTEMA_', float(dia), 'GWh')])
+        finally:
+            db_manager.SNAPSHOTS_CONSERVAR = conservar
+        snapshots = db_manager.get_snapshots()
+        self.assertEqual(len(snapshots), 2)
+        self.assertEqual(os.path.realpath(db_manager.DB_PATH), str(snapshots[-1].resolve()))
+        self.assertEqual(self._valores(), [1.0, 2.0, 3.0, 4.0])
+
+
+class TestRollups(BaseBDTest):
+    """Tests de los rollups semanales/mensuales/anuales y por grupo"""
+
+    def setUp(self):
+        super().setUp()
+        from datetime import date, timedelta
+        self.filas = []
+        for i in range(120):  # 2024-01-01 .. 2024-04-29
+            fecha = (date(2024, 1, 1) + timedelta(days=i)).isoformat()
+            self.filas.append((fecha, 'Gene', 'Recurso', 'H1', 2.0, 'GWh'))
+            self.filas.append((fecha, 'Gene', 'Recurso', 'T1', float(i), 'GWh'))
+        db_manager.upsert_metrics_bulk(self.filas)
+        db_manager.upsert_catalogo_bulk('ListadoRecursos', [
+            {'codigo': 'H1', 'nombre': 'Hidro 1', 'tipo': 'HIDRAULICA'},
+            {'codigo': 'T1', 'nombre': 'Termo 1', 'tipo': 'TERMICA'},
+        ])
+        db_manager.refresh_rollups_bulk(self.filas)
+
+    def test_pick_resolution(self):
+        """La resolución automática es la más gruesa con suficientes puntos"""
+        self.assertEqual(db_manager.pick_resolution('2020-01-01', '2024-12-31'), 'M')
+        self.assertEqual(db_manager.pick_resolution('2024-01-01', '2024-12-31'), 'W')
+        self.assertEqual(db_manager.pick_resolution('2024-01-01', '2024-03-31'), 'D')
+
+    def test_rollup_mensual_igual_a_diario(self):
+        """Meses completos desde el rollup y meses parciales al vuelo dan lo mismo que sumar los diarios"""
+        df = db_manager.get_metric_data('Gene', 'Recurso', '2024-01-15', '2024-04-10',
+                                        recurso='T1', resolucion='M')
+        esperado = {}
+        for fecha, _, _, recurso, valor, _ in self.filas:
+            if recurso == 'T1' and '2024-01-15' <= fecha <= '2024-04-10':
+                esperado[fecha[:7] + '-01'] = esperado.get(fecha[:7] + '-01', 0) + valor
+        self.assertEqual(df['fecha'].tolist(), sorted(esperado))
+        for fecha, valor in zip(df['fecha'], df['valor_gwh']):
+            self.assertAlmostEqual(valor, esperado[fecha])
+        self.assertEqual(df['conteo'].tolist(), [17, 29, 31, 10])
+
+    def test_rollup_por_grupo(self):
+        """Los grupos por tipo de catálogo y el total suman los recursos del día"""
+        df = db_manager.get_group_rollup('Gene', 'Recurso', '2024-01-01', '2024-01-31', resolucion='M')
+        por_grupo = dict(zip(df['grupo'], df['suma']))
+        self.assertAlmostEqual(por_grupo['HIDRAULICA'], 62.0)
+        self.assertAlmostEqual(por_grupo['TERMICA'], sum(range(31)))
+        self.assertAlmostEqual(por_grupo[db_manager.GRUPO_TOTAL], 62.0 + sum(range(31)))
+
+    def test_refresh_incremental(self):
+        """Un upsert seguido de refresh_rollups actualiza solo los periodos tocados"""
+        nueva = [('2024-02-10', 'Gene', 'Recurso', 'H1', 100.0, 'GWh')]
+        db_manager.upsert_metrics_bulk(nueva)
+        db_manager.refresh_rollups_bulk(nueva)
+        df = db_manager.get_metric_data('Gene', 'Recurso', '2024-02-01', '2024-02-29',
+                                        recurso='H1', resolucion='M', agregacion='maximo')
+        self.assertAlmostEqual(df['valor_gwh'].iloc[0], 100.0)
+        anual = db_manager.get_group_rollup('Gene', 'Recurso', '2024-01-01', '2024-12-31',
+                                            resolucion='Y', grupos=['HIDRAULICA'])
+        self.assertAlmostEqual(anual['suma'].iloc[0], 2.0 * 119 + 100.0)
+
+
+class TestRollupsBDPrevia(BaseBDTest):
+    """Rollups en una BD con historia diaria anterior a los rollups (sin reconstruir)"""
+
+    def setUp(self):
+        super().setUp()
+        from datetime import date, timedelta
+        filas = [((date(2023, 1, 1) + timedelta(days=i)).isoformat(), 'Gene', 'Sistema', None, 1.0, 'GWh')
+                 for i in range(365)]
+        db_manager.upsert_metrics_bulk(filas)
+        self.enero = [(f'2024-01-{d:02d}', 'Gene', 'Sistema', None, 2.0, 'GWh') for d in range(1, 32)]
+        db_manager.upsert_metrics_bulk(self.enero)
+        db_manager.refresh_rollups_bulk(self.enero)
+
+    def test_historia_completa_sin_reconstruir(self):
+        """Un refresh sobre historia previa no deja rollups truncados: se agrega al vuelo"""
+        df = db_manager.get_metric_data('Gene', 'Sistema', '2023-01-01', '2024-01-31', resolucion='M')
+        self.assertEqual(len(df), 13)
+        self.assertAlmostEqual(df['valor_gwh'].iloc[0], 31.0)
+        self.assertAlmostEqual(df['valor_gwh'].iloc[-1], 62.0)
+        self.assertTrue(df['recurso'].isna().all())
+
+        grupo = db_manager.get_group_rollup('Gene', 'Sistema', '2023-01-01', '2024-01-31', resolucion='M')
+        self.assertEqual(len(grupo), 13)
+        self.assertAlmostEqual(grupo['suma'].sum(), 365.0 + 62.0)
+
+    def test_reconstruir_y_mantener(self):
+        """Tras rebuild_rollups la serie se lee de los rollups y refresh_rollups la mantiene"""
+        self.assertGreater(db_manager.rebuild_rollups('Gene', 'Sistema'), 0)
+        nueva = [('2024-02-01', 'Gene', 'Sistema', None, 5.0, 'GWh')]
+        db_manager.upsert_metrics_bulk(nueva)
+        self.assertGreater(db_manager.refresh_rollups_bulk(nueva), 0)
+        df = db_manager.get_metric_data('Gene', 'Sistema', '2023-01-01', '2024-12-31', resolucion='Y')
+        self.assertEqual(df['valor_gwh'].tolist(), [365.0, 67.0])
+
+
+class TestParticiones(BaseBDTest):
+    """Tests de las particiones por año y del router de consultas"""
+
+    SCHEMA_V2 = False
+
+    def setUp(self):
+        super().setUp()
+        if self.SCHEMA_V2:
+            self.assertTrue(db_manager.migrate_schema_v2())
+        from datetime import date, timedelta
+        filas = []
+        for i in range(0, 3 * 365, 5):  # 2022-01-01 .. 2024-12-30
+            fecha = (date(2022, 1, 1) + timedelta(days=i)).isoformat()
+            filas += [(fecha, 'Gene', 'Recurso', 'R1', float(i), 'GWh'),
+                      (fecha, 'Gene', 'Recurso', 'R2', 1.0, 'GWh')]
+        filas.append(('2022-03-01', 'Gene', 'Recurso', 'SOLO22', 7.0, 'GWh'))
+        db_manager.upsert_metrics_bulk(filas)
+        self.antes = db_manager.get_metric_data('Gene', 'Recurso', '2022-06-01', '2024-06-30')
+        self.assertGreater(db_manager.particionar_anio(2022), 0)
+        self.assertGreater(db_manager.particionar_anio(2023), 0)
+
+    def test_router_une_particiones(self):
+        """get_metric_data devuelve lo mismo leyendo de las particiones y de la BD principal"""
+        self.assertEqual(sorted(db_manager.get_particiones()), [2022, 2023])
+        despues = db_manager.get_metric_data('Gene', 'Recurso', '2022-06-01', '2024-06-30')
+        cols = ['fecha', 'metrica', 'entidad', 'recurso', 'valor_gwh', 'unidad']
+        self.assertEqual(self.antes[cols].values.tolist(), despues[cols].values.tolist())
+        self.assertEqual(db_manager.get_latest_date('Gene', 'Recurso', 'SOLO22'), '2022-03-01')
+        self.assertIn('SOLO22', db_manager.get_codigos_con_datos('Gene', 'Recurso', '2022-01-01', '2024-12-31'))
+        with db_manager.get_connection(readonly=True) as conn:
+            principal = conn.execute("SELECT COUNT(*) FROM metrics WHERE fecha < '2024-01-01'").fetchone()[0]
+        self.assertEqual(principal, 0)
+        # El índice de cobertura incluye los años particionados; el catálogo de estadísticas no
+        self.assertEqual(db_manager.get_limites_cobertura('Gene', 'Recurso', 'R1'), ('2022-01-01', '2024-12-26'))
+        self.assertEqual(db_manager.get_cobertura('Gene', 'Recurso', 'SOLO22'), [('2022-03-01', '2022-03-01')])
+        self.assertGreater(db_manager.rebuild_cobertura(), 0)
+        self.assertEqual(db_manager.get_cobertura('Gene', 'Recurso', 'SOLO22'), [('2022-03-01', '2022-03-01')])
+        self.assertEqual(db_manager.get_metrics_stats()['fecha_min'].iloc[0], '2024-01-01')
+        self.assertEqual(db_manager.get_database_stats()['total_registros'], 2 * 73)
+
+    def test_anio_cerrado_solo_lectura(self):
+        """Las escrituras de años particionados se ignoran hasta reabrir el año"""
+        db_manager.upsert_metrics_bulk([('2022-03-01', 'Gene', 'Recurso', 'SOLO22', 99.0, 'GWh'),
+                                        ('2024-03-01', 'Gene', 'Recurso', 'NUEVO', 1.0, 'GWh')])
+        df = db_manager.get_metric_data('Gene', 'Recurso', '2022-03-01', '2024-03-01', recurso_filter=['SOLO22', 'NUEVO'])
+        self.assertEqual(df['valor_gwh'].tolist(), [7.0, 1.0])
+
+        self.assertGreater(db_manager.reabrir_particion(2022), 0)
+        self.assertEqual(sorted(db_manager.get_particiones()), [2023])
+        db_manager.upsert_metrics_bulk([('2022-03-01', 'Gene', 'Recurso', 'SOLO22', 99.0, 'GWh')])
+        df = db_manager.get_metric_data('Gene', 'Recurso', '2022-03-01', recurso='SOLO22')
+        self.assertEqual(df['valor_gwh'].tolist(), [99.0])
+        self.assertEqual(db_manager.get_metrics_stats()['fecha_min'].iloc[0], '2022-01-01')
+
+    def test_rollups_de_anios_particionados(self):
+        """rebuild_rollups incluye las series que solo están en particiones"""
+        db_manager.rebuild_rollups('Gene', 'Recurso')
+        df = db_manager.get_metric_data('Gene', 'Recurso', '2022-01-01', '2022-12-31',
+                                        recurso='SOLO22', resolucion='Y')
+        self.assertEqual(df['valor_gwh'].tolist(), [7.0])
+
+
+class TestParticionesV2(TestParticiones):
+    """Las mismas pruebas de particiones sobre el esquema v2"""
+
+    SCHEMA_V2 = True
+
+
+if __name__ == '__main__':
+    unittest.main()
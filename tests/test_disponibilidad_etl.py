@@ -50,7 +50,7 @@ config1 = {
 }
 
 try:
-    registros1 = poblar_metrica(
+    resultado1 = poblar_metrica(
         obj_api=obj_api,
         config=config1,
         usar_timeout=True,
@@ -59,6 +59,7 @@ try:
         fecha_fin_custom=fecha_fin.strftime('%Y-%m-%d')
     )
     
+    registros1 = resultado1['registros']
     if registros1 > 0:
         print(f"\n✅ ÉXITO: {registros1:,} registros insertados")
     else:
@@ -0,0 +1,70 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║              TESTS UNITARIOS - ESTADO DEL ETL                ║
+║                                                              ║
+║  etl/estado.py: checkpoints por lote y watermarks por serie  ║
+║  sobre una BD temporal                                       ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import sqlite3
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from base_bd import BaseBDTest  # Antes de db_manager: BD temporal
+from utils import db_manager
+from etl import estado
+
+
+class TestEstadoETL(BaseBDTest):
+    """Checkpoints por lote del ETL concurrente y watermarks de la carga incremental"""
+
+    def test_reanudar(self):
+        """Los lotes registrados se leen por ejecución y se borran al terminar"""
+        self.assertEqual(estado.get_etl_checkpoints('2020-01-01|2020-12-31'), set())
+        self.assertTrue(estado.save_etl_checkpoint('2020-01-01|2020-12-31', 'Gene', 'Recurso',
+                                                       '2020-01-01', '2020-01-30', 9000))
+        estado.save_etl_checkpoint('2020-01-01|2020-12-31', 'Gene', 'Recurso', '2020-01-01', '2020-01-30', 9000)
+        estado.save_etl_checkpoint('otra', 'Gene', 'Sistema', '2020-01-01', '2020-12-31', 366)
+        self.assertEqual(estado.get_etl_checkpoints('2020-01-01|2020-12-31'),
+                         {('Gene', 'Recurso', '2020-01-01', '2020-01-30')})
+        self.assertEqual(estado.clear_etl_checkpoints('2020-01-01|2020-12-31'), 1)
+        self.assertEqual(estado.get_etl_checkpoints('2020-01-01|2020-12-31'), set())
+        self.assertEqual(len(estado.get_etl_checkpoints('otra')), 1)
+
+    def test_watermark(self):
+        """Sin watermark se usa la cobertura; el watermark solo avanza y se puede borrar"""
+        self.assertIsNone(estado.get_etl_watermark('Gene', 'Sistema'))
+        db_manager.upsert_metrics_bulk([('2024-01-10', 'Gene', 'Sistema', '_SISTEMA_', 1.0, 'GWh')])
+        self.assertEqual(estado.get_etl_watermark('Gene', 'Sistema'), '2024-01-10')
+
+        self.assertTrue(estado.set_etl_watermark('Gene', 'Sistema', '2024-01-05'))
+        self.assertEqual(estado.get_etl_watermark('Gene', 'Sistema'), '2024-01-05')
+        estado.set_etl_watermark('Gene', 'Sistema', '2024-01-20')
+        estado.set_etl_watermark('Gene', 'Sistema', '2024-01-15')
+        self.assertEqual(estado.get_etl_watermark('Gene', 'Sistema'), '2024-01-20')
+
+        estado.set_etl_watermark('Gene', 'Recurso', '2024-01-20')
+        self.assertEqual(estado.clear_etl_watermarks('Gene', 'Sistema'), 1)
+        self.assertEqual(estado.get_etl_watermark('Gene', 'Sistema'), '2024-01-10')
+        self.assertEqual(estado.clear_etl_watermarks(), 1)
+
+    def test_bd_existente_sin_tablas(self):
+        """Una BD creada antes de este módulo no tiene las tablas: se leen vacías y se crean al escribir"""
+        with db_manager.get_connection(readonly=True) as conn:
+            tablas = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertFalse(tablas & {'etl_checkpoints', 'etl_watermarks'})
+        self.assertEqual(estado.get_etl_checkpoints('x'), set())
+        self.assertIsNone(estado.get_etl_watermark('Gene', 'Sistema'))
+
+        self.assertTrue(estado.save_etl_checkpoint('x', 'Gene', 'Sistema', '2024-01-01', '2024-01-31', 31))
+        self.assertTrue(estado.set_etl_watermark('Gene', 'Sistema', '2024-01-31'))
+        conn = sqlite3.connect(db_manager.DB_PATH)
+        self.assertEqual(conn.execute("SELECT COUNT(*) FROM etl_watermarks").fetchone()[0], 1)
+        conn.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,206 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║          TESTS UNITARIOS - CARGA INCREMENTAL DEL ETL         ║
+║                                                              ║
+║  etl/etl_xm_to_sqlite.py: estado de poblar_metrica, rango    ║
+║  desde el watermark y avance del watermark, con una API XM   ║
+║  falsa sobre una BD temporal                                 ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from base_bd import BaseBDTest  # Antes de db_manager: BD temporal
+import pandas as pd
+from utils import db_manager, cache_manager, utils_xm
+from etl import etl_xm_to_sqlite as etl, estado
+
+AYER = date.today() - timedelta(days=1)
+
+
+class APIAporEner:
+    """request_data AporEner/Sistema: 2e9 Wh (2 GWh) por día publicado; los rangos de `fallar` lanzan error"""
+
+    def __init__(self, publicado_hasta=AYER, fallar=()):
+        self.publicado_hasta = publicado_hasta
+        self.fallar = set(fallar)
+        self.rangos = []
+        self._lock = threading.Lock()
+
+    def request_data(self, metric, entity, start_date, end_date):
+        with self._lock:
+            self.rangos.append((start_date, end_date))
+        if start_date in self.fallar:
+            raise ConnectionError("503")
+        fechas = pd.date_range(start_date, min(pd.Timestamp(end_date), pd.Timestamp(self.publicado_hasta)))
+        return pd.DataFrame({'Id': 'Sistema', 'Date': fechas.strftime('%Y-%m-%d'), 'Value': 2e9})
+
+
+class BaseETLTest(BaseBDTest):
+    """BD y caché temporales, limitador de tasa sin espera"""
+
+    CONFIG = {'metric': 'AporEner', 'entity': 'Sistema', 'conversion': 'Wh_a_GWh',
+              'dias_history': 60, 'batch_size': 60}
+
+    def setUp(self):
+        super().setUp()
+        self.cache_original = cache_manager.CACHE_PATH
+        self.limitador_original = utils_xm.LIMITADOR_XM
+        cache_manager.CACHE_PATH = Path(self.tmpdir.name) / 'xm_cache.db'
+        utils_xm.LIMITADOR_XM = utils_xm.LimitadorTasa(tasa=1000, rafaga=10)
+
+    def tearDown(self):
+        utils_xm.LIMITADOR_XM = self.limitador_original
+        cache_manager.CACHE_PATH = self.cache_original
+        super().tearDown()
+
+    def poblar(self, api, config=None, **kwargs):
+        return etl.poblar_metrica(api, config or self.CONFIG, incremental=True, **kwargs)
+
+
+class TestEstadoCarga(BaseETLTest):
+    """poblar_metrica separa el estado de la carga de los registros modificados"""
+
+    def test_sin_cambios_es_exitosa(self):
+        """Recibir lo mismo que ya estaba guardado es una carga exitosa con 0 registros"""
+        primera = self.poblar(APIAporEner())
+        self.assertEqual(primera['estado'], 'exitosa')
+        self.assertEqual(primera['registros'], 61)
+
+        segunda = self.poblar(APIAporEner(), ventana_revision=10)
+        self.assertEqual(segunda, {'estado': 'exitosa', 'registros': 0, 'filas_api': 11, 'lotes_fallidos': 0})
+
+    def test_al_dia_y_sin_datos(self):
+        """Sin días que pedir la serie está al día; si XM no devuelve filas, sin datos; ninguno es fallo"""
+        self.poblar(APIAporEner())
+        fin = (AYER - timedelta(days=5)).isoformat()
+        al_dia = self.poblar(APIAporEner(), fecha_fin_custom=fin, ventana_revision=0)
+        self.assertEqual(al_dia['estado'], 'al_dia')
+
+        db_manager.close_all_connections()
+        db_manager.DB_PATH = Path(self.tmpdir.name) / 'vacia.db'
+        self.assertTrue(db_manager.init_database())
+        sin_datos = self.poblar(APIAporEner(publicado_hasta=AYER - timedelta(days=100)))
+        self.assertEqual(sin_datos['estado'], 'sin_datos')
+
+    def test_error_de_api_es_fallida(self):
+        """Un error de la API (rango completo) marca la métrica como fallida"""
+        inicio = (AYER - timedelta(days=60)).isoformat()
+        resultado = self.poblar(APIAporEner(fallar=[inicio]))
+        self.assertEqual(resultado['estado'], 'fallida')
+        self.assertEqual(resultado['registros'], 0)
+
+
+
+class TestWatermark(BaseETLTest):
+    """rango_carga desde el watermark y _avanzar_watermark"""
+
+    def dias(self, n):
+        return (AYER - timedelta(days=n)).isoformat()
+
+    def test_rango_acotado_a_dias_history(self):
+        """El inicio es el watermark menos la ventana, sin ir más atrás que dias_history"""
+        estado.set_etl_watermark('AporEner', 'Sistema', self.dias(3))
+        inicio, fin, watermark, desde_limite = etl.rango_carga(self.CONFIG, incremental=True, ventana_revision=7)
+        self.assertEqual((str(inicio), str(fin), watermark), (self.dias(10), str(AYER), self.dias(3)))
+        self.assertFalse(desde_limite)
+
+        estado.clear_etl_watermarks()
+        estado.set_etl_watermark('AporEner', 'Sistema', self.dias(200))
+        inicio, _, _, desde_limite = etl.rango_carga(self.CONFIG, incremental=True, ventana_revision=7)
+        self.assertEqual(str(inicio), self.dias(60))
+        self.assertTrue(desde_limite)
+
+        # Modo completo: siempre dias_history
+        inicio, _, _, _ = etl.rango_carga(self.CONFIG, incremental=False)
+        self.assertEqual(str(inicio), self.dias(60))
+
+    def test_sin_watermark_usa_ultima_fecha(self):
+        """Una serie cargada antes de los watermarks parte de su última fecha en SQLite"""
+        db_manager.upsert_metrics_bulk([(self.dias(n), 'AporEner', 'Sistema', '_SISTEMA_', 2.0, 'GWh')
+                                        for n in range(20, 40)])
+        inicio, _, watermark, _ = etl.rango_carga(self.CONFIG, incremental=True, ventana_revision=7)
+        self.assertEqual(watermark, self.dias(20))
+        self.assertEqual(str(inicio), self.dias(27))
+
+    def test_avanza_hasta_el_ultimo_dia_publicado(self):
+        """Una carga completa avanza el watermark al último día con datos, no a fecha_fin"""
+        api = APIAporEner(publicado_hasta=AYER - timedelta(days=2))
+        self.poblar(api)
+        self.assertEqual(estado.get_etl_watermark('AporEner', 'Sistema'), self.dias(2))
+
+        # La siguiente corrida pide solo la ventana de revisión
+        api.rangos.clear()
+        self.poblar(api, ventana_revision=5)
+        self.assertEqual(api.rangos, [(self.dias(7), str(AYER))])
+
+    def test_hueco_detras_no_avanza(self):
+        """Una carga que no empalma con el watermark (deja un hueco) no lo mueve"""
+        self.poblar(APIAporEner(publicado_hasta=AYER - timedelta(days=30)))
+        self.assertEqual(estado.get_etl_watermark('AporEner', 'Sistema'), self.dias(30))
+
+        resultado = self.poblar(APIAporEner(), fecha_inicio_custom=self.dias(10))
+        self.assertEqual(resultado['estado'], 'exitosa')
+        self.assertEqual(estado.get_etl_watermark('AporEner', 'Sistema'), self.dias(30))
+
+        etl._avanzar_watermark('AporEner', 'Sistema', self.dias(30), AYER - timedelta(days=29), AYER)
+        self.assertEqual(estado.get_etl_watermark('AporEner', 'Sistema'), str(AYER))
+
+    def test_atrasado_mas_que_dias_history_avanza(self):
+        """Un watermark más viejo que dias_history (caída del ETL) avanza con la carga acotada"""
+        config = dict(self.CONFIG, dias_history=30, batch_size=30)
+        estado.set_etl_watermark('AporEner', 'Sistema', self.dias(45))
+        api = APIAporEner()
+        resultado = self.poblar(api, config, ventana_revision=7)
+        self.assertEqual(resultado['estado'], 'exitosa')
+        self.assertEqual(api.rangos, [(self.dias(30), str(AYER))])
+        self.assertEqual(estado.get_etl_watermark('AporEner', 'Sistema'), str(AYER))
+
+        # La siguiente corrida ya es incremental
+        api.rangos.clear()
+        self.poblar(api, config, ventana_revision=7)
+        self.assertEqual(api.rangos, [(self.dias(7), str(AYER))])
+
+    def test_lotes_fallidos_no_avanzan(self):
+        """Con un lote fallido el watermark queda donde estaba"""
+        config = dict(self.CONFIG, batch_size=10)
+        self.poblar(APIAporEner(publicado_hasta=AYER - timedelta(days=30)), config)
+        self.assertEqual(estado.get_etl_watermark('AporEner', 'Sistema'), self.dias(30))
+
+        lotes = etl.lotes_metrica(config, AYER - timedelta(days=37), AYER)
+        resultado = self.poblar(APIAporEner(fallar=[str(lotes[-1][0])]), config, ventana_revision=7)
+        self.assertEqual(resultado['estado'], 'fallida')
+        self.assertEqual(resultado['lotes_fallidos'], 1)
+        self.assertEqual(estado.get_etl_watermark('AporEner', 'Sistema'), self.dias(30))
+
+    def test_lote_intermedio_fallido_conserva_los_demas(self):
+        """Guardado en streaming: un lote del medio que falla no descarta los ya guardados"""
+        config = dict(self.CONFIG, batch_size=10)
+        estado.set_etl_watermark('AporEner', 'Sistema', self.dias(60))
+        lotes = etl.lotes_metrica(config, AYER - timedelta(days=60), AYER)
+        self.assertEqual(len(lotes), 7)
+        fallido = lotes[3]
+
+        resultado = self.poblar(APIAporEner(fallar=[str(fallido[0])]), config, ventana_revision=7)
+        self.assertEqual(resultado['estado'], 'fallida')
+        self.assertEqual(resultado['lotes_fallidos'], 1)
+        self.assertEqual(resultado['registros'], 51)
+        self.assertEqual(resultado['filas_api'], 51)
+
+        df = db_manager.get_metric_data('AporEner', 'Sistema', self.dias(60), str(AYER))
+        fechas = set(df['fecha'])
+        self.assertEqual(len(fechas), 51)
+        self.assertIn(str(lotes[2][1]), fechas)
+        self.assertIn(str(lotes[4][0]), fechas)
+        self.assertNotIn(str(fallido[0]), fechas)
+        self.assertEqual(estado.get_etl_watermark('AporEner', 'Sistema'), self.dias(60))
+
+
+if __name__ == '__main__':
+    unittest.main()
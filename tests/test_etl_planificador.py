@@ -0,0 +1,113 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║            TESTS UNITARIOS - PLANIFICADOR DEL ETL            ║
+║                                                              ║
+║  etl/planificador.py: dependencias, pool acotado, limitador  ║
+║  solo para las tareas que consultan la API y reintentos      ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from utils import utils_xm
+from etl.planificador import tarea, ejecutar_grafo
+
+
+class LimitadorContado:
+    """Limitador sin espera que cuenta los turnos tomados"""
+
+    def __init__(self):
+        self.turnos = 0
+        self._lock = threading.Lock()
+
+    def tomar(self):
+        with self._lock:
+            self.turnos += 1
+
+
+class TestPlanificador(unittest.TestCase):
+    """Grafo catálogos → métricas → lotes"""
+
+    def test_orden_y_concurrencia(self):
+        """Cada tarea arranca después de sus dependencias; nunca más de max_workers a la vez"""
+        eventos, lock = [], threading.Lock()
+        activos, maximo = [0], [0]
+
+        def hacer(nombre, demora=0.02):
+            def _f():
+                with lock:
+                    activos[0] += 1
+                    maximo[0] = max(maximo[0], activos[0])
+                    eventos.append(('inicio', nombre))
+                time.sleep(demora)
+                with lock:
+                    activos[0] -= 1
+                    eventos.append(('fin', nombre))
+                return nombre
+            return _f
+
+        grafo = {'cat1': tarea(hacer('cat1')), 'cat2': tarea(hacer('cat2')),
+                 'gene': tarea(hacer('gene', 0), depende_de=['cat1', 'cat2'], api=False)}
+        for i in range(6):
+            grafo[f'lote{i}'] = tarea(hacer(f'lote{i}'), depende_de=['gene'])
+
+        limitador = LimitadorContado()
+        resultados = ejecutar_grafo(grafo, max_workers=3, limitador=limitador)
+
+        self.assertEqual({k: r['resultado'] for k, r in resultados.items()}, {k: k for k in grafo})
+        self.assertLessEqual(maximo[0], 3)
+        self.assertGreater(maximo[0], 1)
+        self.assertEqual(limitador.turnos, 8)  # 'gene' no consulta la API
+        orden = [nombre for evento, nombre in eventos]
+        self.assertLess(max(eventos.index(('fin', 'cat1')), eventos.index(('fin', 'cat2'))),
+                        eventos.index(('inicio', 'gene')))
+        self.assertTrue(all(eventos.index(('fin', 'gene')) < eventos.index(('inicio', f'lote{i}')) for i in range(6)))
+        self.assertEqual(len(orden), 18)
+
+    def test_fallos_y_reintentos(self):
+        """Una tarea se reintenta; si falla del todo queda con error y sus dependientes corren igual"""
+        intentos = []
+
+        def inestable():
+            intentos.append(1)
+            if len(intentos) < 2:
+                raise ConnectionError("timeout")
+            return 5
+
+        def rota():
+            raise ValueError("sin columna Value")
+
+        resultados = ejecutar_grafo({'a': tarea(inestable), 'b': tarea(rota),
+                                     'c': tarea(lambda: 1, depende_de=['b'])},
+                                    limitador=LimitadorContado(), retries=1, backoff_sec=0)
+        self.assertEqual(resultados['a']['resultado'], 5)
+        self.assertEqual(len(intentos), 2)
+        self.assertEqual(resultados['b']['error'], 'sin columna Value')
+        self.assertEqual(resultados['c']['resultado'], 1)
+
+    def test_limitador_global_al_ejecutar(self):
+        """Sin limitador explícito se usa utils_xm.LIMITADOR_XM vigente al ejecutar (no el de la importación)"""
+        original = utils_xm.LIMITADOR_XM
+        utils_xm.LIMITADOR_XM = limitador = LimitadorContado()
+        try:
+            ejecutar_grafo({'a': tarea(lambda: 1), 'b': tarea(lambda: 2, api=False)})
+        finally:
+            utils_xm.LIMITADOR_XM = original
+        self.assertEqual(limitador.turnos, 1)
+
+    def test_grafo_invalido(self):
+        """Dependencias inexistentes o ciclos se rechazan"""
+        with self.assertRaises(ValueError):
+            ejecutar_grafo({'a': tarea(lambda: 1, depende_de=['x'])})
+        with self.assertRaises(ValueError):
+            ejecutar_grafo({'a': tarea(lambda: 1, depende_de=['b']), 'b': tarea(lambda: 1, depende_de=['a'])},
+                           limitador=LimitadorContado())
+
+
+if __name__ == '__main__':
+    unittest.main()
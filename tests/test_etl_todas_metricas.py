@@ -0,0 +1,131 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║        TESTS UNITARIOS - ETL DE TODAS LAS MÉTRICAS XM        ║
+║                                                              ║
+║  etl/etl_todas_metricas_xm.py: descargas en paralelo,        ║
+║  estado por métrica, reporte CSV y conversión tomada de      ║
+║  config_metricas, con una API XM falsa sobre una BD temporal ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import threading
+import time
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from base_bd import BaseBDTest  # Antes de db_manager: BD temporal
+import pandas as pd
+from utils import db_manager, cache_manager, utils_xm
+from etl import etl_todas_metricas_xm as etl_todas
+from etl.transformaciones import HORAS_API
+
+
+class APICatalogoXM:
+    """
+    all_variables + request_data: Gene/Sistema con 24 horas de 1000 kWh por día,
+    PrecBolsNaci/Sistema con Value diario en $/kWh, VertEner/Sistema sin datos y
+    DemaSIN/Sistema siempre con error
+    """
+
+    METRICAS = [('Gene', 'Sistema'), ('VertEner', 'Sistema'), ('DemaSIN', 'Sistema'),
+                ('PrecBolsNaci', 'Sistema')]
+
+    def __init__(self, latencia=0.1):
+        self.latencia = latencia
+        self.en_curso = 0
+        self.max_en_curso = 0
+        self._lock = threading.Lock()
+
+    def all_variables(self):
+        return pd.DataFrame(self.METRICAS, columns=['MetricId', 'Entity'])
+
+    def request_data(self, metric, entity, start_date, end_date):
+        with self._lock:
+            self.en_curso += 1
+            self.max_en_curso = max(self.max_en_curso, self.en_curso)
+        try:
+            time.sleep(self.latencia)
+            if metric == 'DemaSIN':
+                raise ConnectionError("503")
+            fechas = pd.date_range(start_date, end_date).strftime('%Y-%m-%d')
+            if metric == 'VertEner':
+                return pd.DataFrame(columns=['Id', 'Date', 'Value'])
+            if metric == 'PrecBolsNaci':
+                return pd.DataFrame({'Id': 'Sistema', 'Date': fechas, 'Value': 300.0})
+            df = pd.DataFrame({'Id': 'Sistema', 'Date': fechas})
+            for hora in HORAS_API:
+                df[hora] = 1000.0
+            return df
+        finally:
+            with self._lock:
+                self.en_curso -= 1
+
+
+class TestETLTodasMetricas(BaseBDTest):
+    """ejecutar_etl_completo sobre una BD temporal"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache_original = cache_manager.CACHE_PATH
+        self.limitador_original = utils_xm.LIMITADOR_XM
+        cache_manager.CACHE_PATH = Path(self.tmpdir.name) / 'xm_cache.db'
+        utils_xm.LIMITADOR_XM = utils_xm.LimitadorTasa(tasa=1000, rafaga=10)
+
+    def tearDown(self):
+        utils_xm.LIMITADOR_XM = self.limitador_original
+        cache_manager.CACHE_PATH = self.cache_original
+        super().tearDown()
+
+    def test_carga_en_paralelo_con_reporte(self):
+        """Descargas solapadas, estado por métrica y reporte CSV con filas y tiempos"""
+        api = APICatalogoXM()
+        ruta = os.path.join(self.tmpdir.name, 'reporte.csv')
+        stats = etl_todas.ejecutar_etl_completo(dias=9, max_workers=4, reporte=ruta, obj_api=api)
+
+        self.assertGreaterEqual(api.max_en_curso, 2)
+        self.assertEqual({k: stats[k] for k in ('total', 'exitosas', 'sin_datos', 'fallidas', 'registros')},
+                         {'total': 4, 'exitosas': 2, 'sin_datos': 1, 'fallidas': 1, 'registros': 20})
+        self.assertEqual(stats['reporte'], ruta)
+
+        reporte = pd.read_csv(ruta).set_index('metrica')
+        self.assertEqual(list(reporte.columns), ['entidad', 'estado', 'filas_api', 'filas', 'descarga_s',
+                                                 'guardado_s', 'total_s'])
+        self.assertEqual(reporte['estado'].to_dict(), {'Gene': 'exitosa', 'VertEner': 'sin_datos',
+                                                       'DemaSIN': 'fallida', 'PrecBolsNaci': 'exitosa'})
+        self.assertEqual(reporte.loc['Gene', 'filas_api'], 10)
+        self.assertEqual(reporte.loc['DemaSIN', 'filas'], 0)
+        self.assertGreaterEqual(reporte.loc['Gene', 'descarga_s'], 0.1)
+
+        # Gene/Sistema: horas sumadas kWh → GWh; PrecBolsNaci sin conversión (config_metricas)
+        gene = db_manager.get_metric_data('Gene', 'Sistema', '2000-01-01', '2099-12-31')
+        self.assertEqual(len(gene), 10)
+        self.assertAlmostEqual(gene['valor_gwh'].iloc[0], 0.024)
+        precio = db_manager.get_metric_data('PrecBolsNaci', 'Sistema', '2000-01-01', '2099-12-31')
+        self.assertAlmostEqual(precio['valor_gwh'].iloc[0], 300.0)
+
+    def test_solo_nuevas(self):
+        """Con solo_nuevas no se descargan las métricas que ya están en la BD"""
+        db_manager.upsert_metrics_bulk([('2024-01-01', 'Gene', 'Sistema', '_SISTEMA_', 1.0, 'GWh')])
+        api = APICatalogoXM(latencia=0)
+        stats = etl_todas.ejecutar_etl_completo(dias=2, solo_nuevas=True, metrica_especifica='PrecBolsNaci',
+                                                reporte=os.path.join(self.tmpdir.name, 'r.csv'), obj_api=api)
+        self.assertEqual((stats['total'], stats['exitosas']), (1, 1))
+        stats = etl_todas.ejecutar_etl_completo(dias=2, solo_nuevas=True, metrica_especifica='Gene',
+                                                reporte=os.path.join(self.tmpdir.name, 'r.csv'), obj_api=api)
+        self.assertEqual(stats['total'], 0)
+
+    def test_conversion_de_config_metricas(self):
+        """La conversión de config_metricas tiene prioridad sobre la heurística por nombre"""
+        # VoluUtilDiarEner/Embalse está en config_metricas (kWh); por nombre sería Wh
+        self.assertEqual(etl_todas.detectar_conversion('VoluUtilDiarEner', 'Embalse'), 'kWh_a_GWh')
+        self.assertEqual(etl_todas.detectar_conversion('VoluUtilDiarEner', 'Sistema'), 'Wh_a_GWh')
+        # AporCaudal/Rio se guarda sin convertir según config_metricas
+        self.assertIsNone(etl_todas.detectar_conversion('AporCaudal', 'Rio'))
+        self.assertEqual(etl_todas.detectar_conversion('DispoDeclarada', 'Recurso'), 'horas_a_diario')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║               TESTS UNITARIOS - CLIENTE XM                   ║
+║                                                              ║
+║  utils/xm_client.py: plazos, circuit breaker, cupos del      ║
+║  pool compartido y estadísticas por métrica                  ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+from utils.xm_client import XMClient
+from utils.exceptions import APITimeoutError, APIUnavailableError, APIResponseError
+
+
+class APILenta:
+    """request_data que tarda `demora` s (o lanza si demora es None)"""
+
+    def __init__(self, demora: float = 0.0):
+        self.demora = demora
+        self.llamadas = 0
+        self.liberar = threading.Event()
+
+    def request_data(self, metric, entity, start, end):
+        self.llamadas += 1
+        if self.demora is None:
+            raise ValueError("respuesta inválida")
+        self.liberar.wait(self.demora)
+        return pd.DataFrame({'Date': [start], 'Value': [1.0]})
+
+
+class TestXMClient(unittest.TestCase):
+    """Cliente XM resiliente"""
+
+    def test_circuito_abre_y_cierra(self):
+        """Timeouts seguidos abren el circuito; tras el enfriamiento una prueba exitosa lo cierra"""
+        api = APILenta(demora=1.0)
+        cliente = XMClient(api=api, max_workers=4, timeout=0.05, umbral_fallos=2, enfriamiento=0.2)
+        for _ in range(2):
+            with self.assertRaises(APITimeoutError):
+                cliente.request_data('Gene', 'Sistema', '2024-01-01', '2024-01-01')
+        self.assertEqual(cliente.estado_circuito(), 'abierto')
+
+        # Abierto: falla de inmediato sin llamar a la API
+        t0 = time.monotonic()
+        with self.assertRaises(APIUnavailableError):
+            cliente.request_data('Gene', 'Sistema', '2024-01-01', '2024-01-01')
+        self.assertLess(time.monotonic() - t0, 0.05)
+        self.assertEqual(api.llamadas, 2)
+
+        api.liberar.set()
+        time.sleep(0.25)
+        self.assertEqual(cliente.estado_circuito(), 'semiabierto')
+        df = cliente.request_data('Gene', 'Sistema', '2024-01-01', '2024-01-01')
+        self.assertEqual(len(df), 1)
+        self.assertEqual(cliente.estado_circuito(), 'cerrado')
+
+        stats = cliente.estadisticas()['metricas']['Gene']
+        self.assertEqual(stats['llamadas'], 4)
+        self.assertEqual(stats['errores'], {'timeout': 2, 'circuito_abierto': 1})
+        self.assertEqual(sum(stats['latencias'].values()), 3)
+
+    def test_cupos_acotados(self):
+        """Con todos los hilos ocupados por llamadas colgadas, la siguiente falla sin encolarse"""
+        api = APILenta(demora=5.0)
+        cliente = XMClient(api=api, max_workers=2, timeout=0.05, umbral_fallos=10)
+        for _ in range(2):
+            with self.assertRaises(APITimeoutError):
+                cliente.request_data('AporEner', 'Sistema', '2024-01-01', '2024-01-01')
+        with self.assertRaises(APIUnavailableError):
+            cliente.request_data('AporEner', 'Sistema', '2024-01-01', '2024-01-01')
+        self.assertEqual(cliente.estadisticas()['metricas']['AporEner']['errores'], {'timeout': 2, 'sin_cupo': 1})
+
+        # Cuando la API responde los cupos se liberan
+        api.liberar.set()
+        time.sleep(0.05)
+        self.assertEqual(len(cliente.request_data('AporEner', 'Sistema', '2024-01-01', '2024-01-01')), 1)
+
+    def test_error_de_api(self):
+        """Las excepciones de pydataxm llegan como APIResponseError y cuentan como fallo"""
+        cliente = XMClient(api=APILenta(demora=None), umbral_fallos=5)
+        with self.assertRaises(APIResponseError):
+            cliente.request_data('PrecBolsNaci', 'Sistema', '2024-01-01', '2024-01-01')
+        self.assertEqual(cliente.estadisticas()['metricas']['PrecBolsNaci']['errores'], {'error': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║             TESTS UNITARIOS - CUBO RECIENTE (mmap)           ║
+║                                                              ║
+║  utils/_xm.py: el cubo que escribe el ETL devuelve lo mismo  ║
+║  que SQLite, sin copiar datos, y deja de usarse cuando la    ║
+║  serie cambia en la BD                                       ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from base_bd import BaseBDTest  # Antes de db_manager: BD temporal
+import numpy as np
+from utils import db_manager, _xm
+
+COLUMNAS = ['fecha', 'metrica', 'entidad', 'recurso', 'valor_gwh', 'unidad']
+
+
+class TestCuboReciente(BaseBDTest):
+    """Cubo NumPy de las ventanas recientes"""
+
+    def setUp(self):
+        super().setUp()
+        self.revalidar_original = _xm.CUBO_REVALIDAR
+        filas = [(f'2025-01-{dia:02d}', 'Gene', 'Recurso', recurso, dia + i / 10, 'GWh')
+                 for dia in range(1, 11) for i, recurso in enumerate(('TBST', 'GVIO', 'ALBG'))
+                 if not (recurso == 'ALBG' and dia % 3 == 0)]  # huecos: NaN en el cubo
+        filas += [(f'2025-01-{dia:02d}', 'Gene', 'Sistema', '_SISTEMA_', 100.0 + dia, 'GWh') for dia in range(1, 11)]
+        filas += [(f'2025-01-{dia:02d}', 'Gene', 'Agente', recurso, 5.0, 'GWh')
+                  for dia in range(1, 11) for recurso in (None, 'EPMC')]  # recurso NULL
+        db_manager.upsert_metrics_bulk(filas)
+        self.assertEqual(_xm.escribir_cubo_reciente(('Gene',), dias=10, fecha_fin='2025-01-10'), 6)
+
+    def tearDown(self):
+        _xm.CUBO_REVALIDAR = self.revalidar_original
+        _xm._cubo.clear()
+        super().tearDown()
+
+    def test_igual_a_sqlite_sin_copia(self):
+        """Las ventanas del cubo son vistas del mmap con los mismos datos que get_metric_data"""
+        for entidad, recurso in (('Recurso', None), ('Recurso', 'GVIO'), ('Agente', None)):
+            esperado = db_manager.get_metric_data('Gene', entidad, '2025-01-02', '2025-01-09', recurso=recurso)
+            df = _xm._metric_data_desde_cubo('Gene', entidad, '2025-01-02', '2025-01-09', recurso)
+            self.assertEqual(df[COLUMNAS].values.tolist(), esperado[COLUMNAS].values.tolist())
+        self.assertIsNone(df['recurso'].iloc[0])
+
+        valores, recursos, fechas = _xm.obtener_ventana_reciente('Gene', 'Sistema', '2025-01-01', '2025-01-10')
+        self.assertIsInstance(valores.base, np.memmap)
+        self.assertFalse(valores.flags.writeable)
+        self.assertEqual(recursos.tolist(), ['_SISTEMA_'])
+        self.assertEqual(str(fechas[-1]), '2025-01-10')
+        self.assertEqual(np.nansum(valores), sum(100.0 + d for d in range(1, 11)))
+
+    def test_fuera_del_cubo_o_desactualizado(self):
+        """Rangos, series o recursos fuera del cubo y series modificadas van a SQLite (None)"""
+        self.assertIsNone(_xm.obtener_ventana_reciente('Gene', 'Recurso', '2024-12-31', '2025-01-05'))
+        self.assertIsNone(_xm.obtener_ventana_reciente('Gene', 'Recurso', '2025-01-05', '2025-01-11'))
+        self.assertIsNone(_xm.obtener_ventana_reciente('DemaCome', 'Sistema', '2025-01-01', '2025-01-05'))
+        self.assertIsNone(_xm.obtener_ventana_reciente('Gene', 'Recurso', '2025-01-01', '2025-01-05', 'XXXX'))
+
+        _xm.CUBO_REVALIDAR = 0
+        db_manager.upsert_metrics_bulk([('2025-01-05', 'Gene', 'Recurso', 'TBST', 0.0, 'GWh')])
+        self.assertIsNone(_xm.obtener_ventana_reciente('Gene', 'Recurso', '2025-01-01', '2025-01-05'))
+        self.assertIsNotNone(_xm.obtener_ventana_reciente('Gene', 'Sistema', '2025-01-01', '2025-01-05'))
+
+        # El siguiente cubo que publica el ETL se abre sin reiniciar el worker
+        _xm.escribir_cubo_reciente(('Gene',), dias=10, fecha_fin='2025-01-10')
+        df = _xm._metric_data_desde_cubo('Gene', 'Recurso', '2025-01-05', '2025-01-05', 'TBST')
+        self.assertEqual(df['valor_gwh'].tolist(), [0.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
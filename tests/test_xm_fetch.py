@@ -0,0 +1,125 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║         TESTS UNITARIOS - CONSULTAS CONCURRENTES A XM        ║
+║                                                              ║
+║  utils/utils_xm.py: limitador de tasa, pool de chunks con    ║
+║  reintentos y fetch_gene_recurso_chunked en paralelo         ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import pandas as pd
+from utils import cache_manager, utils_xm
+
+
+class APIGeneFalsa:
+    """request_data Gene/Recurso: 24 horas de 1000 kWh por código y día; falla la primera vez que ve cada lote"""
+
+    def __init__(self):
+        self.llamadas = []
+        self.vistos = set()
+        self._lock = threading.Lock()
+
+    def request_data(self, metric, entity, start, end, codigos):
+        with self._lock:
+            self.llamadas.append((start, end, tuple(codigos)))
+            primera = (start, tuple(codigos)) not in self.vistos
+            self.vistos.add((start, tuple(codigos)))
+        if primera:
+            raise ConnectionError("503")
+        filas = [(f, c) for f in pd.date_range(start, end).strftime('%Y-%m-%d') for c in codigos]
+        df = pd.DataFrame(filas, columns=['Date', 'Values_code'])
+        for h in range(1, 25):
+            df[f'Values_Hour{h:02d}'] = 1000.0
+        return df
+
+
+class TestFetchConcurrente(unittest.TestCase):
+    """Pool acotado + token bucket + reintentos"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.ruta_original = cache_manager.CACHE_PATH
+        cache_manager.CACHE_PATH = Path(self.tmpdir.name) / 'xm_cache.db'
+
+    def tearDown(self):
+        cache_manager.CACHE_PATH = self.ruta_original
+        self.tmpdir.cleanup()
+
+    def test_limitador_tasa(self):
+        """Tras la ráfaga inicial las llamadas salen a la tasa configurada"""
+        limitador = utils_xm.LimitadorTasa(tasa=50, rafaga=2)
+        t0 = time.monotonic()
+        for _ in range(7):
+            limitador.tomar()
+        self.assertGreaterEqual(time.monotonic() - t0, 5 / 50 * 0.9)
+
+    def test_gene_recurso_en_paralelo_con_reintentos(self):
+        """Todos los chunks (fechas × lotes) llegan, reintentados, ordenados y en GWh"""
+        api = APIGeneFalsa()
+        codigos = [f'P{i:02d}' for i in range(7)]
+        limitador_original = utils_xm.LIMITADOR_XM
+        utils_xm.LIMITADOR_XM = utils_xm.LimitadorTasa(tasa=1000, rafaga=10)
+        try:
+            df = utils_xm.fetch_gene_recurso_chunked(api, date(2015, 1, 1), date(2015, 12, 31), codigos,
+                                                     backoff_sec=0.01)
+        finally:
+            utils_xm.LIMITADOR_XM = limitador_original
+
+        # 365 días → chunks de 180 días (3) × lotes de 40 códigos (1), cada uno fallido una vez
+        self.assertEqual(len(api.llamadas), 6)
+        self.assertEqual(len(df), 365 * 7)
+        self.assertEqual(df[['Fecha', 'Codigo']].values.tolist()[:2], [[date(2015, 1, 1), 'P00'], [date(2015, 1, 1), 'P01']])
+        self.assertAlmostEqual(df['Generacion_GWh'].iloc[0], 0.024)
+
+        # Segunda llamada: resultado completo desde la caché
+        utils_xm.fetch_gene_recurso_chunked(api, date(2015, 1, 1), date(2015, 12, 31), codigos)
+        self.assertEqual(len(api.llamadas), 6)
+
+    def test_chunk_agotado(self):
+        """Un chunk que falla siempre se entrega como None sin detener los demás"""
+        def consultar(tarea):
+            if tarea == 2:
+                raise TimeoutError("timeout")
+            return pd.DataFrame({'x': [tarea]})
+
+        limitador = utils_xm.LimitadorTasa(tasa=1000, rafaga=10)
+        resultados = dict(utils_xm.fetch_chunks_concurrente(consultar, [1, 2, 3], limitador=limitador,
+                                                             retries=1, backoff_sec=0.01))
+        self.assertIsNone(resultados[2])
+        self.assertEqual(resultados[3]['x'].tolist(), [3])
+
+    def test_memoria_acotada(self):
+        """Con un consumidor lento, como máximo en_vuelo chunks están descargados sin entregar"""
+        lock = threading.Lock()
+        estado = {'sin_entregar': 0, 'maximo': 0}
+
+        def consultar(tarea):
+            with lock:
+                estado['sin_entregar'] += 1
+                estado['maximo'] = max(estado['maximo'], estado['sin_entregar'])
+            return pd.DataFrame({'x': [tarea]})
+
+        limitador = utils_xm.LimitadorTasa(tasa=1000, rafaga=10)
+        entregadas = []
+        for tarea, df in utils_xm.fetch_chunks_concurrente(consultar, list(range(20)), max_workers=2,
+                                                            limitador=limitador, en_vuelo=3):
+            time.sleep(0.01)  # guardar en SQLite
+            with lock:
+                estado['sin_entregar'] -= 1
+            entregadas.append(tarea)
+        self.assertEqual(sorted(entregadas), list(range(20)))
+        self.assertLessEqual(estado['maximo'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+"""
+╔══════════════════════════════════════════════════════════════╗
+║          TESTS UNITARIOS - RELLENO DE HUECOS DE SQLITE       ║
+║                                                              ║
+║  utils/_xm.obtener_datos_inteligente: solo los días que      ║
+║  faltan en SQLite van a la API XM, se convierten como en el  ║
+║  ETL y quedan guardados para la siguiente consulta           ║
+╚══════════════════════════════════════════════════════════════╝
+"""
+
+import unittest
+import sys
+import os
+from pathlib import Path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from base_bd import BaseBDTest  # Antes de db_manager: BD temporal
+import pandas as pd
+from utils import db_manager, cache_manager, _xm
+from etl.transformaciones import HORAS_API, filas_sqlite, filas_horarias, valor_diario
+
+
+class APIGeneSistema:
+    """request_data Gene/Sistema: 24 horas de 1000 kWh por día (0.024 GWh)"""
+
+    def __init__(self):
+        self.rangos = []
+
+    def request_data(self, metric, entity, start, end):
+        self.rangos.append((start, end))
+        fechas = pd.date_range(start, end, freq='D').strftime('%Y-%m-%d')
+        df = pd.DataFrame({'Id': 'Sistema', 'Date': fechas})
+        for hora in HORAS_API:
+            df[hora] = 1000.0
+        return df
+
+
+class TestRellenoHuecos(BaseBDTest):
+    """Read-through SQLite → API XM"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache_original = cache_manager.CACHE_PATH
+        self.api_original = _xm._objetoAPI
+        cache_manager.CACHE_PATH = Path(self.tmpdir.name) / 'xm_cache.db'
+        _xm._objetoAPI = self.api = APIGeneSistema()
+        db_manager.upsert_metrics_bulk([(f'2015-01-{dia:02d}', 'Gene', 'Sistema', '_SISTEMA_', 200.0, 'GWh')
+                                        for dia in range(5, 11)])
+
+    def tearDown(self):
+        _xm._objetoAPI = self.api_original
+        cache_manager.CACHE_PATH = self.cache_original
+        super().tearDown()
+
+    def test_solo_dias_faltantes(self):
+        """Los días fuera de SQLite se piden una vez, se convierten a GWh y se guardan"""
+        df, aviso = _xm.obtener_datos_inteligente('Gene', 'Sistema', '2015-01-01', '2015-01-15')
+        self.assertEqual(self.api.rangos, [('2015-01-01', '2015-01-04'), ('2015-01-11', '2015-01-15')])
+        self.assertIn('9 días', aviso)
+        self.assertEqual(pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d').tolist(),
+                         pd.date_range('2015-01-01', '2015-01-15').strftime('%Y-%m-%d').tolist())
+        self.assertEqual(df['Value'].round(3).tolist(), [0.024] * 4 + [200.0] * 6 + [0.024] * 5)
+
+        guardado = db_manager.get_metric_data('Gene', 'Sistema', '2015-01-01', '2015-01-15', recurso='_SISTEMA_')
+        self.assertEqual(len(guardado), 15)
+
+        # Segunda consulta: todo en SQLite, sin API ni advertencia
+        self.api.rangos.clear()
+        df, aviso = _xm.obtener_datos_inteligente('Gene', 'Sistema', '2015-01-01', '2015-01-15')
+        self.assertEqual(self.api.rangos, [])
+        self.assertIsNone(aviso)
+        self.assertEqual(len(df), 15)
+
+    def test_snapshot_publicado_no_guarda(self):
+        """Con la BD publicada por snapshots los días de la API se devuelven sin escribirlos"""
+        with db_manager.carga_en_snapshot():
+            pass
+        self.assertTrue(db_manager.publicada_por_snapshots())
+        df, aviso = _xm.obtener_datos_inteligente('Gene', 'Sistema', '2015-01-01', '2015-01-15')
+        self.assertEqual(len(df), 15)
+        self.assertIn('9 días', aviso)
+        guardado = db_manager.get_metric_data('Gene', 'Sistema', '2015-01-01', '2015-01-15', recurso='_SISTEMA_')
+        self.assertEqual(len(guardado), 6)
+
+    def test_sin_guardar_por_configuracion(self):
+        """PORTAL_RELLENO_GUARDAR=0 (RELLENO_GUARDAR) desactiva la escritura"""
+        guardar = _xm.RELLENO_GUARDAR
+        _xm.RELLENO_GUARDAR = False
+        try:
+            df, _ = _xm.obtener_datos_inteligente('Gene', 'Sistema', '2015-01-01', '2015-01-15')
+        finally:
+            _xm.RELLENO_GUARDAR = guardar
+        self.assertEqual(len(df), 15)
+        self.assertEqual(db_manager.get_ultima_fecha('Gene', 'Sistema'), '2015-01-10')
+
+    def test_bulk_completa_series_parciales(self):
+        """obtener_datos_inteligente_bulk manda al relleno las series con días faltantes"""
+        datos = _xm.obtener_datos_inteligente_bulk([('Gene', 'Sistema')], '2015-01-03', '2015-01-10')
+        df, _ = datos[('Gene', 'Sistema')]
+        self.assertEqual(len(df), 8)
+        self.assertEqual(self.api.rangos, [('2015-01-03', '2015-01-04')])
+
+    def test_transformacion_como_etl(self):
+        """Conversión y normalización de recursos de etl/transformaciones.py"""
+        df = pd.DataFrame({'Date': ['2015-01-01', '2015-01-02'], 'Name': ['Peñol ', 'OTRO'],
+                           'Value': [5e6, 1e6]})
+        filas = filas_sqlite(valor_diario(df, 'VoluUtilDiarEner', 'kWh_a_GWh'), 'VoluUtilDiarEner', 'Embalse',
+                             {'PEÑOL': 'PENOL'})
+        self.assertEqual(filas, [('2015-01-01', 'VoluUtilDiarEner', 'Embalse', 'PENOL', 5.0, 'GWh'),
+                                 ('2015-01-02', 'VoluUtilDiarEner', 'Embalse', 'OTRO', 1.0, 'GWh')])
+
+        demanda = pd.DataFrame({'Date': ['2015-01-01', '2015-01-02'], 'Id': ['Sistema', 'Sistema']})
+        for hora in HORAS_API:
+            demanda[hora] = [1e6, 1e5]  # 24 GWh y 2.4 GWh (rechazado, < 10 GWh)
+        filas = filas_sqlite(valor_diario(demanda, 'DemaCome', 'horas_a_diario'), 'DemaCome', 'Sistema')
+        self.assertEqual(filas, [('2015-01-01', 'DemaCome', 'Sistema', '_SISTEMA_', 24.0, 'GWh')])
+
+    def test_transformacion_vectorizada(self):
+        """Match parcial de embalses (ETL) y horas Values_Hour01-24 → tuplas por día en MWh"""
+        df = pd.DataFrame({'Date': ['2015-01-01'] * 3, 'Name': ['PEÑOL', 'GUATAPE', 'NADA'],
+                           'Value': [1.0, 2.0, 3.0]})
+        codigos = {'PEÑOL': 'PENOL', 'GUATAPE PEÑOL': 'GUAT'}
+        filas = filas_sqlite(df, 'VoluUtilDiarEner', 'Embalse', codigos, coincidencia_parcial=True)
+        self.assertEqual([fila[3] for fila in filas], ['PENOL', 'GUAT', 'NADA'])
+        filas = filas_sqlite(df, 'VoluUtilDiarEner', 'Embalse', codigos)
+        self.assertEqual([fila[3] for fila in filas], ['PENOL', 'GUATAPE', 'NADA'])
+
+        horario = pd.DataFrame({'Date': ['2015-01-01', '2015-01-02'], 'Values_code': ['AG1', 'AG2']})
+        for hora in HORAS_API:
+            horario[hora] = [2000.0, 0.0]
+        horario.loc[0, 'Values_Hour05'] = None
+        filas = filas_horarias(horario, 'DemaCome', 'Agente')
+        self.assertEqual(len(filas), 1)  # AG2 sin ninguna hora válida
+        fecha, metrica, entidad, recurso, valores = filas[0]
+        self.assertEqual((fecha, metrica, entidad, recurso), ('2015-01-01', 'DemaCome', 'Agente', 'AG1'))
+        self.assertEqual(int(pd.isna(valores).sum()), 1)
+        self.assertEqual(float(pd.Series(valores).sum()), 46.0)
+        self.assertEqual(filas_horarias(df, 'VoluUtilDiarEner', 'Embalse'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
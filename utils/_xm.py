@@ -1,13 +1,24 @@
 """Helper ligero para inicializar la conexión a pydataxm de forma perezosa (lazy).
 
-IMPORTANTE: Sistema de caché ELIMINADO - Ahora usamos ETL-SQLite para datos históricos.
-La función fetch_metric_data() consulta directamente la API XM cuando es necesario.
+Los datos históricos se leen de SQLite (ETL). fetch_metric_data() consulta la API XM
+cuando es necesario, con una caché en disco por día (utils/cache_manager.py).
+
+Las ventanas recientes de las métricas más consultadas se sirven desde un cubo NumPy
+que escribe el ETL y que los workers comparten por mmap (ver obtener_ventana_reciente).
 """
 from typing import Optional
+import os
+import json
+import time
 import logging
+import threading
 from datetime import date, datetime, timedelta
+from pathlib import Path
+import numpy as np
 import pandas as pd
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.decorators import single_flight
 
 try:
     from pydataxm.pydataxm import ReadDB
@@ -40,9 +51,118 @@ def get_objetoAPI():
     return _objetoAPI
 
 
+def _consultar_api(metric: str, entity: str, start_date, end_date):
+    """
+    Una consulta a la API XM por el cliente compartido (plazo de 30 s).
+    DataFrame (vacío si la API respondió sin datos) o None si la consulta falló.
+    """
+    from utils.xm_client import get_xm_client
+    from utils.exceptions import APIError
+    logger = logging.getLogger('xm_helper')
+    try:
+        logger.info(f'🔍 API XM: {metric}/{entity} {start_date} a {end_date}')
+        data = get_xm_client().request_data(metric, entity, start_date, end_date)
+        
+        if data is not None and not data.empty:
+            logger.info(f'✅ API XM: {len(data)} registros')
+            return data
+        else:
+            logger.warning(f'⚠️ API XM: Sin datos')
+            return pd.DataFrame()
+            
+    except APIError as e:
+        logger.error(f'❌ {metric}/{entity}: {e}')
+        return None
+
+
+def _respuesta_por_dia(data: pd.DataFrame, inicio: date, fin: date) -> dict:
+    """{dia: filas de ese día} de una respuesta de la API (columna Date)"""
+    if data is None or data.empty or 'Date' not in data.columns:
+        return {}
+    dias = pd.to_datetime(data['Date'], errors='coerce').dt.date
+    return {dia: grupo for dia, grupo in data.groupby(dias, sort=True) if inicio <= dia <= fin}
+
+
+def _huecos(dias: list, presentes) -> list:
+    """Sub-rangos contiguos (ini, fin) de `dias` que no están en `presentes`"""
+    huecos = []
+    for dia in dias:
+        if dia in presentes:
+            continue
+        if huecos and huecos[-1][1] == dia - timedelta(days=1):
+            huecos[-1][1] = dia
+        else:
+            huecos.append([dia, dia])
+    return [tuple(h) for h in huecos]
+
+
+def _descargar_rango(metric: str, entity: str, inicio: date, fin: date) -> dict:
+    """
+    Consulta un rango a la API y guarda cada día en la caché; {dia: DataFrame}.
+    Los días que la API respondió sin filas van a la caché negativa (no los errores).
+    Si otro worker está consultando el mismo rango, lo espera y usa lo que guardó.
+    """
+    from utils import cache_manager
+    from utils.decorators import contar_single_flight
+    objetoAPI = get_objetoAPI()
+    if objetoAPI is None:
+        return {}
+    
+    with cache_manager.bloqueo_entre_procesos(f"{metric}|{entity}|{inicio}|{fin}") as espero:
+        if espero:
+            cacheados = cache_manager.get_cached_days(metric, entity, inicio, fin)
+            vacios = cache_manager.get_empty_days(metric, entity, inicio, fin)
+            if (len(cacheados.keys() | vacios) == (fin - inicio).days + 1
+                    and all(v for _, v in cacheados.values())):
+                contar_single_flight('fetch_metric_data', 'coalescidas_procesos')
+                logging.getLogger('xm_helper').info(f'🔗 API XM: {metric}/{entity} {inicio} a {fin} '
+                                                    f'consultado por otro worker')
+                return {dia: df for dia, (df, _) in cacheados.items()}
+        
+        data = _consultar_api(metric, entity, inicio.isoformat(), fin.isoformat())
+        por_dia = _respuesta_por_dia(data, inicio, fin)
+        cache_manager.save_days(metric, entity, por_dia)
+        if data is not None:
+            dias = (inicio + timedelta(days=d) for d in range((fin - inicio).days + 1))
+            cache_manager.save_empty_days(metric, entity, [dia for dia in dias if dia not in por_dia])
+    return por_dia
+
+
+_refresco_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='xm-refresco')
+_refrescando = set()
+_refrescando_lock = threading.Lock()
+
+
+def _refrescar_en_segundo_plano(metric: str, entity: str, inicio: date, fin: date):
+    """Stale-while-revalidate: vuelve a pedir un rango vencido sin bloquear al callback"""
+    clave = (metric, entity, inicio, fin)
+    with _refrescando_lock:
+        if clave in _refrescando:
+            return
+        _refrescando.add(clave)
+    
+    def _tarea():
+        try:
+            _descargar_rango(metric, entity, inicio, fin)
+        finally:
+            with _refrescando_lock:
+                _refrescando.discard(clave)
+    
+    _refresco_executor.submit(_tarea)
+
+
+@single_flight
 def fetch_metric_data(metric: str, entity: str, start_date, end_date):
     """
-    Consultar datos directamente desde API XM (sin caché).
+    Consultar datos desde la API XM con caché en disco por día (utils/cache_manager).
+    
+    El rango se divide en días ya guardados y huecos; solo los huecos se piden a la API
+    y el resultado es la unión de ambos. Los días históricos no vencen; los recientes
+    vencidos se devuelven igual y se refrescan en segundo plano. Los días que la API ya
+    respondió vacíos (caché negativa) no se vuelven a pedir mientras estén vigentes.
+    
+    Llamadas idénticas concurrentes comparten una sola ejecución (@single_flight) y un
+    rango que otro worker ya está pidiendo a la API no se vuelve a pedir.
     
     Args:
         metric: Métrica (ej: 'PrecBolsNaci', 'Gene')
@@ -53,61 +173,61 @@ def fetch_metric_data(metric: str, entity: str, start_date, end_date):
     Returns:
         DataFrame o None
     """
+    from utils import cache_manager
     logger = logging.getLogger('xm_helper')
-    objetoAPI = get_objetoAPI()
     
-    if objetoAPI is None:
+    inicio, fin = _a_date(start_date), _a_date(end_date)
+    dias = [inicio + timedelta(days=d) for d in range((fin - inicio).days + 1)]
+    
+    cacheados = cache_manager.get_cached_days(metric, entity, inicio, fin)
+    vacios = cache_manager.get_empty_days(metric, entity, inicio, fin) - cacheados.keys()
+    huecos = _huecos(dias, cacheados.keys() | vacios)
+    vencidos = {dia for dia, (_, vigente) in cacheados.items() if not vigente}
+    if cacheados:
+        logger.info(f'💾 Caché XM {metric}/{entity}: {len(cacheados)}/{len(dias)} días, {len(huecos)} huecos')
+    if vacios:
+        logger.info(f'🚫 Caché XM {metric}/{entity}: {len(vacios)} días sin datos en XM (caché negativa)')
+    
+    partes = {dia: df for dia, (df, _) in cacheados.items()}
+    if huecos and get_objetoAPI() is None:
         logger.warning(f'❌ API XM no disponible para {metric}/{entity}')
-        return None
+    else:
+        for ini, fin_hueco in huecos:
+            partes.update(_descargar_rango(metric, entity, ini, fin_hueco))
+        for ini, fin_hueco in _huecos(dias, set(dias) - vencidos):
+            _refrescar_en_segundo_plano(metric, entity, ini, fin_hueco)
     
-    try:
-        logger.info(f'🔍 API XM: {metric}/{entity} {start_date} a {end_date}')
-        
-        def _fetch():
-            return objetoAPI.request_data(metric, entity, start_date, end_date)
-        
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(_fetch)
-            data = future.result(timeout=30)
-        
-        if data is not None and not data.empty:
-            logger.info(f'✅ API XM: {len(data)} registros')
-            return data
-        else:
-            logger.warning(f'⚠️ API XM: Sin datos')
-            return None
-            
-    except FutureTimeoutError:
-        logger.error(f'⏱️ Timeout (30s) {metric}/{entity}')
-        return None
-    except Exception as e:
-        logger.exception(f'❌ Error: {e}')
+    if not partes:
         return None
+    return pd.concat([partes[dia] for dia in sorted(partes)], ignore_index=True)
 
 
 def obtener_datos_desde_sqlite(metric: str, entity: str, fecha_fin, dias_busqueda: int = 7, recurso: str = None):
     """
-    Consultar datos desde SQLite con fallback automático hacia atrás.
+    Consultar datos desde SQLite con fallback automático hacia atrás: el último día con
+    datos en los `dias_busqueda` días hasta fecha_fin, resuelto con el índice de cobertura
+    (db_manager.get_ultima_fecha) y leído con una sola consulta.
     """
     from utils import db_manager
     logger = logging.getLogger('xm_helper')
     
-    if isinstance(fecha_fin, str):
-        fecha_fin = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-    elif isinstance(fecha_fin, datetime):
-        fecha_fin = fecha_fin.date()
+    fecha_fin = _a_date(fecha_fin)
     
-    for dias_atras in range(dias_busqueda):
+    ultima = db_manager.get_ultima_fecha(metric, entity, hasta=fecha_fin, recurso=recurso)
+    dias_atras = (fecha_fin - _a_date(ultima)).days if ultima else dias_busqueda
+    if dias_atras < dias_busqueda:
         fecha_inicio = fecha_fin - timedelta(days=dias_atras)
         fecha_str = fecha_inicio.strftime('%Y-%m-%d')
         
-        df = db_manager.get_metric_data(
-            metrica=metric,
-            entidad=entity,
-            fecha_inicio=fecha_str,
-            fecha_fin=fecha_str,
-            recurso=recurso
-        )
+        df = _metric_data_desde_cubo(metric, entity, fecha_str, fecha_str, recurso)
+        if df is None:
+            df = db_manager.get_metric_data(
+                metrica=metric,
+                entidad=entity,
+                fecha_inicio=fecha_str,
+                fecha_fin=fecha_str,
+                recurso=recurso
+            )
         
         if df is not None and not df.empty:
             if dias_atras > 0:
@@ -132,13 +252,126 @@ def obtener_datos_desde_sqlite(metric: str, entity: str, fecha_fin, dias_busqued
     
     logger.warning(f"❌ [SQLite] Sin datos {metric}/{entity} últimos {dias_busqueda}d")
     return None, None
+
+
+def _columnas_compatibles(df: pd.DataFrame, entity: str, nombres: Optional[pd.Series] = None) -> pd.DataFrame:
+    """
+    Renombra un DataFrame de db_manager (fecha, recurso, valor_gwh, ...) a las columnas
+    de la API XM que usan las páginas (Date, Name, Value, Values_Code y alias por entidad).
+
+    Args:
+        df: DataFrame de get_metric_data / get_metrics_bulk
+        entity: Entidad XM de la serie
+        nombres: Nombre de catálogo de cada recurso (si None, Name = código)
+    """
+    # SQLite: fecha, metrica, entidad, recurso, valor_gwh, unidad
+    # API XM: Date, Name, Value, Id
+    df = df.rename(columns={'valor_gwh': 'Value', 'fecha': 'Date'})
+    
+    if 'recurso' in df.columns:
+        df['Name'] = nombres if nombres is not None else df['recurso']
+        
+        # Crear columna Values_Code con el código (para filtrado por agente/recurso)
+        df['Values_Code'] = df['recurso']
+        df['Values_code'] = df['recurso']  # Alias lowercase
+        
+        # Crear alias según entidad (para compatibilidad legacy)
+        if entity == 'Embalse':
+            df['Embalse'] = df['Name']
+        elif entity == 'Rio':
+            df['Rio'] = df['Name']
+        elif entity == 'Recurso':
+            df['Resources'] = df['Name']
+        elif entity == 'Agente':
+            df['Agente'] = df['Name']
+    
+    return df
+
+
+# Guardar en SQLite los días que trae el relleno de huecos (PORTAL_RELLENO_GUARDAR=0 lo
+# desactiva). Con la BD publicada por snapshots nunca se guardan: se perderían al publicar
+# y cada commit en modo DELETE bloquearía a los lectores de todos los workers
+RELLENO_GUARDAR = os.getenv('PORTAL_RELLENO_GUARDAR', '1') != '0'
+
+
+def _rellenar_huecos(df: Optional[pd.DataFrame], metric: str, entity: str, recurso: Optional[str],
+                     conversion: Optional[str], inicio: date, fin: date):
+    """
+    Read-through de SQLite: pide a la API XM solo los días del rango que no están en SQLite,
+    los convierte como el ETL (etl/transformaciones.py), los guarda con upsert_metrics_bulk
+    y los une a lo leído. Una consulta repetida ya no vuelve a la API; los años
+    particionados (solo lectura) no se escriben, pero sus días quedan en la caché XM.
+    Sin RELLENO_GUARDAR o con la BD publicada por snapshots los días solo se devuelven en
+    memoria (y quedan en la caché XM) hasta que los cargue el ETL.
+    
+    Los días desde hoy no se consideran huecos: XM publica con un día de retraso.
+    
+    Args:
+        df: Lo leído de SQLite (columnas de get_metric_data) o None
+        metric, entity: Serie
+        recurso: Filtro por recurso de la lectura (ej: '_SISTEMA_'), o None
+        conversion: Conversión del ETL para la serie (config_metricas)
+        inicio, fin: Rango pedido
+    
+    Returns:
+        tuple: (DataFrame combinado ordenado por fecha y recurso, días traídos de la API)
+    """
+    from utils import db_manager, catalogos
+    from etl.transformaciones import COLUMNAS_METRICS, valor_diario, filas_sqlite
+    logger = logging.getLogger('xm_helper')
+    
+    ultimo = min(fin, date.today() - timedelta(days=1))
+    if ultimo < inicio:
+        return df, 0
+    # Índice de cobertura: los huecos salen sin recorrer lo leído
+    huecos = [(_a_date(h_ini), _a_date(h_fin))
+              for h_ini, h_fin in db_manager.get_rangos_faltantes(metric, entity, inicio, ultimo, recurso)]
+    if not huecos:
+        return df, 0
+    
+    faltantes = sum((h_fin - h_ini).days + 1 for h_ini, h_fin in huecos)
+    logger.info(f"🧩 [SQLite] {metric}/{entity}: faltan {faltantes}/{(ultimo - inicio).days + 1} días en "
+                f"{len(huecos)} huecos, completando desde API XM")
+    
+    # La API trae los embalses por nombre: búsqueda inversa nombre → código del catálogo
+    codigos_embalse = catalogos.mapa_nombres('ListadoEmbalses') if entity == 'Embalse' else None
+    filas = []
+    for h_ini, h_fin in huecos:
+        crudo = fetch_metric_data(metric, entity, h_ini.isoformat(), h_fin.isoformat())
+        if crudo is not None and not crudo.empty:
+            filas.extend(filas_sqlite(valor_diario(crudo, metric, conversion), metric, entity, codigos_embalse))
+    if not filas:
+        return df, 0
+    
+    if RELLENO_GUARDAR and not db_manager.publicada_por_snapshots():
+        db_manager.upsert_metrics_bulk(filas)
+        db_manager.refresh_rollups_bulk(filas)
+    else:
+        logger.info(f"🧩 [SQLite] {metric}/{entity}: {len(filas)} filas de la API solo en memoria "
+                    f"(BD publicada por snapshots o PORTAL_RELLENO_GUARDAR=0)")
+    
+    nuevas = pd.DataFrame(filas, columns=COLUMNAS_METRICS)
+    if recurso:
+        nuevas = nuevas[nuevas['recurso'] == recurso]
+    partes = [p for p in (df, nuevas) if p is not None and not p.empty]
+    if not partes:
+        return df, 0
+    df = pd.concat(partes, ignore_index=True).sort_values(['fecha', 'recurso'], kind='stable', ignore_index=True)
+    return df, nuevas['fecha'].nunique()
+
+
+@single_flight
 def obtener_datos_inteligente(metric: str, entity: str, fecha_inicio, fecha_fin, recurso: str = None):
     """
-    Consulta inteligente de datos: SQLite (>=2020, rápido) vs API XM (<2020, lento con advertencia).
+    Consulta inteligente de datos: SQLite primero, API XM solo para lo que falta.
     
-    Esta función decide automáticamente la fuente de datos basándose en el rango de fechas:
-    - Si fecha_inicio >= 2020-01-01: Consulta SQLite (rápido, <5s)
-    - Si fecha_inicio < 2020-01-01: Consulta API XM directo (lento, 30-60s, muestra advertencia)
+    Lee el rango completo desde SQLite (o el cubo reciente) y, si la serie la carga el ETL
+    (etl/config_metricas.py), completa desde la API XM los días que faltan y los escribe
+    en SQLite (ver _rellenar_huecos): un gráfico 2015-2024 paga la latencia de la API
+    solo por los días que no están en la BD, y solo la primera vez.
+    
+    Las series que el ETL no carga (o sin nombres de catálogo) se consultan completas
+    a la API XM como antes.
     
     Args:
         metric: Métrica XM (ej: 'Gene', 'AporEner', 'VoluUtilDiarEner')
@@ -151,52 +384,33 @@ def obtener_datos_inteligente(metric: str, entity: str, fecha_inicio, fecha_fin,
         tuple: (DataFrame con datos, str mensaje de advertencia o None)
     
     Ejemplos:
-        # Consulta reciente (>= 2020) - Usa SQLite
+        # Rango cubierto por SQLite: sin API, sin advertencia
         df, warning = obtener_datos_inteligente('Gene', 'Sistema', '2023-01-01', '2024-01-01')
-        # warning = None, consulta rápida
         
-        # Consulta histórica (< 2020) - Usa API XM
-        df, warning = obtener_datos_inteligente('Gene', 'Sistema', '2015-01-01', '2016-01-01')
-        # warning = "⚠️ Consultando datos históricos (antes de 2020) directamente..."
+        # Rango con días fuera de SQLite: solo esos días van a la API (la primera vez)
+        df, warning = obtener_datos_inteligente('Gene', 'Sistema', '2015-01-01', '2024-01-01')
+        # warning = "⚠️ Se completaron 1826 días desde la API XM..."
     """
-    from datetime import datetime, date
-    from utils import db_manager
+    from utils import db_manager, catalogos
+    from etl.transformaciones import config_serie
     
     logger = logging.getLogger('xm_helper')
     
-    # Fecha límite: datos antes del 2020 no están en SQLite
-    FECHA_LIMITE_SQLITE = date(2020, 1, 1)
-    
-    # Convertir fechas a objetos date
-    if isinstance(fecha_inicio, str):
-        fecha_inicio_date = datetime.strptime(fecha_inicio, '%Y-%m-%d').date()
-    elif isinstance(fecha_inicio, datetime):
-        fecha_inicio_date = fecha_inicio.date()
-    else:
-        fecha_inicio_date = fecha_inicio
-    
-    if isinstance(fecha_fin, str):
-        fecha_fin_date = datetime.strptime(fecha_fin, '%Y-%m-%d').date()
-    elif isinstance(fecha_fin, datetime):
-        fecha_fin_date = fecha_fin.date()
-    else:
-        fecha_fin_date = fecha_fin
-    
-    # Convertir a strings para las consultas
+    fecha_inicio_date, fecha_fin_date = _a_date(fecha_inicio), _a_date(fecha_fin)
     fecha_inicio_str = fecha_inicio_date.strftime('%Y-%m-%d')
     fecha_fin_str = fecha_fin_date.strftime('%Y-%m-%d')
     
-    # Decisión: SQLite vs API XM
-    if fecha_inicio_date >= FECHA_LIMITE_SQLITE:
-        # CASO 1: Datos recientes (>= 2020) - Usar SQLite (rápido)
-        logger.info(f"📊 [SQLite] Consultando {metric}/{entity} desde {fecha_inicio_str} hasta {fecha_fin_str}")
-        
-        # Para métricas de nivel Sistema, usar recurso='_SISTEMA_' para evitar duplicados
-        recurso_filtro = recurso
-        if entity == 'Sistema' and recurso is None:
-            recurso_filtro = '_SISTEMA_'
-            logger.info(f"🔍 [Filtro] Aplicando recurso='_SISTEMA_' para evitar datos duplicados")
-        
+    logger.info(f"📊 [SQLite] Consultando {metric}/{entity} desde {fecha_inicio_str} hasta {fecha_fin_str}")
+    
+    # Para métricas de nivel Sistema, usar recurso='_SISTEMA_' para evitar duplicados
+    recurso_filtro = recurso
+    if entity == 'Sistema' and recurso is None:
+        recurso_filtro = '_SISTEMA_'
+        logger.info(f"🔍 [Filtro] Aplicando recurso='_SISTEMA_' para evitar datos duplicados")
+    
+    # Ventanas recientes de las métricas más consultadas: cubo compartido, sin SQL
+    df = _metric_data_desde_cubo(metric, entity, fecha_inicio_str, fecha_fin_str, recurso_filtro)
+    if df is None:
         df = db_manager.get_metric_data(
             metrica=metric,
             entidad=entity,
@@ -204,88 +418,54 @@ def obtener_datos_inteligente(metric: str, entity: str, fecha_inicio, fecha_fin,
             fecha_fin=fecha_fin_str,
             recurso=recurso_filtro
         )
-        
-        if df is not None and not df.empty:
-            # Renombrar columnas para compatibilidad con código existente
-            # SQLite: fecha, metrica, entidad, recurso, valor_gwh, unidad
-            # API XM: Date, Name, Value, Id
-            
-            if 'valor_gwh' in df.columns:
-                df = df.rename(columns={'valor_gwh': 'Value'})
-            
-            if 'fecha' in df.columns:
-                df = df.rename(columns={'fecha': 'Date'})
-            
+    
+    # Días que faltan en SQLite: solo esos van a la API XM y quedan guardados
+    mensaje_advertencia = None
+    config = config_serie(metric, entity)
+    if config is not None:
+        df, dias_api = _rellenar_huecos(df, metric, entity, recurso_filtro, config.get('conversion'),
+                                         fecha_inicio_date, fecha_fin_date)
+        if dias_api:
+            mensaje_advertencia = (
+                f"⚠️ Se completaron {dias_api} días desde la API XM que no estaban en la base de datos. "
+                f"Las próximas consultas de este rango serán inmediatas."
+            )
+    
+    if df is not None and not df.empty:
+        nombres = None
+        if 'recurso' in df.columns:
             # MAPEO DE CÓDIGOS A NOMBRES usando tabla catalogos
-            if 'recurso' in df.columns:
-                # Intentar mapear códigos a nombres desde catálogos
-                catalogo_nombre = None
-                if entity == 'Recurso':
-                    catalogo_nombre = 'ListadoRecursos'
-                elif entity == 'Embalse':
-                    catalogo_nombre = 'ListadoEmbalses'
-                elif entity == 'Rio':
-                    catalogo_nombre = 'ListadoRios'
-                elif entity == 'Agente':
-                    catalogo_nombre = 'ListadoAgentes'
-                
-                if catalogo_nombre:
-                    try:
-                        # Obtener mapeo código → nombre
-                        mapeo = db_manager.get_mapeo_codigos(catalogo_nombre)
-                        if mapeo:
-                            # Aplicar mapeo: si el código existe en catálogo, usar nombre; si no, mantener código
-                            df['Name'] = df['recurso'].apply(lambda x: mapeo.get(str(x).upper(), x) if pd.notna(x) else x)
-                            logger.info(f"✅ [Mapeo] {len(mapeo)} códigos mapeados desde {catalogo_nombre}")
-                        else:
-                            # Sin mapeo, usar código tal cual
-                            df['Name'] = df['recurso']
-                            logger.warning(f"⚠️ [Mapeo] {catalogo_nombre} vacío, usando códigos directamente")
-                    except Exception as e:
-                        logger.warning(f"⚠️ [Mapeo] Error obteniendo {catalogo_nombre}: {e}")
-                        df['Name'] = df['recurso']
-                else:
-                    # Sin catálogo, renombrar directamente
-                    df['Name'] = df['recurso']
-                
-                # Crear columna Values_Code con el código (para filtrado por agente/recurso)
-                if 'recurso' in df.columns:
-                    df['Values_Code'] = df['recurso']
-                    df['Values_code'] = df['recurso']  # Alias lowercase
-                
-                # Crear alias según entidad (para compatibilidad legacy)
-                if entity == 'Embalse' and 'Name' in df.columns:
-                    df['Embalse'] = df['Name']
-                elif entity == 'Rio' and 'Name' in df.columns:
-                    df['Rio'] = df['Name']
-                elif entity == 'Recurso' and 'Name' in df.columns:
-                    df['Resources'] = df['Name']
-                elif entity == 'Agente' and 'Name' in df.columns:
-                    df['Agente'] = df['Name']
-            
-            # VERIFICAR: Si todos los valores de Name son None, usar API como fallback
-            if 'Name' in df.columns and df['Name'].isna().all():
-                logger.warning(f"⚠️ [SQLite] Columna 'Name' vacía, fallback a API XM")
-                # No retornar estos datos vacíos, dejar que consulte API
-                df = None
-            
-            if df is not None:
-                logger.info(f"✅ [SQLite] {len(df)} registros obtenidos con nombres mapeados")
-                return df, None  # Sin advertencia
+            catalogo_nombre = db_manager.CATALOGO_POR_ENTIDAD.get(entity)
+            if catalogo_nombre:
+                try:
+                    # Catálogo en memoria del worker (se relee solo si cambió su versión)
+                    if catalogos.mapa_codigos(catalogo_nombre):
+                        # Si el código existe en catálogo, usar nombre; si no, mantener código
+                        nombres = catalogos.nombres(df['recurso'], catalogo_nombre)
+                    else:
+                        # Sin mapeo, usar código tal cual
+                        logger.warning(f"⚠️ [Mapeo] {catalogo_nombre} vacío, usando códigos directamente")
+                except Exception as e:
+                    logger.warning(f"⚠️ [Mapeo] Error obteniendo {catalogo_nombre}: {e}")
         
-        # Si no hay datos en SQLite o están incompletos, usar API XM
-        logger.info(f"📡 [Fallback] Consultando API XM para {metric}/{entity}")
+        df = _columnas_compatibles(df, entity, nombres)
+        
+        # VERIFICAR: Si todos los valores de Name son None, usar API como fallback
+        if 'Name' in df.columns and df['Name'].isna().all():
+            logger.warning(f"⚠️ [SQLite] Columna 'Name' vacía, fallback a API XM")
+            # No retornar estos datos vacíos, dejar que consulte API
+            df = None
+        
+        if df is not None:
+            logger.info(f"✅ [SQLite] {len(df)} registros obtenidos con nombres mapeados")
+            return df, mensaje_advertencia
+    elif config is not None:
+        # Serie del ETL sin datos ni en SQLite ni en la API para el rango
+        logger.warning(f"⚠️ [API XM] No hay datos para {metric}/{entity} en el rango solicitado")
+        return None, mensaje_advertencia
     
-    # CASO 2: Datos históricos (< 2020) o fallback desde SQLite
-    mensaje_advertencia = None
-    if fecha_inicio_date < FECHA_LIMITE_SQLITE:
-        mensaje_advertencia = (
-            f"⚠️ **Consultando datos históricos** (antes de 2020) directamente desde API XM. "
-            f"Esta operación puede tardar 30-60 segundos..."
-        )
-        logger.warning(f"🐌 [API XM] Consultando datos históricos {metric}/{entity} desde {fecha_inicio_str}")
-    else:
-        logger.info(f"📡 [API XM] Fallback desde SQLite, consultando {metric}/{entity}")
+    # Series que el ETL no carga: rango completo desde la API XM (respuesta cruda)
+    logger.info(f"📡 [API XM] Consultando {metric}/{entity} desde {fecha_inicio_str}")
     
     try:
         df = fetch_metric_data(
@@ -328,3 +508,338 @@ def obtener_datos_inteligente(metric: str, entity: str, fecha_inicio, fecha_fin,
     except Exception as e:
         logger.error(f"❌ [API XM] Error al consultar datos: {e}")
         return None, mensaje_advertencia
+
+
+@single_flight
+def obtener_datos_inteligente_bulk(series: list, fecha_inicio, fecha_fin):
+    """
+    Versión por lotes de obtener_datos_inteligente: lee todas las series desde SQLite
+    en una sola consulta (db_manager.get_metrics_bulk) y aplica los mismos renombres.
+    Las series sin datos en SQLite, o con días que faltan en el rango, siguen el camino
+    normal de obtener_datos_inteligente (relleno de huecos desde la API XM).
+    
+    Args:
+        series: Lista de (metric, entity) o (metric, entity, recurso)
+        fecha_inicio: Fecha inicial del rango (str 'YYYY-MM-DD' o date/datetime object)
+        fecha_fin: Fecha final del rango (str 'YYYY-MM-DD' o date/datetime object)
+    
+    Returns:
+        dict: {(metric, entity): (DataFrame o None, str mensaje de advertencia o None)}
+    
+    Ejemplo:
+        datos = obtener_datos_inteligente_bulk([('PerdidasEner', 'Sistema'), ('Gene', 'Sistema')],
+                                               '2024-01-01', '2024-12-31')
+        perdidas, warning = datos[('PerdidasEner', 'Sistema')]
+    """
+    from utils import db_manager, catalogos
+    from etl.transformaciones import config_serie
+    
+    logger = logging.getLogger('xm_helper')
+    
+    fecha_inicio_str = pd.to_datetime(fecha_inicio).strftime('%Y-%m-%d')
+    fecha_fin_str = pd.to_datetime(fecha_fin).strftime('%Y-%m-%d')
+    
+    resultados = {}
+    pendientes = []
+    
+    # Días que se esperan en SQLite (XM publica con un día de retraso)
+    ultimo = min(_a_date(fecha_fin_str), date.today() - timedelta(days=1))
+    dias_esperados = max((ultimo - _a_date(fecha_inicio_str)).days + 1, 0)
+    
+    # Mismo filtro que obtener_datos_inteligente: nivel Sistema → '_SISTEMA_'
+    especificaciones = []
+    for serie in series:
+        metric, entity = serie[0], serie[1]
+        recurso = serie[2] if len(serie) > 2 else None
+        if entity == 'Sistema' and recurso is None:
+            recurso = '_SISTEMA_'
+        especificaciones.append((metric, entity, recurso))
+    
+    # Ventanas recientes desde el cubo compartido; el resto en una pasada por SQLite
+    datos = {}
+    for metric, entity, recurso in especificaciones:
+        df = _metric_data_desde_cubo(metric, entity, fecha_inicio_str, fecha_fin_str, recurso)
+        if df is not None:
+            catalogo = db_manager.CATALOGO_POR_ENTIDAD.get(entity)
+            df['nombre'] = catalogos.nombres(df['recurso'], catalogo) if catalogo else df['recurso']
+            datos[(metric, entity)] = df
+    especificaciones = [e for e in especificaciones if (e[0], e[1]) not in datos]
+    
+    if especificaciones:
+        logger.info(f"📊 [SQLite] Consultando {len(especificaciones)} series desde {fecha_inicio_str} hasta {fecha_fin_str}")
+        datos.update(db_manager.get_metrics_bulk(especificaciones, fecha_inicio_str, fecha_fin_str, como_dict=True))
+    
+    for serie in series:
+        metric, entity = serie[0], serie[1]
+        df = datos.get((metric, entity))
+        if df is None or df.empty:
+            pendientes.append(serie)
+            continue
+        if df['fecha'].nunique() < dias_esperados and config_serie(metric, entity) is not None:
+            # Faltan días en SQLite: el camino individual los completa desde la API XM
+            pendientes.append(serie)
+            continue
+        nombres = df.pop('nombre') if 'nombre' in df.columns else None
+        df = _columnas_compatibles(df, entity, nombres)
+        if 'Name' in df.columns and df['Name'].isna().all():
+            pendientes.append(serie)
+            continue
+        resultados[(metric, entity)] = (df, None)
+    
+    # Series sin datos o con huecos en SQLite: camino individual (API XM)
+    for serie in pendientes:
+        metric, entity = serie[0], serie[1]
+        recurso = serie[2] if len(serie) > 2 else None
+        resultados[(metric, entity)] = obtener_datos_inteligente(metric, entity, fecha_inicio_str,
+                                                                 fecha_fin_str, recurso=recurso)
+    
+    return resultados
+
+
+# ============================================================================
+# CUBO RECIENTE EN MEMORIA COMPARTIDA (mmap)
+# ============================================================================
+#
+# Los dashboards piden una y otra vez las ventanas de 30/90/365 días de las mismas
+# métricas. Después de cada carga el ETL escribe esos días en una matriz densa
+# (serie × día) en un archivo .npy; cada worker de gunicorn lo abre con mmap de solo
+# lectura, así que las páginas del archivo las comparte el page cache de todos los
+# procesos y una ventana reciente es una vista de la matriz, sin SQL.
+#
+#     cubo/cubo.json                    índice: series, filas, fechas y versiones
+#     cubo/cubo.<marca>.npy             float64 [filas, días], NaN = sin dato
+#
+# Las filas de cada (métrica, entidad) son contiguas y van ordenadas por recurso.
+# Cada serie guarda la versión de datos con la que se construyó: si la BD cambió
+# (get_data_version) la serie deja de servirse desde el cubo hasta el siguiente.
+
+CUBO_DIR = os.getenv('PORTAL_CUBO_DIR')
+CUBO_METRICAS = ('Gene', 'DemaCome', 'AporEner', 'VoluUtilDiarEner', 'PrecBolsNaci')
+CUBO_DIAS = int(os.getenv('PORTAL_CUBO_DIAS', 400))
+# Cada cuánto (s) un worker vuelve a comparar la versión de una serie con la BD
+CUBO_REVALIDAR = float(os.getenv('PORTAL_CUBO_REVALIDAR', 15))
+
+_INDICE_CUBO = 'cubo.json'
+_cubo = {}
+_cubo_lock = threading.Lock()
+
+
+def _dir_cubo() -> Path:
+    """Carpeta del cubo: PORTAL_CUBO_DIR o 'cubo' junto a la BD"""
+    from utils import db_manager
+    return Path(CUBO_DIR) if CUBO_DIR else Path(db_manager.DB_PATH).parent / 'cubo'
+
+
+def escribir_cubo_reciente(metricas=CUBO_METRICAS, dias: int = CUBO_DIAS, fecha_fin=None) -> int:
+    """
+    Escribe el cubo de los últimos `dias` días de `metricas` (todas sus entidades) desde SQLite.
+    Lo llama el ETL al terminar una carga; el índice se reemplaza de forma atómica y los
+    workers abren el cubo nuevo en su siguiente consulta.
+    
+    Args:
+        metricas: Métricas a incluir
+        dias: Días hacia atrás desde fecha_fin
+        fecha_fin: Último día del cubo (hoy por defecto)
+    
+    Returns:
+        Filas (series con recurso) escritas, 0 si hay error
+    """
+    from utils import db_manager
+    logger = logging.getLogger('xm_helper')
+    
+    fin = pd.to_datetime(fecha_fin or date.today()).date()
+    inicio = fin - timedelta(days=dias - 1)
+    carpeta = _dir_cubo()
+    t0 = time.perf_counter()
+    
+    try:
+        bloques, recursos, matrices = {}, [], []
+        stats = db_manager.get_metrics_stats()
+        if stats.empty:
+            logger.warning("⚠️ Cubo reciente: catálogo de estadísticas vacío (ver db_manager.rebuild_stats)")
+            return 0
+        for metrica in metricas:
+            series = stats[(stats['metrica'] == metrica) & (stats['fecha_max'] >= inicio.isoformat())]
+            for entidad in sorted(series['entidad']):
+                # Versión ANTES de leer: una escritura intermedia invalida la serie, no la corrompe
+                version = db_manager.get_data_version(metrica, entidad)
+                df = db_manager.get_metric_data(metrica, entidad, inicio.isoformat(), fin.isoformat())
+                if df.empty:
+                    continue
+                # recurso NULL se guarda como '' (como en metrics_hourly_dia) y se lee de vuelta como None
+                codigos, filas = np.unique(df['recurso'].fillna('').astype(str).to_numpy(), return_inverse=True)
+                columnas = (pd.to_datetime(df['fecha']).dt.date - inicio).map(lambda d: d.days).to_numpy()
+                matriz = np.full((len(codigos), dias), np.nan)
+                matriz[filas, columnas] = df['valor_gwh'].to_numpy(dtype=float)
+                bloques[f"{metrica}|{entidad}"] = {
+                    'filas': [len(recursos), len(recursos) + len(codigos)],
+                    'unidad': df['unidad'].iloc[0],
+                    'version': version,
+                }
+                recursos.extend(codigos.tolist())
+                matrices.append(matriz)
+        
+        carpeta.mkdir(parents=True, exist_ok=True)
+        archivo = f"cubo.{datetime.now():%Y%m%d-%H%M%S-%f}.npy"
+        valores = np.vstack(matrices) if matrices else np.empty((0, dias))
+        np.save(carpeta / archivo, valores)
+        
+        indice = {'archivo': archivo, 'fecha_inicio': inicio.isoformat(), 'fecha_fin': fin.isoformat(),
+                  'series': bloques, 'recursos': recursos}
+        tmp = carpeta / (_INDICE_CUBO + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(indice, f)
+        os.replace(tmp, carpeta / _INDICE_CUBO)
+        
+        # Los workers que aún tienen mapeado un cubo viejo lo siguen leyendo tras el unlink
+        for viejo in carpeta.glob('cubo.*.npy'):
+            if viejo.name != archivo:
+                viejo.unlink(missing_ok=True)
+        
+        logger.info(f"✅ Cubo reciente: {len(bloques)} series, {len(recursos)} filas × {dias} días "
+                    f"({valores.nbytes / 1e6:.1f} MB) en {time.perf_counter() - t0:.1f}s → {carpeta}")
+        return len(recursos)
+    except Exception as e:
+        logger.error(f"❌ Error escribiendo cubo reciente: {e}")
+        return 0
+
+
+def _a_date(fecha) -> date:
+    """str 'YYYY-MM-DD' / date / datetime → date (sin pasar por pandas en el camino caliente)"""
+    if isinstance(fecha, datetime):
+        return fecha.date()
+    if isinstance(fecha, date):
+        return fecha
+    if isinstance(fecha, str):
+        return date.fromisoformat(fecha[:10])
+    return pd.to_datetime(fecha).date()
+
+
+def _cargar_cubo() -> Optional[dict]:
+    """Cubo del proceso (mmap de solo lectura); se reabre si el ETL publicó uno nuevo"""
+    ruta = _dir_cubo() / _INDICE_CUBO
+    try:
+        estado = ruta.stat()
+        marca = (estado.st_ino, estado.st_mtime_ns)
+    except OSError:
+        return None
+    
+    cubo = _cubo.get('actual')
+    if cubo is not None and cubo['ruta'] == ruta and cubo['marca'] == marca:
+        return cubo
+    
+    with _cubo_lock:
+        cubo = _cubo.get('actual')
+        if cubo is not None and cubo['ruta'] == ruta and cubo['marca'] == marca:
+            return cubo
+        try:
+            with open(ruta, 'r', encoding='utf-8') as f:
+                indice = json.load(f)
+            cubo = {
+                'ruta': ruta,
+                'marca': marca,
+                'valores': np.load(ruta.parent / indice['archivo'], mmap_mode='r'),
+                'recursos': np.array(indice['recursos'], dtype=str),
+                'fecha_inicio': date.fromisoformat(indice['fecha_inicio']),
+                'fecha_fin': date.fromisoformat(indice['fecha_fin']),
+                'series': indice['series'],
+                'validado': {},
+            }
+        except (OSError, ValueError, KeyError) as e:
+            logging.getLogger('xm_helper').warning(f"⚠️ Cubo reciente no disponible: {e}")
+            return None
+        _cubo['actual'] = cubo
+        return cubo
+
+
+def _serie_vigente(cubo: dict, clave: str) -> bool:
+    """La versión de la serie en la BD sigue siendo la del cubo (comprobado cada CUBO_REVALIDAR s)"""
+    from utils import db_manager
+    ahora = time.monotonic()
+    if ahora - cubo['validado'].get(clave, float('-inf')) < CUBO_REVALIDAR:
+        return True
+    metrica, entidad = clave.split('|', 1)
+    if db_manager.get_data_version(metrica, entidad) != cubo['series'][clave]['version']:
+        return False
+    cubo['validado'][clave] = ahora
+    return True
+
+
+def obtener_ventana_reciente(metric: str, entity: str, fecha_inicio, fecha_fin, recurso: str = None):
+    """
+    Ventana reciente de una serie desde el cubo en memoria compartida, sin copiar datos.
+    
+    Args:
+        metric: Métrica XM (ej: 'Gene')
+        entity: Entidad (ej: 'Recurso', 'Sistema')
+        fecha_inicio, fecha_fin: Rango (str 'YYYY-MM-DD' o date/datetime)
+        recurso: Un solo recurso (ej: '_SISTEMA_'); None = todos
+    
+    Returns:
+        tuple (valores, recursos, fechas) o None si el cubo no cubre la consulta:
+            valores: vista float64 [recurso, día] del mmap (solo lectura, NaN = sin dato)
+            recursos: códigos de las filas (ordenados; '' = recurso NULL)
+            fechas: datetime64[D] de las columnas
+    
+    Ejemplo:
+        ventana = obtener_ventana_reciente('Gene', 'Sistema', '2025-01-01', '2025-01-30', '_SISTEMA_')
+        if ventana is not None:
+            valores, recursos, fechas = ventana
+            total = np.nansum(valores)
+    """
+    cubo = _cargar_cubo()
+    if cubo is None:
+        return None
+    return _ventana_cubo(cubo, metric, entity, fecha_inicio, fecha_fin, recurso)
+
+
+def _ventana_cubo(cubo: dict, metric: str, entity: str, fecha_inicio, fecha_fin, recurso: str = None):
+    """obtener_ventana_reciente sobre un cubo ya abierto"""
+    clave = f"{metric}|{entity}"
+    inicio, fin = _a_date(fecha_inicio), _a_date(fecha_fin)
+    if clave not in cubo['series'] or inicio < cubo['fecha_inicio'] or fin > cubo['fecha_fin'] or inicio > fin:
+        return None
+    if not _serie_vigente(cubo, clave):
+        return None
+    
+    primera, ultima = cubo['series'][clave]['filas']
+    if recurso is not None:
+        codigos = cubo['recursos'][primera:ultima]
+        pos = int(np.searchsorted(codigos, recurso))
+        if pos == len(codigos) or codigos[pos] != recurso:
+            return None
+        primera, ultima = primera + pos, primera + pos + 1
+    
+    d0 = (inicio - cubo['fecha_inicio']).days
+    d1 = (fin - cubo['fecha_inicio']).days + 1
+    fechas = np.datetime64(cubo['fecha_inicio'].isoformat(), 'D') + np.arange(d0, d1)
+    return cubo['valores'][primera:ultima, d0:d1], cubo['recursos'][primera:ultima], fechas
+
+
+def _metric_data_desde_cubo(metric: str, entity: str, fecha_inicio, fecha_fin, recurso: str = None):
+    """
+    Mismo DataFrame que db_manager.get_metric_data (fecha, metrica, entidad, recurso,
+    valor_gwh, unidad; ordenado por fecha y recurso) armado desde el cubo, o None
+    si el cubo no cubre la consulta o la ventana no tiene datos.
+    """
+    cubo = _cargar_cubo()
+    ventana = _ventana_cubo(cubo, metric, entity, fecha_inicio, fecha_fin, recurso) if cubo else None
+    if ventana is None:
+        return None
+    valores, recursos, fechas = ventana
+    
+    # Transpuesta: el orden natural de nonzero queda (fecha, recurso) como el ORDER BY de SQLite
+    dias, filas = np.nonzero(~np.isnan(valores.T))
+    if len(dias) == 0:
+        return None
+    unidad = cubo['series'][f"{metric}|{entity}"]['unidad']
+    codigos = recursos.astype(object)
+    codigos[codigos == ''] = None
+    return pd.DataFrame({
+        'fecha': fechas.astype(str).astype(object)[dias],
+        'metrica': metric,
+        'entidad': entity,
+        'recurso': codigos[filas],
+        'valor_gwh': valores[filas, dias],
+        'unidad': unidad,
+    })
@@ -38,73 +38,62 @@ class AgentIA:
             raise ValueError("❌ Necesitas GROQ_API_KEY o OPENROUTER_API_KEY en .env")
         
         # Configuración de base de datos SQLite (misma que usa el dashboard)
-        self.db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'portal_energetico.db')
+        from utils import db_manager
+        self.db_path = str(db_manager.DB_PATH)
     
     def get_db_connection(self):
-        """Obtiene conexión a SQLite (base de datos del dashboard)"""
-        import sqlite3
-        import os
-        try:
-            db_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'portal_energetico.db')
-            return sqlite3.connect(db_path)
-        except Exception as e:
-            print(f"❌ Error conectando a SQLite: {e}")
-            return None
+        """Obtiene conexión de solo lectura a SQLite desde el pool del dashboard (context manager)"""
+        from utils import db_manager
+        return db_manager.get_connection(readonly=True)
+    
+    @staticmethod
+    def _fila_a_dict(cursor, row):
+        return dict(zip([col[0] for col in cursor.description], row))
     
     def obtener_datos_recientes(self, tabla: str, limite: int = 100) -> List[Dict]:
         """Obtiene datos recientes de una tabla específica desde SQLite"""
-        conn = self.get_db_connection()
-        if not conn:
-            return []
-        
         try:
-            # SQLite usa row_factory para diccionarios
-            conn.row_factory = lambda cursor, row: dict(zip([col[0] for col in cursor.description], row))
-            cursor = conn.cursor()
-            
-            # Consulta adaptada para SQLite
-            cursor.execute(f"""
-                SELECT * FROM {tabla}
-                ORDER BY Date DESC
-                LIMIT ?
-            """, (limite,))
-            
-            resultados = cursor.fetchall()
-            cursor.close()
-            return resultados
+            with self.get_db_connection() as conn:
+                # row_factory en el cursor: la conexión del pool es compartida
+                cursor = conn.cursor()
+                cursor.row_factory = self._fila_a_dict
+                
+                # Consulta adaptada para SQLite
+                cursor.execute(f"""
+                    SELECT * FROM {tabla}
+                    ORDER BY Date DESC
+                    LIMIT ?
+                """, (limite,))
+                
+                resultados = cursor.fetchall()
+                cursor.close()
+                return resultados
         except Exception as e:
             print(f"❌ Error obteniendo datos de {tabla}: {e}")
             return []
-        finally:
-            conn.close()
     
     def obtener_metricas(self, metric_code: str, limite: int = 100) -> List[Dict]:
         """Obtiene métricas específicas desde la tabla metrics"""
-        conn = self.get_db_connection()
-        if not conn:
-            return []
-        
         try:
-            conn.row_factory = lambda cursor, row: dict(zip([col[0] for col in cursor.description], row))
-            cursor = conn.cursor()
-            
-            # Consultar métricas específicas (nombres de columnas en español)
-            cursor.execute("""
-                SELECT fecha, valor_gwh, metrica, entidad, recurso
-                FROM metrics
-                WHERE metrica = ?
-                ORDER BY fecha DESC
-                LIMIT ?
-            """, (metric_code, limite))
-            
-            resultados = cursor.fetchall()
-            cursor.close()
-            return resultados
+            with self.get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = self._fila_a_dict
+                
+                # Consultar métricas específicas (nombres de columnas en español)
+                cursor.execute("""
+                    SELECT fecha, valor_gwh, metrica, entidad, recurso
+                    FROM metrics
+                    WHERE metrica = ?
+                    ORDER BY fecha DESC
+                    LIMIT ?
+                """, (metric_code, limite))
+                
+                resultados = cursor.fetchall()
+                cursor.close()
+                return resultados
         except Exception as e:
             print(f"❌ Error obteniendo métrica {metric_code}: {e}")
             return []
-        finally:
-            conn.close()
     
     def obtener_datos_contexto_pagina(self, ruta_pagina: str) -> Dict:
         """Obtiene datos específicos según la página del dashboard que el usuario está viendo"""
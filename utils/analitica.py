@@ -0,0 +1,275 @@
+"""
+Motor analítico: espejo Parquet de metrics + DuckDB
+Portal Energético MME
+
+Las consultas analíticas (años de filas que luego se agrupan o pivotan) pueden leer un
+espejo columnar de los datos diarios en Parquet, particionado por métrica y año:
+
+    parquet/metrica=Gene/anio=2024/datos.parquet
+    parquet/catalogos.parquet
+
+DuckDB lo consulta vectorizado y en varios hilos, sin abrir el archivo SQLite que
+escriben el ETL y leen los dashboards. El SQL es el mismo para los dos motores
+(tablas metrics y catalogos, parámetros '?'): consultar() elige el motor.
+
+Configuración:
+    PORTAL_MOTOR_ANALITICO=duckdb   usa el espejo ('sqlite' por defecto: consulta la BD)
+    PORTAL_PARQUET_DIR              carpeta del espejo ('parquet' junto a la BD por defecto)
+
+DuckDB es opcional: sin él, o mientras el espejo no exista, consultar() usa SQLite.
+El ETL mantiene el espejo con sincronizar_parquet(), que solo reescribe las
+particiones (métrica, año) cuya versión de datos cambió (ver db_manager.get_data_version).
+"""
+
+import os
+import json
+import sqlite3
+import threading
+import time
+import logging
+import pandas as pd
+from pathlib import Path
+from typing import Optional
+
+from utils import db_manager
+
+try:
+    import duckdb
+    DUCKDB_AVAILABLE = True
+except ImportError:
+    DUCKDB_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MOTOR_ANALITICO = os.getenv('PORTAL_MOTOR_ANALITICO', 'sqlite').lower()
+PARQUET_DIR = os.getenv('PORTAL_PARQUET_DIR')
+
+# Versión exportada de cada partición: {"Gene/2024": 123, "_catalogos": 45}
+_MANIFIESTO = '_versiones.json'
+_CLAVE_CATALOGOS = '_catalogos'
+
+_duckdb_local = threading.local()
+
+
+def _dir_parquet() -> Path:
+    """Carpeta del espejo: PORTAL_PARQUET_DIR o 'parquet' junto a DB_PATH"""
+    return Path(PARQUET_DIR) if PARQUET_DIR else Path(db_manager.DB_PATH).parent / 'parquet'
+
+
+def _leer_manifiesto(carpeta: Path) -> dict:
+    try:
+        with open(carpeta / _MANIFIESTO, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def motor_activo() -> str:
+    """'duckdb' si está configurado, instalado y el espejo existe; si no, 'sqlite'"""
+    if MOTOR_ANALITICO == 'duckdb' and DUCKDB_AVAILABLE and (_dir_parquet() / _MANIFIESTO).exists():
+        return 'duckdb'
+    return 'sqlite'
+
+
+def _conexion_duckdb():
+    """Conexión DuckDB del hilo con las vistas metrics y catalogos sobre el espejo"""
+    carpeta = str(_dir_parquet())
+    conn = getattr(_duckdb_local, 'conn', None)
+    if conn is None or getattr(_duckdb_local, 'carpeta', None) != carpeta:
+        conn = duckdb.connect()
+        # Las vistas se resuelven en cada consulta: ven las particiones que publique el ETL
+        conn.execute(f"""
+            CREATE VIEW metrics AS
+            SELECT fecha, metrica, entidad, recurso, valor_gwh, unidad
+            FROM read_parquet('{carpeta}/*/*/datos.parquet', hive_partitioning = true)
+        """)
+        if os.path.exists(os.path.join(carpeta, 'catalogos.parquet')):
+            conn.execute(f"CREATE VIEW catalogos AS SELECT * FROM read_parquet('{carpeta}/catalogos.parquet')")
+        _duckdb_local.conn, _duckdb_local.carpeta = conn, carpeta
+    return conn
+
+
+def consultar(sql: str, params=()) -> pd.DataFrame:
+    """
+    Ejecuta una consulta analítica sobre metrics/catalogos con el motor configurado
+
+    Args:
+        sql: SQL común a SQLite y DuckDB (parámetros '?'; sin funciones de fecha propias
+             de un motor: las fechas se pasan como 'YYYY-MM-DD')
+        params: Parámetros de la consulta
+
+    Returns:
+        DataFrame con el resultado (vacío si hay error). Con DuckDB las fechas llegan
+        como datetime64; con SQLite como texto
+
+    Ejemplo:
+        df = consultar("SELECT fecha, SUM(valor_gwh) AS total FROM metrics "
+                       "WHERE metrica = ? AND fecha >= ? GROUP BY fecha", ('Gene', '2020-01-01'))
+    """
+    if motor_activo() == 'duckdb':
+        try:
+            return _conexion_duckdb().execute(sql, list(params)).df()
+        except Exception as e:
+            logger.warning(f"⚠️ Consulta DuckDB fallida, usando SQLite: {e}")
+
+    try:
+        with db_manager.get_connection(readonly=True) as conn:
+            return pd.read_sql_query(sql, conn, params=list(params))
+    except Exception as e:
+        logger.error(f"❌ Error en consulta analítica: {e}")
+        return pd.DataFrame()
+
+
+# ============================================================================
+# SINCRONIZACIÓN DEL ESPEJO (ETL)
+# ============================================================================
+
+def _particiones_origen() -> dict:
+    """(metrica, anio) → ruta de la partición anual de SQLite o None (BD principal)"""
+    origen = {}
+    series = db_manager.get_metrics_stats()
+    if not series.empty:
+        for fila in series.itertuples():
+            for anio in range(int(fila.fecha_min[:4]), int(fila.fecha_max[:4]) + 1):
+                origen[(fila.metrica, anio)] = None
+    else:
+        # BD sin catálogo de estadísticas: un recorrido completo
+        with db_manager.get_connection(readonly=True) as conn:
+            for metrica, anio in conn.execute("SELECT DISTINCT metrica, substr(fecha, 1, 4) FROM metrics"):
+                origen[(metrica, int(anio))] = None
+
+    for anio, ruta in db_manager.get_particiones().items():
+        conn = sqlite3.connect(db_manager._uri(ruta, 'mode=ro&immutable=1'), uri=True)
+        try:
+            for (metrica,) in conn.execute("SELECT DISTINCT metrica FROM metrics"):
+                origen[(metrica, anio)] = ruta
+        finally:
+            conn.close()
+    return origen
+
+
+def _versiones_actuales() -> dict:
+    """Versión de datos por (metrica, anio) y de los catálogos (0 si nunca cambió)"""
+    with db_manager.get_connection(readonly=True) as conn:
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'data_versions'").fetchone():
+            return {}
+        filas = conn.execute("""
+            SELECT metrica, entidad, substr(mes, 1, 4), MAX(version)
+            FROM data_versions
+            WHERE mes != '' OR metrica = ?
+            GROUP BY metrica, entidad, substr(mes, 1, 4)
+        """, (db_manager.METRICA_CATALOGO,)).fetchall()
+
+    versiones = {}
+    for metrica, _, anio, version in filas:
+        clave = _CLAVE_CATALOGOS if metrica == db_manager.METRICA_CATALOGO else f"{metrica}/{anio}"
+        versiones[clave] = max(versiones.get(clave, 0), version)
+    return versiones
+
+
+def _escribir_parquet(conn, df: pd.DataFrame, destino: Path, select: str) -> None:
+    """COPY de un DataFrame a Parquet en un .tmp renombrado al final (los lectores ven el viejo o el nuevo)"""
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    tmp = destino.with_name(destino.name + '.tmp')
+    conn.register('datos', df)
+    try:
+        conn.execute(f"COPY ({select}) TO '{tmp}' (FORMAT PARQUET, COMPRESSION ZSTD)")
+    finally:
+        conn.unregister('datos')
+    os.replace(tmp, destino)
+
+
+def _exportar_metrica_anio(conn, carpeta: Path, metrica: str, anio: int, ruta_particion: Optional[Path]) -> int:
+    """Reescribe parquet/metrica=<metrica>/anio=<anio>/datos.parquet desde SQLite; retorna filas"""
+    query = """
+        SELECT fecha, entidad, recurso, valor_gwh, unidad
+        FROM metrics
+        WHERE metrica = ? AND fecha BETWEEN ? AND ?
+        ORDER BY entidad, recurso, fecha
+    """
+    params = (metrica, f"{anio}-01-01", f"{anio}-12-31")
+    if ruta_particion is not None:
+        origen = sqlite3.connect(db_manager._uri(ruta_particion, 'mode=ro&immutable=1'), uri=True)
+        try:
+            df = pd.read_sql_query(query, origen, params=params)
+        finally:
+            origen.close()
+    else:
+        with db_manager.get_connection(readonly=True) as origen:
+            df = pd.read_sql_query(query, origen, params=params)
+
+    destino = carpeta / f"metrica={metrica}" / f"anio={anio}" / 'datos.parquet'
+    if df.empty:
+        destino.unlink(missing_ok=True)
+        return 0
+    _escribir_parquet(conn, df, destino,
+                      "SELECT CAST(fecha AS DATE) AS fecha, entidad, recurso, valor_gwh, unidad FROM datos")
+    return len(df)
+
+
+def sincronizar_parquet(completo: bool = False) -> int:
+    """
+    Actualiza el espejo Parquet: reescribe las particiones (métrica, año) nuevas o cuya
+    versión de datos cambió desde la última sincronización, y los catálogos si cambiaron.
+    Los años cerrados (particiones de solo lectura) se exportan una sola vez.
+
+    Args:
+        completo: Reescribir todas las particiones
+
+    Returns:
+        Particiones reescritas (0 si DuckDB no está instalado o si falla)
+    """
+    if not DUCKDB_AVAILABLE:
+        logger.warning("⚠️ DuckDB no instalado: espejo Parquet no actualizado (pip install duckdb)")
+        return 0
+
+    carpeta = _dir_parquet()
+    t0 = time.perf_counter()
+    try:
+        carpeta.mkdir(parents=True, exist_ok=True)
+        manifiesto = {} if completo else _leer_manifiesto(carpeta)
+        versiones = _versiones_actuales()
+        origen = _particiones_origen()
+
+        conn = duckdb.connect()
+        escritas, filas = 0, 0
+        try:
+            for (metrica, anio), ruta_particion in sorted(origen.items()):
+                clave = f"{metrica}/{anio}"
+                version = versiones.get(clave, 0)
+                if manifiesto.get(clave) == version:
+                    continue
+                filas += _exportar_metrica_anio(conn, carpeta, metrica, anio, ruta_particion)
+                manifiesto[clave] = version
+                escritas += 1
+
+            version = versiones.get(_CLAVE_CATALOGOS, 0)
+            if manifiesto.get(_CLAVE_CATALOGOS) != version or not (carpeta / 'catalogos.parquet').exists():
+                with db_manager.get_connection(readonly=True) as origen_sqlite:
+                    df = pd.read_sql_query(
+                        "SELECT catalogo, codigo, nombre, tipo, region, capacidad FROM catalogos", origen_sqlite
+                    )
+                _escribir_parquet(conn, df, carpeta / 'catalogos.parquet', "SELECT * FROM datos")
+                manifiesto[_CLAVE_CATALOGOS] = version
+                escritas += 1
+        finally:
+            conn.close()
+
+        # Particiones de métricas/años que ya no existen en SQLite
+        for clave in [c for c in manifiesto if c != _CLAVE_CATALOGOS]:
+            metrica, anio = clave.rsplit('/', 1)
+            if (metrica, int(anio)) not in origen:
+                (carpeta / f"metrica={metrica}" / f"anio={anio}" / 'datos.parquet').unlink(missing_ok=True)
+                del manifiesto[clave]
+
+        tmp = carpeta / (_MANIFIESTO + '.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifiesto, f, indent=1, sort_keys=True)
+        os.replace(tmp, carpeta / _MANIFIESTO)
+
+        logger.info(f"✅ Espejo Parquet: {escritas} particiones reescritas ({filas:,} filas) "
+                    f"en {time.perf_counter() - t0:.1f}s → {carpeta}")
+        return escritas
+    except Exception as e:
+        logger.error(f"❌ Error sincronizando espejo Parquet: {e}")
+        return 0
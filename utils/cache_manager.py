@@ -0,0 +1,375 @@
+"""
+Caché en disco de respuestas de la API XM
+Portal Energético MME
+
+La API XM tarda 30-60 s por consulta y lo histórico prácticamente no cambia. Este
+módulo guarda las respuestas en un archivo SQLite propio (xm_cache.db, separado de la
+BD del portal para que una caché corrupta o borrada no afecte los datos):
+
+    respuestas_xm   filas de la API por (métrica, entidad, día): fetch_metric_data
+                    divide el rango pedido en días en caché y huecos, y consulta
+                    a la API solo los huecos
+    vacios_xm       caché negativa: días en que la API respondió sin filas para la
+                    (métrica, entidad). fetch_metric_data no los vuelve a pedir mientras
+                    estén vigentes; el ETL los olvida al cargar datos de esa serie
+    cache_kv        resultados completos por clave (get_cache_key / get_from_cache /
+                    save_to_cache) para funciones de página como fetch_gene_recurso_chunked
+
+Una consulta a la API en curso en un worker no se repite en otro: los workers se
+coordinan con candados de archivo (xm_cache.db.locks/, ver bloqueo_entre_procesos).
+
+Vigencia:
+    Los días anteriores a CACHE_DIAS_RECIENTES se guardan indefinidamente. Los días
+    recientes (XM los reliquida) vencen a las CACHE_TTL_RECIENTE horas; vencidos se
+    siguen sirviendo mientras se refrescan en segundo plano (stale-while-revalidate).
+    Un día vacío vence a las CACHE_TTL_VACIO horas (CACHE_TTL_VACIO_RECIENTE si es
+    reciente: XM puede publicarlo más tarde); solo se registra cuando la API respondió,
+    nunca por un timeout o un error.
+
+Configuración:
+    PORTAL_XM_CACHE_PATH          archivo de la caché (xm_cache.db en la raíz por defecto)
+    XM_CACHE_DIAS_RECIENTES       días hacia atrás que se consideran recientes (60)
+    XM_CACHE_TTL_RECIENTE         horas de vigencia de un día reciente (6)
+    XM_CACHE_TTL_VACIO            horas de vigencia de un día histórico sin datos (24)
+    XM_CACHE_TTL_VACIO_RECIENTE   horas de vigencia de un día reciente sin datos (1)
+"""
+
+import os
+import pickle
+import hashlib
+import sqlite3
+import threading
+import time
+import logging
+import pandas as pd
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Optional, Dict, Tuple
+from datetime import date, timedelta
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = Path(os.getenv('PORTAL_XM_CACHE_PATH', Path(__file__).parent.parent / "xm_cache.db"))
+CACHE_DIAS_RECIENTES = int(os.getenv('XM_CACHE_DIAS_RECIENTES', 60))
+CACHE_TTL_RECIENTE = float(os.getenv('XM_CACHE_TTL_RECIENTE', 6)) * 3600
+CACHE_TTL_VACIO = float(os.getenv('XM_CACHE_TTL_VACIO', 24)) * 3600
+CACHE_TTL_VACIO_RECIENTE = float(os.getenv('XM_CACHE_TTL_VACIO_RECIENTE', 1)) * 3600
+
+# Vigencia (s) de cache_kv por tipo de resultado; None = sin vencimiento
+TTL_POR_TIPO = {
+    'gene_recurso': 6 * 3600,
+    'historico': None,
+    'default': 3600,
+}
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS respuestas_xm (
+        metrica TEXT NOT NULL,
+        entidad TEXT NOT NULL,
+        dia TEXT NOT NULL,
+        datos BLOB NOT NULL,
+        guardado REAL NOT NULL,
+        PRIMARY KEY (metrica, entidad, dia)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS vacios_xm (
+        metrica TEXT NOT NULL,
+        entidad TEXT NOT NULL,
+        dia TEXT NOT NULL,
+        guardado REAL NOT NULL,
+        PRIMARY KEY (metrica, entidad, dia)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS cache_kv (
+        clave TEXT PRIMARY KEY,
+        datos BLOB NOT NULL,
+        tipo TEXT NOT NULL,
+        expira REAL
+    )
+    """,
+)
+
+_local = threading.local()
+
+
+def _get_connection() -> sqlite3.Connection:
+    """Conexión del hilo a la caché (WAL: los workers leen mientras otro escribe)"""
+    ruta = str(CACHE_PATH)
+    conn = getattr(_local, 'conn', None)
+    if conn is None or getattr(_local, 'ruta', None) != ruta:
+        conn = sqlite3.connect(ruta, timeout=10.0, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        for ddl in _SCHEMA:
+            conn.execute(ddl)
+        conn.commit()
+        _local.conn, _local.ruta = conn, ruta
+    return conn
+
+
+def es_dia_historico(dia: date, hoy: Optional[date] = None) -> bool:
+    """Días que XM ya no reliquida: se guardan sin vencimiento"""
+    return dia < (hoy or date.today()) - timedelta(days=CACHE_DIAS_RECIENTES)
+
+
+# ============================================================================
+# RESPUESTAS POR DÍA (fetch_metric_data)
+# ============================================================================
+
+def get_cached_days(metrica: str, entidad: str, inicio: date, fin: date) -> Dict[date, Tuple[pd.DataFrame, bool]]:
+    """
+    Días del rango que están en caché
+
+    Returns:
+        {dia: (DataFrame de la API para ese día, vigente)}; vigente=False en los días
+        recientes cuyo TTL venció (se pueden servir mientras se refrescan)
+    """
+    try:
+        filas = _get_connection().execute("""
+            SELECT dia, datos, guardado
+            FROM respuestas_xm
+            WHERE metrica = ? AND entidad = ? AND dia BETWEEN ? AND ?
+        """, (metrica, entidad, inicio.isoformat(), fin.isoformat())).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error leyendo caché XM {metrica}/{entidad}: {e}")
+        return {}
+
+    ahora, hoy = time.time(), date.today()
+    dias = {}
+    for dia, datos, guardado in filas:
+        dia = date.fromisoformat(dia)
+        vigente = es_dia_historico(dia, hoy) or ahora - guardado < CACHE_TTL_RECIENTE
+        try:
+            dias[dia] = (pickle.loads(datos), vigente)
+        except Exception as e:
+            logger.warning(f"⚠️ Entrada de caché ilegible {metrica}/{entidad} {dia}: {e}")
+    return dias
+
+
+def save_days(metrica: str, entidad: str, por_dia: Dict[date, pd.DataFrame]) -> int:
+    """Guarda (o reemplaza) la respuesta de la API de cada día; retorna días guardados"""
+    if not por_dia:
+        return 0
+    ahora = time.time()
+    try:
+        conn = _get_connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO respuestas_xm (metrica, entidad, dia, datos, guardado) VALUES (?, ?, ?, ?, ?)",
+            [(metrica, entidad, dia.isoformat(), pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL), ahora)
+             for dia, df in por_dia.items()]
+        )
+        conn.commit()
+        return len(por_dia)
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error guardando caché XM {metrica}/{entidad}: {e}")
+        return 0
+
+
+def get_empty_days(metrica: str, entidad: str, inicio: date, fin: date) -> set:
+    """Días del rango que la API devolvió vacíos y siguen vigentes en la caché negativa"""
+    try:
+        filas = _get_connection().execute("""
+            SELECT dia, guardado
+            FROM vacios_xm
+            WHERE metrica = ? AND entidad = ? AND dia BETWEEN ? AND ?
+        """, (metrica, entidad, inicio.isoformat(), fin.isoformat())).fetchall()
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error leyendo caché negativa {metrica}/{entidad}: {e}")
+        return set()
+
+    ahora, hoy = time.time(), date.today()
+    vacios = set()
+    for dia, guardado in filas:
+        dia = date.fromisoformat(dia)
+        ttl = CACHE_TTL_VACIO if es_dia_historico(dia, hoy) else CACHE_TTL_VACIO_RECIENTE
+        if ahora - guardado < ttl:
+            vacios.add(dia)
+    return vacios
+
+
+def save_empty_days(metrica: str, entidad: str, dias) -> int:
+    """Registra días que la API respondió sin filas; retorna días guardados"""
+    dias = list(dias)
+    if not dias:
+        return 0
+    ahora = time.time()
+    try:
+        conn = _get_connection()
+        conn.executemany(
+            "INSERT OR REPLACE INTO vacios_xm (metrica, entidad, dia, guardado) VALUES (?, ?, ?, ?)",
+            [(metrica, entidad, dia.isoformat(), ahora) for dia in dias]
+        )
+        conn.commit()
+        return len(dias)
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error guardando caché negativa {metrica}/{entidad}: {e}")
+        return 0
+
+
+def clear_empty_days(metrica: str, entidad: str, inicio=None, fin=None) -> int:
+    """
+    Olvida los días vacíos de una serie (todos o los del rango): lo llama el ETL
+    después de cargar datos, porque la fuente ya los tiene
+
+    Returns:
+        Días borrados
+    """
+    query = "DELETE FROM vacios_xm WHERE metrica = ? AND entidad = ?"
+    params = [metrica, entidad]
+    if inicio is not None:
+        query += " AND dia >= ?"
+        params.append(str(inicio)[:10])
+    if fin is not None:
+        query += " AND dia <= ?"
+        params.append(str(fin)[:10])
+    try:
+        conn = _get_connection()
+        borrados = conn.execute(query, params).rowcount
+        conn.commit()
+        return borrados
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error limpiando caché negativa {metrica}/{entidad}: {e}")
+        return 0
+
+
+# Archivos de candado fijos (franjas): cada clave usa el de int(sha1) % CANDADO_FRANJAS,
+# así la carpeta no crece con las claves consultadas. Dos claves de la misma franja se
+# esperan entre sí (al entrar revisan la caché, sin otro efecto)
+CANDADO_FRANJAS = 256
+
+
+def _carpeta_candados() -> Path:
+    return CACHE_PATH.parent / (CACHE_PATH.name + '.locks')
+
+
+@contextmanager
+def bloqueo_entre_procesos(clave: str, espera: float = 90.0):
+    """
+    Candado de archivo (flock) por clave, compartido por los workers de gunicorn.
+    El primero que lo toma consulta la API; los demás esperan y, al entrar, deben
+    revisar la caché antes de consultar (lo que buscaban ya puede estar guardado).
+    
+    flock no tiene plazo y SIGALRM solo interrumpe el hilo principal (los callbacks
+    corren en hilos del worker): la espera es un sondeo con LOCK_NB cada 50 ms.
+    
+    Args:
+        clave: Identificador de la consulta (ej: 'Gene|Recurso|2024-01-01|2024-01-31')
+        espera: Segundos máximos de espera; vencidos se sigue sin candado
+    
+    Yields:
+        True si hubo que esperar a otro proceso
+    """
+    import fcntl
+    carpeta = _carpeta_candados()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    franja = int(hashlib.sha1(clave.encode('utf-8')).hexdigest(), 16) % CANDADO_FRANJAS
+    
+    with open(carpeta / f"franja-{franja:03d}.lock", 'w') as candado:
+        espero, tomado = False, False
+        limite = time.monotonic() + espera
+        while True:
+            try:
+                fcntl.flock(candado, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                tomado = True
+                break
+            except BlockingIOError:
+                espero = True
+                if time.monotonic() > limite:
+                    logger.warning(f"⚠️ Candado de caché ocupado más de {espera:.0f}s: {clave}")
+                    break
+                time.sleep(0.05)
+        try:
+            yield espero
+        finally:
+            if tomado:
+                fcntl.flock(candado, fcntl.LOCK_UN)
+
+
+# ============================================================================
+# RESULTADOS COMPLETOS POR CLAVE
+# ============================================================================
+
+def get_cache_key(*partes) -> str:
+    """
+    Clave estable entre procesos y reinicios (sha1 de las partes; no usar hash(),
+    que cambia en cada proceso)
+
+    Ejemplo:
+        clave = get_cache_key('gene_recurso_chunked', tuple(sorted(codigos)), inicio, fin)
+    """
+    texto = '|'.join(repr(p) for p in partes)
+    return f"{partes[0]}:{hashlib.sha1(texto.encode('utf-8')).hexdigest()}" if partes else ''
+
+
+def get_from_cache(clave: str, allow_expired: bool = False):
+    """Valor guardado con save_to_cache, o None si no existe (o venció y allow_expired=False)"""
+    try:
+        fila = _get_connection().execute(
+            "SELECT datos, expira FROM cache_kv WHERE clave = ?", (clave,)
+        ).fetchone()
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error leyendo caché {clave}: {e}")
+        return None
+    if fila is None:
+        return None
+    datos, expira = fila
+    if expira is not None and expira < time.time() and not allow_expired:
+        return None
+    try:
+        return pickle.loads(datos)
+    except Exception as e:
+        logger.warning(f"⚠️ Entrada de caché ilegible {clave}: {e}")
+        return None
+
+
+def save_to_cache(clave: str, datos, cache_type: str = 'default', ttl: Optional[float] = None) -> bool:
+    """
+    Guarda un resultado (DataFrame u otro objeto serializable)
+
+    Args:
+        clave: Clave de get_cache_key
+        datos: Valor a guardar
+        cache_type: Tipo de resultado; define la vigencia (TTL_POR_TIPO)
+        ttl: Vigencia en segundos (sobrescribe la del tipo)
+    """
+    ttl = ttl if ttl is not None else TTL_POR_TIPO.get(cache_type, TTL_POR_TIPO['default'])
+    expira = time.time() + ttl if ttl is not None else None
+    try:
+        conn = _get_connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache_kv (clave, datos, tipo, expira) VALUES (?, ?, ?, ?)",
+            (clave, pickle.dumps(datos, protocol=pickle.HIGHEST_PROTOCOL), cache_type, expira)
+        )
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error guardando caché {clave}: {e}")
+        return False
+
+
+def clear_cache(vencidos: bool = True) -> int:
+    """
+    Limpia la caché
+
+    Args:
+        vencidos: True = solo resultados vencidos de cache_kv; False = todo (incluida la caché negativa)
+
+    Returns:
+        Entradas borradas
+    """
+    try:
+        conn = _get_connection()
+        if vencidos:
+            borradas = conn.execute("DELETE FROM cache_kv WHERE expira < ?", (time.time(),)).rowcount
+        else:
+            borradas = conn.execute("DELETE FROM cache_kv").rowcount
+            borradas += conn.execute("DELETE FROM respuestas_xm").rowcount
+            borradas += conn.execute("DELETE FROM vacios_xm").rowcount
+        conn.commit()
+        return borradas
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error limpiando caché: {e}")
+        return 0
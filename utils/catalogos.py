@@ -0,0 +1,144 @@
+"""
+Servicio de catálogos en memoria
+Portal Energético MME
+
+Los catálogos de XM en SQLite (ListadoRecursos, ListadoEmbalses, ListadoRios,
+ListadoAgentes) se leen una vez por worker y quedan en memoria junto con sus mapeos
+código → nombre y nombre → código. Un catálogo se vuelve a leer solo cuando cambia su
+versión de datos (db_manager.get_data_version(METRICA_CATALOGO, <catalogo>), que sube
+cuando upsert_catalogo_bulk inserta o cambia alguna fila); la versión se revisa a lo
+más cada CATALOGOS_REVISION_S segundos (5 por defecto).
+
+El mapeo de columnas es vectorizado: los valores se factorizan (como pd.Categorical) y
+el diccionario se aplica con Series.map a los valores distintos (cientos de códigos),
+no a cada fila.
+
+Uso:
+    from utils import catalogos
+
+    df['Name'] = catalogos.nombres(df['recurso'], 'ListadoRecursos')
+    df['codigo'] = catalogos.codigos(df['Embalse'], 'ListadoEmbalses')
+"""
+
+import os
+import time
+import threading
+import logging
+import numpy as np
+import pandas as pd
+
+from utils import db_manager
+
+logger = logging.getLogger(__name__)
+
+CATALOGOS_REVISION_S = float(os.getenv('CATALOGOS_REVISION_S', 5))
+
+# (ruta de la BD, catálogo) → {'version', 'revisado', 'df', 'por_codigo', 'por_nombre'}
+_catalogos = {}
+_lock = threading.Lock()
+
+
+def _normalizar(valores: pd.Series) -> pd.Series:
+    """Clave de búsqueda: texto sin espacios extremos y en mayúsculas"""
+    return valores.astype(str).str.strip().str.upper()
+
+
+def _cargar(catalogo: str, version: int) -> dict:
+    """Lee el catálogo de SQLite y arma sus mapeos"""
+    df = db_manager.get_catalogo(catalogo)
+    if df is None or df.empty:
+        return {'version': version, 'revisado': time.monotonic(), 'df': pd.DataFrame(),
+                'por_codigo': {}, 'por_nombre': {}}
+
+    con_nombre = df[df['nombre'].notna()]
+    return {
+        'version': version,
+        'revisado': time.monotonic(),
+        'df': df,
+        'por_codigo': dict(zip(_normalizar(con_nombre['codigo']), con_nombre['nombre'])),
+        'por_nombre': dict(zip(_normalizar(con_nombre['nombre']), con_nombre['codigo'].astype(str).str.strip())),
+    }
+
+
+def _catalogo(catalogo: str) -> dict:
+    """Entrada en memoria del catálogo, recargada si su versión cambió"""
+    clave = (str(db_manager.DB_PATH), catalogo)
+    entrada = _catalogos.get(clave)
+    if entrada is not None and time.monotonic() - entrada['revisado'] < CATALOGOS_REVISION_S:
+        return entrada
+
+    with _lock:
+        entrada = _catalogos.get(clave)
+        if entrada is not None and time.monotonic() - entrada['revisado'] < CATALOGOS_REVISION_S:
+            return entrada
+        version = db_manager.get_data_version(db_manager.METRICA_CATALOGO, catalogo)
+        if entrada is not None and entrada['version'] == version and not entrada['df'].empty:
+            entrada['revisado'] = time.monotonic()
+            return entrada
+        entrada = _catalogos[clave] = _cargar(catalogo, version)
+        logger.info(f"📚 Catálogo {catalogo} en memoria: {len(entrada['df'])} registros (versión {version})")
+        return entrada
+
+
+def invalidar(catalogo: str = None) -> None:
+    """Descarta de memoria un catálogo (o todos); la siguiente consulta lo vuelve a leer"""
+    with _lock:
+        for clave in [c for c in _catalogos if catalogo is None or c[1] == catalogo]:
+            del _catalogos[clave]
+
+
+def get_catalogo(catalogo: str) -> pd.DataFrame:
+    """
+    Registros del catálogo (columnas de db_manager.get_catalogo), desde memoria
+
+    Returns:
+        Copia del DataFrame (vacío si el catálogo no existe)
+    """
+    return _catalogo(catalogo)['df'].copy()
+
+
+def mapa_codigos(catalogo: str) -> dict:
+    """{CÓDIGO: nombre} del catálogo (compartido: no modificar)"""
+    return _catalogo(catalogo)['por_codigo']
+
+
+def mapa_nombres(catalogo: str) -> dict:
+    """{NOMBRE EN MAYÚSCULAS: código} del catálogo (compartido: no modificar)"""
+    return _catalogo(catalogo)['por_nombre']
+
+
+def _mapear(valores: pd.Series, mapeo: dict) -> pd.Series:
+    """
+    Aplica mapeo a los valores distintos de la serie (clave normalizada); los que no
+    están en el diccionario se conservan y los nulos siguen nulos
+    """
+    posiciones, distintos = pd.factorize(valores)
+    if len(distintos) == 0 or not mapeo:
+        return pd.Series(valores, copy=True)
+    distintos = pd.Series(np.asarray(distintos, dtype=object))
+    destino = _normalizar(distintos).map(mapeo)
+    destino = destino.where(destino.notna(), distintos).to_numpy(dtype=object)
+    resultado = np.where(posiciones >= 0, destino[posiciones], np.asarray(valores, dtype=object))
+    return pd.Series(resultado, index=valores.index, name=valores.name, dtype=object)
+
+
+def nombres(codigos: pd.Series, catalogo: str) -> pd.Series:
+    """
+    Código → nombre con el catálogo (mismo criterio de siempre: código en mayúsculas;
+    si no está en el catálogo se conserva el código)
+
+    Ejemplo:
+        df['Name'] = nombres(df['recurso'], 'ListadoRecursos')   # '2QBW' → 'GUAVIO'
+    """
+    return _mapear(codigos, mapa_codigos(catalogo))
+
+
+def codigos(nombres_: pd.Series, catalogo: str) -> pd.Series:
+    """
+    Nombre → código (búsqueda inversa, sin distinguir mayúsculas ni espacios extremos);
+    si el nombre no está en el catálogo se conserva. La API XM trae embalses por nombre.
+
+    Ejemplo:
+        df['codigo'] = codigos(df['Name'], 'ListadoEmbalses')   # 'Peñol ' → 'PENOL'
+    """
+    return _mapear(nombres_, mapa_nombres(catalogo))
@@ -2,47 +2,224 @@
 Database Manager para Portal Energético MME
 Base de datos: SQLite
 Propósito: Gestión de conexiones y queries a base de datos de métricas energéticas
+
+Conexiones:
+    Todas las conexiones salen de un pool por hilo/proceso (gunicorn: 6 workers × 3
+    threads). Cada hilo reutiliza su conexión de escritura y su conexión de solo
+    lectura, en modo WAL y con PRAGMAs ajustados aplicados una sola vez.
+
+Particiones por año:
+    Los años cerrados pueden moverse a archivos de solo lectura
+    (particiones/metrics_AAAA.db, ver scripts/particionar_por_anio.py). Las lecturas
+    diarias adjuntan (ATTACH) solo los años que pide el rango y unen los resultados.
+
+Snapshots:
+    DB_PATH puede ser un symlink al snapshot publicado (snapshots/<nombre>.<fecha>.db).
+    El ETL carga una copia y la publica cambiando el symlink (ver carga_en_snapshot):
+    los lectores nunca comparten el archivo con una carga en curso.
 """
 
+import os
+import re
 import sqlite3
+import threading
+import time
+import numpy as np
 import pandas as pd
 import logging
 from pathlib import Path
 from typing import Optional, List, Tuple
 from contextlib import contextmanager
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from urllib.request import pathname2url
 
 # Configuración de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Ruta a la base de datos
-DB_PATH = Path(__file__).parent.parent / "portal_energetico.db"
+# Ruta a la base de datos (PORTAL_DB_PATH permite apuntar a otra copia, ej: tests/benchmarks)
+DB_PATH = Path(os.getenv('PORTAL_DB_PATH', Path(__file__).parent.parent / "portal_energetico.db"))
 SCHEMA_PATH = Path(__file__).parent.parent / "sql" / "schema.sql"
+SCHEMA_V2_PATH = Path(__file__).parent.parent / "sql" / "schema_v2.sql"
+SCHEMA_ROLLUPS_PATH = Path(__file__).parent.parent / "sql" / "schema_rollups.sql"
+SCHEMA_HOURLY_DIA_PATH = Path(__file__).parent.parent / "sql" / "schema_hourly_dia.sql"
+SCHEMA_PARTICION_PATH = Path(__file__).parent.parent / "sql" / "schema_particion.sql"
+
+# Particiones por año (años cerrados, solo lectura). None = carpeta 'particiones' junto a DB_PATH
+PARTICIONES_DIR = os.getenv('PORTAL_PARTICIONES_DIR')
+
+# Snapshots publicados por el ETL (ver carga_en_snapshot). None = carpeta 'snapshots' junto a DB_PATH
+SNAPSHOTS_DIR = os.getenv('PORTAL_SNAPSHOTS_DIR')
+SNAPSHOTS_CONSERVAR = int(os.getenv('PORTAL_SNAPSHOTS_CONSERVAR', 3))
+
+# Esquema v2: fechas como días desde 1970-01-01 (ver sql/schema_v2.sql)
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Cargas masivas (ver _cargar_por_lotes): desde UMBRAL_STAGING filas se usa la tabla
+# staging, y se confirma cada LOTE_CARGA filas para no retener el lock de escritura
+UMBRAL_STAGING = int(os.getenv('ETL_UMBRAL_STAGING', 5000))
+LOTE_CARGA = int(os.getenv('ETL_LOTE_CARGA', 100000))
+
+# PRAGMAs aplicados una vez por conexión (no persisten en el archivo)
+SQLITE_PRAGMAS = {
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 2 * 1024 ** 3)),   # 2 GB mapeados en memoria
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -65536)),        # 64 MB (negativo = KiB)
+    'temp_store': 'MEMORY',
+    'synchronous': 'NORMAL',                                          # Seguro en modo WAL
+    'busy_timeout': 10000,
+}
+
+# PRAGMAs de la conexión de escritura durante una carga masiva (se restauran al terminar).
+# synchronous=OFF en WAL no corrompe la BD: un corte de luz solo puede perder los últimos
+# lotes confirmados, que el ETL vuelve a cargar
+PRAGMAS_CARGA = {
+    'synchronous': 'OFF',
+    'cache_size': -262144,              # 256 MB
+    'wal_autocheckpoint': 10000,        # Checkpoints cada ~40 MB en lugar de cada 4 MB
+}
+
+# Pool de conexiones: una conexión de escritura y una de lectura por hilo
+_pool_local = threading.local()
+_pool_lock = threading.Lock()
+_pool_conexiones = []
+_pool_pid = os.getpid()
+
+
+def _uri(ruta, parametros: str = '') -> str:
+    """URI SQLite de un archivo (las conexiones se abren con uri=True para poder hacer ATTACH de URIs)"""
+    uri = f"file:{pathname2url(str(ruta))}"
+    return f"{uri}?{parametros}" if parametros else uri
+
+
+def _abrir_conexion(ruta: str, readonly: bool, wal: bool = True) -> sqlite3.Connection:
+    """
+    Abre una conexión nueva y le aplica los PRAGMAs del pool.
+    Con wal=False se respeta el modo journal del archivo (snapshot publicado en DELETE).
+    """
+    if readonly and os.path.exists(ruta):
+        conn = sqlite3.connect(_uri(ruta, 'mode=ro'), uri=True, timeout=10.0, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(_uri(ruta), uri=True, timeout=10.0, check_same_thread=False)
+        if wal:
+            # WAL es persistente en el archivo: lectores no bloquean al ETL ni viceversa
+            conn.execute("PRAGMA journal_mode=WAL")
+    
+    for pragma, valor in SQLITE_PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={valor}")
+    
+    conn.row_factory = sqlite3.Row  # Permite acceso por nombre de columna
+    return conn
+
+
+def _ruta_publicada() -> str:
+    """Archivo que se abre para DB_PATH: el destino del symlink si es un snapshot publicado"""
+    ruta = str(DB_PATH)
+    if os.path.islink(ruta):
+        return os.path.join(os.path.dirname(ruta), os.readlink(ruta))
+    return ruta
+
+
+def _checkout_conexion(readonly: bool) -> Tuple[sqlite3.Connection, dict]:
+    """
+    Retorna la conexión del hilo actual (abriéndola si es necesario).
+    Detecta fork de gunicorn y cambios de DB_PATH para no reutilizar conexiones inválidas.
+    Si se publicó un snapshot nuevo, el siguiente checkout (fuera de bloques anidados)
+    abre el nuevo; la conexión vieja termina lo que estaba leyendo sobre el anterior.
+    """
+    global _pool_pid
+    
+    if os.getpid() != _pool_pid:
+        # Proceso hijo (fork): las conexiones heredadas no se deben usar ni cerrar
+        with _pool_lock:
+            _pool_conexiones.clear()
+            _pool_pid = os.getpid()
+        _pool_local.__dict__.clear()
+    
+    slots = getattr(_pool_local, 'slots', None)
+    if slots is None or getattr(_pool_local, 'pid', None) != _pool_pid:
+        slots = _pool_local.slots = {}
+        _pool_local.pid = _pool_pid
+    
+    ruta = _ruta_publicada()
+    slot = slots.get(readonly)
+    if slot is None or (slot['ruta'] != ruta and slot['profundidad'] == 0):
+        if slot is not None:
+            _descartar_conexion(slot['conn'])
+        # Un snapshot publicado (DB_PATH es symlink) queda en DELETE: volver a ponerlo en
+        # WAL desde un proceso del dashboard haría que los lectores consulten un -wal
+        conn = _abrir_conexion(ruta, readonly, wal=ruta == str(DB_PATH))
+        with _pool_lock:
+            _pool_conexiones.append(conn)
+        slot = slots[readonly] = {'ruta': ruta, 'conn': conn, 'profundidad': 0}
+    
+    return slot['conn'], slot
+
+
+def _descartar_conexion(conn: sqlite3.Connection):
+    """Cierra una conexión del pool y la quita del registro."""
+    with _pool_lock:
+        if conn in _pool_conexiones:
+            _pool_conexiones.remove(conn)
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def close_all_connections():
+    """
+    Cierra todas las conexiones del pool del proceso actual.
+    Útil al apagar workers, en tests o antes de reemplazar el archivo de la BD.
+    """
+    with _pool_lock:
+        conexiones = list(_pool_conexiones)
+        _pool_conexiones.clear()
+    for conn in conexiones:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _pool_local.__dict__.clear()
 
 
 @contextmanager
-def get_connection():
+def get_connection(readonly: bool = False):
     """
-    Context manager para conexión a SQLite
-    Garantiza cierre automático de conexión
+    Context manager para conexión a SQLite (desde el pool del hilo)
+    La conexión NO se cierra al salir: queda disponible para el siguiente uso del hilo.
+    Si el bloque falla o deja una transacción abierta sin commit, se hace rollback.
+    
+    Args:
+        readonly: True para lectores del dashboard (conexión mode=ro, nunca toma locks de escritura)
     
     Uso:
         with get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM metrics")
     """
-    conn = None
     try:
-        conn = sqlite3.connect(str(DB_PATH), timeout=10.0, check_same_thread=False)
-        conn.row_factory = sqlite3.Row  # Permite acceso por nombre de columna
+        conn, slot = _checkout_conexion(readonly)
+    except sqlite3.Error as e:
+        logger.error(f"Error de conexión SQLite: {e}")
+        raise
+    
+    slot['profundidad'] += 1
+    try:
         yield conn
     except sqlite3.Error as e:
         logger.error(f"Error de conexión SQLite: {e}")
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
         raise
     finally:
-        if conn:
-            conn.close()
+        slot['profundidad'] -= 1
+        # Mismo comportamiento que cerrar la conexión: lo no confirmado se descarta
+        if slot['profundidad'] == 0 and conn.in_transaction:
+            conn.rollback()
 
 
 def init_database():
@@ -55,10 +232,15 @@ def init_database():
         with open(SCHEMA_PATH, 'r', encoding='utf-8') as f:
             schema_sql = f.read()
         
-        # Ejecutar schema
+        # Ejecutar schema (+ tablas de rollups)
         with get_connection() as conn:
             cursor = conn.cursor()
             cursor.executescript(schema_sql)
+            _asegurar_rollups(conn)
+            conn.execute(_SCHEMA_DATA_VERSIONS)
+            for ddl in _SCHEMA_METRICS_STATS:
+                conn.execute(ddl)
+            conn.execute(_SCHEMA_COBERTURA)
             conn.commit()
             logger.info(f"✅ Base de datos inicializada: {DB_PATH}")
             
@@ -68,13 +250,841 @@ def init_database():
         return False
 
 
+def migrate_schema_v2(conservar_v1: bool = False) -> bool:
+    """
+    Migra la tabla metrics (v1) al esquema v2 en una sola transacción:
+    dimensiones + metrics_fact WITHOUT ROWID + vista de compatibilidad metrics.
+    
+    Args:
+        conservar_v1: Si True, deja la tabla original como metrics_v1 (ocupa espacio)
+    
+    Returns:
+        True si la BD quedó en v2 (o ya lo estaba), False si error
+    """
+    try:
+        with open(SCHEMA_V2_PATH, 'r', encoding='utf-8') as f:
+            schema_v2_sql = f.read()
+        
+        with get_connection() as conn:
+            if es_schema_v2(conn):
+                logger.info("ℹ️ La base de datos ya está en esquema v2")
+                return True
+            
+            # Duplicados con recurso NULL (v1 los permite): gana el de mayor id
+            conn.executescript(f"""
+                BEGIN;
+                ALTER TABLE metrics RENAME TO metrics_v1;
+                {schema_v2_sql}
+                INSERT INTO dim_metrica (nombre) SELECT DISTINCT metrica FROM metrics_v1 ORDER BY metrica;
+                INSERT INTO dim_entidad (nombre) SELECT DISTINCT entidad FROM metrics_v1 ORDER BY entidad;
+                INSERT INTO dim_recurso (codigo)
+                    SELECT DISTINCT recurso FROM metrics_v1 WHERE recurso IS NOT NULL ORDER BY recurso;
+                INSERT INTO dim_unidad (nombre) SELECT DISTINCT COALESCE(unidad, 'GWh') FROM metrics_v1;
+                INSERT OR REPLACE INTO metrics_fact
+                    (metrica_id, entidad_id, recurso_id, fecha_dia, valor_gwh, unidad_id, fecha_actualizacion)
+                SELECT m.id, e.id, COALESCE(r.id, 0),
+                       CAST(julianday(v.fecha) - 2440587.5 AS INTEGER),
+                       v.valor_gwh, u.id,
+                       CAST(strftime('%s', COALESCE(v.fecha_actualizacion, 'now')) AS INTEGER)
+                FROM metrics_v1 v
+                JOIN dim_metrica m ON m.nombre = v.metrica
+                JOIN dim_entidad e ON e.nombre = v.entidad
+                LEFT JOIN dim_recurso r ON r.codigo = v.recurso
+                JOIN dim_unidad u ON u.nombre = COALESCE(v.unidad, 'GWh')
+                ORDER BY v.id;
+                {'' if conservar_v1 else 'DROP TABLE metrics_v1;'}
+                COMMIT;
+            """)
+            conn.execute("ANALYZE")
+            total = conn.execute("SELECT COUNT(*) FROM metrics_fact").fetchone()[0]
+        
+        logger.info(f"✅ Migración a esquema v2 completada: {total:,} registros en metrics_fact")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Error migrando a esquema v2: {e}")
+        return False
+
+
+# ============================================================================
+# ESQUEMA V2 (tabla de hechos metrics_fact + dimensiones, ver sql/schema_v2.sql)
+# ============================================================================
+
+def fecha_a_dia(fecha) -> int:
+    """Convierte 'YYYY-MM-DD' (o date/datetime) al número de día usado por metrics_fact"""
+    if not hasattr(fecha, 'toordinal'):
+        fecha = date.fromisoformat(str(fecha)[:10])
+    return fecha.toordinal() - _EPOCH_ORDINAL
+
+
+def dia_a_fecha(dia: int) -> str:
+    """Convierte un número de día de metrics_fact a 'YYYY-MM-DD'"""
+    return date.fromordinal(int(dia) + _EPOCH_ORDINAL).isoformat()
+
+
+def es_schema_v2(conn: sqlite3.Connection) -> bool:
+    """True si la BD fue migrada al esquema v2 (metrics es una vista sobre metrics_fact)"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metrics_fact'"
+    ).fetchone()
+    return row is not None
+
+
+def _resolver_ids(cursor: sqlite3.Cursor, tabla: str, columna: str, valores) -> dict:
+    """
+    Obtiene (creando si faltan) los ids de una dimensión para un conjunto de valores.
+    Retorna diccionario {valor: id}
+    """
+    valores = list({v for v in valores if v is not None})
+    ids = {}
+    for i in range(0, len(valores), 500):
+        lote = valores[i:i + 500]
+        cursor.executemany(f"INSERT OR IGNORE INTO {tabla} ({columna}) VALUES (?)", [(v,) for v in lote])
+        placeholders = ','.join(['?'] * len(lote))
+        cursor.execute(f"SELECT {columna}, id FROM {tabla} WHERE {columna} IN ({placeholders})", lote)
+        ids.update({row[0]: row[1] for row in cursor.fetchall()})
+    return ids
+
+
+def _filas_v2(cursor: sqlite3.Cursor, metrics: List[Tuple]) -> List[Tuple]:
+    """Traduce tuplas (fecha, metrica, entidad, recurso, valor_gwh, unidad) a claves enteras v2"""
+    ids_metrica = _resolver_ids(cursor, 'dim_metrica', 'nombre', (m[1] for m in metrics))
+    ids_entidad = _resolver_ids(cursor, 'dim_entidad', 'nombre', (m[2] for m in metrics))
+    ids_recurso = _resolver_ids(cursor, 'dim_recurso', 'codigo', (m[3] for m in metrics))
+    ids_unidad = _resolver_ids(cursor, 'dim_unidad', 'nombre', (m[5] or 'GWh' for m in metrics))
+    ids_recurso[None] = 0
+    
+    return [
+        (
+            ids_metrica[metrica],
+            ids_entidad[entidad],
+            ids_recurso[recurso],
+            fecha_a_dia(fecha),
+            valor_gwh,
+            ids_unidad[unidad or 'GWh']
+        )
+        for fecha, metrica, entidad, recurso, valor_gwh, unidad in metrics
+    ]
+
+
+# ============================================================================
+# VERSIONES DE DATOS (invalidación precisa de cachés)
+# ============================================================================
+
+# Clave de los catálogos en data_versions: (METRICA_CATALOGO, <catalogo>, '')
+METRICA_CATALOGO = '_CATALOGO_'
+
+# Una fila por serie (mes = '') y por serie y mes ('YYYY-MM'); metrica = entidad = '*'
+# guarda el contador global. version es un contador creciente compartido: la versión
+# de un rango es el MAX de sus meses y solo cambia si alguno de ellos cambió.
+# Los datos diarios y horarios de una misma serie comparten versión.
+_SCHEMA_DATA_VERSIONS = """
+    CREATE TABLE IF NOT EXISTS data_versions (
+        metrica VARCHAR(50) NOT NULL,
+        entidad VARCHAR(100) NOT NULL,
+        mes VARCHAR(7) NOT NULL,
+        version INTEGER NOT NULL,
+        fecha_actualizacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (metrica, entidad, mes)
+    ) WITHOUT ROWID
+"""
+
+_UPSERT_DATA_VERSION = """
+    INSERT INTO data_versions (metrica, entidad, mes, version, fecha_actualizacion)
+    VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(metrica, entidad, mes)
+    DO UPDATE SET version = excluded.version, fecha_actualizacion = excluded.fecha_actualizacion
+"""
+
+
+def _clave_version(fila) -> Tuple[str, str, str]:
+    """(metrica, entidad, mes) de una tupla (fecha, metrica, entidad, ...)"""
+    return fila[1], fila[2], str(fila[0])[:7]
+
+
+def _clave_version_dia(fila) -> Tuple[str, str, str]:
+    """(metrica, entidad, mes) de una fila de metrics_hourly_dia (metrica, entidad, fecha, ...)"""
+    return fila[0], fila[1], str(fila[2])[:7]
+
+
+def _registrar_versiones(conn: sqlite3.Connection, claves) -> None:
+    """
+    Sube la versión de los (metrica, entidad, mes) que cambiaron, de sus series y del
+    contador global, dentro de la transacción del escritor (se confirma con los datos)
+    """
+    if not claves:
+        return
+    conn.execute(_SCHEMA_DATA_VERSIONS)
+    fila = conn.execute("SELECT version FROM data_versions WHERE metrica = '*' AND entidad = '*' AND mes = ''").fetchone()
+    version = (fila[0] if fila else 0) + 1
+    
+    filas = {(metrica, entidad, mes) for metrica, entidad, mes in claves}
+    filas |= {(metrica, entidad, '') for metrica, entidad, _ in claves}
+    filas.add(('*', '*', ''))
+    conn.executemany(_UPSERT_DATA_VERSION, [(*clave, version) for clave in filas])
+
+
+def _ejecutar_versionado(conn: sqlite3.Connection, sql: str, filas: List[Tuple], clave, convertir=None,
+                         estadisticas: bool = False) -> int:
+    """
+    executemany de un upsert cuyo DO UPDATE solo escribe si el valor cambió, por grupos de
+    clave de versión (clave(fila) → (metrica, entidad, mes)): si total_changes se movió
+    durante un grupo, ese grupo cambió. convertir(grupo) arma los parámetros (p. ej. claves v2).
+    estadisticas=True (datos diarios) recuenta además esos meses en el catálogo de estadísticas.
+    Retorna filas insertadas o modificadas.
+    """
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault(clave(fila), []).append(fila)
+    
+    cursor = conn.cursor()
+    afectadas, cambiadas = 0, set()
+    for clave_grupo, grupo in grupos.items():
+        parametros = convertir(grupo) if convertir else grupo
+        antes = conn.total_changes
+        cursor.executemany(sql, parametros)
+        if conn.total_changes != antes:
+            afectadas += conn.total_changes - antes
+            cambiadas.add(clave_grupo)
+    
+    _registrar_versiones(conn, cambiadas)
+    if estadisticas:
+        _refrescar_stats(conn, cambiadas)
+    return afectadas
+
+
+def get_data_version(metrica: Optional[str] = None, entidad: Optional[str] = None,
+                     fecha_inicio=None, fecha_fin=None) -> int:
+    """
+    Versión de los datos detrás de una consulta: cambia solo cuando alguna fila de la serie
+    (o de los meses del rango) se inserta o cambia de valor. Una caché guarda la versión
+    junto al resultado y lo reutiliza mientras get_data_version devuelva lo mismo.
+    
+    Args:
+        metrica, entidad: Serie (sin metrica: versión global de toda la BD).
+                          Catálogos: get_data_version(METRICA_CATALOGO, 'ListadoRecursos')
+        fecha_inicio, fecha_fin: Rango opcional: versión más alta de los meses que toca
+    
+    Returns:
+        Versión (0 si la serie no ha cambiado desde que existe data_versions)
+    
+    Ejemplo:
+        version = get_data_version('Gene', 'Recurso', '2024-01-01', '2024-12-31')
+    """
+    if metrica is None:
+        query, params = "SELECT version FROM data_versions WHERE metrica = '*' AND entidad = '*' AND mes = ''", ()
+    elif fecha_inicio is None:
+        query, params = "SELECT version FROM data_versions WHERE metrica = ? AND entidad = ? AND mes = ''", (metrica, entidad)
+    else:
+        query = "SELECT MAX(version) FROM data_versions WHERE metrica = ? AND entidad = ? AND mes BETWEEN ? AND ?"
+        params = (metrica, entidad, _a_fecha(fecha_inicio).strftime('%Y-%m'),
+                  _a_fecha(fecha_fin or fecha_inicio).strftime('%Y-%m'))
+    
+    try:
+        with get_connection(readonly=True) as conn:
+            # BD sin escrituras desde que existe data_versions
+            if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'data_versions'").fetchone():
+                return 0
+            fila = conn.execute(query, params).fetchone()
+        return fila[0] if fila and fila[0] is not None else 0
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error obteniendo versión de {metrica}/{entidad}: {e}")
+        return 0
+
+
+# ============================================================================
+# CATÁLOGO DE ESTADÍSTICAS (conteos y rangos sin recorrer metrics)
+# ============================================================================
+
+# metrics_stats_mes: una fila por serie y mes ('YYYY-MM') con lo que hay en la BD
+# principal (los años particionados no cuentan); metrics_stats la resume por serie.
+# Las cargas de datos diarios recuentan los meses que cambiaron en su misma transacción.
+# Las tablas solo existen si se crearon completas (init_database o rebuild_stats): en una
+# BD anterior los lectores vuelven a recorrer metrics hasta correr rebuild_stats().
+# Los DELETE hechos por fuera de db_manager (scripts/autocorreccion.py) también lo requieren.
+_SCHEMA_METRICS_STATS = (
+    """
+    CREATE TABLE IF NOT EXISTS metrics_stats_mes (
+        metrica VARCHAR(50) NOT NULL,
+        entidad VARCHAR(100) NOT NULL,
+        mes VARCHAR(7) NOT NULL,
+        registros INTEGER NOT NULL,
+        dias INTEGER NOT NULL,
+        fecha_min DATE,
+        fecha_max DATE,
+        fecha_actualizacion TIMESTAMP,
+        PRIMARY KEY (metrica, entidad, mes)
+    ) WITHOUT ROWID
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS metrics_stats (
+        metrica VARCHAR(50) NOT NULL,
+        entidad VARCHAR(100) NOT NULL,
+        registros INTEGER NOT NULL,
+        dias INTEGER NOT NULL,
+        fecha_min DATE,
+        fecha_max DATE,
+        fecha_actualizacion TIMESTAMP,
+        PRIMARY KEY (metrica, entidad)
+    ) WITHOUT ROWID
+    """,
+)
+
+# Conteo de toda la tabla por serie y mes (rebuild_stats)
+_STATS_MES_V1 = """
+    INSERT INTO metrics_stats_mes
+    SELECT metrica, entidad, substr(fecha, 1, 7), COUNT(*), COUNT(DISTINCT fecha),
+           MIN(fecha), MAX(fecha), MAX(fecha_actualizacion)
+    FROM metrics
+    GROUP BY metrica, entidad, substr(fecha, 1, 7)
+"""
+
+_STATS_MES_V2 = """
+    INSERT INTO metrics_stats_mes
+    SELECT m.nombre, e.nombre, strftime('%Y-%m', f.fecha_dia + 2440587.5), COUNT(*), COUNT(DISTINCT f.fecha_dia),
+           date(MIN(f.fecha_dia) + 2440587.5), date(MAX(f.fecha_dia) + 2440587.5),
+           datetime(MAX(f.fecha_actualizacion), 'unixepoch')
+    FROM metrics_fact f
+    JOIN dim_metrica m ON m.id = f.metrica_id
+    JOIN dim_entidad e ON e.id = f.entidad_id
+    GROUP BY f.metrica_id, f.entidad_id, 3
+"""
+
+# Recuento de un (metrica, entidad, mes) que acaba de cambiar, solo con el índice.
+# En v1 los + evitan idx_metrica_entidad (recorrería la serie completa): se recorre el mes
+# en un índice que empieza por fecha
+_REFRESCAR_STATS_MES_V1 = """
+    INSERT INTO metrics_stats_mes
+    SELECT ?, ?, ?, COUNT(*), COUNT(DISTINCT fecha), MIN(fecha), MAX(fecha), CURRENT_TIMESTAMP
+    FROM metrics
+    WHERE fecha BETWEEN ? AND ? AND +metrica = ? AND +entidad = ?
+    HAVING COUNT(*) > 0
+"""
+
+_REFRESCAR_STATS_MES_V2 = """
+    INSERT INTO metrics_stats_mes
+    SELECT ?, ?, ?, COUNT(*), COUNT(DISTINCT fecha_dia),
+           date(MIN(fecha_dia) + 2440587.5), date(MAX(fecha_dia) + 2440587.5), CURRENT_TIMESTAMP
+    FROM metrics_fact
+    WHERE metrica_id = (SELECT id FROM dim_metrica WHERE nombre = ?)
+      AND entidad_id = (SELECT id FROM dim_entidad WHERE nombre = ?)
+      AND fecha_dia BETWEEN ? AND ?
+    HAVING COUNT(*) > 0
+"""
+
+_RESUMIR_STATS = """
+    INSERT OR REPLACE INTO metrics_stats
+    SELECT metrica, entidad, SUM(registros), SUM(dias), MIN(fecha_min), MAX(fecha_max), MAX(fecha_actualizacion)
+    FROM metrics_stats_mes {where}
+    GROUP BY metrica, entidad
+"""
+
+
+def _tiene_stats(conn: sqlite3.Connection) -> bool:
+    """True si el catálogo de estadísticas existe (creado por init_database o rebuild_stats)"""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'metrics_stats'").fetchone() is not None
+
+
+def _resumir_stats(conn: sqlite3.Connection, series=None) -> None:
+    """Recalcula metrics_stats desde metrics_stats_mes (todas las series o las indicadas)"""
+    if series is None:
+        conn.execute("DELETE FROM metrics_stats")
+        conn.execute(_RESUMIR_STATS.format(where=''))
+        return
+    for metrica, entidad in series:
+        conn.execute("DELETE FROM metrics_stats WHERE metrica = ? AND entidad = ?", (metrica, entidad))
+        conn.execute(_RESUMIR_STATS.format(where="WHERE metrica = ? AND entidad = ?"), (metrica, entidad))
+
+
+def _refrescar_stats(conn: sqlite3.Connection, claves) -> None:
+    """
+    Recuenta los (metrica, entidad, mes) de datos diarios que cambiaron y resume sus
+    series, dentro de la transacción del escritor (un recorrido del índice por mes)
+    """
+    if not claves or not _tiene_stats(conn):
+        return
+    v2 = es_schema_v2(conn)
+    for metrica, entidad, mes in claves:
+        inicio, fin = _limites_periodo(_a_fecha(f"{mes}-01"), 'M')
+        conn.execute("DELETE FROM metrics_stats_mes WHERE metrica = ? AND entidad = ? AND mes = ?",
+                     (metrica, entidad, mes))
+        if v2:
+            conn.execute(_REFRESCAR_STATS_MES_V2, (metrica, entidad, mes, metrica, entidad,
+                                                   fecha_a_dia(inicio), fecha_a_dia(fin)))
+        else:
+            conn.execute(_REFRESCAR_STATS_MES_V1, (metrica, entidad, mes, inicio.isoformat(), fin.isoformat(),
+                                                   metrica, entidad))
+    _resumir_stats(conn, {(metrica, entidad) for metrica, entidad, _ in claves})
+
+
+def rebuild_stats() -> int:
+    """
+    Reconstruye el catálogo de estadísticas desde cero (un recorrido completo de los
+    datos diarios de la BD principal). Necesario una vez en BD creadas antes del catálogo
+    y después de borrar filas por fuera de db_manager.
+    
+    Returns:
+        Series en el catálogo (0 si falla)
+    """
+    try:
+        with get_connection() as conn:
+            for ddl in _SCHEMA_METRICS_STATS:
+                conn.execute(ddl)
+            conn.execute("DELETE FROM metrics_stats_mes")
+            conn.execute(_STATS_MES_V2 if es_schema_v2(conn) else _STATS_MES_V1)
+            _resumir_stats(conn)
+            conn.commit()
+            series = conn.execute("SELECT COUNT(*) FROM metrics_stats").fetchone()[0]
+        
+        logger.info(f"✅ Catálogo de estadísticas reconstruido: {series} series")
+        return series
+    except Exception as e:
+        logger.error(f"❌ Error reconstruyendo estadísticas: {e}")
+        return 0
+
+
+def get_metrics_stats(metrica: Optional[str] = None, entidad: Optional[str] = None) -> pd.DataFrame:
+    """
+    Estadísticas por serie desde el catálogo (sin recorrer metrics)
+    
+    Args:
+        metrica, entidad: Filtros opcionales
+    
+    Returns:
+        DataFrame con columnas: metrica, entidad, registros, dias, fecha_min, fecha_max,
+        fecha_actualizacion (vacío si el catálogo no existe: ver rebuild_stats)
+    """
+    query = "SELECT * FROM metrics_stats WHERE 1=1"
+    params = []
+    if metrica:
+        query += " AND metrica = ?"
+        params.append(metrica)
+    if entidad:
+        query += " AND entidad = ?"
+        params.append(entidad)
+    query += " ORDER BY metrica, entidad"
+    
+    try:
+        with get_connection(readonly=True) as conn:
+            if not _tiene_stats(conn):
+                logger.warning("⚠️ Sin catálogo de estadísticas: ejecutar scripts/monitor_etl.py --recompute")
+                return pd.DataFrame()
+            return pd.read_sql_query(query, conn, params=params)
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo estadísticas por serie: {e}")
+        return pd.DataFrame()
+
+
+# ============================================================================
+# ÍNDICE DE COBERTURA (qué días tiene cada serie, sin recorrer metrics)
+# ============================================================================
+
+# metrics_cobertura: tramos contiguos [desde, hasta] de días con datos (número de día de
+# fecha_a_dia) por (metrica, entidad, recurso); recurso NULL se guarda como '' y
+# recurso = '*' guarda la unión de todos los recursos de la serie. Las cargas
+# de datos diarios amplían los tramos en su misma transacción. Cuenta también los años
+# particionados (siguen siendo legibles). Como el catálogo de estadísticas, la tabla solo
+# existe si se creó completa (init_database o rebuild_cobertura); sin ella las consultas
+# recorren metrics. Los DELETE hechos por fuera de db_manager requieren rebuild_cobertura().
+_SCHEMA_COBERTURA = """
+    CREATE TABLE IF NOT EXISTS metrics_cobertura (
+        metrica VARCHAR(50) NOT NULL,
+        entidad VARCHAR(100) NOT NULL,
+        recurso VARCHAR(100) NOT NULL,
+        desde INTEGER NOT NULL,
+        hasta INTEGER NOT NULL,
+        PRIMARY KEY (metrica, entidad, recurso, desde)
+    ) WITHOUT ROWID
+"""
+
+_RECURSO_TODOS = '*'
+
+# Límites del recorrido de metrics cuando no hay índice de cobertura
+_FECHA_MIN_COBERTURA, _FECHA_MAX_COBERTURA = '2000-01-01', '2099-12-31'
+
+# Tramos de días consecutivos (gaps and islands) de una tabla metrics v1 o de metrics_fact
+_TRAMOS_V1 = """
+    SELECT metrica, entidad, recurso, MIN(dia), MAX(dia)
+    FROM (
+        SELECT metrica, entidad, recurso, dia,
+               dia - ROW_NUMBER() OVER (PARTITION BY metrica, entidad, recurso ORDER BY dia) AS grupo
+        FROM (SELECT DISTINCT metrica, entidad, COALESCE(recurso, '') AS recurso,
+                     CAST(julianday(fecha) - 2440587.5 AS INTEGER) AS dia
+              FROM {tabla})
+    )
+    GROUP BY metrica, entidad, recurso, grupo
+"""
+
+_TRAMOS_V2 = """
+    SELECT m.nombre, e.nombre, COALESCE(r.codigo, ''), MIN(t.fecha_dia), MAX(t.fecha_dia)
+    FROM (
+        SELECT metrica_id, entidad_id, recurso_id, fecha_dia,
+               fecha_dia - ROW_NUMBER() OVER (PARTITION BY metrica_id, entidad_id, recurso_id
+                                              ORDER BY fecha_dia) AS grupo
+        FROM metrics_fact
+    ) t
+    JOIN dim_metrica m ON m.id = t.metrica_id
+    JOIN dim_entidad e ON e.id = t.entidad_id
+    LEFT JOIN dim_recurso r ON r.id = t.recurso_id
+    GROUP BY t.metrica_id, t.entidad_id, t.recurso_id, t.grupo
+"""
+
+
+def _tiene_cobertura(conn: sqlite3.Connection) -> bool:
+    """True si el índice de cobertura existe (creado por init_database o rebuild_cobertura)"""
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'metrics_cobertura'").fetchone() is not None
+
+
+def _unir_tramos(tramos) -> List[Tuple[int, int]]:
+    """Une tramos [desde, hasta] que se solapan o son consecutivos; resultado ordenado"""
+    unidos = []
+    for desde, hasta in sorted(tramos):
+        if unidos and desde <= unidos[-1][1] + 1:
+            unidos[-1][1] = max(unidos[-1][1], hasta)
+        else:
+            unidos.append([desde, hasta])
+    return [tuple(t) for t in unidos]
+
+
+def _ampliar_cobertura(conn: sqlite3.Connection, filas: List[Tuple]) -> None:
+    """
+    Agrega los días de tuplas (fecha, metrica, entidad, recurso, ...) a los tramos de
+    cobertura, dentro de la transacción del escritor: por serie, los tramos nuevos se unen
+    con los guardados que tocan y se reemplazan
+    """
+    if not filas or not _tiene_cobertura(conn):
+        return
+    dias_por_fecha, por_serie = {}, {}
+    for fila in filas:
+        fecha = str(fila[0])[:10]
+        dia = dias_por_fecha.get(fecha)
+        if dia is None:
+            dia = dias_por_fecha[fecha] = fecha_a_dia(fecha)
+        por_serie.setdefault((fila[1], fila[2], fila[3] or ''), set()).add(dia)
+        por_serie.setdefault((fila[1], fila[2], _RECURSO_TODOS), set()).add(dia)
+    
+    for serie, dias in por_serie.items():
+        nuevos = _unir_tramos((dia, dia) for dia in dias)
+        limites = (*serie, nuevos[-1][1] + 1, nuevos[0][0] - 1)
+        donde = "WHERE metrica = ? AND entidad = ? AND recurso = ? AND desde <= ? AND hasta >= ?"
+        guardados = conn.execute(f"SELECT desde, hasta FROM metrics_cobertura {donde}", limites).fetchall()
+        unidos = _unir_tramos(nuevos + [tuple(t) for t in guardados])
+        if guardados:
+            if len(unidos) == len(guardados) and all(tuple(g) in unidos for g in guardados):
+                continue  # días ya cubiertos (actualizaciones de valores)
+            conn.execute(f"DELETE FROM metrics_cobertura {donde}", limites)
+        conn.executemany("INSERT INTO metrics_cobertura VALUES (?, ?, ?, ?, ?)",
+                         [(*serie, desde, hasta) for desde, hasta in unidos])
+
+
+def rebuild_cobertura() -> int:
+    """
+    Reconstruye el índice de cobertura desde cero (un recorrido de los datos diarios de la
+    BD principal y de cada partición anual). Necesario una vez en BD creadas antes del
+    índice y después de borrar filas por fuera de db_manager.
+    
+    Returns:
+        Tramos en el índice (0 si falla)
+    """
+    try:
+        with get_connection() as conn:
+            tramos = {}
+            filas = conn.execute(_TRAMOS_V2 if es_schema_v2(conn) else _TRAMOS_V1.format(tabla='metrics')).fetchall()
+            particiones = get_particiones()
+            for anio in sorted(particiones):
+                alias = _adjuntar_particiones(conn, particiones, [anio])[anio]
+                filas += conn.execute(_TRAMOS_V1.format(tabla=f"{alias}.metrics")).fetchall()
+            for metrica, entidad, recurso, desde, hasta in filas:
+                tramos.setdefault((metrica, entidad, recurso), []).append((desde, hasta))
+                tramos.setdefault((metrica, entidad, _RECURSO_TODOS), []).append((desde, hasta))
+            
+            conn.execute(_SCHEMA_COBERTURA)
+            conn.execute("DELETE FROM metrics_cobertura")
+            conn.executemany("INSERT INTO metrics_cobertura VALUES (?, ?, ?, ?, ?)",
+                             [(*serie, desde, hasta) for serie, lista in tramos.items()
+                              for desde, hasta in _unir_tramos(lista)])
+            conn.commit()
+            total = conn.execute("SELECT COUNT(*) FROM metrics_cobertura").fetchone()[0]
+        
+        logger.info(f"✅ Índice de cobertura reconstruido: {total} tramos")
+        return total
+    except Exception as e:
+        logger.error(f"❌ Error reconstruyendo índice de cobertura: {e}")
+        return 0
+
+
+def _tramos_serie(conn: sqlite3.Connection, metrica: str, entidad: str, recurso: Optional[str],
+                  desde: Optional[int] = None, hasta: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Tramos con datos de la serie (los de recurso '*' si recurso es None) que tocan
+    [desde, hasta]. Sin índice de cobertura, los arma recorriendo las fechas de la serie.
+    """
+    if _tiene_cobertura(conn):
+        query = "SELECT desde, hasta FROM metrics_cobertura WHERE metrica = ? AND entidad = ? AND recurso = ?"
+        params = [metrica, entidad, recurso or _RECURSO_TODOS]
+        if hasta is not None:
+            query += " AND desde <= ?"
+            params.append(hasta)
+        if desde is not None:
+            query += " AND hasta >= ?"
+            params.append(desde)
+        return _unir_tramos(tuple(t) for t in conn.execute(query, params).fetchall())
+    
+    fuente, params = _query_fuente(conn, metrica, entidad,
+                                   dia_a_fecha(desde) if desde is not None else _FECHA_MIN_COBERTURA,
+                                   dia_a_fecha(hasta) if hasta is not None else _FECHA_MAX_COBERTURA, recurso)
+    fechas = conn.execute(f"SELECT DISTINCT fecha FROM ({fuente})", params).fetchall()
+    return _unir_tramos((fecha_a_dia(f[0]), fecha_a_dia(f[0])) for f in fechas)
+
+
+def get_cobertura(metrica: str, entidad: str, recurso: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    Tramos de fechas con datos de una serie, desde el índice de cobertura
+    
+    Args:
+        metrica, entidad: Serie
+        recurso: Recurso (por defecto, cualquiera de la serie)
+    
+    Returns:
+        Lista ordenada de (fecha_inicio, fecha_fin) 'YYYY-MM-DD' sin días faltantes dentro
+    
+    Ejemplo:
+        get_cobertura('Gene', 'Sistema')  # [('2020-01-01', '2024-03-09'), ('2024-03-11', '2025-01-31')]
+    """
+    try:
+        with get_connection(readonly=True) as conn:
+            tramos = _tramos_serie(conn, metrica, entidad, recurso)
+        return [(dia_a_fecha(desde), dia_a_fecha(hasta)) for desde, hasta in tramos]
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo cobertura de {metrica}/{entidad}: {e}")
+        return []
+
+
+def get_rangos_faltantes(metrica: str, entidad: str, fecha_inicio, fecha_fin,
+                         recurso: Optional[str] = None) -> List[Tuple[str, str]]:
+    """
+    Sub-rangos de [fecha_inicio, fecha_fin] sin datos de la serie
+    
+    Args:
+        metrica, entidad: Serie
+        fecha_inicio, fecha_fin: Rango (str 'YYYY-MM-DD' o date)
+        recurso: Recurso (por defecto, un día cuenta si tiene datos de cualquier recurso)
+    
+    Returns:
+        Lista ordenada de (fecha_inicio, fecha_fin) 'YYYY-MM-DD' (vacía si el rango está completo;
+        el rango completo si falla la consulta)
+    """
+    inicio, fin = fecha_a_dia(fecha_inicio), fecha_a_dia(fecha_fin)
+    try:
+        with get_connection(readonly=True) as conn:
+            tramos = _tramos_serie(conn, metrica, entidad, recurso, inicio, fin)
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo cobertura de {metrica}/{entidad}: {e}")
+        tramos = []
+    
+    faltantes, cursor = [], inicio
+    for desde, hasta in tramos:
+        if desde > cursor:
+            faltantes.append((cursor, min(desde - 1, fin)))
+        cursor = max(cursor, hasta + 1)
+        if cursor > fin:
+            break
+    if cursor <= fin:
+        faltantes.append((cursor, fin))
+    return [(dia_a_fecha(desde), dia_a_fecha(hasta)) for desde, hasta in faltantes]
+
+
+def get_ultima_fecha(metrica: str, entidad: str, hasta=None, recurso: Optional[str] = None) -> Optional[str]:
+    """
+    Última fecha con datos de la serie en o antes de `hasta` (por defecto, la última)
+    
+    Args:
+        metrica, entidad: Serie
+        hasta: Fecha límite (str 'YYYY-MM-DD' o date), opcional
+        recurso: Recurso (opcional)
+    
+    Returns:
+        'YYYY-MM-DD' o None si no hay datos
+    """
+    limite = fecha_a_dia(hasta) if hasta is not None else None
+    try:
+        with get_connection(readonly=True) as conn:
+            tramos = _tramos_serie(conn, metrica, entidad, recurso, hasta=limite)
+    except Exception as e:
+        logger.error(f"❌ Error obteniendo última fecha para {metrica}/{entidad}: {e}")
+        return None
+    if not tramos:
+        return None
+    ultimo = tramos[-1][1] if limite is None else min(tramos[-1][1], limite)
+    return dia_a_fecha(ultimo)
+
+
+def get_limites_cobertura(metrica: str, entidad: str,
+                          recurso: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """(primera fecha, última fecha) con datos de la serie, o (None, None)"""
+    tramos = get_cobertura(metrica, entidad, recurso)
+    if not tramos:
+        return None, None
+    return tramos[0][0], tramos[-1][1]
+
+
+_UPSERT_METRICS_V1 = """
+    INSERT INTO metrics (fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion)
+    VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+    ON CONFLICT(fecha, metrica, entidad, recurso)
+    DO UPDATE SET
+        valor_gwh = excluded.valor_gwh,
+        unidad = excluded.unidad,
+        fecha_actualizacion = CURRENT_TIMESTAMP
+    WHERE metrics.valor_gwh IS NOT excluded.valor_gwh OR metrics.unidad IS NOT excluded.unidad
+"""
+
+_UPSERT_METRICS_V2 = """
+    INSERT INTO metrics_fact (metrica_id, entidad_id, recurso_id, fecha_dia, valor_gwh, unidad_id, fecha_actualizacion)
+    VALUES (?, ?, ?, ?, ?, ?, CAST(strftime('%s', 'now') AS INTEGER))
+    ON CONFLICT(metrica_id, entidad_id, recurso_id, fecha_dia)
+    DO UPDATE SET
+        valor_gwh = excluded.valor_gwh,
+        unidad_id = excluded.unidad_id,
+        fecha_actualizacion = excluded.fecha_actualizacion
+    WHERE metrics_fact.valor_gwh IS NOT excluded.valor_gwh OR metrics_fact.unidad_id IS NOT excluded.unidad_id
+"""
+
+
+def _upsert_metrics(conn: sqlite3.Connection, metrics: List[Tuple], incluir_particionados: bool = False) -> int:
+    """
+    UPSERT de tuplas (fecha, metrica, entidad, recurso, valor_gwh, unidad) según el esquema de la BD.
+    Las filas de años particionados se descartan (sus archivos son de solo lectura) salvo
+    incluir_particionados=True, que usa reabrir_particion.
+    Retorna filas insertadas o modificadas; sube la versión de las series/meses que cambiaron,
+    los recuenta en el catálogo de estadísticas y amplía el índice de cobertura.
+    """
+    if not incluir_particionados:
+        metrics = _descartar_particionados(metrics)
+        if not metrics:
+            return 0
+    if es_schema_v2(conn):
+        cursor = conn.cursor()
+        afectadas = _ejecutar_versionado(conn, _UPSERT_METRICS_V2, metrics, _clave_version,
+                                         lambda grupo: _filas_v2(cursor, grupo), estadisticas=True)
+    else:
+        afectadas = _ejecutar_versionado(conn, _UPSERT_METRICS_V1, metrics, _clave_version, estadisticas=True)
+    _ampliar_cobertura(conn, metrics)
+    return afectadas
+
+
+def _descartar_particionados(metrics: List[Tuple]) -> List[Tuple]:
+    """Quita las tuplas (fecha, ...) de años particionados (archivos de solo lectura)"""
+    particiones = get_particiones()
+    if not particiones:
+        return metrics
+    cerrados = sorted({int(str(m[0])[:4]) for m in metrics} & particiones.keys())
+    if not cerrados:
+        return metrics
+    
+    filtradas = [m for m in metrics if int(str(m[0])[:4]) not in particiones]
+    logger.warning(f"⚠️ {len(metrics) - len(filtradas)} registros de años particionados {cerrados} ignorados "
+                   f"(solo lectura; ver scripts/particionar_por_anio.py --reabrir)")
+    return filtradas
+
+
+# Merge de la tabla staging: una sentencia por (metrica, entidad, mes) del lote, para saber
+# qué versiones subir. La tabla staging se recorre en orden de inserción: con claves
+# repetidas en el lote gana la última fila (igual que executemany)
+_STAGING_METRICS = ('fecha TEXT', 'metrica TEXT', 'entidad TEXT', 'recurso TEXT', 'valor_gwh REAL', 'unidad TEXT')
+
+_MERGE_METRICS_V1 = """
+    INSERT INTO metrics (fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion)
+    SELECT fecha, metrica, entidad, recurso, valor_gwh, unidad, CURRENT_TIMESTAMP
+    FROM temp.staging_metrics
+    WHERE metrica = ? AND entidad = ? AND substr(fecha, 1, 7) = ?
+    ON CONFLICT(fecha, metrica, entidad, recurso)
+    DO UPDATE SET
+        valor_gwh = excluded.valor_gwh,
+        unidad = excluded.unidad,
+        fecha_actualizacion = CURRENT_TIMESTAMP
+    WHERE metrics.valor_gwh IS NOT excluded.valor_gwh OR metrics.unidad IS NOT excluded.unidad
+"""
+
+
+@contextmanager
+def _modo_carga(conn: sqlite3.Connection):
+    """Aplica PRAGMAS_CARGA a la conexión de escritura y restaura los del pool al salir"""
+    for pragma, valor in PRAGMAS_CARGA.items():
+        conn.execute(f"PRAGMA {pragma}={valor}")
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        conn.execute(f"PRAGMA synchronous={SQLITE_PRAGMAS['synchronous']}")
+        conn.execute(f"PRAGMA cache_size={SQLITE_PRAGMAS['cache_size']}")
+        conn.execute("PRAGMA wal_autocheckpoint=1000")
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def _cargar_por_lotes(conn: sqlite3.Connection, sql: str, filas: List[Tuple], clave,
+                      staging: Optional[Tuple[str, Tuple[str, ...]]] = None, lote: Optional[int] = None,
+                      convertir=None, estadisticas: bool = False) -> int:
+    """
+    Carga masiva con commit cada `lote` filas y PRAGMAS_CARGA: el lock de escritura se
+    libera entre lotes, así que lectores y otros escritores no esperan toda la carga.
+    
+    Con staging=(tabla, columnas), cada lote se inserta en temp.<tabla> (sin índices) y
+    `sql` es el merge INSERT … SELECT … ON CONFLICT, filtrado por (metrica, entidad, mes)
+    y ejecutado una vez por cada clave de versión del lote; sin staging, `sql` es el upsert
+    fila a fila del lote (ver _ejecutar_versionado, que usa `clave` y `convertir`).
+    Las versiones (y con estadisticas=True el catálogo de estadísticas y el índice de
+    cobertura) de cada lote se actualizan en su misma transacción.
+    
+    Si un lote falla, los anteriores quedan confirmados (son upserts: reintentar es seguro).
+    
+    Returns:
+        Filas insertadas/actualizadas
+    """
+    lote = lote or LOTE_CARGA
+    if staging:
+        tabla, columnas = staging
+        conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {tabla} ({', '.join(columnas)})")
+        insertar = f"INSERT INTO temp.{tabla} VALUES ({', '.join(['?'] * len(columnas))})"
+    
+    t_inicio = time.perf_counter()
+    afectadas = 0
+    with _modo_carga(conn):
+        for i in range(0, len(filas), lote):
+            if staging:
+                conn.execute(f"DELETE FROM temp.{tabla}")
+                conn.executemany(insertar, filas[i:i + lote])
+                claves = conn.execute(
+                    f"SELECT DISTINCT metrica, entidad, substr(fecha, 1, 7) FROM temp.{tabla}"
+                ).fetchall()
+                afectadas += _ejecutar_versionado(conn, sql, [tuple(c) for c in claves], lambda c: c,
+                                                  estadisticas=estadisticas)
+            else:
+                afectadas += _ejecutar_versionado(conn, sql, filas[i:i + lote], clave, convertir, estadisticas)
+            if estadisticas:
+                _ampliar_cobertura(conn, filas[i:i + lote])
+            conn.commit()
+        if staging:
+            conn.execute(f"DELETE FROM temp.{tabla}")
+            conn.commit()
+    
+    segundos = max(time.perf_counter() - t_inicio, 1e-6)
+    logger.info(f"⚡ Carga por lotes{f' (staging {tabla})' if staging else ''}: {len(filas):,} filas en "
+                f"{segundos:.1f}s ({len(filas) / segundos:,.0f} filas/s, lotes de {lote:,})")
+    return afectadas
+
+
 def get_metric_data(
     metrica: str,
     entidad: str,
     fecha_inicio: str,
     fecha_fin: Optional[str] = None,
     recurso: Optional[str] = None,
-    recurso_filter: Optional[list] = None
+    recurso_filter: Optional[list] = None,
+    resolucion: Optional[str] = None,
+    agregacion: str = 'suma',
+    min_puntos: Optional[int] = None
 ) -> pd.DataFrame:
     """
     Obtiene datos de métrica desde SQLite
@@ -86,43 +1096,35 @@ def get_metric_data(
         fecha_fin: Fecha fin (opcional, si no se proporciona usa fecha_inicio)
         recurso: Filtro por recurso único (opcional, ej: 'CARBON', 'HIDRAULICA')
         recurso_filter: Lista de recursos para filtrar (opcional, ej: ['2QBW', '2QRL', 'RCIO'])
+        resolucion: None/'D' = datos diarios; 'W', 'M', 'Y' = agregados desde los rollups;
+                    'auto' = la más gruesa que da al menos min_puntos puntos (ver pick_resolution)
+        agregacion: Estadístico que va en valor_gwh con resolucion agregada:
+                    'suma' (energía), 'promedio' (volúmenes, precios), 'minimo', 'maximo'
+        min_puntos: Puntos mínimos para resolucion='auto' (por defecto MIN_PUNTOS_ROLLUP)
     
     Returns:
         DataFrame con columnas: fecha, metrica, entidad, recurso, valor_gwh, unidad
+        (con resolución agregada, fecha es el primer día del periodo y se agregan
+        resolucion, suma, promedio, minimo, maximo y conteo)
     """
     try:
         if fecha_fin is None:
             fecha_fin = fecha_inicio
         
-        # Query base
-        query = """
-            SELECT fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion
-            FROM metrics
-            WHERE metrica = ?
-              AND entidad = ?
-              AND fecha BETWEEN ? AND ?
-        """
-        params = [metrica, entidad, fecha_inicio, fecha_fin]
-        
-        # Agregar filtro por recurso único
-        if recurso:
-            query += " AND recurso = ?"
-            params.append(recurso)
-        
-        # Agregar filtro por lista de recursos (usando IN)
-        elif recurso_filter and len(recurso_filter) > 0:
-            placeholders = ','.join(['?'] * len(recurso_filter))
-            query += f" AND recurso IN ({placeholders})"
-            params.extend(recurso_filter)
-        
-        query += " ORDER BY fecha, recurso"
+        if resolucion == 'auto':
+            resolucion = pick_resolution(fecha_inicio, fecha_fin, min_puntos or MIN_PUNTOS_ROLLUP)
+        if resolucion and resolucion != 'D':
+            return _get_metric_rollup(metrica, entidad, fecha_inicio, fecha_fin, resolucion,
+                                      agregacion, recurso, recurso_filter)
         
         # Ejecutar query
         import time
         t_start = time.time()
-        logger.info(f"🔄 Iniciando query SQLite: {metrica}/{entidad} ({len(params)-4 if recurso_filter else 0} recursos)")
+        logger.info(f"🔄 Iniciando query SQLite: {metrica}/{entidad} ({len(recurso_filter) if recurso_filter else 0} recursos)")
         
-        with get_connection() as conn:
+        with get_connection(readonly=True) as conn:
+            query, params = _query_fuente(conn, metrica, entidad, fecha_inicio, fecha_fin, recurso, recurso_filter,
+                                          ordenar=True)
             df = pd.read_sql_query(query, conn, params=params)
         
         elapsed = time.time() - t_start
@@ -134,6 +1136,201 @@ def get_metric_data(
         return pd.DataFrame()
 
 
+def _query_fuente(conn: sqlite3.Connection, metrica, entidad, fecha_inicio, fecha_fin,
+                  recurso=None, recurso_filter=None, ordenar=False):
+    """
+    (query, params) de los datos diarios de una serie según el esquema de la BD.
+    Los años del rango que tienen partición se leen de su archivo (ATTACH) y los
+    tramos se unen con UNION ALL; sin particiones en el rango la query es la de siempre.
+    """
+    builder = _query_metric_data_v2 if es_schema_v2(conn) else _query_metric_data_v1
+    particiones = get_particiones()
+    anios = []
+    if particiones:
+        inicio, fin = _a_fecha(fecha_inicio), _a_fecha(fecha_fin)
+        anios = [anio for anio in range(inicio.year, fin.year + 1) if anio in particiones]
+    if not anios:
+        return builder(metrica, entidad, fecha_inicio, fecha_fin, recurso, recurso_filter, ordenar)
+    
+    alias = _adjuntar_particiones(conn, particiones, anios)
+    
+    # Tramos [desde, hasta, alias]: cada año particionado es un tramo; los años
+    # contiguos sin partición se leen de la BD principal en un solo tramo
+    tramos = []
+    for anio in range(inicio.year, fin.year + 1):
+        desde, hasta = max(inicio, date(anio, 1, 1)), min(fin, date(anio, 12, 31))
+        if tramos and anio not in alias and tramos[-1][2] is None:
+            tramos[-1][1] = hasta
+        else:
+            tramos.append([desde, hasta, alias.get(anio)])
+    
+    partes, params = [], []
+    for desde, hasta, fuente in tramos:
+        if fuente:
+            query, p = _query_metric_data_v1(metrica, entidad, desde.isoformat(), hasta.isoformat(),
+                                             recurso, recurso_filter, False, tabla=f"{fuente}.metrics")
+        else:
+            query, p = builder(metrica, entidad, desde.isoformat(), hasta.isoformat(), recurso, recurso_filter, False)
+        partes.append(query)
+        params.extend(p)
+    
+    query = " UNION ALL ".join(partes)
+    if ordenar:
+        query = f"SELECT * FROM ({query}) ORDER BY fecha, recurso"
+    return query, params
+
+
+def _query_metric_data_v1(metrica, entidad, fecha_inicio, fecha_fin, recurso=None, recurso_filter=None, ordenar=True,
+                          tabla='metrics'):
+    """Query de get_metric_data sobre la tabla metrics (esquema v1 o partición anual)"""
+    query = f"""
+        SELECT fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion
+        FROM {tabla}
+        WHERE metrica = ?
+          AND entidad = ?
+          AND fecha BETWEEN ? AND ?
+    """
+    params = [metrica, entidad, fecha_inicio, fecha_fin]
+    
+    # Agregar filtro por recurso único
+    if recurso:
+        query += " AND recurso = ?"
+        params.append(recurso)
+    
+    # Agregar filtro por lista de recursos (usando IN)
+    elif recurso_filter and len(recurso_filter) > 0:
+        placeholders = ','.join(['?'] * len(recurso_filter))
+        query += f" AND recurso IN ({placeholders})"
+        params.extend(recurso_filter)
+    
+    if ordenar:
+        query += " ORDER BY fecha, recurso"
+    return query, params
+
+
+def _query_metric_data_v2(metrica, entidad, fecha_inicio, fecha_fin, recurso=None, recurso_filter=None, ordenar=True):
+    """
+    Query equivalente a get_metric_data sobre metrics_fact: filtra por claves enteras
+    y rango de días, recorriendo la PK agrupada (metrica, entidad, recurso, fecha)
+    """
+    query = """
+        SELECT date(f.fecha_dia + 2440587.5) AS fecha, ? AS metrica, ? AS entidad,
+               r.codigo AS recurso, f.valor_gwh, u.nombre AS unidad,
+               datetime(f.fecha_actualizacion, 'unixepoch') AS fecha_actualizacion
+        FROM metrics_fact f
+        JOIN dim_recurso r ON r.id = f.recurso_id
+        JOIN dim_unidad u ON u.id = f.unidad_id
+        WHERE f.metrica_id = (SELECT id FROM dim_metrica WHERE nombre = ?)
+          AND f.entidad_id = (SELECT id FROM dim_entidad WHERE nombre = ?)
+          AND f.fecha_dia BETWEEN ? AND ?
+    """
+    params = [metrica, entidad, metrica, entidad, fecha_a_dia(fecha_inicio), fecha_a_dia(fecha_fin)]
+    
+    if recurso:
+        query += " AND f.recurso_id = (SELECT id FROM dim_recurso WHERE codigo = ?)"
+        params.append(recurso)
+    elif recurso_filter and len(recurso_filter) > 0:
+        placeholders = ','.join(['?'] * len(recurso_filter))
+        query += f" AND f.recurso_id IN (SELECT id FROM dim_recurso WHERE codigo IN ({placeholders}))"
+        params.extend(recurso_filter)
+    
+    if ordenar:
+        query += " ORDER BY f.fecha_dia, r.codigo"
+    return query, params
+
+
+# Catálogo con el nombre legible de los códigos de cada entidad
+CATALOGO_POR_ENTIDAD = {
+    'Recurso': 'ListadoRecursos',
+    'Embalse': 'ListadoEmbalses',
+    'Rio': 'ListadoRios',
+    'Agente': 'ListadoAgentes',
+}
+
+
+def get_metrics_bulk(
+    series: List[Tuple],
+    fecha_inicio: str,
+    fecha_fin: Optional[str] = None,
+    como_dict: bool = False,
+    mapear_nombres: bool = True
+):
+    """
+    Obtiene varias series del mismo rango de fechas en una sola pasada: una conexión
+    del pool, los catálogos en memoria (utils/catalogos) y las consultas de cada serie una tras otra,
+    para callbacks que piden varias métricas (pérdidas, restricciones, aportes)
+
+    Args:
+        series: Lista de (metrica, entidad) o (metrica, entidad, filtro_recurso), donde
+                filtro_recurso es un código ('_SISTEMA_'), una lista de códigos o None
+        fecha_inicio: Fecha inicio en formato 'YYYY-MM-DD'
+        fecha_fin: Fecha fin (opcional, si no se proporciona usa fecha_inicio)
+        como_dict: False = un DataFrame largo; True = {(metrica, entidad): DataFrame}
+                   con una entrada (posiblemente vacía) por cada serie pedida
+        mapear_nombres: Agregar columna nombre (código → nombre del catálogo de la
+                        entidad, ver CATALOGO_POR_ENTIDAD)
+
+    Returns:
+        DataFrame con las columnas de get_metric_data (+ nombre): las series en el orden
+        pedido y cada una por fecha, recurso; o dict de DataFrames si como_dict=True
+
+    Nota: en SQLite (en proceso) no hay latencia de red por consulta; un UNION ALL de
+    las series resultó ~10% más lento que consultas separadas (ordenamiento de las
+    partes en el mismo statement), por eso se ejecutan por separado en la misma conexión.
+
+    Ejemplo:
+        datos = get_metrics_bulk([('PerdidasEner', 'Sistema', '_SISTEMA_'),
+                                  ('Gene', 'Sistema', '_SISTEMA_')],
+                                 '2024-01-01', '2024-12-31', como_dict=True)
+        perdidas = datos[('PerdidasEner', 'Sistema')]
+
+    Nota: una sola especificación por (metrica, entidad); las repetidas se ignoran.
+    """
+    if fecha_fin is None:
+        fecha_fin = fecha_inicio
+
+    especificaciones = {}
+    for serie in series:
+        metrica, entidad = serie[0], serie[1]
+        if (metrica, entidad) in especificaciones:
+            logger.warning(f"⚠️ Serie repetida en get_metrics_bulk ignorada: {metrica}/{entidad}")
+            continue
+        especificaciones[(metrica, entidad)] = serie[2] if len(serie) > 2 else None
+
+    try:
+        import time
+        t_start = time.time()
+
+        with get_connection(readonly=True) as conn:
+            frames = {}
+            for (metrica, entidad), filtro in especificaciones.items():
+                recurso = filtro if isinstance(filtro, str) else None
+                recurso_filter = list(filtro) if filtro and not isinstance(filtro, str) else None
+                query, params = _query_fuente(conn, metrica, entidad, fecha_inicio, fecha_fin,
+                                              recurso, recurso_filter, ordenar=True)
+                frames[(metrica, entidad)] = pd.read_sql_query(query, conn, params=params)
+
+        if mapear_nombres:
+            from utils import catalogos
+            for (_, entidad), df in frames.items():
+                catalogo = CATALOGO_POR_ENTIDAD.get(entidad)
+                df['nombre'] = catalogos.nombres(df['recurso'], catalogo) if catalogo else df['recurso']
+
+        total = sum(len(df) for df in frames.values())
+        elapsed = time.time() - t_start
+        logger.info(f"✅ Query bulk completada en {elapsed:.2f}s: {len(frames)} series, "
+                    f"{total} registros ({fecha_inicio} a {fecha_fin})")
+
+        if como_dict:
+            return frames
+        no_vacios = [df for df in frames.values() if not df.empty]
+        return pd.concat(no_vacios, ignore_index=True) if no_vacios else pd.DataFrame()
+
+    except Exception as e:
+        logger.error(f"❌ Error consultando series en bulk: {e}")
+        return {clave: pd.DataFrame() for clave in especificaciones} if como_dict else pd.DataFrame()
+
+
 def upsert_metric(
     fecha: str,
     metrica: str,
@@ -159,19 +1356,8 @@ def upsert_metric(
         True si operación exitosa, False si error
     """
     try:
-        query = """
-            INSERT INTO metrics (fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(fecha, metrica, entidad, recurso)
-            DO UPDATE SET
-                valor_gwh = excluded.valor_gwh,
-                unidad = excluded.unidad,
-                fecha_actualizacion = CURRENT_TIMESTAMP
-        """
-        
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, (fecha, metrica, entidad, recurso, valor_gwh, unidad))
+            _upsert_metrics(conn, [(fecha, metrica, entidad, recurso, valor_gwh, unidad)])
             conn.commit()
         
         return True
@@ -181,32 +1367,40 @@ def upsert_metric(
         return False
 
 
-def upsert_metrics_bulk(metrics: List[Tuple]) -> int:
+def upsert_metrics_bulk(metrics: List[Tuple], lote: Optional[int] = None) -> int:
     """
-    Inserta múltiples métricas en una sola transacción (más eficiente)
+    Inserta múltiples métricas de forma eficiente
+    
+    Hasta UMBRAL_STAGING filas: un executemany en una sola transacción.
+    Cargas mayores (backfills): por lotes con commit por lote y PRAGMAS_CARGA
+    (ver _cargar_por_lotes); en v1 cada lote pasa por una tabla staging y un solo merge.
+    Las filas idénticas a las guardadas no se reescriben y no cambian get_data_version.
+    Los meses que cambian se recuentan en el catálogo de estadísticas (get_metrics_stats).
     
     Args:
         metrics: Lista de tuplas (fecha, metrica, entidad, recurso, valor_gwh, unidad)
+        lote: Filas por lote de la carga por staging (por defecto LOTE_CARGA)
     
     Returns:
-        Número de registros insertados/actualizados
+        Número de registros insertados o modificados
     """
     try:
-        query = """
-            INSERT INTO metrics (fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion)
-            VALUES (?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
-            ON CONFLICT(fecha, metrica, entidad, recurso)
-            DO UPDATE SET
-                valor_gwh = excluded.valor_gwh,
-                unidad = excluded.unidad,
-                fecha_actualizacion = CURRENT_TIMESTAMP
-        """
-        
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.executemany(query, metrics)
-            conn.commit()
-            rows_affected = cursor.rowcount
+            if len(metrics) < UMBRAL_STAGING:
+                rows_affected = _upsert_metrics(conn, metrics)
+                conn.commit()
+            else:
+                metrics = _descartar_particionados(metrics)
+                if es_schema_v2(conn):
+                    # Claves enteras: el upsert sobre la PK agrupada es más rápido que pasar por staging
+                    cursor = conn.cursor()
+                    rows_affected = _cargar_por_lotes(conn, _UPSERT_METRICS_V2, metrics, _clave_version,
+                                                      lote=lote, convertir=lambda grupo: _filas_v2(cursor, grupo),
+                                                      estadisticas=True)
+                else:
+                    rows_affected = _cargar_por_lotes(conn, _MERGE_METRICS_V1, metrics, _clave_version,
+                                                      ('staging_metrics', _STAGING_METRICS), lote,
+                                                      estadisticas=True)
         
         logger.info(f"✅ Bulk insert: {rows_affected} registros procesados")
         return rows_affected
@@ -218,7 +1412,8 @@ def upsert_metrics_bulk(metrics: List[Tuple]) -> int:
 
 def get_latest_date(metrica: str, entidad: str, recurso: Optional[str] = None) -> Optional[str]:
     """
-    Obtiene la fecha más reciente disponible para una métrica
+    Obtiene la fecha más reciente disponible para una métrica (índice de cobertura,
+    incluidos los años particionados; ver get_ultima_fecha)
     
     Args:
         metrica: Nombre de la métrica
@@ -228,28 +1423,7 @@ def get_latest_date(metrica: str, entidad: str, recurso: Optional[str] = None) -
     Returns:
         Fecha más reciente en formato 'YYYY-MM-DD' o None si no hay datos
     """
-    try:
-        query = """
-            SELECT MAX(fecha) as max_fecha
-            FROM metrics
-            WHERE metrica = ? AND entidad = ?
-        """
-        params = [metrica, entidad]
-        
-        if recurso:
-            query += " AND recurso = ?"
-            params.append(recurso)
-        
-        with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(query, params)
-            result = cursor.fetchone()
-        
-        return result['max_fecha'] if result['max_fecha'] else None
-        
-    except Exception as e:
-        logger.error(f"❌ Error obteniendo última fecha para {metrica}/{entidad}: {e}")
-        return None
+    return get_ultima_fecha(metrica, entidad, recurso=recurso)
 
 
 def get_database_stats() -> dict:
@@ -260,31 +1434,57 @@ def get_database_stats() -> dict:
         Diccionario con estadísticas: total_registros, metricas, fechas, etc.
     """
     try:
-        with get_connection() as conn:
+        with get_connection(readonly=True) as conn:
             cursor = conn.cursor()
             
-            # Total de registros
-            cursor.execute("SELECT COUNT(*) as total FROM metrics")
-            total = cursor.fetchone()['total']
-            
-            # Número de métricas únicas
-            cursor.execute("SELECT COUNT(DISTINCT metrica) as count FROM metrics")
-            metricas_count = cursor.fetchone()['count']
-            
-            # Rango de fechas
-            cursor.execute("SELECT MIN(fecha) as min_fecha, MAX(fecha) as max_fecha FROM metrics")
-            fechas = cursor.fetchone()
+            if _tiene_stats(conn):
+                # Catálogo de estadísticas: una fila por serie, sin recorrer metrics
+                cursor.execute("""
+                    SELECT COALESCE(SUM(registros), 0) as total, COUNT(DISTINCT metrica) as count,
+                           MIN(fecha_min) as min_fecha, MAX(fecha_max) as max_fecha
+                    FROM metrics_stats
+                """)
+                fila = cursor.fetchone()
+                total, metricas_count, fechas = fila['total'], fila['count'], fila
+            else:
+                logger.warning("⚠️ Sin catálogo de estadísticas, recorriendo metrics "
+                               "(ejecutar scripts/monitor_etl.py --recompute)")
+                # En v2 se consulta la tabla de hechos (la vista tendría que resolver joins)
+                tabla, col_metrica, col_fecha = 'metrics', 'metrica', 'fecha'
+                if es_schema_v2(conn):
+                    tabla, col_metrica, col_fecha = 'metrics_fact', 'metrica_id', 'date(fecha_dia + 2440587.5)'
+                
+                # Total de registros
+                cursor.execute(f"SELECT COUNT(*) as total FROM {tabla}")
+                total = cursor.fetchone()['total']
+                
+                # Número de métricas únicas
+                cursor.execute(f"SELECT COUNT(DISTINCT {col_metrica}) as count FROM {tabla}")
+                metricas_count = cursor.fetchone()['count']
+                
+                # Rango de fechas
+                cursor.execute(f"SELECT MIN({col_fecha}) as min_fecha, MAX({col_fecha}) as max_fecha FROM {tabla}")
+                fechas = cursor.fetchone()
             
             # Tamaño del archivo de base de datos
             db_size_mb = DB_PATH.stat().st_size / (1024 * 1024) if DB_PATH.exists() else 0
             
+        # Años cerrados en archivos aparte (no cuentan en total_registros)
+        particiones = get_particiones()
+        fecha_minima = fechas['min_fecha']
+        if particiones:
+            fecha_minima = f"{min(particiones)}-01-01"
+        
         stats = {
             'total_registros': total,
             'metricas_unicas': metricas_count,
-            'fecha_minima': fechas['min_fecha'],
+            'fecha_minima': fecha_minima,
             'fecha_maxima': fechas['max_fecha'],
             'tamano_db_mb': round(db_size_mb, 2),
-            'ruta_db': str(DB_PATH)
+            'ruta_db': str(DB_PATH),
+            'particiones': {
+                anio: round(ruta.stat().st_size / (1024 * 1024), 2) for anio, ruta in sorted(particiones.items())
+            }
         }
         
         return stats
@@ -336,7 +1536,7 @@ def upsert_catalogo_bulk(catalogo: str, registros: List[dict]) -> int:
             }
     
     Returns:
-        Número de registros insertados/actualizados
+        Número de registros insertados o modificados (los idénticos a los guardados no cuentan)
     
     Ejemplo:
         registros = [
@@ -362,6 +1562,11 @@ def upsert_catalogo_bulk(catalogo: str, registros: List[dict]) -> int:
                     capacidad = excluded.capacidad,
                     metadata = excluded.metadata,
                     fecha_actualizacion = CURRENT_TIMESTAMP
+                WHERE catalogos.nombre IS NOT excluded.nombre
+                   OR catalogos.tipo IS NOT excluded.tipo
+                   OR catalogos.region IS NOT excluded.region
+                   OR catalogos.capacidad IS NOT excluded.capacidad
+                   OR catalogos.metadata IS NOT excluded.metadata
             """
             
             datos = [
@@ -377,10 +1582,9 @@ def upsert_catalogo_bulk(catalogo: str, registros: List[dict]) -> int:
                 for reg in registros
             ]
             
-            cursor.executemany(query, datos)
+            registros_afectados = _ejecutar_versionado(conn, query, datos, lambda fila: (METRICA_CATALOGO, catalogo, ''))
             conn.commit()
             
-            registros_afectados = cursor.rowcount
             logger.info(f"✅ Catálogo {catalogo}: {registros_afectados} registros guardados")
             return registros_afectados
             
@@ -389,131 +1593,711 @@ def upsert_catalogo_bulk(catalogo: str, registros: List[dict]) -> int:
         return 0
 
 
-def get_catalogo(catalogo: str, codigo: str = None) -> pd.DataFrame:
+def get_catalogo(catalogo: str, codigo: str = None) -> pd.DataFrame:
+    """
+    Obtiene registros de un catálogo
+    
+    Args:
+        catalogo: Nombre del catálogo ('ListadoRecursos', 'ListadoEmbalses', etc.)
+        codigo: Código específico a buscar (opcional, si None devuelve todos)
+    
+    Returns:
+        DataFrame con columnas: codigo, nombre, tipo, region, capacidad, metadata
+    
+    Ejemplo:
+        # Obtener todos los recursos
+        df = get_catalogo('ListadoRecursos')
+        
+        # Obtener recurso específico
+        df = get_catalogo('ListadoRecursos', '2QBW')
+    """
+    try:
+        with get_connection(readonly=True) as conn:
+            if codigo:
+                query = """
+                    SELECT codigo, nombre, tipo, region, capacidad, metadata, fecha_actualizacion
+                    FROM catalogos
+                    WHERE catalogo = ? AND codigo = ?
+                """
+                df = pd.read_sql_query(query, conn, params=(catalogo, codigo))
+            else:
+                query = """
+                    SELECT codigo, nombre, tipo, region, capacidad, metadata, fecha_actualizacion
+                    FROM catalogos
+                    WHERE catalogo = ?
+                    ORDER BY nombre
+                """
+                df = pd.read_sql_query(query, conn, params=(catalogo,))
+            
+            logger.info(f"✅ Catálogo {catalogo}: {len(df)} registros obtenidos")
+            return df
+            
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error consultando catálogo {catalogo}: {e}")
+        return pd.DataFrame()
+
+
+def get_mapeo_codigos(catalogo: str) -> dict:
+    """
+    Obtiene diccionario de mapeo código → nombre desde un catálogo
+    
+    Args:
+        catalogo: Nombre del catálogo ('ListadoRecursos', 'ListadoEmbalses', etc.)
+    
+    Returns:
+        Diccionario {codigo: nombre}
+    
+    Ejemplo:
+        mapeo = get_mapeo_codigos('ListadoRecursos')
+        # {'2QBW': 'GUAVIO', '2QRL': 'RIO NEGRO', ...}
+        
+        nombre = mapeo.get('2QBW', '2QBW')  # Devuelve 'GUAVIO'
+    """
+    try:
+        with get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT codigo, nombre
+                FROM catalogos
+                WHERE catalogo = ? AND nombre IS NOT NULL
+            """, (catalogo,))
+            
+            mapeo = {row[0]: row[1] for row in cursor.fetchall()}
+            logger.info(f"✅ Mapeo {catalogo}: {len(mapeo)} códigos")
+            return mapeo
+            
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error obteniendo mapeo {catalogo}: {e}")
+        return {}
+
+
+def get_codigos_con_datos(metrica: str, entidad: str, fecha_inicio: str, fecha_fin: str) -> List[str]:
+    """
+    Obtiene lista de códigos de recurso que tienen datos en un rango de fechas.
+    Útil para optimizar consultas evitando buscar códigos sin datos.
+    
+    Args:
+        metrica: Nombre de la métrica (ej: 'Gene')
+        entidad: Tipo de entidad (ej: 'Recurso')
+        fecha_inicio: Fecha inicio en formato 'YYYY-MM-DD'
+        fecha_fin: Fecha fin en formato 'YYYY-MM-DD'
+    
+    Returns:
+        Lista de códigos de recurso que tienen al menos un dato en el rango
+    
+    Ejemplo:
+        codigos = get_codigos_con_datos('Gene', 'Recurso', '2024-01-01', '2024-12-31')
+        # ['2QBW', '2QEK', '2QRL', ...]
+    """
+    try:
+        with get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
+            if es_schema_v2(conn):
+                cursor.execute("""
+                    SELECT r.codigo
+                    FROM dim_recurso r
+                    WHERE r.id != 0
+                        AND r.codigo != '_SISTEMA_'
+                        AND EXISTS (
+                            SELECT 1 FROM metrics_fact f
+                            WHERE f.metrica_id = (SELECT id FROM dim_metrica WHERE nombre = ?)
+                              AND f.entidad_id = (SELECT id FROM dim_entidad WHERE nombre = ?)
+                              AND f.recurso_id = r.id
+                              AND f.fecha_dia BETWEEN ? AND ?
+                        )
+                """, (metrica, entidad, fecha_a_dia(fecha_inicio), fecha_a_dia(fecha_fin)))
+            else:
+                cursor.execute("""
+                    SELECT DISTINCT recurso
+                    FROM metrics
+                    WHERE metrica = ?
+                        AND entidad = ?
+                        AND fecha BETWEEN ? AND ?
+                        AND recurso IS NOT NULL
+                        AND recurso != '_SISTEMA_'
+                """, (metrica, entidad, fecha_inicio, fecha_fin))
+            
+            codigos = [row[0] for row in cursor.fetchall()]
+            
+            # Años del rango que están en particiones
+            particiones = get_particiones()
+            anios = [a for a in range(_a_fecha(fecha_inicio).year, _a_fecha(fecha_fin).year + 1) if a in particiones]
+            if anios:
+                vistos = set(codigos)
+                for anio, alias in _adjuntar_particiones(conn, particiones, anios).items():
+                    cursor.execute(f"""
+                        SELECT DISTINCT recurso
+                        FROM {alias}.metrics
+                        WHERE metrica = ?
+                            AND entidad = ?
+                            AND fecha BETWEEN ? AND ?
+                            AND recurso IS NOT NULL
+                            AND recurso != '_SISTEMA_'
+                    """, (metrica, entidad, fecha_inicio, fecha_fin))
+                    nuevos = [row[0] for row in cursor.fetchall() if row[0] not in vistos]
+                    vistos.update(nuevos)
+                    codigos.extend(nuevos)
+            
+            logger.info(f"✅ {len(codigos)} códigos con datos en {fecha_inicio} → {fecha_fin}")
+            return codigos
+            
+    except sqlite3.Error as e:
+        logger.error(f"❌ Error obteniendo códigos con datos: {e}")
+        return []
+
+
+# ============================================================================
+# PARTICIONES POR AÑO (años cerrados en archivos de solo lectura)
+# ============================================================================
+
+_PATRON_PARTICION = re.compile(r'^metrics_(\d{4})\.db$')
+_PATRON_ALIAS = re.compile(r'^p(\d{4})_\d+$')
+
+# SQLite admite 10 bases adjuntas por conexión: una queda libre para particionar_anio
+_MAX_PARTICIONES_ADJUNTAS = 9
+
+# (carpeta, mtime) → {anio: ruta}; se reemplaza entera para que los hilos no vean un estado a medias
+_cache_particiones = (None, {})
+
+
+def _dir_particiones() -> Path:
+    """Carpeta de particiones: PORTAL_PARTICIONES_DIR o 'particiones' junto a DB_PATH"""
+    return Path(PARTICIONES_DIR) if PARTICIONES_DIR else Path(DB_PATH).parent / 'particiones'
+
+
+def _ruta_particion(anio: int) -> Path:
+    return _dir_particiones() / f"metrics_{anio}.db"
+
+
+def get_particiones() -> dict:
+    """
+    Años cerrados con partición: {anio: ruta}. La carpeta solo se relee cuando cambia
+    su mtime (se crea o se borra una partición), así que es barato en cada consulta.
+    """
+    global _cache_particiones
+    carpeta = _dir_particiones()
+    try:
+        clave = (str(carpeta), carpeta.stat().st_mtime_ns)
+    except OSError:
+        return {}
+    
+    if _cache_particiones[0] != clave:
+        particiones = {}
+        for ruta in carpeta.iterdir():
+            coincidencia = _PATRON_PARTICION.match(ruta.name)
+            if coincidencia:
+                particiones[int(coincidencia.group(1))] = ruta
+        _cache_particiones = (clave, particiones)
+    return _cache_particiones[1]
+
+
+def _adjuntar_particiones(conn: sqlite3.Connection, particiones: dict, anios) -> dict:
+    """
+    Adjunta (ATTACH, solo lectura) las particiones de los años pedidos y retorna {anio: alias}.
+    Quedan adjuntas en la conexión del pool para las consultas siguientes. El alias lleva
+    el inodo del archivo: si una partición se regenera o se reabre, el adjunto viejo se separa.
+    """
+    alias = {anio: f"p{anio}_{particiones[anio].stat().st_ino}" for anio in anios}
+    adjuntas = [fila[1] for fila in conn.execute("PRAGMA database_list") if _PATRON_ALIAS.match(fila[1])]
+    faltantes = [anio for anio in anios if alias[anio] not in adjuntas]
+    if not faltantes:
+        return alias
+    
+    # Separar adjuntos obsoletos y, si no hay cupo, los que esta consulta no usa
+    libres = _MAX_PARTICIONES_ADJUNTAS - len(adjuntas)
+    requeridas = set(alias.values())
+    for nombre in adjuntas:
+        anio = int(_PATRON_ALIAS.match(nombre).group(1))
+        obsoleta = anio not in particiones or (anio in alias and nombre != alias[anio])
+        if obsoleta or (libres < len(faltantes) and nombre not in requeridas):
+            conn.execute(f"DETACH DATABASE {nombre}")
+            libres += 1
+    
+    for anio in faltantes:
+        # immutable=1: archivo 0444 que nadie escribe, sin locks ni comprobaciones de cambios
+        conn.execute(f"ATTACH DATABASE ? AS {alias[anio]}", (_uri(particiones[anio], 'mode=ro&immutable=1'),))
+        for pragma in ('cache_size', 'mmap_size'):
+            conn.execute(f"PRAGMA {alias[anio]}.{pragma}={SQLITE_PRAGMAS[pragma]}")
+    return alias
+
+
+def particionar_anio(anio: int) -> int:
+    """
+    Mueve los datos diarios de un año cerrado a particiones/metrics_AAAA.db (solo lectura)
+    y los borra de la BD principal. Los rollups y los datos horarios se quedan en la principal.
+    
+    El archivo se escribe como .tmp, se verifica el conteo y se renombra: desde ese
+    momento las consultas del año leen la partición, y solo entonces se borra de la principal.
+    
+    Returns:
+        Filas movidas (0 si el año no tiene datos o si falla)
+    """
+    ruta = _ruta_particion(anio)
+    if anio >= date.today().year:
+        logger.error(f"❌ {anio} no es un año cerrado: solo se particionan años anteriores al actual")
+        return 0
+    if ruta.exists():
+        logger.warning(f"⚠️ {anio} ya está particionado: {ruta}")
+        return 0
+    
+    tmp = ruta.with_name(ruta.name + '.tmp')
+    try:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp.unlink(missing_ok=True)
+        
+        with get_connection() as conn:
+            if es_schema_v2(conn):
+                rango = (fecha_a_dia(date(anio, 1, 1)), fecha_a_dia(date(anio, 12, 31)))
+                conteo = "SELECT COUNT(*) FROM metrics_fact WHERE fecha_dia BETWEEN ? AND ?"
+                origen = """
+                    SELECT date(f.fecha_dia + 2440587.5), m.nombre, e.nombre, r.codigo, f.valor_gwh, u.nombre,
+                           datetime(f.fecha_actualizacion, 'unixepoch')
+                    FROM metrics_fact f
+                    JOIN dim_metrica m ON m.id = f.metrica_id
+                    JOIN dim_entidad e ON e.id = f.entidad_id
+                    JOIN dim_recurso r ON r.id = f.recurso_id
+                    JOIN dim_unidad u ON u.id = f.unidad_id
+                    WHERE f.fecha_dia BETWEEN ? AND ?
+                """
+                borrar = "DELETE FROM metrics_fact WHERE fecha_dia BETWEEN ? AND ?"
+            else:
+                rango = (f"{anio}-01-01", f"{anio}-12-31")
+                conteo = "SELECT COUNT(*) FROM main.metrics WHERE fecha BETWEEN ? AND ?"
+                origen = """
+                    SELECT fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion
+                    FROM main.metrics
+                    WHERE fecha BETWEEN ? AND ?
+                """
+                borrar = "DELETE FROM metrics WHERE fecha BETWEEN ? AND ?"
+            
+            total = conn.execute(conteo, rango).fetchone()[0]
+            if total == 0:
+                logger.warning(f"⚠️ {anio} no tiene datos diarios en la BD principal")
+                return 0
+            
+            with open(SCHEMA_PARTICION_PATH, 'r', encoding='utf-8') as f:
+                schema_sql = f.read()
+            destino = sqlite3.connect(tmp)
+            try:
+                destino.executescript(schema_sql)
+            finally:
+                destino.close()
+            
+            # Copia ordenada por serie y fecha (el orden del índice de la partición)
+            conn.execute("ATTACH DATABASE ? AS particion_nueva", (_uri(tmp),))
+            try:
+                copiadas = conn.execute(f"""
+                    INSERT INTO particion_nueva.metrics
+                        (fecha, metrica, entidad, recurso, valor_gwh, unidad, fecha_actualizacion)
+                    {origen}
+                    ORDER BY 2, 3, 1, 4
+                """, rango).rowcount
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.execute("DETACH DATABASE particion_nueva")
+            
+            if copiadas != total:
+                raise sqlite3.DatabaseError(f"se copiaron {copiadas} de {total} filas")
+            
+            destino = sqlite3.connect(tmp)
+            try:
+                destino.execute("ANALYZE")
+                destino.commit()
+            finally:
+                destino.close()
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, ruta)
+            
+            conn.execute(borrar, rango)
+            if _tiene_stats(conn):
+                conn.execute("DELETE FROM metrics_stats_mes WHERE mes BETWEEN ? AND ?", (f"{anio}-01", f"{anio}-12"))
+                _resumir_stats(conn)
+            conn.commit()
+        
+        logger.info(f"✅ {anio} particionado: {total} filas → {ruta}")
+        return total
+        
+    except Exception as e:
+        logger.error(f"❌ Error particionando {anio}: {e}")
+        tmp.unlink(missing_ok=True)
+        return 0
+
+
+def reabrir_particion(anio: int) -> int:
+    """
+    Devuelve un año particionado a la BD principal (para corregirlo o recargarlo
+    con el ETL) y borra su archivo. Las filas se copian antes de borrar la partición,
+    así que las consultas nunca ven el año vacío.
+    
+    Returns:
+        Filas devueltas a la BD principal (0 si el año no está particionado o si falla)
+    """
+    ruta = _ruta_particion(anio)
+    if not ruta.exists():
+        logger.warning(f"⚠️ {anio} no está particionado")
+        return 0
+    
+    try:
+        filas = 0
+        origen = sqlite3.connect(_uri(ruta, 'mode=ro&immutable=1'), uri=True)
+        try:
+            cursor = origen.execute("SELECT fecha, metrica, entidad, recurso, valor_gwh, unidad FROM metrics")
+            with get_connection() as conn:
+                while True:
+                    lote = cursor.fetchmany(50000)
+                    if not lote:
+                        break
+                    _upsert_metrics(conn, lote, incluir_particionados=True)
+                    filas += len(lote)
+                conn.commit()
+        finally:
+            origen.close()
+        
+        ruta.unlink()
+        logger.info(f"✅ {anio} reabierto: {filas} filas devueltas a {DB_PATH}")
+        return filas
+        
+    except Exception as e:
+        logger.error(f"❌ Error reabriendo {anio}: {e}")
+        return 0
+
+
+# ============================================================================
+# SNAPSHOTS (publicación atómica de la BD cargada por el ETL)
+# ============================================================================
+
+_PATRON_SNAPSHOT = r'^{nombre}\.(\d{{8}}-\d{{6}}-\d{{6}})\.db$'
+
+
+def _dir_snapshots() -> Path:
+    """Carpeta de snapshots: PORTAL_SNAPSHOTS_DIR o 'snapshots' junto a DB_PATH"""
+    return Path(SNAPSHOTS_DIR) if SNAPSHOTS_DIR else Path(DB_PATH).parent / 'snapshots'
+
+
+def get_snapshots() -> List[Path]:
+    """Snapshots de DB_PATH en la carpeta de snapshots, del más viejo al más nuevo"""
+    carpeta = _dir_snapshots()
+    if not carpeta.is_dir():
+        return []
+    patron = re.compile(_PATRON_SNAPSHOT.format(nombre=re.escape(Path(DB_PATH).stem)))
+    return sorted(ruta for ruta in carpeta.iterdir() if patron.match(ruta.name))
+
+
+def _borrar_snapshot(ruta: Path) -> None:
+    """Borra un snapshot y sus archivos -wal/-shm (quien lo tenga abierto sigue leyéndolo)"""
+    for sufijo in ('', '-wal', '-shm', '-journal'):
+        Path(str(ruta) + sufijo).unlink(missing_ok=True)
+
+
+def crear_snapshot() -> Path:
+    """
+    Copia la BD publicada a un snapshot nuevo (API de backup de SQLite: copia consistente
+    aunque haya lectores o escritores) para cargarlo sin tocar el archivo de los dashboards.
+    
+    Returns:
+        Ruta del snapshot (todavía sin publicar)
+    """
+    carpeta = _dir_snapshots()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    ruta = carpeta / f"{Path(DB_PATH).stem}.{datetime.now():%Y%m%d-%H%M%S-%f}.db"
+    
+    t0 = time.perf_counter()
+    origen = sqlite3.connect(_uri(_ruta_publicada(), 'mode=ro'), uri=True)
+    destino = sqlite3.connect(ruta)
+    try:
+        origen.backup(destino)
+        destino.execute("PRAGMA journal_mode=WAL")
+    finally:
+        destino.close()
+        origen.close()
+    
+    logger.info(f"📸 Snapshot de carga: {ruta} ({time.perf_counter() - t0:.1f}s)")
+    return ruta
+
+
+def publicar_snapshot(ruta: Path) -> bool:
+    """
+    Publica un snapshot cargado: lo deja en modo journal DELETE (sin -wal que los lectores
+    tengan que consultar) y apunta DB_PATH a él con un symlink reemplazado de forma atómica.
+    Los procesos del dashboard lo toman en su siguiente checkout del pool. Conserva los
+    SNAPSHOTS_CONSERVAR snapshots más recientes (para volver atrás) y borra el resto.
+    
+    Si DB_PATH era un archivo normal, queda reemplazado por el symlink (su contenido está
+    en el snapshot, que se copió de él).
+    
+    Returns:
+        True si se publicó
+    """
+    ruta = Path(ruta)
+    try:
+        conn = sqlite3.connect(ruta)
+        try:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            conn.close()
+        
+        enlace = Path(DB_PATH)
+        tmp = enlace.with_name(enlace.name + '.tmp')
+        tmp.unlink(missing_ok=True)
+        os.symlink(os.path.relpath(ruta, enlace.parent), tmp)
+        if not enlace.is_symlink() and enlace.exists():
+            logger.warning(f"⚠️ {enlace} era un archivo: desde ahora es un symlink al snapshot publicado")
+        os.replace(tmp, enlace)
+        logger.info(f"✅ Snapshot publicado: {enlace} → {ruta.name}")
+    except OSError as e:
+        logger.error(f"❌ Error publicando snapshot {ruta}: {e}")
+        return False
+    
+    # Los snapshots posteriores al publicado son restos de cargas interrumpidas
+    snapshots = get_snapshots()
+    anteriores = [s.name for s in snapshots if s.name < ruta.name]
+    conservar = set(anteriores[-(SNAPSHOTS_CONSERVAR - 1):] if SNAPSHOTS_CONSERVAR > 1 else []) | {ruta.name}
+    for viejo in snapshots:
+        if viejo.name not in conservar:
+            _borrar_snapshot(viejo)
+    return True
+
+
+def publicada_por_snapshots() -> bool:
+    """
+    True si la BD se publica por snapshots: DB_PATH es el symlink de un snapshot publicado
+    o hay uno en curso. Lo que otros procesos escriban en ella se pierde en la siguiente
+    publicación (ver carga_en_snapshot) y, en modo journal DELETE, bloquea a los lectores.
+    """
+    return os.path.islink(DB_PATH) or bool(get_snapshots())
+
+
+@contextmanager
+def carga_en_snapshot():
+    """
+    Ejecuta una carga del ETL sobre una copia de la BD y la publica al terminar.
+    Durante el bloque, db_manager de este proceso escribe en el snapshot; los dashboards
+    siguen leyendo el publicado sin competir por locks con la carga. Si el bloque falla,
+    el snapshot se descarta y lo publicado no cambia.
+    
+    Una sola carga a la vez (lock de archivo): una segunda carga simultánea partiría del
+    mismo snapshot y al publicar perdería las escrituras de la primera.
+    
+    Ventana de pérdida: lo que otros procesos (p. ej. el dashboard) escriban en la BD
+    publicada entre crear_snapshot() y la publicación no pasa al snapshot y deja de verse
+    al publicarlo (queda solo en el snapshot anterior conservado). Esas escrituras se
+    deben repetir después de la carga o hacerse fuera de esa ventana.
+    
+    Uso:
+        with db_manager.carga_en_snapshot():
+            db_manager.upsert_metrics_bulk(filas)
+    """
+    import fcntl
+    global DB_PATH, PARTICIONES_DIR, SNAPSHOTS_DIR
+    
+    publicada = DB_PATH
+    config = (PARTICIONES_DIR, SNAPSHOTS_DIR)
+    carpeta = _dir_snapshots()
+    carpeta.mkdir(parents=True, exist_ok=True)
+    
+    with open(carpeta / '.carga.lock', 'w') as candado:
+        fcntl.flock(candado, fcntl.LOCK_EX)
+        ruta = crear_snapshot()
+        
+        # Particiones y snapshots siguen ubicándose junto a la BD publicada
+        PARTICIONES_DIR, SNAPSHOTS_DIR = str(_dir_particiones()), str(carpeta)
+        DB_PATH = ruta
+        try:
+            yield ruta
+        except BaseException:
+            close_all_connections()
+            DB_PATH, (PARTICIONES_DIR, SNAPSHOTS_DIR) = publicada, config
+            _borrar_snapshot(ruta)
+            logger.error(f"❌ Carga interrumpida: snapshot {ruta.name} descartado")
+            raise
+        
+        close_all_connections()
+        DB_PATH, (PARTICIONES_DIR, SNAPSHOTS_DIR) = publicada, config
+        if not publicar_snapshot(ruta):
+            raise OSError(f"No se pudo publicar el snapshot {ruta}")
+
+
+# ============================================================================
+# FUNCIONES PARA DATOS HORARIOS
+# ============================================================================
+
+# Columnas de las 24 horas en metrics_hourly_dia (ver sql/schema_hourly_dia.sql)
+HORAS_COLS = [f'h{h:02d}' for h in range(1, 25)]
+
+_UPSERT_HOURLY_V1 = """
+    INSERT INTO metrics_hourly (fecha, metrica, entidad, recurso, hora, valor_mwh, unidad)
+    VALUES (?, ?, ?, ?, ?, ?, 'MWh')
+    ON CONFLICT(fecha, metrica, entidad, recurso, hora) 
+    DO UPDATE SET 
+        valor_mwh = excluded.valor_mwh,
+        fecha_actualizacion = CURRENT_TIMESTAMP
+    WHERE metrics_hourly.valor_mwh IS NOT excluded.valor_mwh
+"""
+
+
+_UPSERT_HOURLY_DIA = f"""
+    INSERT INTO metrics_hourly_dia (metrica, entidad, fecha, recurso, {', '.join(HORAS_COLS)}, unidad)
+    VALUES (?, ?, ?, ?, {', '.join(['?'] * 24)}, 'MWh')
+    ON CONFLICT(metrica, entidad, fecha, recurso)
+    DO UPDATE SET
+        {', '.join(f'{c} = COALESCE(excluded.{c}, {c})' for c in HORAS_COLS)},
+        fecha_actualizacion = CURRENT_TIMESTAMP
+    WHERE {' OR '.join(f'COALESCE(excluded.{c}, {c}) IS NOT {c}' for c in HORAS_COLS)}
+"""
+
+
+# Carga masiva de metrics_hourly (una fila por hora) por tabla staging (ver _cargar_por_lotes)
+_STAGING_HOURLY_V1 = ('fecha TEXT', 'metrica TEXT', 'entidad TEXT', 'recurso TEXT', 'hora INTEGER', 'valor_mwh REAL')
+
+_MERGE_HOURLY_V1 = """
+    INSERT INTO metrics_hourly (fecha, metrica, entidad, recurso, hora, valor_mwh, unidad)
+    SELECT fecha, metrica, entidad, recurso, hora, valor_mwh, 'MWh'
+    FROM temp.staging_hourly
+    WHERE metrica = ? AND entidad = ? AND substr(fecha, 1, 7) = ?
+    ON CONFLICT(fecha, metrica, entidad, recurso, hora)
+    DO UPDATE SET
+        valor_mwh = excluded.valor_mwh,
+        fecha_actualizacion = CURRENT_TIMESTAMP
+    WHERE metrics_hourly.valor_mwh IS NOT excluded.valor_mwh
+"""
+
+
+def _upsert_hourly_filas(conn: sqlite3.Connection, filas: List[Tuple], dia: bool) -> int:
     """
-    Obtiene registros de un catálogo
-    
-    Args:
-        catalogo: Nombre del catálogo ('ListadoRecursos', 'ListadoEmbalses', etc.)
-        codigo: Código específico a buscar (opcional, si None devuelve todos)
-    
-    Returns:
-        DataFrame con columnas: codigo, nombre, tipo, region, capacidad, metadata
-    
-    Ejemplo:
-        # Obtener todos los recursos
-        df = get_catalogo('ListadoRecursos')
-        
-        # Obtener recurso específico
-        df = get_catalogo('ListadoRecursos', '2QBW')
+    UPSERT de filas horarias ya armadas: parámetros de _UPSERT_HOURLY_DIA (dia=True)
+    o tuplas por hora de _UPSERT_HOURLY_V1. Desde UMBRAL_STAGING filas carga por lotes;
+    la tabla por hora pasa por staging, la empaquetada no (24 veces menos filas, ya agrupadas)
     """
-    try:
-        with get_connection() as conn:
-            if codigo:
-                query = """
-                    SELECT codigo, nombre, tipo, region, capacidad, metadata, fecha_actualizacion
-                    FROM catalogos
-                    WHERE catalogo = ? AND codigo = ?
-                """
-                df = pd.read_sql_query(query, conn, params=(catalogo, codigo))
-            else:
-                query = """
-                    SELECT codigo, nombre, tipo, region, capacidad, metadata, fecha_actualizacion
-                    FROM catalogos
-                    WHERE catalogo = ?
-                    ORDER BY nombre
-                """
-                df = pd.read_sql_query(query, conn, params=(catalogo,))
-            
-            logger.info(f"✅ Catálogo {catalogo}: {len(df)} registros obtenidos")
-            return df
-            
-    except sqlite3.Error as e:
-        logger.error(f"❌ Error consultando catálogo {catalogo}: {e}")
-        return pd.DataFrame()
+    clave = _clave_version_dia if dia else _clave_version
+    if len(filas) >= UMBRAL_STAGING:
+        if dia:
+            return _cargar_por_lotes(conn, _UPSERT_HOURLY_DIA, filas, clave)
+        return _cargar_por_lotes(conn, _MERGE_HOURLY_V1, filas, clave, ('staging_hourly', _STAGING_HOURLY_V1))
+    
+    afectadas = _ejecutar_versionado(conn, _UPSERT_HOURLY_DIA if dia else _UPSERT_HOURLY_V1, filas, clave)
+    conn.commit()
+    return afectadas
 
 
-def get_mapeo_codigos(catalogo: str) -> dict:
+def es_hourly_dia(conn: sqlite3.Connection) -> bool:
+    """True si los datos horarios están empaquetados por día (metrics_hourly es una vista)"""
+    fila = conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'metrics_hourly'"
+    ).fetchone()
+    return fila is not None and fila[0] == 'view'
+
+
+def migrate_hourly_dia(conservar_v1: bool = False) -> bool:
     """
-    Obtiene diccionario de mapeo código → nombre desde un catálogo
+    Migra metrics_hourly (una fila por hora) a metrics_hourly_dia (una fila por día
+    con h01..h24) en una sola transacción, y deja la vista de compatibilidad metrics_hourly.
     
     Args:
-        catalogo: Nombre del catálogo ('ListadoRecursos', 'ListadoEmbalses', etc.)
+        conservar_v1: Si True, deja la tabla original como metrics_hourly_v1 (ocupa espacio)
     
     Returns:
-        Diccionario {codigo: nombre}
-    
-    Ejemplo:
-        mapeo = get_mapeo_codigos('ListadoRecursos')
-        # {'2QBW': 'GUAVIO', '2QRL': 'RIO NEGRO', ...}
-        
-        nombre = mapeo.get('2QBW', '2QBW')  # Devuelve 'GUAVIO'
+        True si los datos horarios quedaron empaquetados (o ya lo estaban), False si error
     """
     try:
+        with open(SCHEMA_HOURLY_DIA_PATH, 'r', encoding='utf-8') as f:
+            schema_sql = f.read()
+        
+        columnas = ',\n                    '.join(
+            f"MAX(CASE WHEN hora = {h} THEN valor_mwh END)" for h in range(1, 25)
+        )
+        
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT codigo, nombre
-                FROM catalogos
-                WHERE catalogo = ? AND nombre IS NOT NULL
-            """, (catalogo,))
-            
-            mapeo = {row[0]: row[1] for row in cursor.fetchall()}
-            logger.info(f"✅ Mapeo {catalogo}: {len(mapeo)} códigos")
-            return mapeo
+            if es_hourly_dia(conn):
+                logger.info("ℹ️ Los datos horarios ya están empaquetados por día")
+                return True
             
-    except sqlite3.Error as e:
-        logger.error(f"❌ Error obteniendo mapeo {catalogo}: {e}")
-        return {}
+            conn.executescript(f"""
+                BEGIN;
+                ALTER TABLE metrics_hourly RENAME TO metrics_hourly_v1;
+                {schema_sql}
+                INSERT INTO metrics_hourly_dia
+                    (metrica, entidad, fecha, recurso, {', '.join(HORAS_COLS)}, unidad, fecha_actualizacion)
+                SELECT metrica, entidad, fecha, COALESCE(recurso, ''),
+                    {columnas},
+                    COALESCE(MAX(unidad), 'MWh'), MAX(fecha_actualizacion)
+                FROM metrics_hourly_v1
+                GROUP BY metrica, entidad, fecha, COALESCE(recurso, '');
+                {'' if conservar_v1 else 'DROP TABLE metrics_hourly_v1;'}
+                COMMIT;
+            """)
+            total = conn.execute("SELECT COUNT(*) FROM metrics_hourly_dia").fetchone()[0]
+        
+        logger.info(f"✅ Datos horarios empaquetados: {total:,} filas día en metrics_hourly_dia")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Error empaquetando datos horarios: {e}")
+        return False
 
 
-def get_codigos_con_datos(metrica: str, entidad: str, fecha_inicio: str, fecha_fin: str) -> List[str]:
+def _matriz_horaria(registros: List[Tuple]) -> np.ndarray:
+    """Matriz días × 24 (float, NaN = hora sin dato) de los valores de los registros"""
+    return np.array([np.asarray(valores, dtype=float) for *_, valores in registros], dtype=float).reshape(-1, 24)
+
+
+def _filas_hourly_dia(registros: List[Tuple]) -> List[Tuple]:
+    """(fecha, metrica, entidad, recurso, valores_24) → parámetros de _UPSERT_HOURLY_DIA"""
+    matriz = _matriz_horaria(registros)
+    horas = matriz.astype(object)
+    horas[np.isnan(matriz)] = None  # NaN → NULL
+    return [
+        (metrica, entidad, fecha, recurso if recurso is not None else '', *valores)
+        for (fecha, metrica, entidad, recurso, _), valores in zip(registros, horas.tolist())
+    ]
+
+
+def _filas_hourly(registros: List[Tuple]) -> List[Tuple]:
+    """(fecha, metrica, entidad, recurso, valores_24) → (fecha, metrica, entidad, recurso, hora, valor) sin NaN"""
+    matriz = _matriz_horaria(registros)
+    dias, horas = np.nonzero(~np.isnan(matriz))
+    return [
+        (*registros[d][:4], h + 1, v)
+        for d, h, v in zip(dias.tolist(), horas.tolist(), matriz[dias, horas].tolist())
+    ]
+
+
+def upsert_hourly_dia_bulk(registros: List[Tuple]) -> int:
     """
-    Obtiene lista de códigos de recurso que tienen datos en un rango de fechas.
-    Útil para optimizar consultas evitando buscar códigos sin datos.
+    Insertar/actualizar datos horarios por día: una tupla por serie y día
     
     Args:
-        metrica: Nombre de la métrica (ej: 'Gene')
-        entidad: Tipo de entidad (ej: 'Recurso')
-        fecha_inicio: Fecha inicio en formato 'YYYY-MM-DD'
-        fecha_fin: Fecha fin en formato 'YYYY-MM-DD'
+        registros: Lista de tuplas (fecha, metrica, entidad, recurso, valores), donde
+                   valores son las 24 horas en MWh (lista o array; NaN/None = hora sin dato,
+                   conserva el valor guardado)
     
     Returns:
-        Lista de códigos de recurso que tienen al menos un dato en el rango
-    
-    Ejemplo:
-        codigos = get_codigos_con_datos('Gene', 'Recurso', '2024-01-01', '2024-12-31')
-        # ['2QBW', '2QEK', '2QRL', ...]
+        Número de días procesados
     """
+    if not registros:
+        return 0
+    
     try:
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT DISTINCT recurso
-                FROM metrics
-                WHERE metrica = ?
-                    AND entidad = ?
-                    AND fecha BETWEEN ? AND ?
-                    AND recurso IS NOT NULL
-                    AND recurso != '_SISTEMA_'
-            """, (metrica, entidad, fecha_inicio, fecha_fin))
+            if es_hourly_dia(conn):
+                _upsert_hourly_filas(conn, _filas_hourly_dia(registros), dia=True)
+            else:
+                _upsert_hourly_filas(conn, _filas_hourly(registros), dia=False)
             
-            codigos = [row[0] for row in cursor.fetchall()]
-            logger.info(f"✅ {len(codigos)} códigos con datos en {fecha_inicio} → {fecha_fin}")
-            return codigos
+            logger.info(f"✅ Bulk insert horario: {len(registros)} días procesados")
+            return len(registros)
             
     except sqlite3.Error as e:
-        logger.error(f"❌ Error obteniendo códigos con datos: {e}")
-        return []
-
+        logger.error(f"❌ Error en bulk insert horario: {e}")
+        return 0
 
-# ============================================================================
-# FUNCIONES PARA DATOS HORARIOS
-# ============================================================================
 
 def upsert_hourly_metrics_bulk(metrics_data: List[Tuple]) -> int:
     """
     Insertar/actualizar múltiples métricas horarias de forma eficiente (bulk)
+    Desde UMBRAL_STAGING filas se carga por lotes (ver _cargar_por_lotes)
     
     Args:
         metrics_data: Lista de tuplas (fecha, metrica, entidad, recurso, hora, valor_mwh)
@@ -524,22 +2308,21 @@ def upsert_hourly_metrics_bulk(metrics_data: List[Tuple]) -> int:
     if not metrics_data:
         return 0
     
-    query = """
-        INSERT INTO metrics_hourly (fecha, metrica, entidad, recurso, hora, valor_mwh, unidad)
-        VALUES (?, ?, ?, ?, ?, ?, 'MWh')
-        ON CONFLICT(fecha, metrica, entidad, recurso, hora) 
-        DO UPDATE SET 
-            valor_mwh = excluded.valor_mwh,
-            fecha_actualizacion = CURRENT_TIMESTAMP
-    """
-    
     try:
         with get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.executemany(query, metrics_data)
-            conn.commit()
+            if es_hourly_dia(conn):
+                # Agrupar las horas de cada (serie, día) en una sola fila
+                dias = {}
+                for fecha, metrica, entidad, recurso, hora, valor_mwh in metrics_data:
+                    clave = (fecha, metrica, entidad, recurso)
+                    dias.setdefault(clave, [None] * 24)[int(hora) - 1] = valor_mwh
+                _upsert_hourly_filas(conn, _filas_hourly_dia(
+                    [(*clave, valores) for clave, valores in dias.items()]
+                ), dia=True)
+                registros_afectados = len(metrics_data)
+            else:
+                registros_afectados = _upsert_hourly_filas(conn, metrics_data, dia=False)
             
-            registros_afectados = cursor.rowcount
             logger.info(f"✅ Bulk insert horario: {registros_afectados} registros procesados")
             return registros_afectados
             
@@ -548,6 +2331,11 @@ def upsert_hourly_metrics_bulk(metrics_data: List[Tuple]) -> int:
         return 0
 
 
+def _matriz_horas(filas) -> np.ndarray:
+    """Filas de h01..h24 (None = sin dato) → matriz float (n_filas × 24) con NaN"""
+    return np.array(filas, dtype=float).reshape(-1, 24)
+
+
 def get_hourly_data(metrica: str, entidad: str, fecha: str, recurso: str = None) -> pd.DataFrame:
     """
     Obtener datos horarios de una métrica para una fecha específica
@@ -580,8 +2368,21 @@ def get_hourly_data(metrica: str, entidad: str, fecha: str, recurso: str = None)
     query += " ORDER BY hora"
     
     try:
-        with get_connection() as conn:
-            df = pd.read_sql_query(query, conn, params=params)
+        with get_connection(readonly=True) as conn:
+            if es_hourly_dia(conn):
+                # Una sola fila: el día completo de la serie
+                fila = conn.execute(f"""
+                    SELECT {', '.join(HORAS_COLS)}, unidad
+                    FROM metrics_hourly_dia
+                    WHERE metrica = ? AND entidad = ? AND fecha = ? AND recurso = ?
+                """, (metrica, entidad, fecha, recurso if recurso is not None else '')).fetchone()
+                df = pd.DataFrame(columns=['hora', 'valor_mwh', 'unidad'])
+                if fila is not None:
+                    valores = _matriz_horas(fila[:24])[0]
+                    horas = np.flatnonzero(~np.isnan(valores)) + 1
+                    df = pd.DataFrame({'hora': horas, 'valor_mwh': valores[horas - 1], 'unidad': fila[24]})
+            else:
+                df = pd.read_sql_query(query, conn, params=params)
             
             if not df.empty:
                 logger.info(f"✅ Datos horarios: {len(df)} horas para {metrica}/{entidad} en {fecha}")
@@ -618,8 +2419,20 @@ def get_hourly_data_aggregated(metrica: str, entidad: str, fecha: str) -> pd.Dat
     """
     
     try:
-        with get_connection() as conn:
-            df = pd.read_sql_query(query, conn, params=[metrica, entidad, fecha])
+        with get_connection(readonly=True) as conn:
+            if es_hourly_dia(conn):
+                # Una fila por recurso: suma por columna de la matriz recursos × 24
+                filas = conn.execute(f"""
+                    SELECT {', '.join(HORAS_COLS)}
+                    FROM metrics_hourly_dia
+                    WHERE metrica = ? AND entidad = ? AND fecha = ?
+                """, (metrica, entidad, fecha)).fetchall()
+                matriz = _matriz_horas(filas)
+                con_dato = ~np.isnan(matriz).all(axis=0)
+                horas = np.arange(1, 25)[con_dato]
+                df = pd.DataFrame({'hora': horas, 'valor_mwh': np.nansum(matriz, axis=0)[con_dato]})
+            else:
+                df = pd.read_sql_query(query, conn, params=[metrica, entidad, fecha])
             
             if not df.empty:
                 logger.info(f"✅ Datos horarios agregados: {len(df)} horas para {metrica}/{entidad} en {fecha}")
@@ -633,6 +2446,512 @@ def get_hourly_data_aggregated(metrica: str, entidad: str, fecha: str) -> pd.Dat
         return pd.DataFrame()
 
 
+# ============================================================================
+# ROLLUPS SEMANALES / MENSUALES / ANUALES (ver sql/schema_rollups.sql)
+# ============================================================================
+
+# Resoluciones agregadas de la más gruesa a la más fina, con su duración media en días
+RESOLUCIONES_ROLLUP = {'Y': 365.25, 'M': 30.44, 'W': 7}
+
+# Puntos mínimos que debe conservar una serie al elegir resolución automática
+MIN_PUNTOS_ROLLUP = int(os.getenv('ROLLUP_MIN_PUNTOS', 52))
+
+GRUPO_TOTAL = '_TOTAL_'
+
+# Entidades cuyos recursos se agrupan además por el tipo del catálogo (fuente de generación)
+CATALOGO_GRUPOS = {'Recurso': 'ListadoRecursos'}
+
+# Inicio del periodo que contiene la fecha de la columna {col}
+_PERIODO_SQL = {
+    'D': "date({col})",
+    'W': "date({col}, 'weekday 0', '-6 days')",     # Lunes de la semana
+    'M': "date({col}, 'start of month')",
+    'Y': "date({col}, 'start of year')",
+}
+
+_AGREGACIONES_ROLLUP = ('suma', 'promedio', 'minimo', 'maximo')
+
+_INSERT_ROLLUP = """
+    INSERT INTO metrics_rollup
+        (metrica, entidad, resolucion, recurso, periodo, suma, promedio, minimo, maximo, conteo, unidad)
+    SELECT ?, ?, ?, recurso, {periodo}, SUM(valor_gwh), AVG(valor_gwh), MIN(valor_gwh), MAX(valor_gwh),
+           COUNT(*), MAX(unidad)
+    FROM temp.rollup_fuente
+    WHERE fecha BETWEEN ? AND ?
+    GROUP BY recurso, 5
+"""
+
+_INSERT_ROLLUP_GRUPO = """
+    INSERT INTO metrics_rollup_grupo
+        (metrica, entidad, resolucion, grupo, periodo, suma, promedio, minimo, maximo, conteo, unidad)
+    SELECT ?, ?, ?, grupo, {periodo}, SUM(total), AVG(total), MIN(total), MAX(total), COUNT(*), MAX(unidad)
+    FROM (
+        SELECT fecha, '{total}' AS grupo, SUM(valor_gwh) AS total, MAX(unidad) AS unidad
+        FROM temp.rollup_fuente
+        WHERE fecha BETWEEN ? AND ?
+        GROUP BY fecha
+        UNION ALL
+        SELECT fecha, grupo, SUM(valor_gwh), MAX(unidad)
+        FROM temp.rollup_fuente
+        WHERE grupo IS NOT NULL AND fecha BETWEEN ? AND ?
+        GROUP BY fecha, grupo
+    )
+    GROUP BY grupo, 5
+"""
+
+
+def _a_fecha(fecha) -> date:
+    """'YYYY-MM-DD', date o datetime → date"""
+    if isinstance(fecha, datetime):
+        return fecha.date()
+    if isinstance(fecha, date):
+        return fecha
+    return date.fromisoformat(str(fecha)[:10])
+
+
+def _limites_periodo(fecha: date, resolucion: str) -> Tuple[date, date]:
+    """Primer y último día del periodo ('D', 'W', 'M', 'Y') que contiene la fecha"""
+    if resolucion == 'W':
+        inicio = fecha - timedelta(days=fecha.weekday())
+        return inicio, inicio + timedelta(days=6)
+    if resolucion == 'M':
+        inicio = fecha.replace(day=1)
+        siguiente = (inicio + timedelta(days=32)).replace(day=1)
+        return inicio, siguiente - timedelta(days=1)
+    if resolucion == 'Y':
+        return date(fecha.year, 1, 1), date(fecha.year, 12, 31)
+    return fecha, fecha
+
+
+def _periodos_completos(inicio: date, fin: date, resolucion: str) -> Optional[Tuple[date, date]]:
+    """
+    Sub-rango de [inicio, fin] formado solo por periodos completos, o None si no hay ninguno.
+    Los extremos parciales se agregan al vuelo (el rollup incluye días fuera del rango)
+    """
+    primero, fin_primero = _limites_periodo(inicio, resolucion)
+    if primero != inicio:
+        primero = fin_primero + timedelta(days=1)
+    inicio_ultimo, ultimo = _limites_periodo(fin, resolucion)
+    if ultimo != fin:
+        ultimo = inicio_ultimo - timedelta(days=1)
+    if primero > ultimo:
+        return None
+    return primero, ultimo
+
+
+def _asegurar_rollups(conn: sqlite3.Connection):
+    """Crea las tablas de rollups si no existen (BDs creadas antes de los rollups)"""
+    with open(SCHEMA_ROLLUPS_PATH, 'r', encoding='utf-8') as f:
+        conn.executescript(f.read())
+
+
+def _rollups_construidos(conn: sqlite3.Connection, metrica: str, entidad: str) -> bool:
+    """True si los rollups de la serie cubren toda su historia (metrics_rollup_series)"""
+    if conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'metrics_rollup_series'"
+    ).fetchone() is None:
+        return False
+    return conn.execute(
+        "SELECT 1 FROM metrics_rollup_series WHERE metrica = ? AND entidad = ?", (metrica, entidad)
+    ).fetchone() is not None
+
+
+def _marcar_rollups(conn: sqlite3.Connection, metrica: str, entidad: str) -> None:
+    conn.execute("""
+        INSERT OR REPLACE INTO metrics_rollup_series (metrica, entidad, fecha_construccion)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+    """, (metrica, entidad))
+
+
+def _datos_fuera_de(conn: sqlite3.Connection, metrica: str, entidad: str, desde: str, hasta: str) -> bool:
+    """True si la serie tiene datos diarios antes de `desde` o después de `hasta`"""
+    antes = (_a_fecha(desde) - timedelta(days=1)).isoformat()
+    despues = (_a_fecha(hasta) + timedelta(days=1)).isoformat()
+    for ini, fin in ((_FECHA_MIN_COBERTURA, antes), (despues, _FECHA_MAX_COBERTURA)):
+        fuente, params = _query_fuente(conn, metrica, entidad, ini, fin)
+        if conn.execute(f"SELECT 1 FROM ({fuente}) LIMIT 1", params).fetchone():
+            return True
+    return False
+
+
+def pick_resolution(fecha_inicio, fecha_fin, min_puntos: int = MIN_PUNTOS_ROLLUP) -> str:
+    """
+    Elige la resolución más gruesa que todavía da al menos min_puntos puntos en el rango.
+    Ej (min_puntos=52): 5 años → 'M' (60 meses), 1 año → 'W', 3 meses → 'D'
+    """
+    dias = (_a_fecha(fecha_fin) - _a_fecha(fecha_inicio)).days + 1
+    for resolucion, dias_periodo in RESOLUCIONES_ROLLUP.items():
+        if dias / dias_periodo >= min_puntos:
+            return resolucion
+    return 'D'
+
+
+def _rangos_refresco(inicio: date, fin: date) -> dict:
+    """Periodos ('D', 'W', 'M', 'Y') que tocan [inicio, fin]: {resolucion: (primer día, último día)}"""
+    return {
+        res: (_limites_periodo(inicio, res)[0], _limites_periodo(fin, res)[1])
+        for res in ('D', 'W', 'M', 'Y')
+    }
+
+
+def _refrescar_rollups(conn: sqlite3.Connection, metrica: str, entidad: str, rangos: dict) -> int:
+    """Recalcula en la transacción de conn los rollups de los periodos de `rangos` (sin commit)"""
+    desde = min(r[0] for r in rangos.values()).isoformat()
+    hasta = max(r[1] for r in rangos.values()).isoformat()
+    catalogo = CATALOGO_GRUPOS.get(entidad)
+    cursor = conn.cursor()
+    
+    # Datos diarios de la serie leídos una sola vez (tabla temporal en memoria)
+    fuente, params = _query_fuente(conn, metrica, entidad, desde, hasta)
+    if catalogo:
+        grupo_sql = "UPPER(c.tipo)"
+        fuente = f"({fuente}) s LEFT JOIN catalogos c ON c.catalogo = ? AND c.codigo = s.recurso"
+        params.append(catalogo)
+    else:
+        grupo_sql = "NULL"
+        fuente = f"({fuente}) s"
+    cursor.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS rollup_fuente
+            (fecha TEXT, recurso TEXT, grupo TEXT, valor_gwh REAL, unidad TEXT)
+    """)
+    cursor.execute("DELETE FROM temp.rollup_fuente")
+    cursor.execute(f"""
+        INSERT INTO temp.rollup_fuente
+        SELECT date(s.fecha), COALESCE(s.recurso, ''), {grupo_sql}, s.valor_gwh, s.unidad
+        FROM {fuente}
+    """, params)
+    
+    filas = 0
+    for res in ('W', 'M', 'Y'):
+        p_ini, p_fin = (d.isoformat() for d in rangos[res])
+        cursor.execute("""
+            DELETE FROM metrics_rollup
+            WHERE metrica = ? AND entidad = ? AND resolucion = ? AND periodo BETWEEN ? AND ?
+        """, (metrica, entidad, res, p_ini, p_fin))
+        cursor.execute(
+            _INSERT_ROLLUP.format(periodo=_PERIODO_SQL[res].format(col='fecha')),
+            (metrica, entidad, res, p_ini, p_fin)
+        )
+        filas += cursor.rowcount
+    
+    for res in ('D', 'W', 'M', 'Y'):
+        p_ini, p_fin = (d.isoformat() for d in rangos[res])
+        cursor.execute("""
+            DELETE FROM metrics_rollup_grupo
+            WHERE metrica = ? AND entidad = ? AND resolucion = ? AND periodo BETWEEN ? AND ?
+        """, (metrica, entidad, res, p_ini, p_fin))
+        cursor.execute(
+            _INSERT_ROLLUP_GRUPO.format(periodo=_PERIODO_SQL[res].format(col='fecha'), total=GRUPO_TOTAL),
+            (metrica, entidad, res, p_ini, p_fin, p_ini, p_fin)
+        )
+        filas += cursor.rowcount
+    
+    cursor.execute("DELETE FROM temp.rollup_fuente")
+    return filas
+
+
+def refresh_rollups(metrica: str, entidad: str, fecha_inicio, fecha_fin=None) -> int:
+    """
+    Recalcula los rollups de una serie para todos los periodos que tocan
+    [fecha_inicio, fecha_fin] (la semana, el mes y el año completos de cada extremo).
+    El ETL lo llama tras cada carga. Retorna las filas de rollup escritas.
+    
+    Solo mantiene series ya construidas (metrics_rollup_series). Una serie sin
+    construir se construye aquí si el rango abarca todos sus datos (serie nueva);
+    si tiene historia fuera del rango se deja sin rollups hasta ejecutar
+    scripts/reconstruir_rollups.py y las consultas la agregan al vuelo.
+    """
+    try:
+        inicio = _a_fecha(fecha_inicio)
+        fin = _a_fecha(fecha_fin or fecha_inicio)
+        rangos = _rangos_refresco(inicio, fin)
+        
+        with get_connection() as conn:
+            _asegurar_rollups(conn)
+            if not _rollups_construidos(conn, metrica, entidad):
+                desde = min(r[0] for r in rangos.values()).isoformat()
+                hasta = max(r[1] for r in rangos.values()).isoformat()
+                if _datos_fuera_de(conn, metrica, entidad, desde, hasta):
+                    logger.debug(f"Rollups {metrica}/{entidad} sin construir: se omite el refresco")
+                    return 0
+                _marcar_rollups(conn, metrica, entidad)
+            filas = _refrescar_rollups(conn, metrica, entidad, rangos)
+            conn.commit()
+        
+        logger.info(f"✅ Rollups {metrica}/{entidad} ({inicio} a {fin}): {filas} filas")
+        return filas
+        
+    except Exception as e:
+        logger.error(f"❌ Error actualizando rollups {metrica}/{entidad}: {e}")
+        return 0
+
+
+def refresh_rollups_bulk(metrics: List[Tuple]) -> int:
+    """
+    Actualiza los rollups de las series tocadas por una lista de tuplas
+    (fecha, metrica, entidad, recurso, valor_gwh, unidad), la misma que recibe upsert_metrics_bulk
+    """
+    rangos = {}
+    for m in metrics:
+        fecha = str(m[0])[:10]
+        clave = (m[1], m[2])
+        if clave in rangos:
+            rangos[clave] = (min(rangos[clave][0], fecha), max(rangos[clave][1], fecha))
+        else:
+            rangos[clave] = (fecha, fecha)
+    
+    return sum(
+        refresh_rollups(metrica, entidad, ini, fin)
+        for (metrica, entidad), (ini, fin) in rangos.items()
+    )
+
+
+def rebuild_rollups(metrica: Optional[str] = None, entidad: Optional[str] = None) -> int:
+    """
+    Reconstruye desde cero los rollups de todas las series (o de una métrica/entidad),
+    año por año para acotar la memoria. Retorna filas de rollup escritas.
+    """
+    with get_connection() as conn:
+        _asegurar_rollups(conn)
+        if es_schema_v2(conn):
+            query = """
+                SELECT m.nombre, e.nombre, date(MIN(f.fecha_dia) + 2440587.5), date(MAX(f.fecha_dia) + 2440587.5)
+                FROM metrics_fact f
+                JOIN dim_metrica m ON m.id = f.metrica_id
+                JOIN dim_entidad e ON e.id = f.entidad_id
+                GROUP BY f.metrica_id, f.entidad_id
+            """
+        else:
+            query = "SELECT metrica, entidad, MIN(fecha), MAX(fecha) FROM metrics GROUP BY metrica, entidad"
+        rangos = {(row[0], row[1]): (row[2], row[3]) for row in conn.execute(query).fetchall()}
+        
+        # Series (o años) que solo están en particiones también se reconstruyen
+        particiones = get_particiones()
+        if particiones:
+            for anio in particiones:
+                alias = _adjuntar_particiones(conn, particiones, [anio])[anio]
+                filas_particion = conn.execute(
+                    f"SELECT metrica, entidad, MIN(fecha), MAX(fecha) FROM {alias}.metrics GROUP BY metrica, entidad"
+                ).fetchall()
+                for serie_metrica, serie_entidad, fecha_min, fecha_max in filas_particion:
+                    actual = rangos.get((serie_metrica, serie_entidad))
+                    if actual:
+                        fecha_min, fecha_max = min(actual[0], fecha_min), max(actual[1], fecha_max)
+                    rangos[(serie_metrica, serie_entidad)] = (fecha_min, fecha_max)
+        
+        series = [
+            (serie[0], serie[1], fechas[0], fechas[1]) for serie, fechas in rangos.items()
+            if (metrica is None or serie[0] == metrica) and (entidad is None or serie[1] == entidad)
+        ]
+        
+        # Mientras se reconstruye, las consultas de la serie se agregan al vuelo
+        for serie_metrica, serie_entidad, _, _ in series:
+            for tabla in ('metrics_rollup_series', 'metrics_rollup', 'metrics_rollup_grupo'):
+                conn.execute(f"DELETE FROM {tabla} WHERE metrica = ? AND entidad = ?", (serie_metrica, serie_entidad))
+        conn.commit()
+    
+    filas = 0
+    for serie_metrica, serie_entidad, fecha_min, fecha_max in series:
+        for anio in range(_a_fecha(fecha_min).year, _a_fecha(fecha_max).year + 1):
+            with get_connection() as conn:
+                filas += _refrescar_rollups(conn, serie_metrica, serie_entidad,
+                                            _rangos_refresco(date(anio, 1, 1), date(anio, 12, 31)))
+                conn.commit()
+        with get_connection() as conn:
+            _marcar_rollups(conn, serie_metrica, serie_entidad)
+            conn.commit()
+    
+    logger.info(f"✅ Rollups reconstruidos: {len(series)} series, {filas} filas")
+    return filas
+
+
+def _get_metric_rollup(metrica, entidad, fecha_inicio, fecha_fin, resolucion, agregacion,
+                       recurso=None, recurso_filter=None) -> pd.DataFrame:
+    """
+    get_metric_data a resolución 'W'/'M'/'Y': los periodos completos salen de metrics_rollup
+    y los periodos parciales de los extremos se agregan al vuelo desde los datos diarios
+    """
+    try:
+        if resolucion not in RESOLUCIONES_ROLLUP:
+            raise ValueError(f"resolución no soportada: {resolucion}")
+        if agregacion not in _AGREGACIONES_ROLLUP:
+            raise ValueError(f"agregación no soportada: {agregacion}")
+        
+        import time
+        t_start = time.time()
+        inicio, fin = _a_fecha(fecha_inicio), _a_fecha(fecha_fin)
+        partes, params = [], []
+        
+        with get_connection(readonly=True) as conn:
+            completos = _periodos_completos(inicio, fin, resolucion)
+            if completos and _rollups_construidos(conn, metrica, entidad):
+                query = """
+                    SELECT periodo AS fecha, recurso, suma, promedio, minimo, maximo, conteo, unidad
+                    FROM metrics_rollup
+                    WHERE metrica = ? AND entidad = ? AND resolucion = ? AND periodo BETWEEN ? AND ?
+                """
+                params += [metrica, entidad, resolucion, completos[0].isoformat(), completos[1].isoformat()]
+                if recurso:
+                    query += " AND recurso = ?"
+                    params.append(recurso)
+                elif recurso_filter:
+                    query += f" AND recurso IN ({','.join(['?'] * len(recurso_filter))})"
+                    params.extend(recurso_filter)
+                partes.append(query)
+                tramos = [(inicio, completos[0] - timedelta(days=1)), (completos[1] + timedelta(days=1), fin)]
+            else:
+                # Sin rollups construidos para la serie: todo el rango se agrega al vuelo
+                tramos = [(inicio, fin)]
+            
+            for desde, hasta in tramos:
+                if desde > hasta:
+                    continue
+                fuente, p = _query_fuente(conn, metrica, entidad, desde.isoformat(), hasta.isoformat(),
+                                          recurso, recurso_filter)
+                partes.append(f"""
+                    SELECT {_PERIODO_SQL[resolucion].format(col='fecha')} AS fecha, COALESCE(recurso, '') AS recurso,
+                           SUM(valor_gwh) AS suma, AVG(valor_gwh) AS promedio, MIN(valor_gwh) AS minimo,
+                           MAX(valor_gwh) AS maximo, COUNT(*) AS conteo, MAX(unidad) AS unidad
+                    FROM ({fuente})
+                    GROUP BY 1, 2
+                """)
+                params += p
+            
+            query = f"""
+                SELECT fecha, ? AS metrica, ? AS entidad, NULLIF(recurso, '') AS recurso,
+                       {agregacion} AS valor_gwh, unidad, ? AS resolucion,
+                       suma, promedio, minimo, maximo, conteo
+                FROM ({' UNION ALL '.join(partes)})
+                ORDER BY fecha, recurso
+            """
+            df = pd.read_sql_query(query, conn, params=[metrica, entidad, resolucion] + params)
+        
+        elapsed = time.time() - t_start
+        logger.info(f"✅ Rollup {metrica}/{entidad} [{resolucion}] en {elapsed:.2f}s: {len(df)} registros ({fecha_inicio} a {fecha_fin})")
+        return df
+        
+    except Exception as e:
+        logger.error(f"❌ Error consultando rollup {metrica}/{entidad}: {e}")
+        return pd.DataFrame()
+
+
+def get_group_rollup(
+    metrica: str,
+    entidad: str,
+    fecha_inicio: str,
+    fecha_fin: Optional[str] = None,
+    resolucion: str = 'auto',
+    grupos: Optional[list] = None,
+    agregacion: str = 'suma',
+    min_puntos: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Serie agregada por grupo de recursos desde metrics_rollup_grupo
+    
+    Args:
+        metrica, entidad: Serie ('Gene'/'Recurso', 'VoluUtilDiarEner'/'Embalse', ...)
+        fecha_inicio, fecha_fin: Rango 'YYYY-MM-DD'
+        resolucion: 'D' (totales diarios), 'W', 'M', 'Y' o 'auto' (ver pick_resolution)
+        grupos: Filtro de grupos (ej: ['_TOTAL_'], ['HIDRAULICA', 'SOLAR']); None = todos
+        agregacion: 'suma', 'promedio', 'minimo' o 'maximo' de los totales diarios → valor_gwh
+        min_puntos: Puntos mínimos para resolucion='auto'
+    
+    Returns:
+        DataFrame con columnas: fecha, metrica, entidad, grupo, valor_gwh, unidad, resolucion,
+        suma, promedio, minimo, maximo, conteo. Si los rollups de la serie no están
+        construidos, los totales se agregan al vuelo desde los datos diarios
+    """
+    try:
+        if fecha_fin is None:
+            fecha_fin = fecha_inicio
+        if resolucion == 'auto':
+            resolucion = pick_resolution(fecha_inicio, fecha_fin, min_puntos or MIN_PUNTOS_ROLLUP)
+        if resolucion not in _PERIODO_SQL:
+            raise ValueError(f"resolución no soportada: {resolucion}")
+        if agregacion not in _AGREGACIONES_ROLLUP:
+            raise ValueError(f"agregación no soportada: {agregacion}")
+        
+        inicio, fin = _a_fecha(fecha_inicio), _a_fecha(fecha_fin)
+        filtro, params_filtro = "", []
+        if grupos:
+            filtro = f" AND grupo IN ({','.join(['?'] * len(grupos))})"
+            params_filtro = list(grupos)
+        
+        partes, params = [], []
+        with get_connection(readonly=True) as conn:
+            if _rollups_construidos(conn, metrica, entidad):
+                completos = _periodos_completos(inicio, fin, resolucion) if resolucion != 'D' else None
+                if completos:
+                    partes.append(f"""
+                        SELECT periodo AS fecha, grupo, suma, promedio, minimo, maximo, conteo, unidad
+                        FROM metrics_rollup_grupo
+                        WHERE metrica = ? AND entidad = ? AND resolucion = ? AND periodo BETWEEN ? AND ?{filtro}
+                    """)
+                    params += [metrica, entidad, resolucion, completos[0].isoformat(),
+                               completos[1].isoformat()] + params_filtro
+                    tramos = [(inicio, completos[0] - timedelta(days=1)), (completos[1] + timedelta(days=1), fin)]
+                else:
+                    tramos = [(inicio, fin)]
+                
+                # Periodos parciales: se agregan los totales diarios ('D') del grupo
+                for desde, hasta in tramos:
+                    if desde > hasta:
+                        continue
+                    partes.append(f"""
+                        SELECT {_PERIODO_SQL[resolucion].format(col='periodo')} AS fecha, grupo,
+                               SUM(suma) AS suma, AVG(suma) AS promedio, MIN(suma) AS minimo, MAX(suma) AS maximo,
+                               COUNT(*) AS conteo, MAX(unidad) AS unidad
+                        FROM metrics_rollup_grupo
+                        WHERE metrica = ? AND entidad = ? AND resolucion = 'D' AND periodo BETWEEN ? AND ?{filtro}
+                        GROUP BY 1, 2
+                    """)
+                    params += [metrica, entidad, desde.isoformat(), hasta.isoformat()] + params_filtro
+            else:
+                # Serie sin rollups construidos: totales diarios por grupo al vuelo desde los datos diarios
+                fuente, p = _query_fuente(conn, metrica, entidad, inicio.isoformat(), fin.isoformat())
+                totales = f"""
+                    SELECT date(fecha) AS periodo, '{GRUPO_TOTAL}' AS grupo, SUM(valor_gwh) AS suma,
+                           MAX(unidad) AS unidad
+                    FROM ({fuente})
+                    GROUP BY 1
+                """
+                params_totales = list(p)
+                catalogo = CATALOGO_GRUPOS.get(entidad)
+                if catalogo:
+                    totales += f"""
+                        UNION ALL
+                        SELECT date(s.fecha), UPPER(c.tipo), SUM(s.valor_gwh), MAX(s.unidad)
+                        FROM ({fuente}) s JOIN catalogos c ON c.catalogo = ? AND c.codigo = s.recurso
+                        WHERE c.tipo IS NOT NULL
+                        GROUP BY 1, 2
+                    """
+                    params_totales += list(p) + [catalogo]
+                partes.append(f"""
+                    SELECT {_PERIODO_SQL[resolucion].format(col='periodo')} AS fecha, grupo,
+                           SUM(suma) AS suma, AVG(suma) AS promedio, MIN(suma) AS minimo, MAX(suma) AS maximo,
+                           COUNT(*) AS conteo, MAX(unidad) AS unidad
+                    FROM ({totales})
+                    WHERE 1 = 1{filtro}
+                    GROUP BY 1, 2
+                """)
+                params += params_totales + params_filtro
+            
+            query = f"""
+                SELECT fecha, ? AS metrica, ? AS entidad, grupo, {agregacion} AS valor_gwh, unidad,
+                       ? AS resolucion, suma, promedio, minimo, maximo, conteo
+                FROM ({' UNION ALL '.join(partes)})
+                ORDER BY fecha, grupo
+            """
+            df = pd.read_sql_query(query, conn, params=[metrica, entidad, resolucion] + params)
+        
+        logger.info(f"✅ Rollup por grupo {metrica}/{entidad} [{resolucion}]: {len(df)} registros ({fecha_inicio} a {fecha_fin})")
+        return df
+        
+    except Exception as e:
+        logger.error(f"❌ Error consultando rollup por grupo {metrica}/{entidad}: {e}")
+        return pd.DataFrame()
+
+
 # ============================================================================
 # INICIALIZACIÓN AUTOMÁTICA
 # ============================================================================
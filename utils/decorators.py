@@ -9,6 +9,7 @@ Decoradores disponibles:
     - @retry: Reintentar operaciones fallidas
     - @timing: Medir tiempo de ejecución
     - @cache_result: Cachear resultados de funciones
+    - @single_flight: Una sola ejecución para llamadas idénticas concurrentes
     - @require_api: Validar que API esté disponible
 
 Uso:
@@ -22,7 +23,9 @@ Uso:
 """
 
 import functools
+import threading
 import time
+from concurrent.futures import Future
 from typing import Any, Callable, Optional, Type, Union
 from datetime import datetime, timedelta
 
@@ -247,6 +250,93 @@ def cache_result(ttl: int = 3600):
     return decorator
 
 
+# ============================================================================
+# SINGLE-FLIGHT (COALESCENCIA DE LLAMADAS CONCURRENTES)
+# ============================================================================
+
+# {nombre de función: {'ejecuciones': n, 'coalescidas': n, ...}}
+_single_flight_stats = {}
+_single_flight_stats_lock = threading.Lock()
+
+
+def contar_single_flight(nombre: str, contador: str, n: int = 1):
+    """Suma n a un contador de get_single_flight_stats (ej: coalescencias entre procesos)"""
+    with _single_flight_stats_lock:
+        stats = _single_flight_stats.setdefault(nombre, {'ejecuciones': 0, 'coalescidas': 0})
+        stats[contador] = stats.get(contador, 0) + n
+
+
+def get_single_flight_stats() -> dict:
+    """
+    Contadores de @single_flight por función: ejecuciones reales y llamadas coalescidas
+    (que esperaron el resultado de otra idéntica en curso)
+    
+    Ejemplo:
+        get_single_flight_stats()
+        # {'fetch_metric_data': {'ejecuciones': 3, 'coalescidas': 12, 'coalescidas_procesos': 2}}
+    """
+    with _single_flight_stats_lock:
+        return {nombre: dict(stats) for nombre, stats in _single_flight_stats.items()}
+
+
+def _copiar_resultado(resultado):
+    """Copia de DataFrames (sueltos o en tuplas/dicts): cada llamador puede modificar el suyo"""
+    if hasattr(resultado, 'copy') and hasattr(resultado, 'columns'):
+        return resultado.copy()
+    if isinstance(resultado, tuple):
+        return tuple(_copiar_resultado(r) for r in resultado)
+    if isinstance(resultado, dict):
+        return {k: _copiar_resultado(v) for k, v in resultado.items()}
+    return resultado
+
+
+def single_flight(func: Callable) -> Callable:
+    """
+    Decorador single-flight: si varios hilos del proceso llaman a la función con los
+    mismos argumentos mientras una llamada está en curso, solo esa se ejecuta y las
+    demás esperan y reciben su resultado (o su excepción). No guarda nada al terminar:
+    la siguiente llamada vuelve a ejecutar la función.
+    
+    Los DataFrames del resultado se copian para cada llamador.
+    Contadores en get_single_flight_stats().
+    
+    Ejemplo:
+        @single_flight
+        def fetch_metric_data(metric, entity, start_date, end_date):
+            return api.request_data(metric, entity, start_date, end_date)
+    """
+    en_vuelo = {}
+    lock = threading.Lock()
+    
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        clave = repr((args, sorted(kwargs.items())))
+        with lock:
+            futuro = en_vuelo.get(clave)
+            lider = futuro is None
+            if lider:
+                futuro = en_vuelo[clave] = Future()
+        
+        if not lider:
+            contar_single_flight(func.__name__, 'coalescidas')
+            logger.debug(f"🔗 {func.__name__}: esperando llamada idéntica en curso")
+            return _copiar_resultado(futuro.result())
+        
+        contar_single_flight(func.__name__, 'ejecuciones')
+        try:
+            resultado = func(*args, **kwargs)
+            futuro.set_result(resultado)
+        except BaseException as e:
+            futuro.set_exception(e)
+            raise
+        finally:
+            with lock:
+                del en_vuelo[clave]
+        return _copiar_resultado(resultado)
+    
+    return wrapper
+
+
 # ============================================================================
 # VALIDACIÓN DE API
 # ============================================================================
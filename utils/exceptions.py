@@ -13,7 +13,8 @@ Jerarquía:
     ├── APIError
     │   ├── APIConnectionError
     │   ├── APITimeoutError
-    │   └── APIResponseError
+    │   ├── APIResponseError
+    │   └── APIUnavailableError
     ├── CacheError
     │   ├── CacheCorruptedError
     │   └── CacheExpiredError
@@ -150,6 +151,20 @@ class APIResponseError(APIError):
     pass
 
 
+class APIUnavailableError(APIError):
+    """
+    Se lanza sin consultar la API cuando el cliente XM la da por caída (circuito
+    abierto tras timeouts repetidos) o no tiene hilos libres para otra consulta.
+    
+    Ejemplo:
+        raise APIUnavailableError(
+            "Circuito abierto: API XM no responde",
+            details={'reintento_en_s': 42}
+        )
+    """
+    pass
+
+
 # ============================================================================
 # ERRORES DE CACHE
 # ============================================================================
@@ -7,24 +7,22 @@
 ╚══════════════════════════════════════════════════════════════╝
 """
 
-import sqlite3
 from datetime import datetime, timedelta
 from typing import Dict, Any
 import os
 
+from utils import db_manager
 
-def verificar_salud_sistema(db_path: str = 'portal_energetico.db') -> Dict[str, Any]:
+
+def verificar_salud_sistema() -> Dict[str, Any]:
     """
     Verifica la salud del sistema completo
+    Usa la conexión de solo lectura del pool de db_manager (misma BD del dashboard)
     
     Returns:
         Dict con status, checks individuales y mensaje
     """
-    # Si es ruta relativa, construir desde directorio raíz
-    if not os.path.isabs(db_path):
-        # utils/health_check.py -> raíz del proyecto
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        db_path = os.path.join(script_dir, '..', db_path)
+    db_path = str(db_manager.DB_PATH)
     
     resultado = {
         'status': 'healthy',
@@ -44,104 +42,98 @@ def verificar_salud_sistema(db_path: str = 'portal_energetico.db') -> Dict[str,
         
         resultado['checks']['database_exists'] = True
         
-        # Conectar a SQLite
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+        # Conteos y fechas por serie desde el catálogo de estadísticas (sin recorrer metrics)
+        series = db_manager.get_metrics_stats()
+        resultado['checks']['stats_catalog'] = not series.empty
+        if series.empty:
+            resultado['warnings'].append('Sin catálogo de estadísticas (scripts/monitor_etl.py --recompute)')
+            series_sistema = {}
+        else:
+            series_sistema = {fila.metrica: fila for fila in series[series['entidad'] == 'Sistema'].itertuples()}
         
-        # 2. Verificar tamaño de la base de datos
-        db_size_mb = os.path.getsize(db_path) / (1024 * 1024)
-        resultado['checks']['database_size_mb'] = round(db_size_mb, 2)
+        # Conectar a SQLite (pool de solo lectura)
+        with db_manager.get_connection(readonly=True) as conn:
+            cursor = conn.cursor()
         
-        if db_size_mb < 100:
-            resultado['warnings'].append(f'Base de datos pequeña: {db_size_mb:.2f} MB')
+            # 2. Verificar tamaño de la base de datos
+            db_size_mb = os.path.getsize(db_path) / (1024 * 1024)
+            resultado['checks']['database_size_mb'] = round(db_size_mb, 2)
         
-        # Verificar tablas principales
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tablas = [row['name'] for row in cursor.fetchall()]
+            if db_size_mb < 100:
+                resultado['warnings'].append(f'Base de datos pequeña: {db_size_mb:.2f} MB')
         
-        tablas_requeridas = ['metrics', 'catalogos']
-        tablas_faltantes = [t for t in tablas_requeridas if t not in tablas]
+            # Verificar tablas principales
+            cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")  # metrics es vista en esquema v2
+            tablas = [row['name'] for row in cursor.fetchall()]
         
-        if tablas_faltantes:
-            resultado['errors'].append(f'Tablas faltantes: {tablas_faltantes}')
-            resultado['status'] = 'unhealthy'
+            tablas_requeridas = ['metrics', 'catalogos']
+            tablas_faltantes = [t for t in tablas_requeridas if t not in tablas]
         
-        resultado['checks']['tables_exist'] = len(tablas_faltantes) == 0
-        resultado['checks']['tables_found'] = len(tablas)
+            if tablas_faltantes:
+                resultado['errors'].append(f'Tablas faltantes: {tablas_faltantes}')
+                resultado['status'] = 'unhealthy'
         
-        # 4. Verificar cantidad de registros
-        cursor.execute("SELECT COUNT(*) as count FROM metrics")
-        total_registros = cursor.fetchone()['count']
-        resultado['checks']['total_records'] = total_registros
+            resultado['checks']['tables_exist'] = len(tablas_faltantes) == 0
+            resultado['checks']['tables_found'] = len(tablas)
         
-        if total_registros < 100000:
-            resultado['warnings'].append(f'Pocos registros: {total_registros}')
+            # 4. Verificar cantidad de registros
+            total_registros = int(series['registros'].sum()) if not series.empty else 0
+            resultado['checks']['total_records'] = total_registros
         
-        # 5. Verificar frescura de los datos
-        cursor.execute("""
-            SELECT MAX(fecha) as fecha_max
-            FROM metrics
-            WHERE metrica = 'Gene' AND entidad = 'Sistema' AND recurso = '_SISTEMA_'
-        """)
+            if total_registros < 100000:
+                resultado['warnings'].append(f'Pocos registros: {total_registros}')
         
-        row = cursor.fetchone()
-        if row and row['fecha_max']:
-            fecha_max = datetime.strptime(row['fecha_max'], '%Y-%m-%d')
-            dias_antiguedad = (datetime.now() - fecha_max).days
+            # 5. Verificar frescura de los datos
+            row = series_sistema.get('Gene')
+            if row is not None and row.fecha_max:
+                fecha_max = datetime.strptime(row.fecha_max, '%Y-%m-%d')
+                dias_antiguedad = (datetime.now() - fecha_max).days
             
-            resultado['checks']['latest_data_date'] = row['fecha_max']
-            resultado['checks']['data_age_days'] = dias_antiguedad
+                resultado['checks']['latest_data_date'] = row.fecha_max
+                resultado['checks']['data_age_days'] = dias_antiguedad
             
-            if dias_antiguedad > 3:
-                resultado['warnings'].append(f'Datos desactualizados: {dias_antiguedad} días')
-                resultado['status'] = 'degraded'
-            elif dias_antiguedad > 7:
-                resultado['errors'].append(f'Datos muy desactualizados: {dias_antiguedad} días')
+                if dias_antiguedad > 3:
+                    resultado['warnings'].append(f'Datos desactualizados: {dias_antiguedad} días')
+                    resultado['status'] = 'degraded'
+                elif dias_antiguedad > 7:
+                    resultado['errors'].append(f'Datos muy desactualizados: {dias_antiguedad} días')
+                    resultado['status'] = 'unhealthy'
+            else:
+                resultado['errors'].append('No se encontraron datos de generación')
                 resultado['status'] = 'unhealthy'
-        else:
-            resultado['errors'].append('No se encontraron datos de generación')
-            resultado['status'] = 'unhealthy'
-        
-        # 6. Verificar duplicados
-        cursor.execute("""
-            SELECT COUNT(*) as count
-            FROM (
-                SELECT metrica, entidad, recurso, fecha, COUNT(*) as n
-                FROM metrics
-                GROUP BY metrica, entidad, recurso, fecha
-                HAVING COUNT(*) > 1
-            )
-        """)
         
-        duplicados = cursor.fetchone()['count']
-        resultado['checks']['duplicate_records'] = duplicados
-        
-        if duplicados > 0:
-            resultado['warnings'].append(f'Duplicados encontrados: {duplicados}')
-        
-        # 7. Verificar integridad de métricas críticas
-        metricas_criticas = ['Gene', 'DemaCome', 'AporEner']
-        metricas_faltantes = []
-        
-        for metrica in metricas_criticas:
+            # 6. Verificar duplicados
             cursor.execute("""
                 SELECT COUNT(*) as count
-                FROM metrics
-                WHERE metrica = ? AND entidad = 'Sistema' AND recurso = '_SISTEMA_'
-            """, (metrica,))
-            
-            count = cursor.fetchone()['count']
-            if count == 0:
-                metricas_faltantes.append(metrica)
-        
-        if metricas_faltantes:
-            resultado['errors'].append(f'Métricas críticas sin datos: {metricas_faltantes}')
-            resultado['status'] = 'unhealthy'
+                FROM (
+                    SELECT metrica, entidad, recurso, fecha, COUNT(*) as n
+                    FROM metrics
+                    GROUP BY metrica, entidad, recurso, fecha
+                    HAVING COUNT(*) > 1
+                )
+            """)
+        
+            duplicados = cursor.fetchone()['count']
+            resultado['checks']['duplicate_records'] = duplicados
+        
+            if duplicados > 0:
+                resultado['warnings'].append(f'Duplicados encontrados: {duplicados}')
+        
+            # 7. Verificar integridad de métricas críticas
+            metricas_criticas = ['Gene', 'DemaCome', 'AporEner']
+            metricas_faltantes = []
+        
+            for metrica in metricas_criticas:
+                row = series_sistema.get(metrica)
+                if row is None or row.registros == 0:
+                    metricas_faltantes.append(metrica)
+        
+            if metricas_faltantes:
+                resultado['errors'].append(f'Métricas críticas sin datos: {metricas_faltantes}')
+                resultado['status'] = 'unhealthy'
         
-        resultado['checks']['critical_metrics_ok'] = len(metricas_faltantes) == 0
+            resultado['checks']['critical_metrics_ok'] = len(metricas_faltantes) == 0
         
-        conn.close()
         
         # Mensaje resumen
         if resultado['status'] == 'healthy':
@@ -1,8 +1,15 @@
+import os
+import random
+import threading
+import logging
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import date, timedelta
-from typing import Iterable, List, Tuple, Optional
+from typing import Callable, Iterable, Iterator, List, Tuple, Optional
 import time
 
+logger = logging.getLogger(__name__)
+
 def chunk_date_ranges(start: date, end: date, chunk_days: int = 30) -> List[Tuple[date, date]]:
 	"""Divide un rango [start, end] en sub-rangos de hasta chunk_days días (incluidos).
 	Retorna lista de tuplas (ini, fin) contiguas y no superpuestas.
@@ -17,24 +24,147 @@ def chunk_date_ranges(start: date, end: date, chunk_days: int = 30) -> List[Tupl
 		cur = seg_end + timedelta(days=1)
 	return ranges
 
+class LimitadorTasa:
+	"""Token bucket compartido por hilos: como máximo `tasa` llamadas por segundo
+	en promedio, con ráfagas de hasta `rafaga` llamadas seguidas.
+	"""
+
+	def __init__(self, tasa: float, rafaga: int = 1):
+		self.tasa = tasa
+		self.rafaga = rafaga
+		self._tokens = float(rafaga)
+		self._ultimo = time.monotonic()
+		self._lock = threading.Lock()
+
+	def tomar(self):
+		"""Bloquea hasta que haya un token disponible y lo consume"""
+		while True:
+			with self._lock:
+				ahora = time.monotonic()
+				self._tokens = min(self.rafaga, self._tokens + (ahora - self._ultimo) * self.tasa)
+				self._ultimo = ahora
+				if self._tokens >= 1:
+					self._tokens -= 1
+					return
+				espera = (1 - self._tokens) / self.tasa
+			time.sleep(espera)
+
+
+# Tolerancia de la API XM: la carga secuencial anterior hacía ~1 consulta/s
+# (pausa de 0.8-1.2 s entre lotes) sin rechazos; 4 en paralelo a 2/s como máximo
+XM_API_WORKERS = int(os.getenv('XM_API_WORKERS', 4))
+LIMITADOR_XM = LimitadorTasa(float(os.getenv('XM_API_TASA', 2.0)), rafaga=int(os.getenv('XM_API_RAFAGA', 4)))
+
+
+def reintentar(funcion: Callable, descripcion: str, limitador: Optional[LimitadorTasa] = None,
+               retries: int = 2, backoff_sec: float = 0.8) -> Tuple[object, Optional[Exception], float]:
+	"""Llama funcion() hasta retries + 1 veces, con backoff exponencial con jitter entre
+	intentos; antes de cada intento toma un turno de `limitador` (None = sin limitador).
+	Retorna (resultado, None, segundos) o (None, última excepción, segundos) si se agotan
+	los intentos; segundos cuenta solo los intentos, sin la espera del limitador ni el backoff.
+	"""
+	segundos = 0.0
+	for intento in range(retries + 1):
+		if limitador is not None:
+			limitador.tomar()
+		inicio = time.monotonic()
+		try:
+			resultado = funcion()
+			return resultado, None, segundos + time.monotonic() - inicio
+		except Exception as e:
+			segundos += time.monotonic() - inicio
+			if intento >= retries:
+				logger.error(f"❌ {descripcion} falló tras {retries + 1} intentos: {e}")
+				return None, e, segundos
+			espera = backoff_sec * (2 ** intento) * random.uniform(0.5, 1.5)
+			logger.warning(f"⚠️ {descripcion} falló ({e}), reintento en {espera:.1f}s")
+			time.sleep(espera)
+
+
+def fetch_chunks_concurrente(consultar: Callable, tareas: List, max_workers: int = None,
+                             limitador: Optional[LimitadorTasa] = None, retries: int = 2,
+                             backoff_sec: float = 0.8,
+                             en_vuelo: Optional[int] = None) -> Iterator[Tuple[object, Optional[pd.DataFrame]]]:
+	"""Ejecuta consultar(tarea) para cada tarea en un pool acotado de hilos y entrega
+	(tarea, DataFrame) a medida que terminan (no en el orden de `tareas`).
+
+	Cada llamada pasa por el limitador de tasa (por defecto el compartido de la API XM).
+	Una tarea que lanza excepción se reintenta hasta `retries` veces con backoff
+	exponencial con jitter; si se agotan los reintentos se entrega (tarea, None).
+
+	Las tareas se envían al pool a medida que se consumen los resultados: como máximo
+	`en_vuelo` (por defecto 2 × max_workers) están en curso o terminadas sin entregar,
+	así la memoria depende del tamaño del chunk y no del número de chunks aunque el
+	consumidor sea más lento que la API.
+
+	Ejemplo:
+		tareas = chunk_date_ranges(inicio, fin, 30)
+		for (ini, fin), df in fetch_chunks_concurrente(
+				lambda t: api.request_data('Gene', 'Sistema', t[0], t[1]), tareas):
+			...
+	"""
+	limitador = limitador or LIMITADOR_XM
+
+	def _ejecutar(tarea):
+		return reintentar(lambda: consultar(tarea), f"Chunk {tarea}", limitador, retries, backoff_sec)[0]
+
+	if not tareas:
+		return
+	workers = min(max_workers or XM_API_WORKERS, len(tareas))
+	en_vuelo = max(en_vuelo or 2 * workers, 1)
+	with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='xm-chunk') as pool:
+		siguientes = iter(tareas)
+		futuros = {}
+		for tarea in siguientes:
+			futuros[pool.submit(_ejecutar, tarea)] = tarea
+			if len(futuros) >= en_vuelo:
+				break
+		while futuros:
+			hechos, _ = wait(futuros, return_when=FIRST_COMPLETED)
+			for futuro in hechos:
+				yield futuros.pop(futuro), futuro.result()
+				for tarea in siguientes:
+					futuros[pool.submit(_ejecutar, tarea)] = tarea
+					break
+
+
+def _gene_recurso_diario(df: pd.DataFrame) -> Optional[pd.DataFrame]:
+	"""Respuesta Gene/Recurso de la API → (Codigo, Fecha, Generacion_GWh): suma de las horas"""
+	if df is None or df.empty:
+		return None
+	horas_cols = [c for c in df.columns if str(c).startswith('Values_Hour')]
+	if not horas_cols:
+		return None
+	# Identificar columna de código en respuesta Gene (puede variar)
+	code_col = None
+	for cand in ('Values_code', 'Values_Code', 'Values_resourceCode', 'Values_ResourceCode'):
+		if cand in df.columns:
+			code_col = cand
+			break
+	kwh = df[horas_cols].apply(pd.to_numeric, errors='coerce').sum(axis=1)
+	return pd.DataFrame({
+		'Codigo': df[code_col].astype(str).str.strip() if code_col else '',
+		'Fecha': df['Date'],
+		'Generacion_GWh': kwh / 1_000_000.0,
+	})
+
+
 def fetch_gene_recurso_chunked(objetoAPI, start: date, end: date, filtros: Iterable[str], batch_size: int = 50, chunk_days: int = 180, retries: int = 2, backoff_sec: float = 0.8) -> pd.DataFrame:
 	"""Consulta Gene con Entity='Recurso' para una lista de filtros (SIC) en lotes y por chunks de fechas.
 	Devuelve DataFrame con columnas: ['Codigo','Fecha','Generacion_GWh'] agregadas por día.
 	OPTIMIZADO: Usa cache manager para evitar consultas repetidas a API.
-	MEJORA DE PERFORMANCE: chunk_days dinámico según tamaño del rango.
+	MEJORA DE PERFORMANCE: chunk_days dinámico según tamaño del rango; los chunks
+	(fechas × lotes de códigos) se consultan en paralelo con fetch_chunks_concurrente
+	(limitador de tasa compartido, reintentos con backoff_sec y jitter).
 	"""
-	from utils._xm import fetch_metric_data
-	from utils.cache_manager import get_cache_key, get_from_cache, save_to_cache
-	import logging
-	logger = logging.getLogger(__name__)
+	from utils.cache_manager import get_cache_key, get_from_cache, save_to_cache, es_dia_historico
 	
 	filtros = [str(x).strip() for x in filtros if x and isinstance(x, (str, int))]
-	if not filtros:
+	if objetoAPI is None or not filtros:
 		return pd.DataFrame(columns=['Codigo','Fecha','Generacion_GWh'])
 
 	# OPTIMIZACIÓN: Cachear resultado completo de consulta
-	filtros_hash = hash(tuple(sorted(filtros)))
-	cache_key = get_cache_key('gene_recurso_chunked', filtros_hash, start, end)
+	cache_key = get_cache_key('gene_recurso_chunked', tuple(sorted(filtros)), start, end)
 	cached_data = get_from_cache(cache_key, allow_expired=False)
 	if cached_data is not None:
 		logger.info(f"✅ Cache válido para Gene/Recurso ({len(filtros)} códigos, {start} a {end})")
@@ -43,7 +173,7 @@ def fetch_gene_recurso_chunked(objetoAPI, start: date, end: date, filtros: Itera
 	# OPTIMIZACIÓN V2: Chunk days dinámico según rango total
 	total_days = (end - start).days
 	if total_days <= 60:
-		chunk_days = total_days  # 1 consulta para rangos cortos
+		chunk_days = total_days + 1  # 1 consulta para rangos cortos
 		logger.info(f"📊 Rango corto ({total_days} días) - 1 consulta")
 	elif total_days <= 180:
 		chunk_days = 90  # 2 consultas para rango medio
@@ -58,69 +188,41 @@ def fetch_gene_recurso_chunked(objetoAPI, start: date, end: date, filtros: Itera
 	# OPTIMIZACIÓN V3: Reducir batch_size para rangos grandes (evitar timeouts)
 	if total_days > 365:
 		batch_size = 30  # Lotes más pequeños para rangos >1 año
-		backoff_sec = 1.2  # Más pausa entre requests
 		logger.info(f"⚠️ Rango >1 año: batch_size reducido a {batch_size} para estabilidad")
 	elif total_days > 180:
 		batch_size = 40  # Lotes medianos para rangos >6 meses
-		backoff_sec = 1.0
 	
-	import time
-	registros = []
-	total_batches = sum(1 for _ in chunk_date_ranges(start, end, chunk_days=chunk_days) for _ in range(0, len(filtros), batch_size))
-	batch_count = 0
+	tareas = [(ini, fin, tuple(filtros[i:i+batch_size]))
+	          for ini, fin in chunk_date_ranges(start, end, chunk_days=chunk_days)
+	          for i in range(0, len(filtros), batch_size)]
 	
-	for ini, fin in chunk_date_ranges(start, end, chunk_days=chunk_days):
-		# Batches por códigos SIC
-		for i in range(0, len(filtros), batch_size):
-			batch_count += 1
-			lote = filtros[i:i+batch_size]
-			
-			# OPTIMIZACIÓN: Backoff entre batches para evitar saturar API
-			if batch_count > 1:
-				time.sleep(backoff_sec)
-			
-			# Log de progreso para rangos grandes
-			if total_batches > 5 and batch_count % 5 == 0:
-				logger.info(f"📊 Progreso: {batch_count}/{total_batches} batches completados")
-			
-			# Usar la API directamente con códigos específicos
-			df = objetoAPI.request_data("Gene", "Recurso", ini, fin, lote)
-			if df is None or df.empty:
-				continue
-			horas_cols = [c for c in df.columns if str(c).startswith('Values_Hour')]
-			if not horas_cols:
-				continue
-			# Identificar columna de código en respuesta Gene (puede variar)
-			code_col = None
-			for cand in ('Values_code', 'Values_Code', 'Values_resourceCode', 'Values_ResourceCode'):
-				if cand in df.columns:
-					code_col = cand
-					break
-			for _, row in df.iterrows():
-				try:
-					kwh = sum(float(row.get(c)) for c in horas_cols if pd.notna(row.get(c)))
-				except Exception:
-					kwh = 0.0
-				registros.append({
-					'Codigo': str(row.get(code_col, '') if code_col else '').strip(),
-					'Fecha': row.get('Date'),
-					'Generacion_GWh': kwh/1_000_000.0
-				})
-
-	if not registros:
+	# Cada chunk se transforma apenas llega; el orden final es por fecha y código
+	partes = []
+	for n, (_, df) in enumerate(fetch_chunks_concurrente(
+			lambda t: objetoAPI.request_data("Gene", "Recurso", t[0], t[1], list(t[2])),
+			tareas, retries=retries, backoff_sec=backoff_sec), start=1):
+		parte = _gene_recurso_diario(df)
+		if parte is not None:
+			partes.append(parte)
+		# Log de progreso para rangos grandes
+		if len(tareas) > 5 and n % 5 == 0:
+			logger.info(f"📊 Progreso: {n}/{len(tareas)} batches completados")
+
+	if not partes:
 		return pd.DataFrame(columns=['Codigo','Fecha','Generacion_GWh'])
 	
-	df_out = pd.DataFrame(registros)
+	df_out = pd.concat(partes, ignore_index=True)
 	# Asegurar tipos/orden básico
 	if 'Fecha' in df_out.columns:
 		try:
 			df_out['Fecha'] = pd.to_datetime(df_out['Fecha']).dt.date
 		except Exception:
 			pass
+	df_out = df_out.sort_values(['Fecha', 'Codigo'], kind='stable', ignore_index=True)
 	
-	# Cachear resultado por 6 horas (datos de generación actualizados diariamente)
-	save_to_cache(cache_key, df_out, cache_type='gene_recurso')
+	# Cachear resultado por 6 horas (datos de generación actualizados diariamente);
+	# rangos que terminan antes de los días recientes no cambian: sin vencimiento
+	save_to_cache(cache_key, df_out, cache_type='historico' if es_dia_historico(end) else 'gene_recurso')
 	logger.info(f"✅ Cacheado Gene/Recurso: {len(df_out)} registros ({len(filtros)} códigos)")
 	
 	return df_out
-
@@ -0,0 +1,236 @@
+"""
+Cliente XM: todas las llamadas a pydataxm del dashboard pasan por aquí
+Portal Energético MME
+
+Envuelve el singleton ReadDB de get_objetoAPI() con:
+    - Un pool de hilos compartido y acotado (XM_CLIENT_WORKERS): antes cada consulta
+      creaba su propio ThreadPoolExecutor para poder aplicar el timeout, y una consulta
+      colgada dejaba su hilo vivo sin límite. Un hilo colgado ocupa su cupo hasta que
+      la API responde; sin cupos libres la consulta falla de inmediato.
+    - Plazo por llamada (timeout, 30 s por defecto).
+    - Circuit breaker: tras XM_CLIENT_UMBRAL_FALLOS timeouts/errores seguidos el
+      circuito se abre y las consultas fallan sin esperar durante XM_CLIENT_ENFRIAMIENTO
+      segundos; luego una consulta de prueba decide si se cierra o se vuelve a abrir.
+    - Histogramas de latencia y conteo de errores por métrica (ver estadisticas()).
+
+Errores: APITimeoutError, APIUnavailableError (circuito abierto / sin cupo) y
+APIResponseError (excepción de pydataxm), todos subclases de APIError.
+
+Uso:
+    from utils.xm_client import get_xm_client
+
+    df = get_xm_client().request_data('Gene', 'Sistema', '2024-01-01', '2024-01-31')
+"""
+
+import os
+import time
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Optional
+
+from utils.exceptions import APITimeoutError, APIResponseError, APIUnavailableError
+
+logger = logging.getLogger('xm_helper')
+
+XM_CLIENT_WORKERS = int(os.getenv('XM_CLIENT_WORKERS', 6))
+XM_CLIENT_TIMEOUT = float(os.getenv('XM_CLIENT_TIMEOUT', 30))
+XM_CLIENT_UMBRAL_FALLOS = int(os.getenv('XM_CLIENT_UMBRAL_FALLOS', 3))
+XM_CLIENT_ENFRIAMIENTO = float(os.getenv('XM_CLIENT_ENFRIAMIENTO', 60))
+
+# Límites superiores (s) de los buckets del histograma de latencias
+BUCKETS_LATENCIA = (0.5, 1, 2, 5, 10, 30, float('inf'))
+
+
+class XMClient:
+    """Cliente de la API XM con pool acotado, plazos, circuit breaker y estadísticas"""
+
+    def __init__(self, api=None, max_workers: int = XM_CLIENT_WORKERS, timeout: float = XM_CLIENT_TIMEOUT,
+                 umbral_fallos: int = XM_CLIENT_UMBRAL_FALLOS, enfriamiento: float = XM_CLIENT_ENFRIAMIENTO):
+        """
+        Args:
+            api: Objeto con request_data/get_collections (por defecto get_objetoAPI())
+            max_workers: Consultas simultáneas como máximo (incluidas las colgadas)
+            timeout: Plazo por defecto de cada llamada (s)
+            umbral_fallos: Fallos seguidos que abren el circuito
+            enfriamiento: Segundos con el circuito abierto antes de probar de nuevo
+        """
+        self._api = api
+        self.timeout = timeout
+        self.umbral_fallos = umbral_fallos
+        self.enfriamiento = enfriamiento
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='xm-api')
+        self._cupos = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._fallos_seguidos = 0
+        self._abierto_hasta = 0.0
+        self._probando = False
+        self._stats = {}
+
+    @property
+    def api(self):
+        """ReadDB subyacente (None si pydataxm no está disponible)"""
+        if self._api is not None:
+            return self._api
+        from utils._xm import get_objetoAPI
+        return get_objetoAPI()
+
+    @property
+    def disponible(self) -> bool:
+        return self.api is not None
+
+    # ------------------------------------------------------------------
+    # Circuit breaker
+    # ------------------------------------------------------------------
+
+    def estado_circuito(self) -> str:
+        """'cerrado' (normal), 'abierto' (falla sin consultar) o 'semiabierto' (consulta de prueba)"""
+        with self._lock:
+            if self._fallos_seguidos < self.umbral_fallos:
+                return 'cerrado'
+            return 'abierto' if time.monotonic() < self._abierto_hasta else 'semiabierto'
+
+    def _admitir(self, metrica: str):
+        """Deja pasar la llamada o lanza APIUnavailableError (circuito abierto)"""
+        with self._lock:
+            if self._fallos_seguidos < self.umbral_fallos:
+                return
+            restante = self._abierto_hasta - time.monotonic()
+            if restante <= 0 and not self._probando:
+                self._probando = True  # una sola consulta de prueba
+                return
+        self._registrar(metrica, None, 'circuito_abierto')
+        raise APIUnavailableError("Circuito abierto: API XM sin responder",
+                                  details={'metrica': metrica, 'reintento_en_s': round(max(restante, 0), 1)})
+
+    def _resultado(self, exito: bool):
+        with self._lock:
+            self._probando = False
+            if exito:
+                if self._fallos_seguidos >= self.umbral_fallos:
+                    logger.info("✅ API XM responde de nuevo: circuito cerrado")
+                self._fallos_seguidos = 0
+                return
+            self._fallos_seguidos += 1
+            if self._fallos_seguidos >= self.umbral_fallos:
+                self._abierto_hasta = time.monotonic() + self.enfriamiento
+                logger.error(f"🔌 API XM: {self._fallos_seguidos} fallos seguidos, circuito abierto "
+                             f"por {self.enfriamiento:.0f}s")
+
+    # ------------------------------------------------------------------
+    # Estadísticas
+    # ------------------------------------------------------------------
+
+    def _registrar(self, metrica: str, latencia: Optional[float], error: Optional[str] = None):
+        with self._lock:
+            stats = self._stats.setdefault(metrica, {
+                'llamadas': 0, 'latencias': [0] * len(BUCKETS_LATENCIA), 'errores': {}
+            })
+            stats['llamadas'] += 1
+            if latencia is not None:
+                bucket = next(i for i, limite in enumerate(BUCKETS_LATENCIA) if latencia <= limite)
+                stats['latencias'][bucket] += 1
+            if error:
+                stats['errores'][error] = stats['errores'].get(error, 0) + 1
+
+    def estadisticas(self) -> dict:
+        """
+        Por métrica: llamadas, histograma de latencias {'<=0.5s': n, ...} y errores por tipo
+        (timeout, error, circuito_abierto, sin_cupo), más el estado del circuito
+        """
+        etiquetas = [f"<={b:g}s" if b != float('inf') else f">{BUCKETS_LATENCIA[-2]:g}s" for b in BUCKETS_LATENCIA]
+        with self._lock:
+            metricas = {
+                metrica: {
+                    'llamadas': s['llamadas'],
+                    'latencias': dict(zip(etiquetas, s['latencias'])),
+                    'errores': dict(s['errores']),
+                }
+                for metrica, s in self._stats.items()
+            }
+        return {'circuito': self.estado_circuito(), 'metricas': metricas}
+
+    # ------------------------------------------------------------------
+    # Llamadas
+    # ------------------------------------------------------------------
+
+    def _llamar(self, metrica: str, metodo: str, *args, timeout: Optional[float] = None):
+        """Ejecuta api.<metodo>(*args) en el pool compartido con plazo y circuit breaker"""
+        api = self.api
+        if api is None:
+            raise APIUnavailableError("pydataxm no disponible", details={'metrica': metrica})
+        funcion = getattr(api, metodo)
+        self._admitir(metrica)
+        if not self._cupos.acquire(blocking=False):
+            with self._lock:
+                self._probando = False
+            self._registrar(metrica, None, 'sin_cupo')
+            raise APIUnavailableError("Sin hilos libres para consultar la API XM",
+                                      details={'metrica': metrica})
+
+        def _tarea():
+            try:
+                return funcion(*args)
+            finally:
+                # El cupo se libera cuando la API responde, no cuando vence el plazo
+                self._cupos.release()
+
+        plazo = timeout or self.timeout
+        inicio = time.monotonic()
+        try:
+            futuro = self._executor.submit(_tarea)
+        except RuntimeError:
+            self._cupos.release()
+            raise
+        try:
+            resultado = futuro.result(timeout=plazo)
+        except FutureTimeoutError:
+            self._registrar(metrica, time.monotonic() - inicio, 'timeout')
+            self._resultado(False)
+            raise APITimeoutError(f"Timeout ({plazo:.0f}s) consultando API XM",
+                                  details={'metrica': metrica, 'timeout': plazo})
+        except Exception as e:
+            self._registrar(metrica, time.monotonic() - inicio, 'error')
+            self._resultado(False)
+            raise APIResponseError(f"Error de la API XM: {e}", details={'metrica': metrica}) from e
+        self._registrar(metrica, time.monotonic() - inicio)
+        self._resultado(True)
+        return resultado
+
+    def request_data(self, metric: str, entity: str, start_date, end_date, filtros=None,
+                     timeout: Optional[float] = None):
+        """
+        ReadDB.request_data con plazo y circuit breaker
+
+        Args:
+            metric, entity: Métrica y entidad XM
+            start_date, end_date: Rango (str 'YYYY-MM-DD' o date)
+            filtros: Lista opcional de códigos (quinto argumento de pydataxm)
+            timeout: Plazo de esta llamada (por defecto el del cliente)
+
+        Returns:
+            DataFrame de la API (puede ser None o vacío)
+
+        Raises:
+            APITimeoutError, APIUnavailableError, APIResponseError
+        """
+        args = (metric, entity, start_date, end_date) + ((filtros,) if filtros is not None else ())
+        return self._llamar(metric, 'request_data', *args, timeout=timeout)
+
+    def get_collections(self, timeout: Optional[float] = None):
+        """ReadDB.get_collections (catálogo de métricas XM) con plazo y circuit breaker"""
+        return self._llamar('_colecciones', 'get_collections', timeout=timeout)
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def get_xm_client() -> XMClient:
+    """Cliente XM único del proceso"""
+    global _cliente
+    if _cliente is None:
+        with _cliente_lock:
+            if _cliente is None:
+                _cliente = XMClient()
+    return _cliente